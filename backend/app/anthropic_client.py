@@ -1,9 +1,12 @@
 from __future__ import annotations
-from typing import Dict, Iterable, List
+from typing import Any, AsyncIterator, Dict, Iterable, List
 import os
 import logging
+import httpx
 from dotenv import load_dotenv
-from anthropic import Anthropic
+from anthropic import Anthropic, AsyncAnthropic
+from app.llm_metrics import get_prompt_cache_metrics
+from app.prompts import split_system_prompt
 
 # Create logger for Anthropic client
 llm_logger = logging.getLogger('llm.anthropic')
@@ -12,16 +15,31 @@ load_dotenv()
 
 
 class AnthropicStreamer:
-    def __init__(self, model: str | None = None) -> None:
+    def __init__(
+        self,
+        model: str | None = None,
+        http_client: httpx.Client | None = None,
+        async_http_client: httpx.AsyncClient | None = None,
+        prompt_cache: bool = True,
+    ) -> None:
         api_key = os.getenv("ANTHROPIC_API_KEY")
         if not api_key:
             llm_logger.error("ANTHROPIC_API_KEY is not set")
             raise RuntimeError("ANTHROPIC_API_KEY is not set")
         
-        self.client = Anthropic(api_key=api_key)
+        # Shared httpx pools (from the LLM client registry) keep TLS connections warm across turns
+        self.client = Anthropic(api_key=api_key, http_client=http_client)
+        self.async_client = AsyncAnthropic(api_key=api_key, http_client=async_http_client)
         self.model = model or os.getenv("ANTHROPIC_MODEL", "claude-sonnet-4-5-20250929")
+        # Mark the static persona prompt with cache_control so it is read from Anthropic's prompt cache
+        self.prompt_cache = prompt_cache
         llm_logger.info(f"Anthropic client initialized with model: {self.model}")
 
+    @property
+    def max_output_tokens(self) -> int:
+        """Reply token limit sent with every request (ANTHROPIC_MAX_TOKENS)."""
+        return int(os.getenv("ANTHROPIC_MAX_TOKENS", "1024"))
+
     def _convert_messages(self, messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
         llm_logger.debug(f"Converting {len(messages)} messages for Anthropic format")
         converted: List[Dict[str, str]] = []
@@ -38,27 +56,45 @@ class AnthropicStreamer:
         llm_logger.debug(f"Converted to {len(converted)} messages")
         return converted
 
-    def stream_chat(self, messages: List[Dict[str, str]], **kwargs) -> Iterable[str]:
-        llm_logger.info(f"Starting Anthropic chat stream with {len(messages)} messages")
-        
+    def _system_blocks(self, message: Dict[str, str]) -> List[Dict[str, Any]]:
+        """Split the system prompt into a cache-controlled persona block and a per-turn block."""
+        prefix, suffix = split_system_prompt(message)
+        blocks: List[Dict[str, Any]] = [
+            {"type": "text", "text": prefix, "cache_control": {"type": "ephemeral"}}
+        ]
+        if suffix.strip():
+            blocks.append({"type": "text", "text": suffix})
+        return blocks
+
+    def _build_request(self, messages: List[Dict[str, str]], **kwargs) -> Dict[str, Any]:
+        """Build the keyword arguments shared by the sync and async stream calls."""
         system_prompt = None
         if messages and messages[0].get("role") == "system":
-            system_prompt = messages[0].get("content")
+            if self.prompt_cache:
+                system_prompt = self._system_blocks(messages[0])
+            else:
+                system_prompt = messages[0].get("content")
             msg_body = self._convert_messages(messages[1:])
             llm_logger.debug("Using system prompt from first message")
         else:
             msg_body = self._convert_messages(messages)
             llm_logger.debug("No system prompt detected")
 
+        return dict(
+            model=self.model,
+            max_tokens=self.max_output_tokens,
+            system=system_prompt,
+            messages=msg_body,
+            temperature=float(os.getenv("ANTHROPIC_TEMPERATURE", "0.5")),
+            **kwargs,
+        )
+
+    def stream_chat(self, messages: List[Dict[str, str]], **kwargs) -> Iterable[str]:
+        llm_logger.info(f"Starting Anthropic chat stream with {len(messages)} messages")
+        request = self._build_request(messages, **kwargs)
+
         try:
-            with self.client.messages.stream(
-                model=self.model,
-                max_tokens=int(os.getenv("ANTHROPIC_MAX_TOKENS", "1024")),
-                system=system_prompt,
-                messages=msg_body,
-                temperature=float(os.getenv("ANTHROPIC_TEMPERATURE", "0.5")),
-                **kwargs,
-            ) as stream:
+            with self.client.messages.stream(**request) as stream:
                 token_count = 0
                 for event in stream:
                     if event.type == "content_block_delta":
@@ -69,11 +105,33 @@ class AnthropicStreamer:
                 
                 llm_logger.info(f"Anthropic stream completed successfully, yielded {token_count} tokens")
                 
-                # ensure stream is consumed; final message can be accessed if needed
-                _ = stream.get_final_message()
+                # ensure stream is consumed; usage reports cache reads/writes
+                final_message = stream.get_final_message()
+                get_prompt_cache_metrics().record_anthropic_usage(getattr(final_message, "usage", None))
                 
         except Exception as e:
             llm_logger.error(f"Anthropic streaming failed: {str(e)}")
             raise
 
+    async def astream_chat(self, messages: List[Dict[str, str]], **kwargs) -> AsyncIterator[str]:
+        """Stream chat completion on the event loop without holding a worker thread."""
+        llm_logger.info(f"Starting async Anthropic chat stream with {len(messages)} messages")
+        request = self._build_request(messages, **kwargs)
 
+        try:
+            async with self.async_client.messages.stream(**request) as stream:
+                token_count = 0
+                async for event in stream:
+                    if event.type == "content_block_delta":
+                        delta = event.delta
+                        if delta and getattr(delta, "text", None):
+                            token_count += 1
+                            yield delta.text
+
+                llm_logger.info(f"Async Anthropic stream completed successfully, yielded {token_count} tokens")
+                final_message = await stream.get_final_message()
+                get_prompt_cache_metrics().record_anthropic_usage(getattr(final_message, "usage", None))
+
+        except Exception as e:
+            llm_logger.error(f"Async Anthropic streaming failed: {str(e)}")
+            raise
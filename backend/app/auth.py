@@ -3,8 +3,9 @@ from fastapi import Depends, HTTPException, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import Optional
 import logging
-from .utils import decode_token
+from .utils import decode_token_claims
 from .db import get_session
+from .auth_cache import get_principal_cache
 from .models import User
 from sqlalchemy import select
 
@@ -49,16 +50,33 @@ def get_current_user(
 
     auth_logger.debug(f"Attempting authentication for request: {request.method} {request.url}")
     
-    sub = decode_token(creds.credentials)
-    if not sub:
+    claims = decode_token_claims(creds.credentials)
+    if not claims:
         auth_logger.warning(f"Invalid token provided for request: {request.method} {request.url}")
         raise HTTPException(status_code=401, detail="Invalid token")
 
+    sub = claims["sub"]
+    uid = claims.get("uid")
+    cache = get_principal_cache()
+
+    # Hot path: principal already cached (no DB round-trip)
+    user = cache.get_by_id(uid) if uid is not None else cache.get_by_login_id(sub)
+    if user is not None and user.login_id == sub:
+        auth_logger.debug(f"User authenticated from cache: {user.login_id} (ID: {user.id})")
+        return user
+
     with get_session() as db:
-        user = db.exec(select(User).where(User.login_id == sub)).scalar_one_or_none()
+        if uid is not None:
+            # Primary-key lookup; the login_id check guards against stale/forged uid claims
+            user = db.get(User, uid)
+            if user is not None and user.login_id != sub:
+                user = None
+        else:
+            user = db.exec(select(User).where(User.login_id == sub)).scalar_one_or_none()
         if not user:
             auth_logger.warning(f"User not found for login_id: {sub}")
             raise HTTPException(status_code=401, detail="User not found")
         
+        cache.put(user)
         auth_logger.info(f"User authenticated successfully: {user.login_id} (ID: {user.id})")
         return user
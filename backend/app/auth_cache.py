@@ -0,0 +1,153 @@
+"""In-process cache of authenticated principals to skip the per-request user lookup."""
+from __future__ import annotations
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import make_transient_to_detached
+
+from .models import User
+
+# Create logger for the principal cache
+auth_cache_logger = logging.getLogger('auth.cache')
+
+
+def _snapshot(user: User) -> User:
+    """Copy a loaded User into a detached instance that no DB session owns."""
+    copy = User(**user.model_dump())
+    make_transient_to_detached(copy)
+    return copy
+
+
+class PrincipalCache:
+    """TTL + LRU cache of User rows keyed by user ID, with a login_id index.
+
+    Entries are invalidated automatically whenever a User row is updated or
+    deleted through the ORM (profile edits, Google linking, onboarding name
+    changes, password resets, account deletion).
+    """
+
+    def __init__(self, ttl_seconds: float = 300.0, max_entries: int = 10000):
+        """Initialize the cache.
+
+        Args:
+            ttl_seconds: How long an entry stays valid
+            max_entries: Maximum number of cached users (least recently used evicted)
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, Tuple[float, User]]" = OrderedDict()
+        self._login_index: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_by_id(self, user_id: int) -> Optional[User]:
+        """Return a fresh detached copy of the cached user, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, user = entry
+            if expires_at <= time.monotonic():
+                self._remove(user_id)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+        # Callers get their own copy so request code can't mutate the shared entry
+        return _snapshot(user)
+
+    def get_by_login_id(self, login_id: str) -> Optional[User]:
+        """Return the cached user for a login ID, or None on a miss."""
+        with self._lock:
+            user_id = self._login_index.get(login_id)
+        if user_id is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        return self.get_by_id(user_id)
+
+    def put(self, user: User) -> None:
+        """Cache a loaded user."""
+        if user is None or user.id is None:
+            return
+        snapshot = _snapshot(user)
+        with self._lock:
+            self._remove(user.id)
+            self._entries[user.id] = (time.monotonic() + self.ttl_seconds, snapshot)
+            self._login_index[user.login_id] = user.id
+            while len(self._entries) > self.max_entries:
+                oldest_id = next(iter(self._entries))
+                self._remove(oldest_id)
+
+    def invalidate(self, user_id: Optional[int] = None, login_id: Optional[str] = None) -> None:
+        """Drop a user from the cache by ID and/or login ID."""
+        with self._lock:
+            if login_id is not None and user_id is None:
+                user_id = self._login_index.get(login_id)
+            if user_id is not None:
+                self._remove(user_id)
+            if login_id is not None:
+                self._login_index.pop(login_id, None)
+        auth_cache_logger.debug(f"Invalidated cached principal (user_id={user_id}, login_id={login_id})")
+
+    def clear(self) -> None:
+        """Drop every cached user."""
+        with self._lock:
+            self._entries.clear()
+            self._login_index.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Return cache size and hit/miss counters."""
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def _remove(self, user_id: int) -> None:
+        """Remove an entry and its login index (caller holds the lock)."""
+        entry = self._entries.pop(user_id, None)
+        if entry is not None:
+            login_id = entry[1].login_id
+            if self._login_index.get(login_id) == user_id:
+                del self._login_index[login_id]
+
+
+class PrincipalCacheFactory:
+    """Factory for creating the principal cache with lazy initialization."""
+
+    _instance: Optional[PrincipalCache] = None
+
+    @classmethod
+    def create_cache(cls) -> PrincipalCache:
+        """Create or return existing principal cache instance."""
+        if cls._instance is None:
+            from .config.settings import get_settings
+            settings = get_settings()
+            cls._instance = PrincipalCache(
+                ttl_seconds=settings.auth_cache_ttl_seconds,
+                max_entries=settings.auth_cache_max_entries,
+            )
+        return cls._instance
+
+    @classmethod
+    def reset_instance(cls) -> None:
+        """Reset the singleton instance (useful for testing)."""
+        cls._instance = None
+
+
+# Factory function for backward compatibility
+def get_principal_cache() -> PrincipalCache:
+    """Get the global principal cache instance."""
+    return PrincipalCacheFactory.create_cache()
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_changed_user(mapper, connection, target: User) -> None:
+    """Evict a user from the principal cache whenever its row changes."""
+    if PrincipalCacheFactory._instance is not None:
+        PrincipalCacheFactory._instance.invalidate(user_id=target.id, login_id=target.login_id)
@@ -1,7 +1,7 @@
 """Centralized configuration for TherapyBro backend."""
 import os
 from decimal import Decimal
-from typing import Optional, Dict
+from typing import Any, Dict, List, Literal, Optional
 from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -22,6 +22,11 @@ class Settings(BaseSettings):
     jwt_secret: str = Field(default="dev-secret-change", alias="JWT_SECRET")
     jwt_algorithm: str = Field(default="HS256", alias="JWT_ALG")
     jwt_expire_minutes: int = Field(default=1440, alias="JWT_EXPIRE_MIN")  # 24h
+    jwt_include_user_id: bool = Field(default=True, alias="JWT_INCLUDE_USER_ID")
+
+    # Authenticated principal cache (skips the per-request user lookup)
+    auth_cache_ttl_seconds: float = Field(default=300.0, alias="AUTH_CACHE_TTL_SECONDS")
+    auth_cache_max_entries: int = Field(default=10000, alias="AUTH_CACHE_MAX_ENTRIES")
     
     # LLM Provider Configuration
     llm_provider: str = Field(default="anthropic", alias="LLM_PROVIDER")
@@ -39,7 +44,46 @@ class Settings(BaseSettings):
     # Together AI Configuration
     together_api_key: Optional[str] = Field(default=None, alias="TOGETHER_API_KEY")
     together_model: str = Field(default="openai/gpt-oss-20b", alias="TOGETHER_MODEL")
-    
+
+    # LLM HTTP Connection Pool Configuration (shared across all chat turns)
+    llm_http2: bool = Field(default=True, alias="LLM_HTTP2")
+    llm_max_connections: int = Field(default=100, alias="LLM_MAX_CONNECTIONS")
+    llm_max_keepalive_connections: int = Field(default=20, alias="LLM_MAX_KEEPALIVE_CONNECTIONS")
+    llm_keepalive_expiry: float = Field(default=60.0, alias="LLM_KEEPALIVE_EXPIRY")
+    llm_connect_timeout: float = Field(default=5.0, alias="LLM_CONNECT_TIMEOUT")
+    llm_read_timeout: float = Field(default=600.0, alias="LLM_READ_TIMEOUT")
+    # Send the static persona prompt so providers can serve it from their prompt caches
+    prompt_cache_enabled: bool = Field(default=True, alias="PROMPT_CACHE_ENABLED")
+
+    # Provider failover: providers tried after LLM_PROVIDER, in order (comma-separated; empty disables)
+    llm_fallback_providers: str = Field(default="", alias="LLM_FALLBACK_PROVIDERS")
+    llm_first_token_timeout: float = Field(default=10.0, alias="LLM_FIRST_TOKEN_TIMEOUT")
+    # Hedged requests: start the next provider when the first has no token after its p95
+    # time-to-first-token (LLM_HEDGE_DELAY_MS until enough latency samples exist)
+    llm_hedge_enabled: bool = Field(default=False, alias="LLM_HEDGE_ENABLED")
+    llm_hedge_delay_ms: float = Field(default=2000.0, alias="LLM_HEDGE_DELAY_MS")
+    # Per-provider circuit breakers over the last LLM_BREAKER_WINDOW requests
+    llm_breaker_window: int = Field(default=20, alias="LLM_BREAKER_WINDOW")
+    llm_breaker_error_rate: float = Field(default=0.5, alias="LLM_BREAKER_ERROR_RATE")
+    llm_breaker_min_requests: int = Field(default=5, alias="LLM_BREAKER_MIN_REQUESTS")
+    llm_breaker_cooldown_seconds: float = Field(default=30.0, alias="LLM_BREAKER_COOLDOWN_SECONDS")
+    # Adaptive routing across LLM_ROUTES: "static" (LLM_PROVIDER + fallbacks), "cheapest_under_slo"
+    # or "by_message" (fast tier for short messages, strong tier for long or emotional ones)
+    llm_routing_policy: Literal["static", "cheapest_under_slo", "by_message"] = Field(
+        default="static", alias="LLM_ROUTING_POLICY"
+    )
+    # JSON list of {"provider", "model", "tier": "fast"|"strong", "input_price", "output_price"} (USD per 1M tokens)
+    llm_routes: List[Dict[str, Any]] = Field(default_factory=list, alias="LLM_ROUTES")
+    llm_ttft_slo_ms: float = Field(default=1500.0, alias="LLM_TTFT_SLO_MS")
+    llm_long_message_chars: int = Field(default=600, alias="LLM_LONG_MESSAGE_CHARS")
+    # Weight of the newest sample in the per-route latency/throughput/error/cost averages
+    llm_stats_ewma_alpha: float = Field(default=0.2, alias="LLM_STATS_EWMA_ALPHA")
+
+    # Shared secret for /internal endpoints (sent as X-Internal-Token; empty disables them)
+    internal_api_token: str = Field(default="", alias="INTERNAL_API_TOKEN")
+    # Directory of extra persona prompts (<Name>.md or <Name>.txt), loaded at startup
+    persona_directory: Optional[str] = Field(default=None, alias="PERSONA_DIRECTORY")
+
     # Frontend Configuration
     frontend_origin: str = Field(default="http://localhost:3000", alias="FRONTEND_ORIGIN")
     
@@ -65,10 +109,73 @@ class Settings(BaseSettings):
     
     # Memory & Vector Store Configuration
     memory_enabled: bool = Field(default=True, alias="MEMORY_ENABLED")
-    embedding_model: str = Field(default="text-embedding-3-small", alias="EMBEDDING_MODEL")
+    # Embedding provider: "local" (CPU ONNX model), "hashing" (deterministic, tests/benchmarks) or "openai"
+    embedding_provider: str = Field(default="local", alias="EMBEDDING_PROVIDER")
+    embedding_model: str = Field(default="text-embedding-3-small", alias="EMBEDDING_MODEL")  # openai provider
+    local_embedding_model: str = Field(default="all-MiniLM-L6-v2", alias="LOCAL_EMBEDDING_MODEL")
+    embedding_model_path: Optional[str] = Field(default=None, alias="EMBEDDING_MODEL_PATH")
+    embedding_batch_size: int = Field(default=32, alias="EMBEDDING_BATCH_SIZE")
+    embedding_num_threads: int = Field(default=0, alias="EMBEDDING_NUM_THREADS")
+    embedding_dimension: int = Field(default=384, alias="EMBEDDING_DIMENSION")  # hashing provider
+    # Embedding cache keyed by hash(provider model, normalised text); empty path disables the disk tier
+    embedding_cache_enabled: bool = Field(default=True, alias="EMBEDDING_CACHE_ENABLED")
+    embedding_cache_memory_entries: int = Field(default=10000, alias="EMBEDDING_CACHE_MEMORY_ENTRIES")
+    embedding_cache_path: str = Field(default="./embedding_cache.db", alias="EMBEDDING_CACHE_PATH")
+    embedding_cache_disk_entries: int = Field(default=200000, alias="EMBEDDING_CACHE_DISK_ENTRIES")
     memory_retrieval_limit: int = Field(default=3, alias="MEMORY_RETRIEVAL_LIMIT")
     chroma_persist_directory: str = Field(default="./chroma_db", alias="CHROMA_PERSIST_DIRECTORY")
     memory_min_similarity: float = Field(default=0.7, alias="MEMORY_MIN_SIMILARITY")
+    # Vector store backend: "chroma" (shared collection) or "numpy" (per-user in-process shards)
+    vector_store_backend: str = Field(default="chroma", alias="VECTOR_STORE_BACKEND")
+    vector_store_shard_directory: str = Field(default="./vector_shards", alias="VECTOR_STORE_SHARD_DIRECTORY")
+    vector_store_hnsw_threshold: int = Field(default=20000, alias="VECTOR_STORE_HNSW_THRESHOLD")
+    # Run classifier, vector search and recent-context lookup concurrently
+    memory_speculative_retrieval: bool = Field(default=True, alias="MEMORY_SPECULATIVE_RETRIEVAL")
+    memory_prefetch_budget_ms: int = Field(default=1500, alias="MEMORY_PREFETCH_BUDGET_MS")
+    memory_prefetch_workers: int = Field(default=8, alias="MEMORY_PREFETCH_WORKERS")
+    # Memory-need classification: "local" (no LLM), "hybrid" (local, LLM only when ambiguous) or "llm"
+    memory_classifier_mode: Literal["local", "hybrid", "llm"] = Field(default="hybrid", alias="MEMORY_CLASSIFIER_MODE")
+    memory_classifier_model_path: Optional[str] = Field(default=None, alias="MEMORY_CLASSIFIER_MODEL_PATH")
+    memory_classifier_low: float = Field(default=0.3, alias="MEMORY_CLASSIFIER_LOW")
+    memory_classifier_high: float = Field(default=0.7, alias="MEMORY_CLASSIFIER_HIGH")
+    memory_agent_warmup: bool = Field(default=True, alias="MEMORY_AGENT_WARMUP")
+
+    # Background memory finalization queue (chunking/embedding of ended sessions)
+    memory_finalizer_enabled: bool = Field(default=True, alias="MEMORY_FINALIZER_ENABLED")
+    memory_finalizer_workers: int = Field(default=2, alias="MEMORY_FINALIZER_WORKERS")
+    memory_finalizer_poll_seconds: float = Field(default=2.0, alias="MEMORY_FINALIZER_POLL_SECONDS")
+    memory_finalizer_sweep_seconds: float = Field(default=60.0, alias="MEMORY_FINALIZER_SWEEP_SECONDS")
+    # Sessions that ended longer ago than this are left to the on-send path (0 sweeps every session)
+    memory_finalizer_sweep_lookback_hours: float = Field(default=48.0, alias="MEMORY_FINALIZER_SWEEP_LOOKBACK_HOURS")
+    memory_finalizer_max_attempts: int = Field(default=5, alias="MEMORY_FINALIZER_MAX_ATTEMPTS")
+    memory_finalizer_backoff_seconds: float = Field(default=30.0, alias="MEMORY_FINALIZER_BACKOFF_SECONDS")
+    memory_finalizer_lease_seconds: float = Field(default=300.0, alias="MEMORY_FINALIZER_LEASE_SECONDS")
+
+    # Streamed replies: deltas are merged into frames bounded by time and size (0 ms disables)
+    stream_coalesce_ms: float = Field(default=30.0, alias="STREAM_COALESCE_MS")
+    stream_coalesce_chars: int = Field(default=256, alias="STREAM_COALESCE_CHARS")
+    # Reply budget assumed when estimating tokens saved by stopping a disconnected stream
+    # (used for providers whose streamer does not set a max output token limit)
+    stream_disconnect_token_budget: int = Field(default=1024, alias="STREAM_DISCONNECT_TOKEN_BUDGET")
+
+    # Write-behind message persistence (batched multi-row INSERTs across requests)
+    message_write_behind_enabled: bool = Field(default=True, alias="MESSAGE_WRITE_BEHIND_ENABLED")
+    message_write_flush_ms: float = Field(default=5.0, alias="MESSAGE_WRITE_FLUSH_MS")
+    message_write_batch_size: int = Field(default=200, alias="MESSAGE_WRITE_BATCH_SIZE")
+    message_write_ack: str = Field(default="enqueue", alias="MESSAGE_WRITE_ACK")
+    # Retries (doubling backoff) for batches failing with e.g. "database is locked"
+    message_write_retries: int = Field(default=5, alias="MESSAGE_WRITE_RETRIES")
+    message_write_retry_backoff_ms: float = Field(default=50.0, alias="MESSAGE_WRITE_RETRY_BACKOFF_MS")
+    # Longest a request waits for its queued message to be committed
+    message_write_timeout_seconds: float = Field(default=30.0, alias="MESSAGE_WRITE_TIMEOUT_SECONDS")
+
+    # Cascading deletes of sessions and account conversation data
+    deletion_batch_size: int = Field(default=500, alias="DELETION_BATCH_SIZE")
+    deletion_job_stale_seconds: float = Field(default=300.0, alias="DELETION_JOB_STALE_SECONDS")
+
+    # Conversation History Configuration
+    history_token_budget: int = Field(default=8000, alias="HISTORY_TOKEN_BUDGET")
+    history_cache_max_sessions: int = Field(default=1000, alias="HISTORY_CACHE_MAX_SESSIONS")
 
 
 class SettingsFactory:
@@ -6,7 +6,7 @@ from sqlalchemy.pool import QueuePool
 import os
 
 # Import all models so SQLModel knows about them
-from app.models import User, ChatSession, Message, Wallet, WalletTransaction, SessionCharge, Payment, PasswordResetToken, PhoneVerification, OnboardingResponse
+from app.models import User, ChatSession, PersonaVersion, Message, Wallet, WalletTransaction, SessionCharge, Payment, PasswordResetToken, PhoneVerification, OnboardingResponse, DeletionJob
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./chat.db")
 
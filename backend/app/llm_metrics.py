@@ -0,0 +1,146 @@
+"""Process-wide counters for LLM token usage: prompt cache hits and streams cut short by disconnects."""
+from __future__ import annotations
+from typing import Any, Dict
+import logging
+import threading
+
+metrics_logger = logging.getLogger('llm.metrics')
+
+
+class PromptCacheMetrics:
+    """Thread-safe per-provider totals of cached vs uncached input tokens."""
+
+    _FIELDS = ("requests", "input_tokens", "cached_input_tokens", "cache_write_tokens", "output_tokens")
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._totals: Dict[str, Dict[str, int]] = {}
+
+    def record(
+        self,
+        provider: str,
+        input_tokens: int,
+        cached_input_tokens: int = 0,
+        cache_write_tokens: int = 0,
+        output_tokens: int = 0,
+    ) -> None:
+        """Add one request's usage.
+
+        Args:
+            provider: Provider name ("anthropic", "openai", "together")
+            input_tokens: Total prompt tokens, cached or not
+            cached_input_tokens: Prompt tokens read from the provider's cache
+            cache_write_tokens: Prompt tokens written to the cache (Anthropic)
+            output_tokens: Completion tokens
+        """
+        with self._lock:
+            totals = self._totals.setdefault(provider, dict.fromkeys(self._FIELDS, 0))
+            totals["requests"] += 1
+            totals["input_tokens"] += input_tokens
+            totals["cached_input_tokens"] += cached_input_tokens
+            totals["cache_write_tokens"] += cache_write_tokens
+            totals["output_tokens"] += output_tokens
+        metrics_logger.info(
+            f"{provider} usage: input={input_tokens} cached={cached_input_tokens} "
+            f"cache_write={cache_write_tokens} output={output_tokens}"
+        )
+
+    def record_openai_usage(self, provider: str, usage: Any) -> None:
+        """Record an OpenAI-compatible ``usage`` object (may be None)."""
+        if usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        self.record(
+            provider,
+            input_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+            cached_input_tokens=(getattr(details, "cached_tokens", 0) or 0) if details else 0,
+            output_tokens=getattr(usage, "completion_tokens", 0) or 0,
+        )
+
+    def record_anthropic_usage(self, usage: Any) -> None:
+        """Record an Anthropic ``usage`` object (may be None).
+
+        Anthropic reports uncached, cache-read and cache-write tokens separately;
+        input_tokens here is their sum.
+        """
+        if usage is None:
+            return
+        uncached = getattr(usage, "input_tokens", 0) or 0
+        cached = getattr(usage, "cache_read_input_tokens", 0) or 0
+        written = getattr(usage, "cache_creation_input_tokens", 0) or 0
+        self.record(
+            "anthropic",
+            input_tokens=uncached + cached + written,
+            cached_input_tokens=cached,
+            cache_write_tokens=written,
+            output_tokens=getattr(usage, "output_tokens", 0) or 0,
+        )
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Return totals per provider, with the cached share of input tokens."""
+        with self._lock:
+            result: Dict[str, Dict[str, float]] = {}
+            for provider, totals in self._totals.items():
+                entry: Dict[str, float] = dict(totals)
+                entry["uncached_input_tokens"] = totals["input_tokens"] - totals["cached_input_tokens"]
+                entry["cache_hit_ratio"] = (
+                    totals["cached_input_tokens"] / totals["input_tokens"] if totals["input_tokens"] else 0.0
+                )
+                result[provider] = entry
+            return result
+
+    def reset(self) -> None:
+        """Clear all totals (useful for testing)."""
+        with self._lock:
+            self._totals.clear()
+
+
+class StreamCancellationMetrics:
+    """Thread-safe per-provider totals for streams stopped because the client disconnected."""
+
+    _FIELDS = ("cancelled_streams", "generated_output_tokens", "saved_output_tokens")
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._totals: Dict[str, Dict[str, int]] = {}
+
+    def record(self, provider: str, generated_tokens: int, budget_tokens: int) -> None:
+        """Add one cancelled stream.
+
+        Args:
+            provider: Provider name ("anthropic", "openai", "together")
+            generated_tokens: Output tokens produced before the stream was closed
+            budget_tokens: Most output tokens the reply could have used; the
+                remainder is counted as saved (an upper bound)
+        """
+        saved = max(budget_tokens - generated_tokens, 0)
+        with self._lock:
+            totals = self._totals.setdefault(provider, dict.fromkeys(self._FIELDS, 0))
+            totals["cancelled_streams"] += 1
+            totals["generated_output_tokens"] += generated_tokens
+            totals["saved_output_tokens"] += saved
+        metrics_logger.info(f"{provider} stream cancelled: generated={generated_tokens} saved<={saved}")
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        """Return totals per provider."""
+        with self._lock:
+            return {provider: dict(totals) for provider, totals in self._totals.items()}
+
+    def reset(self) -> None:
+        """Clear all totals (useful for testing)."""
+        with self._lock:
+            self._totals.clear()
+
+
+_prompt_cache_metrics = PromptCacheMetrics()
+_stream_cancellation_metrics = StreamCancellationMetrics()
+
+
+def get_prompt_cache_metrics() -> PromptCacheMetrics:
+    """Get the process-wide prompt cache metrics."""
+    return _prompt_cache_metrics
+
+
+def get_stream_cancellation_metrics() -> StreamCancellationMetrics:
+    """Get the process-wide stream cancellation metrics."""
+    return _stream_cancellation_metrics
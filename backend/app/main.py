@@ -9,11 +9,14 @@ from fastapi import Response as FastAPIResponse
 from dotenv import load_dotenv
 
 from app.db import init_db
-from app.routers import auth_router, sessions_router, wallet_router, phone_verification_router, feedback_router
+from app.routers import auth_router, sessions_router, wallet_router, phone_verification_router, feedback_router, internal_router
 from app.routers.onboarding import router as onboarding_router
 from app.password_reset import router as password_reset_router
 from app.logging_config import configure_logging, get_logger
 from app.middleware import register_error_handlers
+from app.services.llm_factory import get_llm_factory
+from app.config.settings import get_settings
+from starlette.concurrency import run_in_threadpool
 
 # Load environment variables
 load_dotenv()
@@ -29,9 +32,30 @@ async def lifespan(app: FastAPI):
     logger.info("Starting TherapyBro application")
     init_db()
     logger.info("Database initialized successfully")
+    # Load and validate persona prompts (including PERSONA_DIRECTORY) before serving
+    from app.prompts import get_persona_registry
+    logger.info(f"Loaded personas: {', '.join(get_persona_registry().names())}")
+    if get_settings().memory_agent_warmup:
+        # Compile the memory graph and create shared clients before the first chat turn
+        from app.services.memory_agent import warm_up_memory_agent
+        await run_in_threadpool(warm_up_memory_agent)
+    settings = get_settings()
+    if settings.memory_enabled and settings.memory_finalizer_enabled:
+        from app.services.memory_finalizer import get_memory_finalizer
+        get_memory_finalizer().start()
+    if settings.message_write_behind_enabled:
+        from app.services.message_writer import get_message_writer
+        get_message_writer().start()
     yield
     # Shutdown
     logger.info("Shutting down TherapyBro application")
+    if settings.memory_enabled and settings.memory_finalizer_enabled:
+        await run_in_threadpool(get_memory_finalizer().stop)
+    if settings.message_write_behind_enabled:
+        # Drains queued messages before the process exits
+        await run_in_threadpool(get_message_writer().stop)
+    await get_llm_factory().aclose()
+    logger.info("LLM connection pools closed")
 
 
 # Create FastAPI app
@@ -83,6 +107,7 @@ app.include_router(password_reset_router)
 app.include_router(phone_verification_router)
 app.include_router(onboarding_router)
 app.include_router(feedback_router)
+app.include_router(internal_router)
 
 
 # Add request/response logging middleware
@@ -0,0 +1,77 @@
+"""Idempotent schema migration that brings existing databases up to the models."""
+from typing import Dict, List
+import logging
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from sqlmodel import SQLModel
+
+import app.models  # noqa: F401  (registers every table on SQLModel.metadata)
+
+
+logger = logging.getLogger(__name__)
+
+# Single-column indexes replaced by the composite indexes declared on the models
+SUPERSEDED_INDEXES: Dict[str, List[str]] = {
+    "chatsession": ["ix_chatsession_user_id"],
+    "message": ["ix_message_session_id"],
+    "wallettransaction": ["ix_wallettransaction_user_id"],
+    "memorychunk": ["ix_memorychunk_user_id", "ix_memorychunk_session_id"],
+    "memoryfinalizationjob": ["ix_memoryfinalizationjob_status"],
+}
+
+
+def migrate_schema(bind: Engine) -> Dict[str, List[str]]:
+    """
+    Bring an existing database up to the schema declared in app.models.
+
+    Creates missing tables, adds missing nullable columns, creates every
+    index declared on the models and drops the single-column indexes they
+    replace. Safe to run repeatedly; a fresh database just gets create_all.
+
+    Args:
+        bind: Engine for the database to migrate
+
+    Returns:
+        Names of the tables, columns and indexes created and indexes dropped
+
+    Raises:
+        RuntimeError: If a missing column is NOT NULL without a server default
+    """
+    report: Dict[str, List[str]] = {"tables": [], "columns": [], "indexes": [], "dropped_indexes": []}
+    inspector = inspect(bind)
+    quote = bind.dialect.identifier_preparer.quote
+    existing_tables = set(inspector.get_table_names())
+
+    for table in SQLModel.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            table.create(bind)
+            report["tables"].append(table.name)
+            continue
+
+        existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing_columns:
+                continue
+            if not column.nullable and column.server_default is None:
+                raise RuntimeError(f"Cannot add NOT NULL column {table.name}.{column.name} without a default")
+            column_type = column.type.compile(dialect=bind.dialect)
+            with bind.begin() as connection:
+                connection.execute(text(f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} {column_type}"))
+            report["columns"].append(f"{table.name}.{column.name}")
+
+        existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                index.create(bind)
+                report["indexes"].append(index.name)
+        for name in SUPERSEDED_INDEXES.get(table.name, []):
+            if name in existing_indexes:
+                with bind.begin() as connection:
+                    connection.execute(text(f"DROP INDEX {quote(name)}"))
+                report["dropped_indexes"].append(name)
+
+    for kind, names in report.items():
+        if names:
+            logger.info(f"Schema migration {kind}: {', '.join(names)}")
+    return report
@@ -4,7 +4,7 @@ from datetime import datetime, timezone, timedelta
 from decimal import Decimal
 
 from sqlmodel import SQLModel, Field, Column, Relationship
-from sqlalchemy import Numeric, String, JSON
+from sqlalchemy import Index, Numeric, String, JSON
 
 import secrets
 
@@ -27,9 +27,16 @@ class User(SQLModel, table=True):
 
 # backend/app/models.py
 class ChatSession(SQLModel, table=True):
+    __table_args__ = (
+        # Session list (keyset by updated_at) and per-user lookups
+        Index("ix_chatsession_user_id_updated_at", "user_id", "updated_at"),
+        # Memory finalization sweep over ended sessions
+        Index("ix_chatsession_session_end_time", "session_end_time"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     session_id: str = Field(index=True, unique=True)
-    user_id: int = Field(index=True)
+    user_id: int
     peer_id: Optional[int] = Field(default=None)  # who they chat with
     category: str
     notes: Optional[str] = None
@@ -43,14 +50,34 @@ class ChatSession(SQLModel, table=True):
     session_end_time: Optional[datetime] = Field(default=None)
     duration_seconds: Optional[int] = Field(default=None)
     status: str = Field(default="ended")  # active | ended
+    # PersonaVersion.id of the system prompt (replaces a per-session system message)
+    persona_version: Optional[str] = Field(default=None)
+
+
+class PersonaVersion(SQLModel, table=True):
+    """
+    A system prompt stored once, keyed by a hash of its text.
+    Sessions reference it via ChatSession.persona_version.
+    """
+    id: str = Field(primary_key=True)  # prompts.prompt_version(prompt)
+    name: str = Field(index=True)  # category it was created for
+    prompt: str
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 
 class Message(SQLModel, table=True):
+    __table_args__ = (
+        # History reads: session_id filter ordered/paged by id
+        Index("ix_message_session_id_id", "session_id", "id"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
-    session_id: str = Field(index=True)
+    session_id: str
     role: str  # system | user | assistant
     content: str
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    # Set on assistant replies cut short because the client disconnected mid-stream
+    truncated: Optional[bool] = None
 
 
 # ---------- new wallet/payment models ----------
@@ -77,15 +104,20 @@ class WalletTransaction(SQLModel, table=True):
     """
     Immutable ledger of every change. amount: positive for credits, negative for debits.
     """
+    __table_args__ = (
+        # Free-session check and other per-user lookups by type
+        Index("ix_wallettransaction_user_id_type", "user_id", "type"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     wallet_id: int = Field(index=True)
-    user_id: int = Field(index=True)
+    user_id: int
     type: str = Field(
         default="unknown"
     )  # 'topup', 'reserved', 'release', 'charge', 'refund', 'fee', 'adjustment'
     amount: Decimal = Field(sa_column=Column(Numeric(18, 4), nullable=False))
     balance_after: Decimal = Field(sa_column=Column(Numeric(18, 4), nullable=False))
-    reference_id: Optional[str] = None  # session_id / payment_id / provider id
+    reference_id: Optional[str] = Field(default=None, index=True)  # session_id / payment_id / provider id
     meta: Optional[Dict[str, Any]] = Field(
         sa_column=Column(JSON), default=None
     )
@@ -137,10 +169,16 @@ class MemoryChunk(SQLModel, table=True):
     Stores metadata about vectorized memory chunks.
     The actual vector embeddings are stored in ChromaDB.
     """
+    __table_args__ = (
+        # Per-user and per-session chunk listings ordered by creation time
+        Index("ix_memorychunk_user_id_created_at", "user_id", "created_at"),
+        Index("ix_memorychunk_session_id_created_at", "session_id", "created_at"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     chunk_id: str = Field(index=True, unique=True)  # UUID for ChromaDB reference
-    user_id: int = Field(index=True)
-    session_id: str = Field(index=True)
+    user_id: int
+    session_id: str
     chunk_text: str  # The actual text stored in vector DB
     message_ids: str  # JSON array of message IDs in this chunk
     chunk_type: str  # "conversation" | "session_summary"
@@ -148,6 +186,47 @@ class MemoryChunk(SQLModel, table=True):
     meta: Optional[Dict[str, Any]] = Field(default=None, sa_column=Column(JSON))
 
 
+class MemoryFinalizationJob(SQLModel, table=True):
+    """
+    Durable queue entry for chunking/embedding a session into memory.
+    One row per session (idempotency key); re-enqueueing a finished session
+    resets the row instead of adding another.
+    """
+    __table_args__ = (
+        # Worker claim query: due jobs by status and next attempt time
+        Index("ix_memoryfinalizationjob_status_next_attempt_at", "status", "next_attempt_at"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    session_id: str = Field(index=True, unique=True)
+    user_id: int = Field(index=True)
+    status: str = Field(default="pending")  # pending | running | done | failed
+    attempts: int = Field(default=0)
+    next_attempt_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), index=True)
+    locked_until: Optional[datetime] = Field(default=None)  # worker lease; expired leases are reclaimed
+    last_error: Optional[str] = None
+    completed_at: Optional[datetime] = None
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+class DeletionJob(SQLModel, table=True):
+    """
+    Background cascading delete of a user's conversation data.
+    progress holds running counts per kind (sessions, messages, memories,
+    charges, feedback) and is updated after every deleted session.
+    """
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(index=True)
+    status: str = Field(default="pending")  # pending | running | done | failed
+    sessions_total: int = Field(default=0)
+    progress: Optional[dict] = Field(default=None, sa_column=Column(JSON))
+    last_error: Optional[str] = None
+    completed_at: Optional[datetime] = None
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+
 class PasswordResetToken(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="user.id")
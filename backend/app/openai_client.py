@@ -1,9 +1,12 @@
 from __future__ import annotations
-from typing import Dict, Iterable, List
+from typing import Any, AsyncIterator, Dict, Iterable, List
 import os
 import logging
+import httpx
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
+from app.llm_metrics import get_prompt_cache_metrics
+from app.prompts import split_system_prompt, wire_message
 
 # Create logger for OpenAI client
 llm_logger = logging.getLogger('llm.openai')
@@ -11,38 +14,102 @@ llm_logger = logging.getLogger('llm.openai')
 load_dotenv()
 
 class OpenAIStreamer:
-    def __init__(self, model: str | None = None) -> None:
+    def __init__(
+        self,
+        model: str | None = None,
+        http_client: httpx.Client | None = None,
+        async_http_client: httpx.AsyncClient | None = None,
+        prompt_cache: bool = True,
+    ) -> None:
         api_key = os.getenv("OPENAI_API_KEY")
         if not api_key:
             llm_logger.error("OPENAI_API_KEY is not set")
             raise RuntimeError("OPENAI_API_KEY is not set")
         
-        self.client = OpenAI(api_key=api_key)
+        self.client = OpenAI(api_key=api_key, http_client=http_client)
+        self.async_client = AsyncOpenAI(api_key=api_key, http_client=async_http_client)
         self.model = model or os.getenv("OPENAI_MODEL", "gpt-5-nano")
+        self.prompt_cache = prompt_cache
         llm_logger.info(f"OpenAI client initialized with model: {self.model}")
 
+    def _build_messages(self, messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """Order messages so the longest possible prefix repeats across turns.
+        
+        OpenAI caches prompt prefixes automatically. The persona prompt goes
+        first and the per-turn context (memories, recent sessions) is sent as a
+        second system message just before the latest user message, so the
+        persona plus all earlier turns form a prefix shared with the last request.
+        """
+        if not messages or messages[0].get("role") != "system":
+            return [wire_message(m) for m in messages]
+        prefix, suffix = split_system_prompt(messages[0])
+        rest = [wire_message(m) for m in messages[1:]]
+        if not self.prompt_cache or not suffix.strip():
+            return [wire_message(messages[0])] + rest
+        split_at = len(rest) - 1 if rest and rest[-1]["role"] == "user" else len(rest)
+        return (
+            [{"role": "system", "content": prefix}]
+            + rest[:split_at]
+            + [{"role": "system", "content": suffix.lstrip("\n")}]
+            + rest[split_at:]
+        )
+
+    def _build_request(self, messages: List[Dict[str, str]], **kwargs) -> Dict[str, Any]:
+        """Build the keyword arguments shared by the sync and async stream calls."""
+        kwargs.setdefault("stream_options", {"include_usage": True})
+        return dict(model=self.model, messages=self._build_messages(messages), stream=True, **kwargs)
+
     def stream_chat(self, messages: List[Dict[str, str]], **kwargs) -> Iterable[str]:
         llm_logger.info(f"Starting OpenAI chat stream with {len(messages)} messages")
         
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                stream=True,
-                **kwargs,
-            )
+            response = self.client.chat.completions.create(**self._build_request(messages, **kwargs))
             
             token_count = 0
-            for chunk in response:
-                if not chunk.choices:
-                    continue
-                delta = chunk.choices[0].delta
-                if delta and delta.content:
-                    token_count += 1
-                    yield delta.content
+            usage = None
+            # Closing the stream (also when the consumer stops early) closes the upstream HTTP response
+            with response:
+                for chunk in response:
+                    if getattr(chunk, "usage", None):
+                        usage = chunk.usage
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta
+                    if delta and delta.content:
+                        token_count += 1
+                        yield delta.content
             
             llm_logger.info(f"OpenAI stream completed successfully, yielded {token_count} tokens")
+            get_prompt_cache_metrics().record_openai_usage("openai", usage)
             
         except Exception as e:
             llm_logger.error(f"OpenAI streaming failed: {str(e)}")
             raise
+
+    async def astream_chat(self, messages: List[Dict[str, str]], **kwargs) -> AsyncIterator[str]:
+        """Stream chat completion on the event loop without holding a worker thread."""
+        llm_logger.info(f"Starting async OpenAI chat stream with {len(messages)} messages")
+        
+        try:
+            response = await self.async_client.chat.completions.create(**self._build_request(messages, **kwargs))
+            
+            token_count = 0
+            usage = None
+            # Closing the stream (also when the consumer stops early) closes the upstream HTTP response
+            async with response:
+                async for chunk in response:
+                    if getattr(chunk, "usage", None):
+                        usage = chunk.usage
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta
+                    if delta and delta.content:
+                        token_count += 1
+                        yield delta.content
+            
+            llm_logger.info(f"Async OpenAI stream completed successfully, yielded {token_count} tokens")
+            get_prompt_cache_metrics().record_openai_usage("openai", usage)
+            
+        except Exception as e:
+            llm_logger.error(f"Async OpenAI streaming failed: {str(e)}")
+            raise
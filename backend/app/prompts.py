@@ -1,5 +1,11 @@
 from __future__ import annotations
-from typing import Optional, Dict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Dict, List, Tuple
+import hashlib
+import logging
+import re
+import threading
 
 # Core personality prompt (static)
 THERAPYBRO_CORE = """You are **TherapyBro**, an AI companion designed to listen and provide supportive guidance on life’s challenges. You're a chill friend who offers perspective when it helps.
@@ -467,60 +473,353 @@ class PromptContext:
          setattr(self, key, value)
 
 
-def build_system_prompt(category: str = "TherapyBro", context: Optional[PromptContext] = None) -> str:
+# Key on a system message dict holding the static (cacheable) start of its content
+CACHE_PREFIX_KEY = "cache_prefix"
+
+# Built-in personas; more can be added as files in PERSONA_DIRECTORY
+PERSONA_PROMPTS = {
+   "TherapyBro": THERAPYBRO_CORE,
+   "Rahul": RAHUL_CORE,
+   "Priya": PRIYA_CORE,
+   "Arjun": ARJUN_CORE,
+   "Ananya": ANANYA_CORE,
+   "Vikram": VIKRAM_CORE,
+   "Sneha": SNEHA_CORE,
+}
+
+PERSONA_FILE_SUFFIXES = (".md", ".txt")
+_PERSONA_NAME_RE = re.compile(r"^[A-Za-z][A-Za-z0-9_-]{0,63}$")
+
+# Context section templates, filled with str.format on every turn
+_USER_NAME_TEMPLATE = "\n<user_info>\nThe user's name is {}.\n</user_info>"
+_USER_AGE_TEMPLATE = "\n<user_info>\nThe user's age is {}.\n</user_info>"
+_FIRST_CONVERSATION_SECTION = "\n<conversation_context>\nThis is your first conversation with this user. Welcome them naturally and be present.\n</conversation_context>"
+_RECENT_CONTEXT_TEMPLATE = "\n<recent_context>\nHere's a brief summary of recent conversations with this user:\n{}\n</recent_context>"
+_MEMORIES_TEMPLATE = "\n<relevant_memories>\nHere are relevant past conversations that may provide useful context:\n{}\n</relevant_memories>"
+_PREFERENCES_TEMPLATE = "\n<user_preferences>\n{}\n</user_preferences>"
+
+
+def prompt_version(prompt: str) -> str:
+   """Return the version ID of a system prompt (a hash of its text)."""
+   return hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+
+
+def _count_tokens(text: str) -> int:
+   # Imported lazily: app.services imports this module
+   from app.services.history_builder import count_tokens
+   return count_tokens(text)
+
+
+@dataclass(frozen=True)
+class RenderedPrompt:
+   """A system prompt with its token counts."""
+   text: str
+   tokens: int
+   prefix: str
+   prefix_tokens: int
+
+
+class PersonaRegistry:
    """
-   Build a complete system prompt with optional context injection.
+   Validated persona prompts, loaded once.
+   
+   Holds the built-in personas plus any template files (*.md, *.txt) found in
+   a directory, named after the file stem, so a new persona needs no code
+   change. The rendered persona prefix and its token count are memoized per
+   persona; only the per-user context is filled in on each call. Full system
+   prompts are also kept by version ID (prompt_version), which is what chat
+   sessions store instead of a copy of the prompt.
+   """
+   
+   def __init__(self, directory: Optional[str] = None, builtins: Optional[Dict[str, str]] = None):
+      """
+      Load and validate all personas.
+      
+      Args:
+         directory: Directory of persona template files (None for built-ins only)
+         builtins: Built-in personas by name (defaults to PERSONA_PROMPTS)
+         
+      Raises:
+         ValueError: If a persona name or template is invalid
+      """
+      self.logger = logging.getLogger("PersonaRegistry")
+      self._cores: Dict[str, str] = {}
+      self._rendered: Dict[str, RenderedPrompt] = {}
+      self._versions: Dict[str, str] = {}
+      self._personas_registered = False
+      self._lock = threading.Lock()
+      for name, core in (PERSONA_PROMPTS if builtins is None else builtins).items():
+         self._add(name, core, "built-in")
+      if directory:
+         self._load_directory(Path(directory))
+   
+   def _load_directory(self, directory: Path) -> None:
+      if not directory.is_dir():
+         self.logger.warning(f"Persona directory not found: {directory}")
+         return
+      for path in sorted(directory.iterdir()):
+         if path.suffix.lower() not in PERSONA_FILE_SUFFIXES or not path.is_file():
+            continue
+         if path.stem in self._cores:
+            self.logger.info(f"Persona {path.stem} overridden by {path}")
+         self._add(path.stem, path.read_text(encoding="utf-8").strip(), str(path))
+   
+   def _add(self, name: str, core: str, source: str) -> None:
+      if not _PERSONA_NAME_RE.match(name):
+         raise ValueError(f"Invalid persona name {name!r} ({source})")
+      if not core.strip():
+         raise ValueError(f"Persona {name} has an empty prompt ({source})")
+      if "<system>" in core or "</system>" in core:
+         raise ValueError(f"Persona {name} must not contain <system> tags ({source})")
+      self._cores[name] = core
+   
+   def names(self) -> List[str]:
+      """Return the registered persona names."""
+      return list(self._cores)
+   
+   def __contains__(self, name: str) -> bool:
+      return name in self._cores
+   
+   def render_persona(self, category: str) -> RenderedPrompt:
+      """
+      Render the static persona prompt (memoized).
+      
+      Args:
+         category: Persona name
+         
+      Returns:
+         RenderedPrompt whose text and prefix are the persona prompt
+         
+      Raises:
+         ValueError: If the persona is unknown
+      """
+      rendered = self._rendered.get(category)
+      if rendered is None:
+         core = self._cores.get(category)
+         if core is None:
+            raise ValueError(f"Invalid category: {category}")
+         text = "\n".join(["<system>", core, "\n</system>"])
+         tokens = _count_tokens(text)
+         rendered = RenderedPrompt(text=text, tokens=tokens, prefix=text, prefix_tokens=tokens)
+         with self._lock:
+            rendered = self._rendered.setdefault(category, rendered)
+      return rendered
+   
+   def register_prompt(self, prompt: str) -> str:
+      """
+      Remember a system prompt by version so sessions can reference it.
+      
+      Args:
+         prompt: Full system prompt text
+         
+      Returns:
+         Version ID of the prompt
+      """
+      version_id = prompt_version(prompt)
+      if version_id not in self._versions:
+         with self._lock:
+            self._versions.setdefault(version_id, prompt)
+      return version_id
+   
+   def resolve_version(self, version_id: str) -> Optional[str]:
+      """Return the prompt registered under a version ID, if known in this process."""
+      prompt = self._versions.get(version_id)
+      if prompt is None and not self._personas_registered:
+         # Sessions usually reference an unchanged persona prompt
+         for category in self._cores:
+            self.register_prompt(self.render_persona(category).text)
+         self._personas_registered = True
+         prompt = self._versions.get(version_id)
+      return prompt
+   
+   def render(
+      self,
+      category: str,
+      context: Optional[PromptContext] = None,
+      first_conversation: bool = False,
+   ) -> RenderedPrompt:
+      """
+      Render the full system prompt: memoized persona plus per-user context.
+      
+      The token count is the sum of the prefix and suffix counts, which can
+      differ from encoding the joined text by a token at the boundary.
+      
+      Args:
+         category: Persona name
+         context: Optional context object with user-specific information
+         first_conversation: Whether to tell the model this is the first conversation
+         
+      Returns:
+         RenderedPrompt
+      """
+      persona = self.render_persona(category)
+      suffix = build_dynamic_context(context, first_conversation)
+      if not suffix:
+         return persona
+      return RenderedPrompt(
+         text=persona.text + suffix,
+         tokens=persona.prefix_tokens + _count_tokens(suffix),
+         prefix=persona.prefix,
+         prefix_tokens=persona.prefix_tokens,
+      )
+
+
+_persona_registry_instance: Optional[PersonaRegistry] = None
+_persona_registry_lock = threading.Lock()
+
+
+def get_persona_registry() -> PersonaRegistry:
+   """
+   Get or create the process-wide PersonaRegistry.
+   
+   Loads the built-in personas and the files in PERSONA_DIRECTORY.
+   
+   Returns:
+      PersonaRegistry instance
+   """
+   global _persona_registry_instance
+   
+   if _persona_registry_instance is None:
+      with _persona_registry_lock:
+         if _persona_registry_instance is None:
+            from app.config.settings import get_settings
+            _persona_registry_instance = PersonaRegistry(directory=get_settings().persona_directory)
+   return _persona_registry_instance
+
+
+def build_persona_prompt(category: str = "TherapyBro") -> str:
+   """
+   Build the static persona part of the system prompt.
+   
+   The text is identical on every turn for a category, so it is the prefix
+   providers can serve from their prompt caches.
+   
+   Args:
+      category: Category of chat
+      
+   Returns:
+      Persona prompt string
+   """
+   return get_persona_registry().render_persona(category).text
+
+
+def build_dynamic_context(context: Optional[PromptContext], first_conversation: bool = False) -> str:
+   """
+   Build the per-user sections appended after the persona prompt.
+   
+   Args:
+      context: Context object with user-specific information
+      first_conversation: Whether to tell the model this is the first conversation
+      
+   Returns:
+      Concatenated context sections ("" when there is nothing to add)
+   """
+   if context is None:
+      return _FIRST_CONVERSATION_SECTION if first_conversation else ""
+   parts = []
+   if context.user_name:
+      parts.append(_USER_NAME_TEMPLATE.format(context.user_name))
+   if context.user_age:
+      parts.append(_USER_AGE_TEMPLATE.format(context.user_age))
+   if first_conversation:
+      parts.append(_FIRST_CONVERSATION_SECTION)
+   if context.recent_sessions:
+      parts.append(_RECENT_CONTEXT_TEMPLATE.format(context.recent_sessions))
+   if context.retrieved_memories:
+      parts.append(_MEMORIES_TEMPLATE.format(context.retrieved_memories))
+   if context.user_preferences:
+      prefs = "\n".join(f"- {k}: {v}" for k, v in context.user_preferences.items())
+      parts.append(_PREFERENCES_TEMPLATE.format(prefs))
+   return "".join(parts)
+
+
+def build_prompt_parts(category: str = "TherapyBro", context: Optional[PromptContext] = None) -> Tuple[str, str]:
+   """
+   Build the system prompt as a stable prefix and a volatile suffix.
    
    Args:
-      category: Category of chat (currently only "TherapyBro")
+      category: Category of chat
       context: Optional context object with user-specific information
       
    Returns:
-      Complete system prompt string
+      (persona prefix, per-user suffix)
    """
-   prompt_parts = ["<system>"]
+   return build_persona_prompt(category), build_dynamic_context(context)
+
+
+def render_system_prompt(
+   category: str = "TherapyBro",
+   context: Optional[PromptContext] = None,
+   first_conversation: bool = False,
+) -> RenderedPrompt:
+   """
+   Render a complete system prompt together with its token count.
    
-   # User name at the very beginning (high priority)
-   if context and context.user_name:
-      prompt_parts.append(f"\nYou are speaking with {context.user_name}.\n")
+   Args:
+      category: Category of chat
+      context: Optional context object with user-specific information
+      first_conversation: Whether to tell the model this is the first conversation
+      
+   Returns:
+      RenderedPrompt (text, tokens, prefix, prefix_tokens)
+   """
+   return get_persona_registry().render(category, context, first_conversation)
+
+
+def build_system_prompt(category: str = "TherapyBro", context: Optional[PromptContext] = None) -> str:
+   """
+   Build a complete system prompt with optional context injection.
    
-   # User age (if available)
-   if context and context.user_age:
-      prompt_parts.append(f"They are {context.user_age} years old.\n")
+   The persona comes first and user-specific context after it, so the start
+   of the prompt is the same on every turn (see build_prompt_parts).
    
-   # Core personality
-   if category == "TherapyBro":
-      prompt_parts.append(THERAPYBRO_CORE)
-   elif category == "Rahul":
-      prompt_parts.append(RAHUL_CORE)
-   elif category == "Priya":
-      prompt_parts.append(PRIYA_CORE)
-   elif category == "Arjun":
-      prompt_parts.append(ARJUN_CORE)
-   elif category == "Ananya":
-      prompt_parts.append(ANANYA_CORE)
-   elif category == "Vikram":
-      prompt_parts.append(VIKRAM_CORE)
-   elif category == "Sneha":
-      prompt_parts.append(SNEHA_CORE)
-   else:
-      raise ValueError(f"Invalid category: {category}")
-
-   # Add user context if provided
-   if context:
-      if context.recent_sessions:
-         prompt_parts.append(f"\n<recent_context>\nHere's a brief summary of recent conversations with this user:\n{context.recent_sessions}\n</recent_context>")
+   Args:
+      category: Category of chat
+      context: Optional context object with user-specific information
       
-      if context.retrieved_memories:
-         prompt_parts.append(f"\n<relevant_memories>\nHere are relevant past conversations that may provide useful context:\n{context.retrieved_memories}\n</relevant_memories>")
+   Returns:
+      Complete system prompt string
+   """
+   return render_system_prompt(category, context).text
+
+
+def system_message(static_prompt: str, dynamic_context: str = "") -> Dict[str, str]:
+   """
+   Build a system message whose static start is marked for prompt caching.
+   
+   Args:
+      static_prompt: Persona prompt (cacheable prefix)
+      dynamic_context: Per-turn context appended after it
       
-      if context.user_preferences:
-         prefs = "\n".join(f"- {k}: {v}" for k, v in context.user_preferences.items())
-         prompt_parts.append(f"\n<user_preferences>\n{prefs}\n</user_preferences>")
+   Returns:
+      Message dict with role, content and CACHE_PREFIX_KEY
+   """
+   return {"role": "system", "content": static_prompt + dynamic_context, CACHE_PREFIX_KEY: static_prompt}
+
+
+def split_system_prompt(message: Dict[str, str]) -> Tuple[str, str]:
+   """
+   Split a system message into its cacheable prefix and volatile suffix.
    
-   prompt_parts.append("\n</system>")
+   Messages without a marked prefix (e.g. the stored persona prompt) are
+   treated as fully static.
    
-   return "\n".join(prompt_parts)
+   Args:
+      message: System message dict
+      
+   Returns:
+      (static prefix, dynamic suffix)
+   """
+   content = message.get("content", "")
+   prefix = message.get(CACHE_PREFIX_KEY)
+   if prefix and content.startswith(prefix):
+      return prefix, content[len(prefix):]
+   return content, ""
+
+
+def wire_message(message: Dict[str, str]) -> Dict[str, str]:
+   """Return a message with only the fields provider APIs accept."""
+   return {"role": message.get("role", "user"), "content": message.get("content", "")}
 
 
 # Backward compatibility
@@ -530,12 +829,4 @@ def system_prompt_for(category: str) -> str:
 
 
 # For easy access to core prompt
-CATEGORY_PROMPTS = {
-    "TherapyBro": build_system_prompt("TherapyBro"),
-    "Rahul": build_system_prompt("Rahul"),
-    "Priya": build_system_prompt("Priya"),
-    "Arjun": build_system_prompt("Arjun"),
-    "Ananya": build_system_prompt("Ananya"),
-    "Vikram": build_system_prompt("Vikram"),
-    "Sneha": build_system_prompt("Sneha")
-}
+CATEGORY_PROMPTS = {name: "\n".join(["<system>", core, "\n</system>"]) for name, core in PERSONA_PROMPTS.items()}
@@ -3,5 +3,6 @@ from .user_repository import UserRepository
 from .session_repository import SessionRepository
 from .message_repository import MessageRepository
 from .wallet_repository import WalletRepository, TransactionRepository
+from .unit_of_work import unit_of_work, in_unit_of_work
 
-__all__ = ["UserRepository", "SessionRepository", "MessageRepository", "WalletRepository", "TransactionRepository"]
+__all__ = ["UserRepository", "SessionRepository", "MessageRepository", "WalletRepository", "TransactionRepository", "unit_of_work", "in_unit_of_work"]
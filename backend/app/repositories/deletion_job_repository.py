@@ -0,0 +1,117 @@
+"""Deletion job repository for background account data deletion."""
+from datetime import timedelta
+from typing import Dict, Optional
+from sqlalchemy.orm import Session
+from sqlalchemy import select, update, or_, and_
+from app.models import DeletionJob
+from app.repositories.unit_of_work import save
+from app.utils import now_utc
+import logging
+
+
+class DeletionJobRepository:
+    """Repository for DeletionJob data access operations."""
+
+    def __init__(self, db_session: Session):
+        """Initialize repository with database session.
+
+        Args:
+            db_session: SQLAlchemy database session
+        """
+        self.db = db_session
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    def create(self, user_id: int, sessions_total: int) -> DeletionJob:
+        """Create a pending deletion job for a user.
+
+        Args:
+            user_id: User whose conversation data will be deleted
+            sessions_total: Number of sessions at the time of the request
+
+        Returns:
+            Created job with ID
+        """
+        job = DeletionJob(user_id=user_id, sessions_total=sessions_total)
+        self.db.add(job)
+        save(self.db, job, flush=True)
+        self.logger.info(f"Created deletion job {job.id} for user {user_id} ({sessions_total} sessions)")
+        return job
+
+    def find_by_id(self, job_id: int) -> Optional[DeletionJob]:
+        """Find a deletion job by ID.
+
+        Args:
+            job_id: Deletion job ID
+
+        Returns:
+            DeletionJob if found, None otherwise
+        """
+        return self.db.get(DeletionJob, job_id)
+
+    def find_active_by_user_id(self, user_id: int) -> Optional[DeletionJob]:
+        """Find the newest pending or running deletion job for a user.
+
+        Args:
+            user_id: User ID to find the job for
+
+        Returns:
+            DeletionJob if one is active, None otherwise
+        """
+        query = (
+            select(DeletionJob)
+            .where(DeletionJob.user_id == user_id, DeletionJob.status.in_(("pending", "running")))
+            .order_by(DeletionJob.id.desc())
+            .limit(1)
+        )
+        return self.db.execute(query).scalar_one_or_none()
+
+    def claim(self, job_id: int, stale_seconds: float) -> bool:
+        """Claim a job for this worker with a conditional UPDATE.
+
+        A job can be claimed when it is pending, or when it is running but has
+        not reported progress for `stale_seconds` (its worker died), so two
+        workers never run the same job at once.
+
+        Args:
+            job_id: Deletion job ID
+            stale_seconds: Silence after which a running job is reclaimed
+
+        Returns:
+            True if this caller now owns the job
+        """
+        now = now_utc()
+        claimable = or_(
+            DeletionJob.status == "pending",
+            and_(DeletionJob.status == "running", DeletionJob.updated_at <= now - timedelta(seconds=stale_seconds)),
+        )
+        result = self.db.execute(
+            update(DeletionJob).where(DeletionJob.id == job_id, claimable).values(status="running", updated_at=now)
+        )
+        save(self.db)
+        return result.rowcount == 1
+
+    def record_progress(self, job: DeletionJob, progress: Dict[str, int]) -> None:
+        """Store the running deletion counts (also refreshes the job's liveness)."""
+        job.progress = dict(progress)
+        job.updated_at = now_utc()
+        self.db.add(job)
+        save(self.db, job, refresh=False)
+
+    def mark_done(self, job: DeletionJob, progress: Dict[str, int]) -> None:
+        """Record a completed deletion."""
+        now = now_utc()
+        job.status = "done"
+        job.progress = dict(progress)
+        job.last_error = None
+        job.completed_at = now
+        job.updated_at = now
+        self.db.add(job)
+        save(self.db, job, refresh=False)
+
+    def mark_failed(self, job: DeletionJob, error: str) -> None:
+        """Record a failed deletion (a new request starts a fresh job)."""
+        job.status = "failed"
+        job.last_error = error[:1000]
+        job.updated_at = now_utc()
+        self.db.add(job)
+        save(self.db, job, refresh=False)
@@ -0,0 +1,222 @@
+"""Memory finalization job repository for the durable background queue."""
+from datetime import datetime, timedelta, timezone
+from typing import Optional, List, Tuple
+from sqlalchemy.orm import Session
+from sqlalchemy import select, update, or_, and_
+from sqlalchemy.exc import IntegrityError
+from app.models import MemoryFinalizationJob, ChatSession
+from app.repositories.unit_of_work import save
+from app.utils import now_utc
+import logging
+
+
+class MemoryFinalizationJobRepository:
+    """Repository for MemoryFinalizationJob data access operations."""
+
+    def __init__(self, db_session: Session):
+        """Initialize repository with database session.
+
+        Args:
+            db_session: SQLAlchemy database session
+        """
+        self.db = db_session
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    def find_by_session_id(self, session_id: str) -> Optional[MemoryFinalizationJob]:
+        """Find the finalization job for a session.
+
+        Args:
+            session_id: Session ID to find the job for
+
+        Returns:
+            MemoryFinalizationJob if found, None otherwise
+        """
+        query = select(MemoryFinalizationJob).where(MemoryFinalizationJob.session_id == session_id)
+        return self.db.execute(query).scalar_one_or_none()
+
+    def enqueue(
+        self,
+        session_id: str,
+        user_id: int,
+        run_at: Optional[datetime] = None,
+        ended_at: Optional[datetime] = None,
+        force: bool = False,
+    ) -> bool:
+        """Queue a session for finalization, keyed on session_id.
+
+        A pending or running job absorbs the request. A finished job is only
+        reset to pending when the session ended again after it completed
+        (`ended_at` later than `completed_at`), so repeated sends to an expired
+        session do not re-index it every time. A failed job is left alone.
+        `force` re-arms finished and failed jobs unconditionally (used when a
+        session is extended).
+
+        Args:
+            session_id: Session to finalize
+            user_id: Owner of the session
+            run_at: Earliest time to run (defaults to now)
+            ended_at: When the session ended (its current end time)
+            force: Re-arm a finished or failed job regardless of ended_at
+
+        Returns:
+            True if a job was created or re-armed, False if nothing was queued
+        """
+        run_at = run_at or now_utc()
+        job = self.find_by_session_id(session_id)
+        if job is None:
+            job = MemoryFinalizationJob(session_id=session_id, user_id=user_id, next_attempt_at=run_at)
+            try:
+                # Savepoint: a duplicate only discards this insert, not the caller's transaction
+                with self.db.begin_nested():
+                    self.db.add(job)
+            except IntegrityError:
+                # Another request enqueued the same session concurrently
+                self.logger.debug(f"Finalization already queued for session: {session_id}")
+                return False
+            save(self.db, job, refresh=False)
+            self.logger.info(f"Queued memory finalization for session: {session_id}")
+            return True
+
+        if job.status in ("pending", "running"):
+            self.logger.debug(f"Finalization already {job.status} for session: {session_id}")
+            return False
+
+        if not force and not (job.status == "done" and _ended_since(job.completed_at, ended_at)):
+            self.logger.debug(f"Finalization already {job.status} for session: {session_id}")
+            return False
+
+        job.status = "pending"
+        job.attempts = 0
+        job.last_error = None
+        job.locked_until = None
+        job.next_attempt_at = run_at
+        job.updated_at = now_utc()
+        self.db.add(job)
+        save(self.db, job, refresh=False)
+        self.logger.info(f"Re-queued memory finalization for session: {session_id}")
+        return True
+
+    def claim_due(self, limit: int, lease_seconds: float) -> List[MemoryFinalizationJob]:
+        """Claim up to `limit` due jobs for this worker.
+
+        A job is due when it is pending and its next attempt time has passed,
+        or when it is running but its lease expired (its worker died). Each
+        claim is a conditional UPDATE, so concurrent workers (threads or
+        processes) never run the same job twice.
+
+        Args:
+            limit: Maximum number of jobs to claim
+            lease_seconds: How long the claim is held before it can be reclaimed
+
+        Returns:
+            Claimed jobs (status running, attempts incremented)
+        """
+        now = now_utc()
+        due = and_(
+            MemoryFinalizationJob.next_attempt_at <= now,
+            or_(
+                MemoryFinalizationJob.status == "pending",
+                and_(MemoryFinalizationJob.status == "running", MemoryFinalizationJob.locked_until <= now),
+            ),
+        )
+        candidates = self.db.execute(
+            select(MemoryFinalizationJob.id).where(due).order_by(MemoryFinalizationJob.next_attempt_at.asc()).limit(limit)
+        ).scalars().all()
+
+        claimed_ids = []
+        for job_id in candidates:
+            result = self.db.execute(
+                update(MemoryFinalizationJob)
+                .where(MemoryFinalizationJob.id == job_id, due)
+                .values(
+                    status="running",
+                    locked_until=now + timedelta(seconds=lease_seconds),
+                    attempts=MemoryFinalizationJob.attempts + 1,
+                    updated_at=now,
+                )
+            )
+            if result.rowcount == 1:
+                claimed_ids.append(job_id)
+        save(self.db)
+
+        if not claimed_ids:
+            return []
+        self.logger.debug(f"Claimed {len(claimed_ids)} finalization jobs")
+        query = select(MemoryFinalizationJob).where(MemoryFinalizationJob.id.in_(claimed_ids))
+        return self.db.execute(query.execution_options(populate_existing=True)).scalars().all()
+
+    def mark_done(self, job: MemoryFinalizationJob) -> None:
+        """Record a successful finalization."""
+        now = now_utc()
+        job.status = "done"
+        job.locked_until = None
+        job.last_error = None
+        job.completed_at = now
+        job.updated_at = now
+        self.db.add(job)
+        save(self.db, job, refresh=False)
+
+    def mark_failed(self, job: MemoryFinalizationJob, error: str, retry_at: Optional[datetime]) -> None:
+        """Record a failed attempt.
+
+        Args:
+            job: Job that failed
+            error: Error message
+            retry_at: When to retry, or None to give up (status failed)
+        """
+        job.status = "pending" if retry_at is not None else "failed"
+        job.next_attempt_at = retry_at or job.next_attempt_at
+        job.locked_until = None
+        job.last_error = error[:1000]
+        job.updated_at = now_utc()
+        self.db.add(job)
+        save(self.db, job, refresh=False)
+
+    def find_sessions_needing_finalization(
+        self, limit: int, ended_after: Optional[datetime] = None
+    ) -> List[Tuple[str, int, datetime]]:
+        """Find ended sessions with no finalization since they ended.
+
+        Matches sessions whose end time has passed and that either have no job
+        or whose last completed job finished before the (possibly extended)
+        end time.
+
+        Args:
+            limit: Maximum number of sessions to return
+            ended_after: Only consider sessions that ended after this time
+
+        Returns:
+            List of (session_id, user_id, session_end_time)
+        """
+        now = now_utc()
+        conditions = [ChatSession.session_end_time.is_not(None), ChatSession.session_end_time <= now]
+        if ended_after is not None:
+            conditions.append(ChatSession.session_end_time > ended_after)
+        query = (
+            select(ChatSession.session_id, ChatSession.user_id, ChatSession.session_end_time)
+            .outerjoin(MemoryFinalizationJob, MemoryFinalizationJob.session_id == ChatSession.session_id)
+            .where(
+                *conditions,
+                or_(
+                    MemoryFinalizationJob.id.is_(None),
+                    and_(
+                        MemoryFinalizationJob.status == "done",
+                        MemoryFinalizationJob.completed_at < ChatSession.session_end_time,
+                    ),
+                ),
+            )
+            .order_by(ChatSession.session_end_time.asc())
+            .limit(limit)
+        )
+        return [(row[0], row[1], row[2]) for row in self.db.execute(query).all()]
+
+
+def _ended_since(completed_at: Optional[datetime], ended_at: Optional[datetime]) -> bool:
+    """Return True if the session ended after the job completed (SQLite returns naive UTC)."""
+    if completed_at is None or ended_at is None:
+        return False
+    if completed_at.tzinfo is None:
+        completed_at = completed_at.replace(tzinfo=timezone.utc)
+    if ended_at.tzinfo is None:
+        ended_at = ended_at.replace(tzinfo=timezone.utc)
+    return ended_at > completed_at
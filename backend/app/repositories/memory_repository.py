@@ -3,6 +3,7 @@ from typing import Optional, List
 from sqlalchemy.orm import Session
 from sqlalchemy import select, delete, func
 from app.models import MemoryChunk
+from app.repositories.unit_of_work import save
 import logging
 
 
@@ -29,11 +30,27 @@ class MemoryRepository:
         """
         self.logger.debug(f"Creating memory chunk: {memory_chunk.chunk_id}")
         self.db.add(memory_chunk)
-        self.db.commit()
-        self.db.refresh(memory_chunk)
+        save(self.db, memory_chunk, flush=True)
         self.logger.info(f"Created memory chunk: {memory_chunk.chunk_id} (ID: {memory_chunk.id})")
         return memory_chunk
     
+    def create_many(self, memory_chunks: List[MemoryChunk]) -> List[MemoryChunk]:
+        """Insert several memory chunks with a single flush/commit.
+        
+        Unlike create(), rows are not refreshed afterwards.
+        
+        Args:
+            memory_chunks: MemoryChunk objects to create
+            
+        Returns:
+            The created memory chunks
+        """
+        self.logger.debug(f"Creating {len(memory_chunks)} memory chunks")
+        self.db.add_all(memory_chunks)
+        save(self.db, refresh=False, flush=True)
+        self.logger.info(f"Created {len(memory_chunks)} memory chunks")
+        return memory_chunks
+    
     def find_by_id(self, chunk_id: str) -> Optional[MemoryChunk]:
         """Find memory chunk by chunk ID.
         
@@ -155,7 +172,7 @@ class MemoryRepository:
         self.logger.debug(f"Deleting memory chunk: {chunk_id}")
         stmt = delete(MemoryChunk).where(MemoryChunk.chunk_id == chunk_id)
         result = self.db.execute(stmt)
-        self.db.commit()
+        save(self.db)
         
         deleted = result.rowcount > 0
         if deleted:
@@ -177,7 +194,7 @@ class MemoryRepository:
         self.logger.debug(f"Deleting memory chunks for session: {session_id}")
         stmt = delete(MemoryChunk).where(MemoryChunk.session_id == session_id)
         result = self.db.execute(stmt)
-        self.db.commit()
+        save(self.db)
         
         count = result.rowcount
         self.logger.info(f"Deleted {count} memory chunks for session: {session_id}")
@@ -195,7 +212,7 @@ class MemoryRepository:
         self.logger.debug(f"Deleting memory chunks for user: {user_id}")
         stmt = delete(MemoryChunk).where(MemoryChunk.user_id == user_id)
         result = self.db.execute(stmt)
-        self.db.commit()
+        save(self.db)
         
         count = result.rowcount
         self.logger.info(f"Deleted {count} memory chunks for user: {user_id}")
@@ -212,8 +229,7 @@ class MemoryRepository:
         """
         self.logger.debug(f"Updating memory chunk: {memory_chunk.chunk_id}")
         self.db.add(memory_chunk)
-        self.db.commit()
-        self.db.refresh(memory_chunk)
+        save(self.db, memory_chunk)
         self.logger.info(f"Updated memory chunk: {memory_chunk.chunk_id}")
         return memory_chunk
 
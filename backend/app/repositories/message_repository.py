@@ -1,8 +1,9 @@
 """Message repository for data access operations."""
-from typing import Optional, List
+from typing import Optional, List, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import select
+from sqlalchemy import delete, func, insert, select
 from app.models import Message
+from app.repositories.unit_of_work import save
 import logging
 
 
@@ -29,11 +30,41 @@ class MessageRepository:
         """
         self.logger.debug(f"Creating message for session: {message.session_id}")
         self.db.add(message)
-        self.db.commit()
-        self.db.refresh(message)
+        save(self.db, message, flush=True)
         self.logger.info(f"Created message: {message.role} (ID: {message.id})")
         return message
     
+    def create_many(self, messages: List[Message]) -> List[int]:
+        """Insert messages with one multi-row INSERT and assign their IDs.
+        
+        IDs are returned (and set on the objects) in input order, so messages
+        for a session keep the order they were submitted in. Keep batches
+        within the driver's bound-parameter limit (5 per row).
+        
+        Args:
+            messages: Unsaved Message objects
+            
+        Returns:
+            Assigned message IDs, in input order
+        """
+        if not messages:
+            return []
+        rows = [
+            {
+                "session_id": m.session_id, "role": m.role, "content": m.content,
+                "created_at": m.created_at, "truncated": m.truncated,
+            }
+            for m in messages
+        ]
+        # IDs are allocated in VALUES order; RETURNING order itself is not guaranteed
+        stmt = insert(Message).values(rows).returning(Message.id)
+        ids = sorted(self.db.execute(stmt).scalars().all())
+        for message, message_id in zip(messages, ids):
+            message.id = message_id
+        save(self.db)
+        self.logger.debug(f"Inserted {len(ids)} messages in one batch")
+        return ids
+    
     def find_by_id(self, message_id: int) -> Optional[Message]:
         """Find message by ID.
         
@@ -63,6 +94,45 @@ class MessageRepository:
         self.logger.debug(f"Found {len(messages)} messages for session: {session_id}")
         return messages
     
+    def find_by_session_after_id(self, session_id: str, after_id: int, limit: Optional[int] = None) -> List[Message]:
+        """Find messages for a session newer than a given message ID.
+        
+        Keyset pagination over the (session_id, id) index.
+        
+        Args:
+            session_id: Session ID to find messages for
+            after_id: Only return messages with an ID greater than this
+            limit: Maximum number of messages to return (None for all)
+            
+        Returns:
+            List of Message objects ordered by ID
+        """
+        self.logger.debug(f"Finding messages for session: {session_id} after ID: {after_id}")
+        query = select(Message).where(
+            Message.session_id == session_id,
+            Message.id > after_id
+        ).order_by(Message.id.asc())
+        if limit is not None:
+            query = query.limit(limit)
+        messages = self.db.execute(query).scalars().all()
+        self.logger.debug(f"Found {len(messages)} new messages for session: {session_id}")
+        return messages
+    
+    def get_session_stats(self, session_id: str) -> Tuple[int, int]:
+        """Get the message count and highest message ID for a session.
+        
+        Args:
+            session_id: Session ID to summarize
+            
+        Returns:
+            (message count, max message ID or 0)
+        """
+        query = select(func.count(Message.id), func.coalesce(func.max(Message.id), 0)).where(
+            Message.session_id == session_id
+        )
+        count, max_id = self.db.execute(query).one()
+        return count, max_id
+    
     def find_by_session_and_role(self, session_id: str, role: str) -> List[Message]:
         """Find messages for a session by role.
         
@@ -93,8 +163,7 @@ class MessageRepository:
         """
         self.logger.debug(f"Updating message: {message.role} (ID: {message.id})")
         self.db.add(message)
-        self.db.commit()
-        self.db.refresh(message)
+        save(self.db, message)
         self.logger.info(f"Updated message: {message.role} (ID: {message.id})")
         return message
     
@@ -113,27 +182,27 @@ class MessageRepository:
             self.logger.warning(f"Cannot delete message with ID: {message_id} - not found")
             return False
         self.db.delete(message)
-        self.db.commit()
+        save(self.db)
         self.logger.info(f"Deleted message: {message.role} (ID: {message_id})")
         return True
     
-    def delete_by_session_id(self, session_id: str) -> int:
-        """Delete all messages for a session.
+    def delete_by_session_id(self, session_id: str, limit: Optional[int] = None) -> int:
+        """Delete messages for a session with a single set-based DELETE.
         
         Args:
             session_id: Session ID to delete messages for
+            limit: Delete at most this many (oldest first), to bound a batch
             
         Returns:
             Number of messages deleted
         """
-        self.logger.debug(f"Deleting all messages for session: {session_id}")
-        query = select(Message).where(Message.session_id == session_id)
-        messages = self.db.execute(query).scalars().all()
-        deleted_count = len(messages)
-        
-        for message in messages:
-            self.db.delete(message)
-        self.db.commit()
+        self.logger.debug(f"Deleting messages for session: {session_id} (limit: {limit})")
+        stmt = delete(Message).where(Message.session_id == session_id)
+        if limit:
+            batch = select(Message.id).where(Message.session_id == session_id).order_by(Message.id.asc()).limit(limit)
+            stmt = delete(Message).where(Message.id.in_(batch.scalar_subquery()))
+        deleted_count = self.db.execute(stmt, execution_options={"synchronize_session": False}).rowcount
+        save(self.db)
         
         self.logger.info(f"Deleted {deleted_count} messages for session: {session_id}")
         return deleted_count
@@ -0,0 +1,63 @@
+"""Persona version repository for stored system prompts."""
+from typing import Optional
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
+from app.models import PersonaVersion
+from app.repositories.unit_of_work import in_unit_of_work, save
+import logging
+
+
+class PersonaVersionRepository:
+    """Repository for PersonaVersion data access operations."""
+
+    def __init__(self, db_session: Session):
+        """Initialize repository with database session.
+
+        Args:
+            db_session: SQLAlchemy database session
+        """
+        self.db = db_session
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    def find_by_id(self, version_id: str) -> Optional[PersonaVersion]:
+        """Find a persona version by ID.
+
+        Args:
+            version_id: Persona version ID (prompt hash)
+
+        Returns:
+            PersonaVersion if found, None otherwise
+        """
+        return self.db.get(PersonaVersion, version_id)
+
+    def ensure(self, version_id: str, name: str, prompt: str) -> PersonaVersion:
+        """Store a prompt under its version ID unless it is already stored.
+
+        Versions are immutable and keyed by content, so a concurrent insert of
+        the same version is treated as success.
+
+        Args:
+            version_id: Persona version ID (prompt hash)
+            name: Category the prompt was rendered for
+            prompt: Full system prompt text
+
+        Returns:
+            The stored PersonaVersion
+        """
+        version = self.find_by_id(version_id)
+        if version is not None:
+            return version
+
+        version = PersonaVersion(id=version_id, name=name, prompt=prompt)
+        self.db.add(version)
+        if in_unit_of_work(self.db):
+            save(self.db, version, flush=True)
+        else:
+            try:
+                save(self.db, version, refresh=False)
+            except IntegrityError:
+                # Another request stored the same version concurrently
+                self.db.rollback()
+                return self.find_by_id(version_id)
+        self.logger.info(f"Stored persona version {version_id} ({name})")
+        return version
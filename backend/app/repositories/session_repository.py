@@ -1,8 +1,10 @@
 """Session repository for data access operations."""
-from typing import Optional, List
+from datetime import datetime
+from typing import Optional, List, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import select
-from app.models import ChatSession
+from sqlalchemy import and_, delete, func, or_, select, update
+from app.models import ChatSession, Message
+from app.repositories.unit_of_work import save
 import logging
 
 
@@ -29,8 +31,7 @@ class SessionRepository:
         """
         self.logger.debug(f"Creating session: {session.session_id}")
         self.db.add(session)
-        self.db.commit()
-        self.db.refresh(session)
+        save(self.db, session, flush=True)
         self.logger.info(f"Created session: {session.session_id} (ID: {session.id})")
         return session
     
@@ -64,6 +65,76 @@ class SessionRepository:
         self.logger.debug(f"Found {len(sessions)} sessions for user_id: {user_id}")
         return sessions
     
+    def find_page_by_user_id(
+        self,
+        user_id: int,
+        limit: Optional[int] = None,
+        before: Optional[Tuple[datetime, int]] = None
+    ) -> List[ChatSession]:
+        """Find a user's sessions, most recently updated first.
+        
+        Keyset pagination over (user_id, updated_at, id): pass the last row's
+        (updated_at, id) as ``before`` to get the next page.
+        
+        Args:
+            user_id: User ID to find sessions for
+            limit: Maximum number of sessions to return (None for all)
+            before: Only return sessions ordered after this (updated_at, id) key
+            
+        Returns:
+            List of ChatSession objects ordered by updated_at desc, id desc
+        """
+        self.logger.debug(f"Finding session page for user_id: {user_id} before: {before}")
+        query = select(ChatSession).where(ChatSession.user_id == user_id)
+        if before is not None:
+            updated_at, session_pk = before
+            query = query.where(or_(
+                ChatSession.updated_at < updated_at,
+                and_(ChatSession.updated_at == updated_at, ChatSession.id < session_pk),
+            ))
+        query = query.order_by(ChatSession.updated_at.desc(), ChatSession.id.desc())
+        if limit is not None:
+            query = query.limit(limit)
+        return list(self.db.execute(query).scalars().all())
+    
+    def find_recent_with_opening_message(
+        self,
+        user_id: int,
+        exclude_session_id: Optional[str] = None,
+        limit: int = 2
+    ) -> List[Tuple[ChatSession, Optional[str]]]:
+        """Find a user's most recent sessions together with each one's first user message.
+        
+        Runs as a single statement: the opening message is a correlated scalar
+        subquery on the message.session_id index, so the cost does not grow
+        with the user's total history.
+        
+        Args:
+            user_id: User ID to find sessions for
+            exclude_session_id: Session to leave out (typically the current one)
+            limit: Maximum number of sessions to return
+            
+        Returns:
+            List of (ChatSession, first user message or None), oldest first
+        """
+        self.logger.debug(f"Finding {limit} recent sessions with opening message for user_id: {user_id}")
+        opening_message = (
+            select(Message.content)
+            .where(Message.session_id == ChatSession.session_id, Message.role == "user")
+            .order_by(Message.id.asc())
+            .limit(1)
+            .correlate(ChatSession)
+            .scalar_subquery()
+        )
+        query = select(ChatSession, opening_message).where(ChatSession.user_id == user_id)
+        if exclude_session_id is not None:
+            query = query.where(ChatSession.session_id != exclude_session_id)
+        query = query.order_by(ChatSession.id.desc()).limit(limit)
+        rows = [(session, first_message) for session, first_message in self.db.execute(query).all()]
+        rows.reverse()
+        self.logger.debug(f"Found {len(rows)} recent sessions for user_id: {user_id}")
+        return rows
+    
     def find_by_session_and_user(self, session_id: str, user_id: int) -> Optional[ChatSession]:
         """Find session by session ID and user ID (for authorization).
         
@@ -94,11 +165,54 @@ class SessionRepository:
         """
         self.logger.debug(f"Updating session: {session.session_id} (ID: {session.id})")
         self.db.add(session)
-        self.db.commit()
-        self.db.refresh(session)
+        save(self.db, session)
         self.logger.info(f"Updated session: {session.session_id} (ID: {session.id})")
         return session
     
+    def touch(self, session_ids: List[str], updated_at: datetime) -> int:
+        """Set updated_at on several sessions with one UPDATE.
+        
+        Args:
+            session_ids: Sessions to bump
+            updated_at: New updated_at value
+            
+        Returns:
+            Number of sessions updated
+        """
+        if not session_ids:
+            return 0
+        stmt = update(ChatSession).where(ChatSession.session_id.in_(session_ids)).values(updated_at=updated_at)
+        count = self.db.execute(stmt, execution_options={"synchronize_session": False}).rowcount
+        save(self.db)
+        return count
+    
+    def find_session_ids_by_user_id(self, user_id: int, limit: Optional[int] = None) -> List[str]:
+        """Find session IDs for a user without loading the sessions.
+        
+        Args:
+            user_id: User ID to find sessions for
+            limit: Maximum number of IDs to return
+            
+        Returns:
+            List of session IDs
+        """
+        query = select(ChatSession.session_id).where(ChatSession.user_id == user_id)
+        if limit:
+            query = query.limit(limit)
+        return list(self.db.execute(query).scalars().all())
+    
+    def count_by_user_id(self, user_id: int) -> int:
+        """Count sessions for a user.
+        
+        Args:
+            user_id: User ID to count sessions for
+            
+        Returns:
+            Number of sessions
+        """
+        query = select(func.count()).select_from(ChatSession).where(ChatSession.user_id == user_id)
+        return self.db.execute(query).scalar_one()
+    
     def delete(self, session_id: str) -> bool:
         """Delete session by session ID.
         
@@ -109,12 +223,11 @@ class SessionRepository:
             True if deleted, False if not found
         """
         self.logger.debug(f"Deleting session: {session_id}")
-        session = self.find_by_id(session_id)
-        if not session:
+        result = self.db.execute(delete(ChatSession).where(ChatSession.session_id == session_id))
+        save(self.db)
+        if not result.rowcount:
             self.logger.warning(f"Cannot delete session: {session_id} - not found")
             return False
-        self.db.delete(session)
-        self.db.commit()
         self.logger.info(f"Deleted session: {session_id}")
         return True
     
@@ -0,0 +1,69 @@
+"""Unit-of-work support so services can batch repository writes into one transaction."""
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
+from sqlalchemy.orm import Session
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+# Key in Session.info holding the current unit-of-work nesting depth
+_UOW_DEPTH_KEY = "unit_of_work_depth"
+
+
+def in_unit_of_work(db: Session) -> bool:
+    """Return True if the session is inside an active unit of work."""
+    info = getattr(db, "info", None)
+    return isinstance(info, dict) and info.get(_UOW_DEPTH_KEY, 0) > 0
+
+
+@contextmanager
+def unit_of_work(db: Session) -> Iterator[Session]:
+    """Group repository writes on a session into a single transaction.
+
+    Inside the block, repository ``create`` methods flush (so generated IDs are
+    available) and ``update``/``delete`` methods only stage changes; nothing is
+    committed or refreshed per call. The outermost block commits once on
+    success and rolls back on any exception. Nested blocks join the outer one.
+
+    Args:
+        db: SQLAlchemy database session
+
+    Yields:
+        The same session, for convenience
+    """
+    depth = db.info.get(_UOW_DEPTH_KEY, 0)
+    db.info[_UOW_DEPTH_KEY] = depth + 1
+    try:
+        yield db
+        if depth == 0:
+            db.commit()
+    except Exception:
+        if depth == 0:
+            logger.debug("Rolling back unit of work")
+            db.rollback()
+        raise
+    finally:
+        db.info[_UOW_DEPTH_KEY] = depth
+
+
+def save(db: Session, obj: Optional[Any] = None, refresh: bool = True, flush: bool = False) -> None:
+    """Persist pending changes for a repository call.
+
+    Outside a unit of work this keeps the classic behaviour: commit, then
+    refresh ``obj``. Inside one it defers the commit to the enclosing block,
+    flushing only when the caller needs database-generated values (``flush``).
+
+    Args:
+        db: SQLAlchemy database session
+        obj: Object to refresh after commit (optional)
+        refresh: Whether to refresh ``obj`` after a standalone commit
+        flush: Whether to flush inside a unit of work (e.g. to assign primary keys)
+    """
+    if in_unit_of_work(db):
+        if flush:
+            db.flush([obj] if obj is not None else None)
+        return
+    db.commit()
+    if refresh and obj is not None:
+        db.refresh(obj)
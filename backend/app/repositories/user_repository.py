@@ -3,6 +3,7 @@ from typing import Optional, List
 from sqlalchemy.orm import Session
 from sqlalchemy import select
 from app.models import User
+from app.repositories.unit_of_work import save
 import logging
 
 
@@ -29,8 +30,7 @@ class UserRepository:
         """
         self.logger.debug(f"Creating user: {user.login_id}")
         self.db.add(user)
-        self.db.commit()
-        self.db.refresh(user)
+        save(self.db, user, flush=True)
         self.logger.info(f"Created user: {user.login_id} (ID: {user.id})")
         return user
     
@@ -119,8 +119,7 @@ class UserRepository:
         """
         self.logger.debug(f"Updating user: {user.login_id} (ID: {user.id})")
         self.db.add(user)
-        self.db.commit()
-        self.db.refresh(user)
+        save(self.db, user)
         self.logger.info(f"Updated user: {user.login_id} (ID: {user.id})")
         return user
     
@@ -139,7 +138,7 @@ class UserRepository:
             self.logger.warning(f"Cannot delete user with ID: {user_id} - not found")
             return False
         self.db.delete(user)
-        self.db.commit()
+        save(self.db)
         self.logger.info(f"Deleted user: {user.login_id} (ID: {user_id})")
         return True
     
@@ -3,6 +3,7 @@ from typing import Optional, List
 from sqlalchemy.orm import Session
 from sqlalchemy import select
 from app.models import Wallet, WalletTransaction
+from app.repositories.unit_of_work import save
 import logging
 
 
@@ -29,8 +30,7 @@ class WalletRepository:
         """
         self.logger.debug(f"Creating wallet for user_id: {wallet.user_id}")
         self.db.add(wallet)
-        self.db.commit()
-        self.db.refresh(wallet)
+        save(self.db, wallet, flush=True)
         self.logger.info(f"Created wallet for user_id: {wallet.user_id} (ID: {wallet.id})")
         return wallet
     
@@ -74,8 +74,7 @@ class WalletRepository:
         """
         self.logger.debug(f"Updating wallet: {wallet.id} for user_id: {wallet.user_id}")
         self.db.add(wallet)
-        self.db.commit()
-        self.db.refresh(wallet)
+        save(self.db, wallet)
         self.logger.info(f"Updated wallet: {wallet.id} for user_id: {wallet.user_id}")
         return wallet
     
@@ -94,7 +93,7 @@ class WalletRepository:
             self.logger.warning(f"Cannot delete wallet with ID: {wallet_id} - not found")
             return False
         self.db.delete(wallet)
-        self.db.commit()
+        save(self.db)
         self.logger.info(f"Deleted wallet: {wallet_id}")
         return True
     
@@ -142,8 +141,7 @@ class TransactionRepository:
         """
         self.logger.debug(f"Creating transaction for wallet_id: {transaction.wallet_id}")
         self.db.add(transaction)
-        self.db.commit()
-        self.db.refresh(transaction)
+        save(self.db, transaction, flush=True)
         self.logger.info(f"Created transaction: {transaction.type} (ID: {transaction.id})")
         return transaction
     
@@ -221,8 +219,7 @@ class TransactionRepository:
         """
         self.logger.debug(f"Updating transaction: {transaction.type} (ID: {transaction.id})")
         self.db.add(transaction)
-        self.db.commit()
-        self.db.refresh(transaction)
+        save(self.db, transaction)
         self.logger.info(f"Updated transaction: {transaction.type} (ID: {transaction.id})")
         return transaction
     
@@ -241,7 +238,7 @@ class TransactionRepository:
             self.logger.warning(f"Cannot delete transaction with ID: {transaction_id} - not found")
             return False
         self.db.delete(transaction)
-        self.db.commit()
+        save(self.db)
         self.logger.info(f"Deleted transaction: {transaction.type} (ID: {transaction_id})")
         return True
     
@@ -4,5 +4,6 @@ from .sessions import router as sessions_router
 from .wallet import router as wallet_router
 from .phone_verification import router as phone_verification_router
 from .feedback import router as feedback_router
+from .internal import router as internal_router
 
-__all__ = ["auth_router", "sessions_router", "wallet_router", "phone_verification_router", "feedback_router"]
+__all__ = ["auth_router", "sessions_router", "wallet_router", "phone_verification_router", "feedback_router", "internal_router"]
@@ -31,7 +31,7 @@ def register(payload: RegisterIn, user_service: UserService = Depends(get_user_s
     auth_router_logger.info(f"Registration attempt for login_id: {payload.login_id}")
 
     user = user_service.create_user(payload)
-    token = create_access_token(payload.login_id)
+    token = create_access_token(payload.login_id, user.id)
     auth_router_logger.info(f"Registration completed successfully for: {payload.login_id}")
     # New users always need onboarding
     return TokenOut(access_token=token, needs_onboarding=True)
@@ -43,7 +43,7 @@ def login(payload: LoginIn, user_service: UserService = Depends(get_user_service
     auth_router_logger.info(f"Login attempt for login_id: {payload.login_id}")
 
     user = user_service.authenticate_user(payload.login_id, payload.password)
-    token = create_access_token(payload.login_id)
+    token = create_access_token(payload.login_id, user.id)
 
     # Check if user needs onboarding
     with get_session() as session:
@@ -162,7 +162,7 @@ def google_auth(payload: GoogleAuthIn, response: Response, user_service: UserSer
     login_logger.info("--- TOKEN GENERATION ---")
     # Create token using login_id (which is email for Google users)
     login_logger.info(f"🔑 Creating access token for login_id: {user.login_id}")
-    token = create_access_token(user.login_id)
+    token = create_access_token(user.login_id, user.id)
     login_logger.info(f"✅ Token created (length: {len(token)})")
     login_logger.debug(f"🔑 Token preview: {token[:30]}...")
 
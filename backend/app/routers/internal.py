@@ -0,0 +1,41 @@
+"""Internal operations router for TherapyBro backend (not for end users)."""
+import hmac
+from typing import Any, Dict, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException
+
+from app.config.settings import get_settings
+from app.llm_metrics import get_prompt_cache_metrics, get_stream_cancellation_metrics
+from app.services.llm_router import get_provider_health_registry
+from app.logging_config import get_logger
+
+# Create logger for internal router
+internal_router_logger = get_logger('internal_router')
+
+# Create router
+router = APIRouter(prefix="/internal", tags=["internal"])
+
+
+def require_internal_token(x_internal_token: Optional[str] = Header(default=None)) -> None:
+    """Allow the request only with the INTERNAL_API_TOKEN shared secret.
+    
+    Internal endpoints are hidden (404) while no token is configured.
+    """
+    expected = get_settings().internal_api_token
+    if not expected:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_internal_token or not hmac.compare_digest(x_internal_token, expected):
+        internal_router_logger.warning("Rejected internal request with a missing or invalid token")
+        raise HTTPException(status_code=401, detail="Invalid internal token")
+
+
+@router.get("/llm-stats", dependencies=[Depends(require_internal_token)])
+def llm_stats() -> Dict[str, Any]:
+    """Live per-route LLM stats: breaker state, EWMA latency/throughput/errors/cost, cache and cancellation totals."""
+    settings = get_settings()
+    return {
+        "policy": settings.llm_routing_policy,
+        "ttft_slo_ms": settings.llm_ttft_slo_ms,
+        "routes": get_provider_health_registry().snapshot(),
+        "prompt_cache": get_prompt_cache_metrics().snapshot(),
+        "cancellations": get_stream_cancellation_metrics().snapshot(),
+    }
@@ -1,20 +1,21 @@
 """Sessions router for TherapyBro backend."""
-import os
 import logging
-from typing import List
-from fastapi import APIRouter, HTTPException, Depends
+from typing import Iterator, List, Optional
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Depends, Query, Request, Response
 from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 
 from app.db import get_session
 from app.models import User
 from app.schemas import (
     StartSessionIn, StartSessionOut, MessageIn, MessageOut, HistoryOut,
-    ConversationItem, NotesIn, ExtendSessionIn, ExtendSessionOut
+    ConversationItem, NotesIn, ExtendSessionIn, ExtendSessionOut, DeletionJobOut
 )
 from app.prompts import system_prompt_for
 from app.auth import get_current_user
 from app.dependencies import get_session_service, get_message_service
 from app.services.session_service import SessionService
+from app.services.deletion_service import DeletionService, run_deletion_job
 from app.services.message_service import MessageService
 from app.logging_config import get_logger
 
@@ -25,10 +26,64 @@ sessions_router_logger = get_logger('sessions_router')
 router = APIRouter(prefix="/api", tags=["sessions"])
 
 
+# Largest page the list/history endpoints return
+MAX_PAGE_SIZE = 500
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header against an ETag (weak comparison)."""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in (tag[2:] if tag.startswith("W/") else tag for tag in candidates)
+
+
+def _export_history(session_id: str, user_id: int) -> Iterator[bytes]:
+    # Uses its own DB session: the response body is produced after the handler returns
+    with get_session() as db:
+        yield from SessionService(db).export_session_history(session_id, user_id)
+
+
 @router.get("/chats", response_model=List[ConversationItem])
-def list_chats(user: User = Depends(get_current_user), session_service: SessionService = Depends(get_session_service)):
-    """Get list of user's chat sessions."""
-    return session_service.list_user_sessions(user.id)
+def list_chats(
+    response: Response,
+    limit: Optional[int] = Query(default=None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    user: User = Depends(get_current_user),
+    session_service: SessionService = Depends(get_session_service),
+):
+    """Get list of user's chat sessions, most recently updated first.
+    
+    With ``limit`` one page is returned; if more sessions follow, the cursor
+    for the next page is sent in the X-Next-Cursor header.
+    """
+    items, next_cursor = session_service.list_user_sessions_page(user.id, limit, cursor)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return items
+
+
+@router.delete("/chats", response_model=DeletionJobOut, status_code=202)
+def delete_all_chats(background_tasks: BackgroundTasks, user: User = Depends(get_current_user)):
+    """Delete all of the user's chats, memories and feedback in the background.
+    
+    Returns the deletion job; poll /api/chats/deletions/{job_id} for progress.
+    Repeating the request while a job is active returns that job.
+    """
+    with get_session() as db:
+        job = DeletionService(db).request_user_deletion(user.id)
+    background_tasks.add_task(run_deletion_job, job.job_id)
+    return job
+
+
+@router.get("/chats/deletions/{job_id}", response_model=DeletionJobOut)
+def get_chat_deletion(job_id: int, user: User = Depends(get_current_user)):
+    """Get the status and progress of a chat deletion job."""
+    try:
+        with get_session() as db:
+            return DeletionService(db).get_user_deletion(job_id, user.id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
 
 
 @router.post("/sessions", response_model=StartSessionOut)
@@ -36,7 +91,10 @@ def start_session(payload: StartSessionIn, user: User = Depends(get_current_user
     """Start a new chat session."""
     sessions_router_logger.info(f"Starting new session for user: {user.login_id}, category: {payload.category}")
     
-    system_prompt = system_prompt_for(payload.category)
+    try:
+        system_prompt = system_prompt_for(payload.category)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     try:
         session_out = session_service.create_session(user.id, payload.category, system_prompt)
@@ -48,17 +106,45 @@ def start_session(payload: StartSessionIn, user: User = Depends(get_current_user
 
 
 @router.get("/sessions/{session_id}", response_model=HistoryOut)
-def get_history(session_id: str, user: User = Depends(get_current_user)):
-    """Get chat history for a specific session."""
+def get_history(
+    session_id: str,
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(default=None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    format: str = Query(default="json", pattern="^(json|ndjson)$"),
+    user: User = Depends(get_current_user),
+):
+    """Get chat history for a specific session.
+    
+    - ``limit``/``cursor`` page through messages oldest first; ``next_cursor``
+      (also sent as X-Next-Cursor) is set while more messages follow.
+    - Responses carry an ETag; a matching If-None-Match returns 304.
+    - ``format=ndjson`` streams the full history, one JSON object per line.
+    """
     sessions_router_logger.info(f"Retrieving history for session: {session_id}, user: {user.login_id}")
     
     try:
         with get_session() as db:
             session_service = SessionService(db)
-            return session_service.get_session_history(session_id, user.id)
+            if format == "ndjson":
+                if not session_service.find_session_by_id(session_id, user.id):
+                    raise ValueError("Session not found")
+                return StreamingResponse(_export_history(session_id, user.id), media_type="application/x-ndjson")
+            
+            etag = session_service.get_history_etag(session_id, user.id, limit, cursor)
+            if _etag_matches(request.headers.get("if-none-match"), etag):
+                return Response(status_code=304, headers={"ETag": etag})
+            history = session_service.get_session_history(session_id, user.id, limit, cursor)
     except ValueError as e:
         sessions_router_logger.warning(f"Session not found: {session_id} for user: {user.login_id}")
         raise HTTPException(status_code=404, detail=str(e))
+    
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
+    if history.next_cursor:
+        response.headers["X-Next-Cursor"] = history.next_cursor
+    return history
 
 
 @router.put("/sessions/{session_id}/notes")
@@ -86,18 +172,33 @@ def delete_session(session_id: str, user: User = Depends(get_current_user)):
 
 
 @router.post("/sessions/{session_id}/messages")
-def send_message(session_id: str, payload: MessageIn, user: User = Depends(get_current_user), message_service: MessageService = Depends(get_message_service)):
-    """Send a message to a chat session and get streaming response."""
+async def send_message(
+    session_id: str,
+    payload: MessageIn,
+    request: Request,
+    format: Optional[str] = Query(default=None, pattern="^(ndjson|sse)$"),
+    user: User = Depends(get_current_user),
+    message_service: MessageService = Depends(get_message_service),
+):
+    """Send a message to a chat session and get streaming response.
+    
+    The reply streams as NDJSON by default, or as Server-Sent Events with
+    ``format=sse`` or ``Accept: text/event-stream``; both carry the same
+    delta/done JSON frames.
+    """
     sessions_router_logger.info(f"Processing message for session: {session_id}, user: {user.login_id}")
     sessions_router_logger.debug(f"Message length: {len(payload.content)} characters")
+    if format is None:
+        format = "sse" if "text/event-stream" in request.headers.get("accept", "") else "ndjson"
     
     try:
-        # Get provider from environment or use default
-        provider = os.getenv("LLM_PROVIDER", "anthropic").strip().lower()
-        
-        # Process message and get streaming response
-        return message_service.process_message_stream(
-            session_id, user.id, payload.content, provider
+        # Session checks, persistence and context building are blocking DB work,
+        # so run them in the threadpool; the LLM stream itself runs on the event loop.
+        # The provider (and any failover/hedging across LLM_FALLBACK_PROVIDERS) comes
+        # from settings via the LLM factory.
+        return await run_in_threadpool(
+            message_service.process_message_stream,
+            session_id, user.id, payload.content, None, format
         )
             
     except ValueError as e:
@@ -1,6 +1,6 @@
 from __future__ import annotations
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime, date
 from enum import Enum
 
@@ -88,12 +88,14 @@ class MessageIn(BaseModel):
 class MessageOut(BaseModel):
     role: str
     content: str
+    truncated: bool = False
 
 class HistoryOut(SessionTimes, BaseModel):
     category: str
     messages: List[MessageOut]
     status: SessionStatus
     remaining_seconds: int
+    next_cursor: Optional[str] = None  # set when a page was requested and more messages follow
 
 class ConversationItem(BaseModel):
     session_id: str
@@ -134,6 +136,15 @@ class FinalizeSessionOut(BaseModel):
     refund_amount: MoneyStr
     wallet_balance: MoneyStr     # String representation of Decimal
 
+class DeletionJobOut(BaseModel):
+    job_id: int
+    status: str                  # pending | running | done | failed
+    sessions_total: int
+    progress: Dict[str, int]     # rows deleted so far per kind
+    error: Optional[str] = None
+    created_at: datetime
+    completed_at: Optional[datetime] = None
+
 # --- Onboarding ---
 class OnboardingResponseIn(BaseModel):
     name: Optional[str] = None
@@ -4,6 +4,7 @@ from sqlalchemy.orm import Session
 from sqlmodel import SQLModel
 from sqlalchemy import select, delete
 from sqlalchemy.sql.elements import UnaryExpression
+from app.repositories.unit_of_work import save, unit_of_work
 import logging
 
 # Type variables for generic service
@@ -49,6 +50,17 @@ class BaseService(Generic[T]):
             filters.append(col == value)
         return filters
 
+    def unit_of_work(self):
+        """Batch this service's repository writes into one transaction.
+
+        Usage::
+
+            with self.unit_of_work():
+                self.wallet_repository.update(wallet)
+                self.transaction_repository.create(tx)
+        """
+        return unit_of_work(self.db)
+
     # -----------------------------
     # CRUD
     # -----------------------------
@@ -56,8 +68,7 @@ class BaseService(Generic[T]):
         """Create a new object in the database."""
         self.logger.debug(f"Creating {obj.__class__.__name__}")
         self.db.add(obj)
-        self.db.commit()
-        self.db.refresh(obj)
+        save(self.db, obj, flush=True)
         self.logger.info(f"Created {obj.__class__.__name__} with ID: {getattr(obj, 'id', 'unknown')}")
         return obj
 
@@ -86,8 +97,7 @@ class BaseService(Generic[T]):
         self.logger.debug(f"Updating {obj.__class__.__name__} with ID: {getattr(obj, 'id', 'unknown')}")
         # .add() is harmless if already persistent; keeps it explicit
         self.db.add(obj)
-        self.db.commit()
-        self.db.refresh(obj)
+        save(self.db, obj)
         self.logger.info(f"Updated {obj.__class__.__name__} with ID: {getattr(obj, 'id', 'unknown')}")
         return obj
 
@@ -99,7 +109,7 @@ class BaseService(Generic[T]):
             self.logger.warning(f"Cannot delete {model_class.__name__} with ID: {obj_id} - not found")
             return False
         self.db.delete(obj)
-        self.db.commit()
+        save(self.db)
         self.logger.info(f"Deleted {model_class.__name__} with ID: {obj_id}")
         return True
 
@@ -111,7 +121,7 @@ class BaseService(Generic[T]):
         for f in filters:
             stmt = stmt.where(f)
         result = self.db.execute(stmt)
-        self.db.commit()
+        save(self.db)
         # Note: some drivers may yield -1 for rowcount; PG/MySQL are fine.
         deleted_count = result.rowcount or 0
         self.logger.info(f"Deleted {deleted_count} {model_class.__name__} objects")
@@ -0,0 +1,245 @@
+"""Cascading deletes of sessions and account conversation data, in bounded batches."""
+import logging
+from typing import Callable, Dict, Optional
+
+from sqlalchemy import delete
+from sqlalchemy.orm import Session
+
+from app.config.settings import get_settings
+from app.models import DeletionJob, Feedback, MemoryFinalizationJob, SessionCharge
+from app.repositories.deletion_job_repository import DeletionJobRepository
+from app.repositories.memory_repository import MemoryRepository
+from app.repositories.message_repository import MessageRepository
+from app.repositories.session_repository import SessionRepository
+from app.schemas import DeletionJobOut
+from app.services.base_service import BaseService
+from app.services.history_builder import get_history_builder
+
+
+logger = logging.getLogger(__name__)
+
+# Counters reported by every delete (and stored as DeletionJob.progress)
+DELETION_KINDS = ("sessions", "messages", "memories", "charges", "feedback")
+
+ProgressCallback = Callable[[Dict[str, int]], None]
+
+
+class DeletionService(BaseService):
+    """
+    Service for cascading deletes of chat data.
+
+    A session delete removes its finalization job, memory chunks (vectors
+    first, then SQL rows), messages, charges, feedback and finally the
+    session row, using set-based DELETE statements. Messages go in batches
+    of `batch_size`, each its own transaction, so large sessions never hold
+    one long lock; the session row goes last, so an interrupted delete can
+    simply be re-run. Wallet transactions, payments and the user account are
+    kept (the wallet ledger must still reconcile).
+    """
+
+    def __init__(self, db_session: Session, batch_size: Optional[int] = None, vector_store=None):
+        """
+        Initialize service with database session.
+
+        Args:
+            db_session: SQLAlchemy database session
+            batch_size: Rows per DELETE batch (defaults to DELETION_BATCH_SIZE)
+            vector_store: Vector store to delete memories from (defaults to get_vector_store())
+        """
+        super().__init__(db_session)
+        self.batch_size = batch_size or get_settings().deletion_batch_size
+        self._vector_store = vector_store
+        self.session_repository = SessionRepository(db_session)
+        self.message_repository = MessageRepository(db_session)
+        self.memory_repository = MemoryRepository(db_session)
+        self.job_repository = DeletionJobRepository(db_session)
+
+    @property
+    def vector_store(self):
+        """Vector store, created on first use (most deletes have no memories)."""
+        if self._vector_store is None:
+            from app.services.vector_store import get_vector_store
+            self._vector_store = get_vector_store()
+        return self._vector_store
+
+    def delete_session(self, session_id: str, user_id: int, progress: Optional[ProgressCallback] = None) -> Dict[str, int]:
+        """
+        Delete a session and everything attached to it.
+
+        Args:
+            session_id: Session ID to delete
+            user_id: User ID (for authorization)
+            progress: Called with the running counts after each batch
+
+        Returns:
+            Number of rows deleted per kind (see DELETION_KINDS)
+
+        Raises:
+            ValueError: If session not found
+        """
+        if not self.session_repository.find_by_session_and_user(session_id, user_id):
+            self.logger.warning(f"Session not found: {session_id} for user: {user_id}")
+            raise ValueError("Session not found")
+        counts = dict.fromkeys(DELETION_KINDS, 0)
+        self._delete_session_data(session_id, counts, progress)
+        self.logger.info(f"Deleted session {session_id}: {counts}")
+        return counts
+
+    def delete_user_data(
+        self,
+        user_id: int,
+        progress: Optional[ProgressCallback] = None,
+        counts: Optional[Dict[str, int]] = None,
+    ) -> Dict[str, int]:
+        """
+        Delete all sessions and conversation data for a user.
+
+        Sessions are fetched `batch_size` IDs at a time and deleted one by
+        one; afterwards memories, feedback and finalization jobs not tied to
+        a remaining session are swept by user ID.
+
+        Args:
+            user_id: User whose data should be deleted
+            progress: Called with the running counts after each batch
+            counts: Counts to continue from (when resuming a job)
+
+        Returns:
+            Number of rows deleted per kind (see DELETION_KINDS)
+        """
+        counts = {kind: (counts or {}).get(kind, 0) for kind in DELETION_KINDS}
+        while True:
+            session_ids = self.session_repository.find_session_ids_by_user_id(user_id, limit=self.batch_size)
+            if not session_ids:
+                break
+            for session_id in session_ids:
+                self._delete_session_data(session_id, counts, progress)
+
+        if get_settings().memory_enabled or self.memory_repository.count_by_user_id(user_id):
+            self.vector_store.delete_user_memories(user_id)
+        counts["memories"] += self.memory_repository.delete_by_user_id(user_id)
+        with self.unit_of_work():
+            counts["feedback"] += self.db.execute(delete(Feedback).where(Feedback.user_id == user_id)).rowcount
+            self.db.execute(delete(MemoryFinalizationJob).where(MemoryFinalizationJob.user_id == user_id))
+        if progress:
+            progress(counts)
+        self.logger.info(f"Deleted conversation data for user {user_id}: {counts}")
+        return counts
+
+    def request_user_deletion(self, user_id: int) -> DeletionJobOut:
+        """
+        Create a background deletion job for a user, or return the active one.
+
+        Args:
+            user_id: User whose data should be deleted
+
+        Returns:
+            The pending or running job (run it with run_deletion_job)
+        """
+        job = self.job_repository.find_active_by_user_id(user_id)
+        if job is not None:
+            self.logger.info(f"Deletion job {job.id} already {job.status} for user {user_id}")
+        else:
+            job = self.job_repository.create(user_id, self.session_repository.count_by_user_id(user_id))
+            self.db.commit()
+        return self._job_out(job)
+
+    def get_user_deletion(self, job_id: int, user_id: int) -> DeletionJobOut:
+        """
+        Get the status and progress of a user's deletion job.
+
+        Args:
+            job_id: Deletion job ID
+            user_id: User ID (for authorization)
+
+        Returns:
+            Job status with the counts deleted so far
+
+        Raises:
+            ValueError: If the job does not exist or belongs to another user
+        """
+        job = self.job_repository.find_by_id(job_id)
+        if job is None or job.user_id != user_id:
+            raise ValueError("Deletion job not found")
+        self.db.refresh(job)
+        return self._job_out(job)
+
+    @staticmethod
+    def _job_out(job: DeletionJob) -> DeletionJobOut:
+        return DeletionJobOut(
+            job_id=job.id,
+            status=job.status,
+            sessions_total=job.sessions_total,
+            progress={kind: (job.progress or {}).get(kind, 0) for kind in DELETION_KINDS},
+            error=job.last_error,
+            created_at=job.created_at,
+            completed_at=job.completed_at,
+        )
+
+    def _delete_session_data(self, session_id: str, counts: Dict[str, int], progress: Optional[ProgressCallback]) -> None:
+        """Delete one session's rows in dependency order, updating `counts`."""
+        # Drop any queued finalization first so a worker cannot re-index the session
+        with self.unit_of_work():
+            self.db.execute(delete(MemoryFinalizationJob).where(MemoryFinalizationJob.session_id == session_id))
+
+        if self.memory_repository.count_by_session_id(session_id):
+            self.vector_store.delete_session_memories(session_id)
+            counts["memories"] += self.memory_repository.delete_by_session_id(session_id)
+
+        while True:
+            deleted = self.message_repository.delete_by_session_id(session_id, limit=self.batch_size)
+            counts["messages"] += deleted
+            if deleted < self.batch_size:
+                break
+            if progress:
+                progress(counts)
+
+        with self.unit_of_work():
+            counts["charges"] += self.db.execute(delete(SessionCharge).where(SessionCharge.session_id == session_id)).rowcount
+            counts["feedback"] += self.db.execute(delete(Feedback).where(Feedback.session_id == session_id)).rowcount
+            counts["sessions"] += int(self.session_repository.delete(session_id))
+        get_history_builder().invalidate(session_id)
+        if progress:
+            progress(counts)
+
+
+def run_deletion_job(job_id: int, session_factory: Optional[Callable[[], Session]] = None) -> bool:
+    """
+    Claim and run a user deletion job, recording progress as it goes.
+
+    Safe to call for a job another worker is running: the claim fails and
+    nothing happens unless that worker has gone quiet for
+    DELETION_JOB_STALE_SECONDS, in which case the job resumes from its
+    recorded counts (every step of the delete is idempotent).
+
+    Args:
+        job_id: Deletion job ID
+        session_factory: Callable returning a new DB session (defaults to the app engine)
+
+    Returns:
+        True if the job ran to completion, False if it was not claimed or failed
+    """
+    if session_factory is None:
+        from app.db import engine
+        session_factory = lambda: Session(engine)
+
+    with session_factory() as db:
+        repo = DeletionJobRepository(db)
+        if not repo.claim(job_id, get_settings().deletion_job_stale_seconds):
+            logger.debug(f"Deletion job {job_id} is not claimable")
+            return False
+        job = repo.find_by_id(job_id)
+        db.refresh(job)
+        try:
+            counts = DeletionService(db).delete_user_data(
+                job.user_id,
+                progress=lambda progress: repo.record_progress(job, progress),
+                counts=job.progress,
+            )
+        except Exception as e:
+            db.rollback()
+            repo.mark_failed(job, str(e))
+            logger.error(f"Deletion job {job_id} failed for user {job.user_id}: {str(e)}")
+            return False
+        repo.mark_done(job, counts)
+        logger.info(f"Deletion job {job_id} completed for user {job.user_id}: {counts}")
+        return True
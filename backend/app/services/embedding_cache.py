@@ -0,0 +1,258 @@
+"""Content-addressed embedding cache with an in-memory LRU tier and a SQLite tier."""
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.config.settings import get_settings
+
+
+logger = logging.getLogger(__name__)
+
+EmbeddingFunction = Callable[[List[str]], Sequence[Sequence[float]]]
+
+
+def normalize_text(text: str) -> str:
+    """Normalise text for cache keys (Unicode NFKC, case-folded, collapsed whitespace)."""
+    return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+
+def cache_key(model: str, text: str) -> str:
+    """Return the cache key for a text embedded with a given model."""
+    return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache keyed by hash(model, normalised text).
+
+    Lookups check an in-memory LRU first, then a SQLite table of float32
+    blobs; disk hits are promoted to memory. Both tiers are bounded and evict
+    least-recently-used entries. Hit/miss/eviction counters are exposed via
+    stats().
+    """
+
+    def __init__(
+        self,
+        model: str,
+        max_memory_entries: int = 10000,
+        db_path: Optional[str] = None,
+        max_disk_entries: int = 200000,
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            model: Embedding model name (part of every key)
+            max_memory_entries: Capacity of the in-memory LRU tier
+            db_path: SQLite file for the disk tier (None disables it)
+            max_disk_entries: Capacity of the disk tier
+        """
+        self.model = model
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "memory_evictions": 0, "disk_evictions": 0}
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path:
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embedding_cache ("
+                "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS ix_embedding_cache_last_used ON embedding_cache (last_used)")
+            self._db.commit()
+
+    def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Look up embeddings for texts; misses are returned as None."""
+        keys = [cache_key(self.model, text) for text in texts]
+        found: List[Optional[np.ndarray]] = [None] * len(keys)
+        disk_lookup: Dict[str, List[int]] = {}
+        with self._lock:
+            for i, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    self._counters["memory_hits"] += 1
+                    found[i] = vector
+                else:
+                    disk_lookup.setdefault(key, []).append(i)
+
+            if disk_lookup and self._db is not None:
+                for key, vector in self._read_disk(list(disk_lookup)).items():
+                    self._remember(key, vector)
+                    for i in disk_lookup.pop(key):
+                        self._counters["disk_hits"] += 1
+                        found[i] = vector
+            self._counters["misses"] += sum(len(rows) for rows in disk_lookup.values())
+        return found
+
+    def put_many(self, texts: List[str], vectors: Sequence[Sequence[float]]) -> None:
+        """Store embeddings for texts in both tiers."""
+        entries = {
+            cache_key(self.model, text): np.asarray(vector, dtype=np.float32)
+            for text, vector in zip(texts, vectors)
+        }
+        with self._lock:
+            for key, vector in entries.items():
+                self._remember(key, vector)
+            if self._db is not None:
+                now = time.time()
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embedding_cache (key, vector, last_used) VALUES (?, ?, ?)",
+                    [(key, vector.tobytes(), now) for key, vector in entries.items()],
+                )
+                self._evict_disk()
+                self._db.commit()
+
+    def embed(self, texts: List[str], embedding_function: EmbeddingFunction) -> List[np.ndarray]:
+        """
+        Return embeddings for texts, computing only the misses.
+
+        Misses are de-duplicated by key and embedded in a single batch call.
+        """
+        vectors = self.get_many(texts)
+        missing: Dict[str, str] = {}
+        for text, vector in zip(texts, vectors):
+            if vector is None:
+                missing.setdefault(cache_key(self.model, text), text)
+        if missing:
+            miss_texts = list(missing.values())
+            computed = embedding_function(miss_texts)
+            self.put_many(miss_texts, computed)
+            by_key = {key: np.asarray(v, dtype=np.float32) for key, v in zip(missing, computed)}
+            vectors = [v if v is not None else by_key[cache_key(self.model, t)] for t, v in zip(texts, vectors)]
+        return vectors
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss/eviction counters and tier sizes."""
+        with self._lock:
+            stats = dict(self._counters)
+            stats["memory_entries"] = len(self._memory)
+            if self._db is not None:
+                stats["disk_entries"] = self._db.execute("SELECT COUNT(*) FROM embedding_cache").fetchone()[0]
+        return stats
+
+    def clear(self) -> None:
+        """Drop all cached embeddings and reset counters."""
+        with self._lock:
+            self._memory.clear()
+            for name in self._counters:
+                self._counters[name] = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM embedding_cache")
+                self._db.commit()
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self._counters["memory_evictions"] += 1
+
+    def _read_disk(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        found: Dict[str, np.ndarray] = {}
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = self._db.execute(
+                f"SELECT key, vector FROM embedding_cache WHERE key IN ({placeholders})", batch
+            ).fetchall()
+            found.update({key: np.frombuffer(blob, dtype=np.float32) for key, blob in rows})
+        if found:
+            now = time.time()
+            self._db.executemany(
+                "UPDATE embedding_cache SET last_used = ? WHERE key = ?", [(now, key) for key in found]
+            )
+            self._db.commit()
+        return found
+
+    def _evict_disk(self) -> None:
+        count = self._db.execute("SELECT COUNT(*) FROM embedding_cache").fetchone()[0]
+        excess = count - self.max_disk_entries
+        if excess > 0:
+            self._db.execute(
+                "DELETE FROM embedding_cache WHERE key IN "
+                "(SELECT key FROM embedding_cache ORDER BY last_used ASC LIMIT ?)",
+                (excess,),
+            )
+            self._counters["disk_evictions"] += excess
+
+
+class CachedEmbeddingFunction:
+    """Embedding callable that serves repeated texts from an EmbeddingCache."""
+
+    def __init__(self, embedding_function: EmbeddingFunction, cache: EmbeddingCache):
+        """
+        Args:
+            embedding_function: Underlying callable mapping texts to vectors
+            cache: Cache consulted before calling it
+        """
+        self.embedding_function = embedding_function
+        self.cache = cache
+
+    def __call__(self, texts: List[str]) -> List[List[float]]:
+        return [vector.tolist() for vector in self.cache.embed(list(texts), self.embedding_function)]
+
+
+# Singleton instances
+_embedding_cache_instance: Optional[EmbeddingCache] = None
+_embedding_function_instance: Optional[EmbeddingFunction] = None
+_embedding_lock = threading.Lock()
+
+
+def get_embedding_cache(model: str) -> EmbeddingCache:
+    """
+    Get or create a singleton instance of EmbeddingCache.
+
+    Args:
+        model: Embedding model identifier used to namespace cache keys
+
+    Returns:
+        EmbeddingCache instance
+    """
+    global _embedding_cache_instance
+
+    with _embedding_lock:
+        if _embedding_cache_instance is None:
+            settings = get_settings()
+            _embedding_cache_instance = EmbeddingCache(
+                model=model,
+                max_memory_entries=settings.embedding_cache_memory_entries,
+                db_path=settings.embedding_cache_path or None,
+                max_disk_entries=settings.embedding_cache_disk_entries,
+            )
+    return _embedding_cache_instance
+
+
+def get_embedding_function() -> EmbeddingFunction:
+    """
+    Get the process-wide embedding callable used by the vector stores.
+
+    Uses the provider selected by EMBEDDING_PROVIDER, wrapped in the embedding
+    cache unless EMBEDDING_CACHE_ENABLED is false.
+
+    Returns:
+        Callable mapping a list of texts to a list of vectors
+    """
+    global _embedding_function_instance
+
+    if _embedding_function_instance is None:
+        from app.services.embedding_providers import create_embedding_provider
+
+        provider = create_embedding_provider()
+        embedding_function: EmbeddingFunction = provider
+        if get_settings().embedding_cache_enabled:
+            embedding_function = CachedEmbeddingFunction(provider, get_embedding_cache(provider.name))
+        _embedding_function_instance = embedding_function
+    return _embedding_function_instance
@@ -0,0 +1,211 @@
+"""Embedding providers: local ONNX model, deterministic hashing embedder and OpenAI."""
+import logging
+import math
+import re
+import threading
+import zlib
+from pathlib import Path
+from typing import List, Optional, Protocol
+
+import numpy as np
+
+from app.config.settings import get_settings
+
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+
+class EmbeddingProvider(Protocol):
+    """Protocol for embedding backends (callable on a batch of texts)."""
+
+    name: str
+
+    def __call__(self, texts: List[str]) -> List[List[float]]:
+        """Embed a batch of texts."""
+        ...
+
+
+class LocalOnnxEmbeddingProvider:
+    """
+    CPU-only sentence-transformer embeddings via ONNX Runtime.
+
+    Runs a MiniLM-style encoder (tokenizer.json + model.onnx) with mean pooling
+    and L2 normalisation. Texts are embedded in batches padded only to the
+    longest text in the batch, and ONNX Runtime's intra-op thread count is
+    configurable so embedding doesn't compete with request threads. The
+    default model is the one Chroma uses, so vectors are compatible with
+    existing collections; it is downloaded once if not present.
+    """
+
+    def __init__(
+        self,
+        model_name: str = "all-MiniLM-L6-v2",
+        model_path: Optional[str] = None,
+        batch_size: int = 32,
+        num_threads: int = 0,
+        max_length: int = 256,
+    ):
+        """
+        Initialize the provider (the model is loaded lazily).
+
+        Args:
+            model_name: Model identifier (part of the embedding cache key)
+            model_path: Directory with tokenizer.json and model.onnx (defaults to Chroma's model cache)
+            batch_size: Texts per ONNX run
+            num_threads: ONNX Runtime intra-op threads (0 lets ONNX Runtime decide)
+            max_length: Token truncation length
+        """
+        self.name = f"local/{model_name}"
+        self.model_name = model_name
+        self.model_path = model_path
+        self.batch_size = batch_size
+        self.num_threads = num_threads
+        self.max_length = max_length
+        self._session = None
+        self._tokenizer = None
+        self._lock = threading.Lock()
+
+    def _model_dir(self) -> Path:
+        if self.model_path:
+            return Path(self.model_path)
+        from chromadb.utils.embedding_functions.onnx_mini_lm_l6_v2 import ONNXMiniLM_L6_V2
+        if self.model_name != ONNXMiniLM_L6_V2.MODEL_NAME:
+            raise ValueError(f"No model path configured for local embedding model '{self.model_name}'")
+        model_dir = Path(ONNXMiniLM_L6_V2.DOWNLOAD_PATH) / ONNXMiniLM_L6_V2.EXTRACTED_FOLDER_NAME
+        if not (model_dir / "model.onnx").exists():
+            # Reuse Chroma's model cache: its public embedding call downloads the model on first use
+            ONNXMiniLM_L6_V2()(["warm up"])
+        return model_dir
+
+    def load(self) -> None:
+        """Load the tokenizer and ONNX session (idempotent)."""
+        if self._session is not None:
+            return
+        with self._lock:
+            if self._session is not None:
+                return
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+
+            model_dir = self._model_dir()
+            tokenizer = Tokenizer.from_file(str(model_dir / "tokenizer.json"))
+            tokenizer.enable_truncation(max_length=self.max_length)
+            tokenizer.enable_padding(pad_id=0, pad_token="[PAD]")
+
+            options = ort.SessionOptions()
+            options.log_severity_level = 3
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            options.inter_op_num_threads = 1
+            if self.num_threads > 0:
+                options.intra_op_num_threads = self.num_threads
+            self._tokenizer = tokenizer
+            self._session = ort.InferenceSession(
+                str(model_dir / "model.onnx"), sess_options=options, providers=["CPUExecutionProvider"]
+            )
+            logger.info(f"Loaded local embedding model {self.model_name} from {model_dir}")
+
+    def __call__(self, texts: List[str]) -> List[List[float]]:
+        self.load()
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            encoded = self._tokenizer.encode_batch(list(texts[start:start + self.batch_size]))
+            input_ids = np.array([e.ids for e in encoded], dtype=np.int64)
+            attention_mask = np.array([e.attention_mask for e in encoded], dtype=np.int64)
+            hidden = self._session.run(None, {
+                "input_ids": input_ids,
+                "attention_mask": attention_mask,
+                "token_type_ids": np.zeros_like(input_ids),
+            })[0]
+            mask = attention_mask[:, :, None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+            norms[norms == 0] = 1e-12
+            vectors.extend((pooled / norms).astype(np.float32).tolist())
+        return vectors
+
+
+class HashingEmbeddingProvider:
+    """
+    Deterministic, dependency-free embedder for tests and offline benchmarks.
+
+    Word unigrams and bigrams are hashed (crc32, stable across processes) into
+    a fixed number of signed buckets and L2-normalised, so texts sharing words
+    get high cosine similarity. Not a semantic model.
+    """
+
+    def __init__(self, dimension: int = 384):
+        """
+        Args:
+            dimension: Output vector size
+        """
+        self.name = f"hashing/{dimension}"
+        self.dimension = dimension
+
+    def embed_one(self, text: str) -> List[float]:
+        """Embed a single text."""
+        tokens = _TOKEN_RE.findall(text.lower())
+        vector = [0.0] * self.dimension
+        for gram in tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]:
+            digest = zlib.crc32(gram.encode("utf-8"))
+            vector[digest % self.dimension] += 1.0 if digest & 0x80000000 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector))
+        return [v / norm for v in vector] if norm else vector
+
+    def __call__(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_one(text) for text in texts]
+
+
+class OpenAIEmbeddingProvider:
+    """Remote embeddings from the OpenAI API (adds a network round trip per uncached batch)."""
+
+    def __init__(self, model_name: str, api_key: Optional[str] = None, batch_size: int = 128):
+        """
+        Args:
+            model_name: OpenAI embedding model, e.g. "text-embedding-3-small"
+            api_key: OpenAI API key (uses settings if None)
+            batch_size: Texts per API request
+        """
+        from openai import OpenAI
+
+        self.name = f"openai/{model_name}"
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.client = OpenAI(api_key=api_key or get_settings().openai_api_key)
+
+    def __call__(self, texts: List[str]) -> List[List[float]]:
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            response = self.client.embeddings.create(model=self.model_name, input=list(texts[start:start + self.batch_size]))
+            vectors.extend(item.embedding for item in sorted(response.data, key=lambda item: item.index))
+        return vectors
+
+
+def create_embedding_provider(provider: Optional[str] = None) -> EmbeddingProvider:
+    """
+    Create the embedding provider named by EMBEDDING_PROVIDER.
+
+    Args:
+        provider: "local", "hashing" or "openai" (uses settings if None)
+
+    Returns:
+        EmbeddingProvider instance
+
+    Raises:
+        ValueError: If the provider is unknown
+    """
+    settings = get_settings()
+    provider = (provider or settings.embedding_provider).lower()
+    if provider == "local":
+        return LocalOnnxEmbeddingProvider(
+            model_name=settings.local_embedding_model,
+            model_path=settings.embedding_model_path,
+            batch_size=settings.embedding_batch_size,
+            num_threads=settings.embedding_num_threads,
+        )
+    if provider == "hashing":
+        return HashingEmbeddingProvider(dimension=settings.embedding_dimension)
+    if provider == "openai":
+        return OpenAIEmbeddingProvider(model_name=settings.embedding_model, batch_size=settings.embedding_batch_size)
+    raise ValueError(f"Unsupported embedding provider: {provider}")
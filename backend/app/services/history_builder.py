@@ -0,0 +1,223 @@
+"""Token-windowed conversation history with an incremental per-session cache."""
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from app.config.settings import get_settings
+from app.models import Message
+
+
+logger = logging.getLogger(__name__)
+
+# Rough per-message framing overhead (role markers, separators) used by chat APIs
+MESSAGE_TOKEN_OVERHEAD = 4
+
+_encoding = None
+_encoding_failed = False
+_encoding_lock = threading.Lock()
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens in text.
+
+    Uses tiktoken's cl100k_base encoding when it can be loaded; otherwise (e.g.
+    offline, since tiktoken downloads encodings on first use) falls back to a
+    ~4 characters per token estimate. The load is attempted only once.
+
+    Args:
+        text: Text to count
+
+    Returns:
+        Token count
+    """
+    global _encoding, _encoding_failed
+    if _encoding is None and not _encoding_failed:
+        with _encoding_lock:
+            if _encoding is None and not _encoding_failed:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding("cl100k_base")
+                except Exception as e:
+                    logger.warning(f"tiktoken unavailable, using approximate token counts: {str(e)}")
+                    _encoding_failed = True
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return max(1, (len(text) + 3) // 4) if text else 0
+
+
+@dataclass
+class _CachedMessage:
+    id: int
+    role: str
+    content: str
+    tokens: int
+
+
+@dataclass
+class _SessionWindow:
+    """Cached, token-counted transcript for one session."""
+    messages: List[_CachedMessage] = field(default_factory=list)
+    last_message_id: int = 0
+    system: Optional[_CachedMessage] = None
+
+    def set_system_prompt(self, prompt: Optional[str]) -> None:
+        if prompt is None or (self.system is not None and self.system.content == prompt):
+            return
+        self.system = _CachedMessage(
+            id=0, role="system", content=prompt, tokens=count_tokens(prompt) + MESSAGE_TOKEN_OVERHEAD
+        )
+
+    def append(self, message: Message) -> None:
+        if message.id is not None and message.id <= self.last_message_id:
+            return
+        self.messages.append(_CachedMessage(
+            id=message.id or 0,
+            role=message.role,
+            content=message.content,
+            tokens=count_tokens(message.content) + MESSAGE_TOKEN_OVERHEAD,
+        ))
+        if message.id is not None:
+            self.last_message_id = message.id
+
+
+@dataclass
+class ConversationWindow:
+    """History to send to the LLM together with its size."""
+    messages: List[Dict[str, str]]
+    prompt_tokens: int
+    total_messages: int
+    dropped_messages: int
+
+
+class ConversationHistoryBuilder:
+    """Builds LLM history from an in-process cache of each session's transcript.
+
+    The first build for a session loads its messages once; afterwards new rows
+    are appended as they are written and only messages with a higher id than
+    the last one seen are fetched (covers writes from other workers). The
+    window sent to the LLM keeps the system prompt plus the most recent turns
+    that fit in the token budget. The system prompt is passed in by the caller
+    (sessions reference a persona version rather than storing it as a row).
+    """
+
+    def __init__(self, token_budget: Optional[int] = None, max_sessions: Optional[int] = None):
+        """
+        Initialize the history builder.
+
+        Args:
+            token_budget: Max prompt tokens for history (uses settings if None)
+            max_sessions: Max sessions kept in the LRU cache (uses settings if None)
+        """
+        settings = get_settings()
+        self.token_budget = token_budget if token_budget is not None else settings.history_token_budget
+        self.max_sessions = max_sessions if max_sessions is not None else settings.history_cache_max_sessions
+        self._windows: "OrderedDict[str, _SessionWindow]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def build(self, session_id: str, message_repository, system_prompt: Optional[str] = None) -> ConversationWindow:
+        """
+        Build the token-bounded history for a session.
+
+        Args:
+            session_id: Session to build history for
+            message_repository: MessageRepository bound to the caller's DB session
+            system_prompt: Session's system prompt, sent before any stored messages
+
+        Returns:
+            ConversationWindow with wire messages and prompt size
+        """
+        with self._lock:
+            window = self._windows.get(session_id)
+            if window is not None:
+                self._windows.move_to_end(session_id)
+
+        if window is None:
+            window = _SessionWindow()
+            for message in message_repository.find_by_session_id(session_id):
+                window.append(message)
+            logger.debug(f"History cache miss for session {session_id}: loaded {len(window.messages)} messages")
+        else:
+            new_messages = message_repository.find_by_session_after_id(session_id, window.last_message_id)
+            for message in new_messages:
+                window.append(message)
+        window.set_system_prompt(system_prompt)
+
+        with self._lock:
+            self._windows[session_id] = window
+            self._windows.move_to_end(session_id)
+            while len(self._windows) > self.max_sessions:
+                self._windows.popitem(last=False)
+
+        return self._trim(window)
+
+    def append(self, session_id: str, message: Message) -> None:
+        """
+        Record a newly persisted message in the session's cached window.
+
+        Sessions that are not cached are ignored; they load on the next build.
+        """
+        with self._lock:
+            window = self._windows.get(session_id)
+            if window is not None:
+                window.append(message)
+
+    def invalidate(self, session_id: str) -> None:
+        """Drop a session's cached window (e.g. after its messages are deleted)."""
+        with self._lock:
+            self._windows.pop(session_id, None)
+
+    def clear(self) -> None:
+        """Drop every cached window."""
+        with self._lock:
+            self._windows.clear()
+
+    def _trim(self, window: _SessionWindow) -> ConversationWindow:
+        """Keep system messages and the newest turns that fit in the budget."""
+        system = [m for m in window.messages if m.role == "system"]
+        if window.system is not None:
+            system.insert(0, window.system)
+        turns = [m for m in window.messages if m.role != "system"]
+
+        used = sum(m.tokens for m in system)
+        kept: List[_CachedMessage] = []
+        for message in reversed(turns):
+            # Always keep the latest message, even if it alone exceeds the budget
+            if kept and used + message.tokens > self.token_budget:
+                break
+            kept.append(message)
+            used += message.tokens
+        kept.reverse()
+
+        # Providers such as Anthropic require the first turn to be from the user
+        while len(kept) > 1 and kept[0].role != "user":
+            used -= kept.pop(0).tokens
+
+        selected = system + kept
+        total = len(window.messages) + (1 if window.system is not None else 0)
+        return ConversationWindow(
+            messages=[{"role": m.role, "content": m.content} for m in selected],
+            prompt_tokens=used,
+            total_messages=total,
+            dropped_messages=total - len(selected),
+        )
+
+
+# Singleton instance shared by all requests in this process
+_history_builder_instance: Optional[ConversationHistoryBuilder] = None
+
+
+def get_history_builder() -> ConversationHistoryBuilder:
+    """
+    Get or create a singleton instance of ConversationHistoryBuilder.
+
+    Returns:
+        ConversationHistoryBuilder instance
+    """
+    global _history_builder_instance
+
+    if _history_builder_instance is None:
+        _history_builder_instance = ConversationHistoryBuilder()
+
+    return _history_builder_instance
@@ -1,11 +1,14 @@
 """LLM factory for creating and managing LLM providers."""
 import os
 import logging
-from typing import Dict, Iterable, List, Protocol, Optional
+import threading
+from typing import AsyncIterator, Dict, Iterable, List, Protocol, Optional, Tuple
+import httpx
 from app.config.settings import get_settings
 from app.openai_client import OpenAIStreamer
 from app.anthropic_client import AnthropicStreamer
 from app.together_client import TogetherStreamer
+from app.services.llm_router import Route, RoutingPolicy, RoutingStreamer, get_provider_health_registry
 
 
 class LLMStreamer(Protocol):
@@ -16,20 +19,124 @@ class LLMStreamer(Protocol):
         ...
 
 
+class AsyncLLMStreamer(LLMStreamer, Protocol):
+    """Protocol for LLM streaming clients that can also stream on the event loop."""
+    
+    def astream_chat(self, messages: List[Dict[str, str]], **kwargs) -> AsyncIterator[str]:
+        """Asynchronously stream chat completion from LLM provider."""
+        ...
+
+
+class LLMClientRegistry:
+    """Process-wide registry of long-lived LLM streamers and their HTTP pools.
+    
+    One sync and one async httpx client is kept per provider so every chat turn
+    reuses warm keep-alive (HTTP/2 when available) connections instead of paying
+    a fresh TLS handshake. Streamers are cached per (provider, model).
+    """
+    
+    def __init__(self):
+        """Initialize an empty registry."""
+        self.logger = logging.getLogger('llm.registry')
+        self._lock = threading.Lock()
+        self._streamers: Dict[Tuple[str, Optional[str]], LLMStreamer] = {}
+        self._http_clients: Dict[str, Tuple[httpx.Client, httpx.AsyncClient]] = {}
+    
+    def _build_http_clients(self) -> Tuple[httpx.Client, httpx.AsyncClient]:
+        """Create a sync/async httpx client pair using configured pool limits."""
+        settings = get_settings()
+        limits = httpx.Limits(
+            max_connections=settings.llm_max_connections,
+            max_keepalive_connections=settings.llm_max_keepalive_connections,
+            keepalive_expiry=settings.llm_keepalive_expiry,
+        )
+        timeout = httpx.Timeout(settings.llm_read_timeout, connect=settings.llm_connect_timeout)
+        http2 = settings.llm_http2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                self.logger.warning("LLM_HTTP2 enabled but 'h2' is not installed; falling back to HTTP/1.1")
+                http2 = False
+        return (
+            httpx.Client(limits=limits, timeout=timeout, http2=http2),
+            httpx.AsyncClient(limits=limits, timeout=timeout, http2=http2),
+        )
+    
+    def get_streamer(self, provider: str, model: Optional[str], streamer_class) -> LLMStreamer:
+        """Return the cached streamer for (provider, model), creating it on first use.
+        
+        Args:
+            provider: Normalized provider name
+            model: Specific model (None means the provider default)
+            streamer_class: Streamer class to instantiate on a cache miss
+            
+        Returns:
+            Shared LLMStreamer instance
+        """
+        key = (provider, model)
+        streamer = self._streamers.get(key)
+        if streamer is not None:
+            return streamer
+        
+        with self._lock:
+            streamer = self._streamers.get(key)
+            if streamer is None:
+                if provider not in self._http_clients:
+                    self._http_clients[provider] = self._build_http_clients()
+                http_client, async_http_client = self._http_clients[provider]
+                streamer = streamer_class(
+                    model=model,
+                    http_client=http_client,
+                    async_http_client=async_http_client,
+                    prompt_cache=get_settings().prompt_cache_enabled,
+                )
+                self._streamers[key] = streamer
+                self.logger.info(f"Registered pooled LLM streamer: {provider}, model: {getattr(streamer, 'model', 'unknown')}")
+        return streamer
+    
+    def stats(self) -> Dict[str, int]:
+        """Return registry sizes (useful for health checks and tests)."""
+        return {"streamers": len(self._streamers), "http_pools": len(self._http_clients)}
+    
+    async def aclose(self) -> None:
+        """Close every pooled HTTP connection and forget cached streamers."""
+        with self._lock:
+            clients = list(self._http_clients.items())
+            self._http_clients.clear()
+            self._streamers.clear()
+        for provider, (http_client, async_http_client) in clients:
+            try:
+                http_client.close()
+                await async_http_client.aclose()
+                self.logger.info(f"Closed LLM connection pool for provider: {provider}")
+            except Exception as e:
+                self.logger.warning(f"Failed to close LLM connection pool for {provider}: {str(e)}")
+
+
 class LLMFactory:
     """Factory for creating LLM streaming clients."""
     
-    def __init__(self):
-        """Initialize the LLM factory."""
+    def __init__(self, registry: Optional[LLMClientRegistry] = None):
+        """Initialize the LLM factory.
+        
+        Args:
+            registry: Client registry to pool streamers in (a private one is created if None)
+        """
         self.logger = logging.getLogger('llm.factory')
         self._providers = {
             'anthropic': AnthropicStreamer,
             'openai': OpenAIStreamer,
             'together': TogetherStreamer,
         }
+        self.registry = registry or LLMClientRegistry()
     
     def create_streamer(self, provider: str = None, model: str = None) -> LLMStreamer:
-        """Create an LLM streamer instance.
+        """Get a pooled LLM streamer instance (built once per provider/model).
+        
+        With LLM_FALLBACK_PROVIDERS set (and no specific model requested) the
+        pooled streamers are wrapped in a RoutingStreamer that fails over to
+        the fallbacks and can hedge slow first tokens.
         
         Args:
             provider: LLM provider name (anthropic, openai, together)
@@ -53,16 +160,86 @@ class LLMFactory:
             raise ValueError(f"Unsupported LLM provider: {provider}")
         
         try:
-            self.logger.info(f"Creating LLM streamer for provider: {provider}")
             streamer_class = self._providers[provider]
-            streamer = streamer_class(model=model)
-            
-            self.logger.info(f"LLM streamer created successfully: {provider}, model: {getattr(streamer, 'model', 'unknown')}")
-            return streamer
+            streamer = self.registry.get_streamer(provider, model, streamer_class)
+            self.logger.debug(f"Using pooled LLM streamer: {provider}, model: {getattr(streamer, 'model', 'unknown')}")
             
         except Exception as e:
             self.logger.error(f"Failed to create LLM streamer for provider {provider}: {str(e)}")
             raise RuntimeError(f"Failed to create LLM streamer for provider {provider}: {str(e)}")
+        
+        # A specific model pins the provider; otherwise route across the configured fallbacks
+        if model is None:
+            fallbacks = self._fallback_streamers(provider)
+            if fallbacks:
+                return RoutingStreamer([(provider, streamer)] + fallbacks)
+        return streamer
+    
+    def _fallback_streamers(self, provider: str) -> List[Tuple[str, LLMStreamer]]:
+        """Pooled streamers for LLM_FALLBACK_PROVIDERS, skipping the primary and any that fail to start."""
+        names = [name.strip().lower() for name in get_settings().llm_fallback_providers.split(",")]
+        streamers = []
+        for name in dict.fromkeys(names):
+            if not name or name == provider:
+                continue
+            if name not in self._providers:
+                self.logger.warning(f"Ignoring unsupported fallback LLM provider: {name}")
+                continue
+            try:
+                streamers.append((name, self.registry.get_streamer(name, None, self._providers[name])))
+            except Exception as e:
+                self.logger.warning(f"Fallback LLM provider {name} unavailable: {str(e)}")
+        return streamers
+    
+    def route_streamer(self, message: str, prompt_tokens: int) -> LLMStreamer:
+        """Get a streamer routed by LLM_ROUTING_POLICY across LLM_ROUTES.
+        
+        Routes are ranked from their live stats (see RoutingPolicy); the best
+        one serves the request and the rest are its failover order. Falls back
+        to create_streamer() with the static policy or no routes configured.
+        
+        Args:
+            message: Latest user message (the by_message policy looks at it)
+            prompt_tokens: Size of the prompt being sent (for cost estimates)
+            
+        Returns:
+            LLMStreamer instance
+            
+        Raises:
+            ValueError: If the policy or a route is invalid
+            RuntimeError: If no route's provider can be initialized
+        """
+        settings = get_settings()
+        if settings.llm_routing_policy == "static" or not settings.llm_routes:
+            return self.create_streamer()
+        
+        routes = [Route.from_config(entry) for entry in settings.llm_routes]
+        policy = RoutingPolicy(
+            [route for route in routes if self.is_provider_supported(route.provider)],
+            settings.llm_routing_policy,
+            get_provider_health_registry(),
+            ttft_slo_ms=settings.llm_ttft_slo_ms,
+            long_message_chars=settings.llm_long_message_chars,
+            max_error_rate=settings.llm_breaker_error_rate,
+        )
+        ranked = policy.rank(message, prompt_tokens)
+        streamers = []
+        for route in ranked:
+            try:
+                streamer = self.registry.get_streamer(route.provider, route.model, self._providers[route.provider])
+            except Exception as e:
+                self.logger.warning(f"LLM route {route.name} unavailable: {str(e)}")
+                continue
+            streamers.append((route.name, streamer))
+        if not streamers:
+            raise RuntimeError("No LLM route could be initialized")
+        
+        self.logger.info(f"Routed LLM request to {streamers[0][0]} (policy: {settings.llm_routing_policy})")
+        return RoutingStreamer(
+            streamers,
+            prices={route.name: (route.input_price, route.output_price) for route in ranked},
+            prompt_tokens=prompt_tokens,
+        )
     
     def get_default_streamer(self) -> LLMStreamer:
         """Get the default LLM streamer based on configuration.
@@ -90,6 +267,10 @@ class LLMFactory:
             True if provider is supported, False otherwise
         """
         return provider.strip().lower() in self._providers
+    
+    async def aclose(self) -> None:
+        """Release pooled provider connections (called from the app lifespan)."""
+        await self.registry.aclose()
 
 
 class LLMFactoryManager:
@@ -0,0 +1,688 @@
+"""Multi-provider LLM routing: adaptive route choice, first-token deadlines, failover, hedging and circuit breakers."""
+import asyncio
+import logging
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+from app.config.settings import get_settings
+from app.services.history_builder import count_tokens
+from app.services.stream_framing import close_token_stream, open_token_stream
+
+
+logger = logging.getLogger('llm.router')
+
+# Circuit breaker states
+BREAKER_CLOSED = "closed"
+BREAKER_OPEN = "open"
+BREAKER_HALF_OPEN = "half_open"
+
+# Time-to-first-token samples kept per provider for percentiles
+LATENCY_SAMPLES = 100
+
+# Exponentially weighted per-route stats
+EWMA_FIELDS = ("ttft_ms", "tokens_per_sec", "error_rate", "output_tokens", "cost_usd")
+
+# LLM_ROUTING_POLICY values
+ROUTING_POLICIES = ("static", "cheapest_under_slo", "by_message")
+ROUTE_TIERS = ("fast", "strong")
+
+# Reply length assumed for cost estimates until a route has its own average
+DEFAULT_EXPECTED_OUTPUT_TOKENS = 300
+
+# Words that send a message to the strong tier under the by_message policy
+EMOTIONAL_TERMS = frozenset({
+    "anxious", "anxiety", "panic", "depressed", "depression", "hopeless", "worthless", "lonely",
+    "alone", "cry", "crying", "grief", "grieving", "heartbroken", "breakup", "scared", "afraid",
+    "overwhelmed", "ashamed", "guilty", "trauma", "abuse", "hurt", "suicidal", "suicide",
+    "self-harm", "die", "angry", "hate", "miserable", "numb", "empty", "exhausted",
+})
+
+_WORD_RE = re.compile(r"[a-z'-]+")
+
+
+class ProviderHealth:
+    """
+    Live latency and error stats for one provider, with a circuit breaker.
+
+    The outcomes of the last `window` requests feed the breaker: it opens
+    once the failure rate reaches `error_rate` over at least `min_requests`
+    outcomes (first-token timeouts count as failures). An open breaker
+    rejects requests for `cooldown_seconds`, then lets a single probe
+    through (half-open); the probe's outcome closes or re-opens it.
+    Time-to-first-token samples give the p95 used as the hedging delay.
+
+    Exponentially weighted averages of time to first token, tokens/sec,
+    error rate, reply length and cost per request feed adaptive routing.
+    """
+
+    def __init__(
+        self,
+        provider: str,
+        window: int,
+        error_rate: float,
+        min_requests: int,
+        cooldown_seconds: float,
+        clock: Callable[[], float] = time.monotonic,
+        ewma_alpha: float = 0.2,
+    ):
+        """
+        Initialize closed, with no samples.
+
+        Args:
+            provider: Provider name
+            window: Number of recent outcomes the error rate is computed over
+            error_rate: Failure share that opens the breaker
+            min_requests: Outcomes needed before the breaker can open
+            cooldown_seconds: How long an open breaker rejects requests
+            clock: Monotonic time source (injectable for tests)
+            ewma_alpha: Weight of the newest sample in the moving averages
+        """
+        self.provider = provider
+        self.error_rate = error_rate
+        self.min_requests = min_requests
+        self.cooldown_seconds = cooldown_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._outcomes: Deque[bool] = deque(maxlen=window)
+        self._ttft: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+        self._state = BREAKER_CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._totals = {"requests": 0, "failures": 0, "timeouts": 0, "rejected": 0, "trips": 0}
+        self.ewma_alpha = ewma_alpha
+        self._ewma: Dict[str, Optional[float]] = dict.fromkeys(EWMA_FIELDS)
+
+    @property
+    def state(self) -> str:
+        """Current breaker state (an open breaker past its cooldown reports half-open)."""
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == BREAKER_OPEN and self._clock() - self._opened_at >= self.cooldown_seconds:
+            self._state = BREAKER_HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    def allow_request(self) -> bool:
+        """
+        Ask to send a request; the caller must report its outcome.
+
+        Returns:
+            True if the request may go ahead (in half-open state only one
+            probe is allowed at a time)
+        """
+        with self._lock:
+            state = self._current_state()
+            if state == BREAKER_CLOSED:
+                allowed = True
+            elif state == BREAKER_HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                allowed = True
+            else:
+                allowed = False
+            if allowed:
+                self._totals["requests"] += 1
+            else:
+                self._totals["rejected"] += 1
+            return allowed
+
+    def _update(self, name: str, value: float) -> None:
+        previous = self._ewma[name]
+        self._ewma[name] = value if previous is None else previous + self.ewma_alpha * (value - previous)
+
+    def ewma(self, name: str) -> Optional[float]:
+        """Current moving average of one of EWMA_FIELDS (None before the first sample)."""
+        with self._lock:
+            return self._ewma[name]
+
+    def record_first_token(self, seconds: float) -> None:
+        """Add a time-to-first-token sample."""
+        with self._lock:
+            self._ttft.append(seconds)
+            self._update("ttft_ms", seconds * 1000)
+
+    def record_success(
+        self,
+        output_tokens: Optional[int] = None,
+        stream_seconds: Optional[float] = None,
+        cost_usd: Optional[float] = None,
+    ) -> None:
+        """
+        Report a request that streamed to the end.
+
+        Args:
+            output_tokens: Reply length in tokens
+            stream_seconds: Time from first token to the end of the reply
+            cost_usd: Estimated cost of the request (None if the route has no prices)
+        """
+        with self._lock:
+            self._outcomes.append(True)
+            self._update("error_rate", 0.0)
+            if output_tokens is not None:
+                self._update("output_tokens", output_tokens)
+                if stream_seconds:
+                    self._update("tokens_per_sec", output_tokens / stream_seconds)
+            if cost_usd is not None:
+                self._update("cost_usd", cost_usd)
+            if self._current_state() == BREAKER_HALF_OPEN:
+                self._state = BREAKER_CLOSED
+                self._outcomes.clear()
+                logger.info(f"Circuit breaker for {self.provider} closed")
+            self._probe_in_flight = False
+
+    def record_failure(self, timeout: bool = False, waited_seconds: Optional[float] = None) -> None:
+        """
+        Report a failed request.
+
+        A timeout also counts as a time-to-first-token sample at the time
+        waited, so a route that never answers stops looking unexplored to
+        adaptive routing. The percentile samples behind the hedge delay keep
+        only real first tokens.
+
+        Args:
+            timeout: The provider sent no token before the first-token deadline
+            waited_seconds: How long the request waited before timing out
+        """
+        with self._lock:
+            self._outcomes.append(False)
+            self._update("error_rate", 1.0)
+            self._totals["failures"] += 1
+            if timeout:
+                self._totals["timeouts"] += 1
+                if waited_seconds is not None:
+                    self._update("ttft_ms", waited_seconds * 1000)
+            state = self._current_state()
+            failures = self._outcomes.count(False)
+            tripped = state == BREAKER_HALF_OPEN or (
+                state == BREAKER_CLOSED
+                and len(self._outcomes) >= self.min_requests
+                and failures / len(self._outcomes) >= self.error_rate
+            )
+            if tripped:
+                self._state = BREAKER_OPEN
+                self._opened_at = self._clock()
+                self._totals["trips"] += 1
+                logger.warning(
+                    f"Circuit breaker for {self.provider} opened "
+                    f"({failures}/{len(self._outcomes)} recent requests failed)"
+                )
+            self._probe_in_flight = False
+
+    def record_cancelled(self) -> None:
+        """Report a request abandoned without an outcome (hedge loser or client disconnect)."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def ttft_percentile(self, quantile: float) -> Optional[float]:
+        """
+        Time-to-first-token percentile over the recent samples.
+
+        Args:
+            quantile: Between 0 and 1 (0.95 for p95)
+
+        Returns:
+            Seconds, or None before `min_requests` samples exist
+        """
+        with self._lock:
+            if len(self._ttft) < max(self.min_requests, 1):
+                return None
+            samples = sorted(self._ttft)
+        return samples[min(int(quantile * len(samples)), len(samples) - 1)]
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return breaker state, totals and recent error rate and latency."""
+        p50 = self.ttft_percentile(0.5)
+        p95 = self.ttft_percentile(0.95)
+        with self._lock:
+            recent = len(self._outcomes)
+            return {
+                "state": self._current_state(),
+                **self._totals,
+                "recent_error_rate": self._outcomes.count(False) / recent if recent else 0.0,
+                "ttft_p50_ms": p50 * 1000 if p50 is not None else None,
+                "ttft_p95_ms": p95 * 1000 if p95 is not None else None,
+                "ewma": dict(self._ewma),
+            }
+
+
+class ProviderHealthRegistry:
+    """Process-wide ProviderHealth per provider, configured from settings."""
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        """Initialize an empty registry."""
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._providers: Dict[str, ProviderHealth] = {}
+
+    def get(self, provider: str) -> ProviderHealth:
+        """Return the health tracker for a provider, creating it on first use."""
+        with self._lock:
+            health = self._providers.get(provider)
+            if health is None:
+                settings = get_settings()
+                health = ProviderHealth(
+                    provider,
+                    window=settings.llm_breaker_window,
+                    error_rate=settings.llm_breaker_error_rate,
+                    min_requests=settings.llm_breaker_min_requests,
+                    cooldown_seconds=settings.llm_breaker_cooldown_seconds,
+                    clock=self.clock,
+                    ewma_alpha=settings.llm_stats_ewma_alpha,
+                )
+                self._providers[provider] = health
+            return health
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Return every provider's stats."""
+        with self._lock:
+            providers = list(self._providers.values())
+        return {health.provider: health.snapshot() for health in providers}
+
+    def reset(self) -> None:
+        """Forget all stats (useful for testing)."""
+        with self._lock:
+            self._providers.clear()
+
+
+@dataclass(frozen=True)
+class Route:
+    """A provider/model the adaptive router can send a request to."""
+    provider: str
+    model: Optional[str] = None
+    tier: str = "strong"
+    input_price: float = 0.0   # USD per million prompt tokens
+    output_price: float = 0.0  # USD per million reply tokens
+
+    @property
+    def name(self) -> str:
+        """Stats key: "provider:model", or the provider for its default model."""
+        return f"{self.provider}:{self.model}" if self.model else self.provider
+
+    @classmethod
+    def from_config(cls, entry: Dict[str, Any]) -> "Route":
+        """
+        Build a route from one LLM_ROUTES entry.
+
+        Raises:
+            ValueError: If the provider is missing or the tier is unknown
+        """
+        provider = str(entry.get("provider") or "").strip().lower()
+        if not provider:
+            raise ValueError(f"LLM route is missing a provider: {entry}")
+        tier = str(entry.get("tier") or "strong").strip().lower()
+        if tier not in ROUTE_TIERS:
+            raise ValueError(f"Invalid LLM route tier: {tier} (expected one of {', '.join(ROUTE_TIERS)})")
+        return cls(
+            provider=provider,
+            model=entry.get("model") or None,
+            tier=tier,
+            input_price=float(entry.get("input_price") or 0.0),
+            output_price=float(entry.get("output_price") or 0.0),
+        )
+
+    def estimated_cost(self, prompt_tokens: int, output_tokens: float) -> float:
+        """Estimated USD cost of one request."""
+        return (prompt_tokens * self.input_price + output_tokens * self.output_price) / 1_000_000
+
+
+def is_emotional(text: str) -> bool:
+    """True if a message uses any of EMOTIONAL_TERMS."""
+    return any(word in EMOTIONAL_TERMS for word in _WORD_RE.findall(text.lower()))
+
+
+class RoutingPolicy:
+    """
+    Orders routes for one request from their live stats.
+
+    "cheapest_under_slo" prefers routes whose average time to first token
+    is within the SLO and whose average error rate is below
+    `max_error_rate` (routes without samples yet count as healthy, so they
+    get explored). Among those it picks the lowest expected cost per
+    successful reply: estimated cost / (1 - error rate). Routes with an open
+    breaker, over the SLO or too error-prone go last, most reliable and then
+    fastest first. First-token timeouts count as samples at the timeout, so
+    a route that never answers falls out of the SLO.
+    "by_message" sends short, neutral messages to the fast tier and long or
+    emotional ones to the strong tier, ordering each tier the same way and
+    keeping the other tier as fallbacks.
+    """
+
+    def __init__(
+        self,
+        routes: List[Route],
+        policy: str,
+        health: ProviderHealthRegistry,
+        ttft_slo_ms: float,
+        long_message_chars: int,
+        max_error_rate: float = 0.5,
+    ):
+        """
+        Initialize the policy.
+
+        Args:
+            routes: Candidate routes
+            policy: One of the adaptive ROUTING_POLICIES
+            health: Registry with the routes' live stats
+            ttft_slo_ms: Average time to first token a route must stay within
+            long_message_chars: Message length that needs the strong tier (by_message)
+            max_error_rate: Average error rate at which a route stops being preferred
+
+        Raises:
+            ValueError: If policy is not an adaptive one from ROUTING_POLICIES
+        """
+        if policy not in ROUTING_POLICIES or policy == "static":
+            raise ValueError(f"Invalid LLM routing policy: {policy}")
+        self.routes = list(routes)
+        self.policy = policy
+        self.health = health
+        self.ttft_slo_ms = ttft_slo_ms
+        self.long_message_chars = long_message_chars
+        self.max_error_rate = max_error_rate
+
+    def tier_for(self, message: str) -> str:
+        """Tier a message needs under the by_message policy."""
+        if len(message) >= self.long_message_chars or is_emotional(message):
+            return "strong"
+        return "fast"
+
+    def rank(self, message: str, prompt_tokens: int) -> List[Route]:
+        """
+        Order the routes for a request, best first.
+
+        Args:
+            message: Latest user message
+            prompt_tokens: Size of the prompt being sent
+
+        Returns:
+            Every route, in the order they should be tried
+        """
+        if self.policy == "cheapest_under_slo":
+            return self._order(self.routes, prompt_tokens)
+        tier = self.tier_for(message)
+        preferred = [route for route in self.routes if route.tier == tier]
+        others = [route for route in self.routes if route.tier != tier]
+        return self._order(preferred, prompt_tokens) + self._order(others, prompt_tokens)
+
+    def _order(self, routes: List[Route], prompt_tokens: int) -> List[Route]:
+        def key(route: Route) -> Tuple[bool, float, float]:
+            health = self.health.get(route.name)
+            ttft = health.ewma("ttft_ms")
+            error_rate = health.ewma("error_rate") or 0.0
+            usable = (
+                health.state != BREAKER_OPEN
+                and (ttft is None or ttft <= self.ttft_slo_ms)
+                and error_rate < self.max_error_rate
+            )
+            if not usable:
+                return (True, error_rate, ttft if ttft is not None else 0.0)
+            output_tokens = health.ewma("output_tokens") or DEFAULT_EXPECTED_OUTPUT_TOKENS
+            cost = route.estimated_cost(prompt_tokens, output_tokens) / max(1.0 - error_rate, 1e-6)
+            return (False, cost, ttft or 0.0)
+        return sorted(routes, key=key)
+
+
+@dataclass
+class _Attempt:
+    """One provider's in-flight stream while waiting for its first token."""
+    provider: str
+    health: ProviderHealth
+    tokens: AsyncIterator[str]
+    started: float
+    pending: Optional[asyncio.Future] = field(default=None)
+
+
+class RoutingStreamer:
+    """
+    LLM streamer that routes one reply across several providers.
+
+    Providers are tried in order, skipping those whose circuit breaker is
+    open. A provider that errors, or sends no token within the first-token
+    deadline, is abandoned and the next one is started; this failover only
+    happens before the first token, so a reply never mixes providers. With
+    hedging enabled, the next provider is also started when the current one
+    has been silent longer than its p95 time-to-first-token; whichever
+    sends a token first wins and the other is closed.
+
+    Every attempt feeds the provider's stats (first-token latency, errors,
+    and on completion tokens/sec, reply length and, with prices, cost).
+    """
+
+    def __init__(
+        self,
+        streamers: List[Tuple[str, Any]],
+        health: Optional[ProviderHealthRegistry] = None,
+        first_token_timeout: Optional[float] = None,
+        hedge_enabled: Optional[bool] = None,
+        hedge_delay_ms: Optional[float] = None,
+        prices: Optional[Dict[str, Tuple[float, float]]] = None,
+        prompt_tokens: Optional[int] = None,
+    ):
+        """
+        Initialize the router (uses settings for any value left as None).
+
+        Args:
+            streamers: (provider name, streamer) pairs in preference order
+            health: Provider stats/breakers (defaults to the process-wide registry)
+            first_token_timeout: Seconds a provider gets to send its first token
+            hedge_enabled: Start a hedged request on slow first tokens
+            hedge_delay_ms: Hedging delay used until a provider has enough latency samples
+            prices: Input/output USD per million tokens by provider name, for cost stats
+            prompt_tokens: Prompt size for cost stats (counted from the messages if None)
+
+        Raises:
+            ValueError: If no streamers are given
+        """
+        if not streamers:
+            raise ValueError("RoutingStreamer needs at least one provider")
+        settings = get_settings()
+        self.streamers = list(streamers)
+        self.health = health or get_provider_health_registry()
+        self.first_token_timeout = first_token_timeout if first_token_timeout is not None else settings.llm_first_token_timeout
+        self.hedge_enabled = hedge_enabled if hedge_enabled is not None else settings.llm_hedge_enabled
+        self.hedge_delay = (hedge_delay_ms if hedge_delay_ms is not None else settings.llm_hedge_delay_ms) / 1000.0
+        self.prices = prices or {}
+        self.prompt_tokens = prompt_tokens
+        primary = self.streamers[0][1]
+        self.model = getattr(primary, "model", "unknown")
+        self.max_output_tokens = getattr(primary, "max_output_tokens", None)
+        # Provider/route serving the current reply: the preferred one until another wins
+        self.active_provider = self.streamers[0][0]
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    @property
+    def providers(self) -> List[str]:
+        """Provider names in preference order."""
+        return [name for name, _ in self.streamers]
+
+    def _record_success(self, provider: str, messages: List[Dict[str, str]], parts: List[str], stream_seconds: float) -> None:
+        output_tokens = count_tokens("".join(parts)) if parts else 0
+        cost = None
+        if provider in self.prices:
+            prompt_tokens = self.prompt_tokens
+            if prompt_tokens is None:
+                prompt_tokens = sum(count_tokens(m.get("content", "")) for m in messages)
+            input_price, output_price = self.prices[provider]
+            cost = (prompt_tokens * input_price + output_tokens * output_price) / 1_000_000
+        self.health.get(provider).record_success(output_tokens, stream_seconds, cost)
+
+    def _hedge_delay_for(self, health: ProviderHealth) -> float:
+        p95 = health.ttft_percentile(0.95)
+        return min(p95 if p95 is not None else self.hedge_delay, self.first_token_timeout)
+
+    def stream_chat(self, messages: List[Dict[str, str]], **kwargs) -> Iterable[str]:
+        """
+        Stream a reply on the calling thread, failing over on errors before the first token.
+
+        Sync callers get failover and circuit breaking but no first-token
+        deadline or hedging (a blocking read cannot be abandoned).
+        """
+        clock = self.health.clock
+        last_error: Optional[Exception] = None
+        for provider, streamer in self.streamers:
+            health = self.health.get(provider)
+            if not health.allow_request():
+                continue
+            started = clock()
+            first_at = started
+            parts: List[str] = []
+            tokens = iter(streamer.stream_chat(messages, **kwargs))
+            try:
+                for token in tokens:
+                    if not parts:
+                        self.active_provider = provider
+                        first_at = clock()
+                        health.record_first_token(first_at - started)
+                    parts.append(token)
+                    yield token
+            except GeneratorExit:
+                health.record_cancelled()
+                raise
+            except Exception as e:
+                health.record_failure()
+                if parts:
+                    raise
+                self.logger.warning(f"LLM provider {provider} failed before the first token, failing over: {str(e)}")
+                last_error = e
+                continue
+            finally:
+                getattr(tokens, "close", lambda: None)()
+            self._record_success(provider, messages, parts, clock() - first_at)
+            return
+        raise RuntimeError(f"All LLM providers failed or are unavailable ({', '.join(self.providers)})") from last_error
+
+    async def astream_chat(self, messages: List[Dict[str, str]], **kwargs) -> AsyncIterator[str]:
+        """Stream a reply on the event loop with deadlines, failover and hedging."""
+        clock = self.health.clock
+        queue = deque(self.streamers)
+        running: List[_Attempt] = []
+        winner: Optional[_Attempt] = None
+        first: Optional[str] = None
+        hedged = False
+        finished = False
+        last_error: Optional[Exception] = None
+
+        def start_next() -> bool:
+            while queue:
+                provider, streamer = queue.popleft()
+                health = self.health.get(provider)
+                if not health.allow_request():
+                    self.logger.info(f"Skipping LLM provider {provider}: circuit breaker open")
+                    continue
+                tokens = open_token_stream(streamer, messages, **kwargs)
+                attempt = _Attempt(provider, health, tokens, clock())
+                attempt.pending = asyncio.ensure_future(tokens.__anext__())
+                running.append(attempt)
+                return True
+            return False
+
+        async def abandon(attempt: _Attempt) -> None:
+            running.remove(attempt)
+            await close_token_stream(attempt.tokens, attempt.pending)
+
+        try:
+            start_next()
+            while winner is None:
+                if not running and not start_next():
+                    raise RuntimeError(
+                        f"All LLM providers failed or are unavailable ({', '.join(self.providers)})"
+                    ) from last_error
+
+                now = clock()
+                wake_at = min(attempt.started + self.first_token_timeout for attempt in running)
+                hedge_at = None
+                if self.hedge_enabled and not hedged and queue and len(running) == 1:
+                    hedge_at = running[0].started + self._hedge_delay_for(running[0].health)
+                    wake_at = min(wake_at, hedge_at)
+                done, _ = await asyncio.wait(
+                    {attempt.pending for attempt in running},
+                    timeout=max(wake_at - now, 0),
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+
+                for attempt in list(running):
+                    if attempt.pending not in done:
+                        continue
+                    try:
+                        first = attempt.pending.result()
+                    except StopAsyncIteration:
+                        first = None  # empty reply: nothing to fail over from
+                    except Exception as e:
+                        attempt.pending = None
+                        attempt.health.record_failure()
+                        self.logger.warning(f"LLM provider {attempt.provider} failed before the first token: {str(e)}")
+                        last_error = e
+                        await abandon(attempt)
+                        continue
+                    attempt.pending = None
+                    attempt.health.record_first_token(clock() - attempt.started)
+                    winner = attempt
+                    self.active_provider = attempt.provider
+                    break
+                if winner is not None:
+                    break
+
+                now = clock()
+                for attempt in list(running):
+                    if now - attempt.started >= self.first_token_timeout:
+                        attempt.health.record_failure(timeout=True, waited_seconds=self.first_token_timeout)
+                        self.logger.warning(
+                            f"LLM provider {attempt.provider} sent no token within "
+                            f"{self.first_token_timeout:.1f}s, failing over"
+                        )
+                        last_error = TimeoutError(f"{attempt.provider} first token timed out")
+                        await abandon(attempt)
+                if hedge_at is not None and now >= hedge_at and running and start_next():
+                    hedged = True
+                    self.logger.info(f"Hedging slow LLM provider {running[0].provider} with {running[-1].provider}")
+
+            # Close the losers of a hedge
+            for attempt in list(running):
+                if attempt is not winner:
+                    attempt.health.record_cancelled()
+                    await abandon(attempt)
+            if winner.provider != self.streamers[0][0]:
+                self.logger.info(f"LLM reply served by fallback provider {winner.provider}")
+
+            first_at = clock()
+            parts: List[str] = []
+            if first is not None:
+                parts.append(first)
+                yield first
+                try:
+                    async for token in winner.tokens:
+                        parts.append(token)
+                        yield token
+                except Exception:
+                    winner.health.record_failure()
+                    raise
+            self._record_success(winner.provider, messages, parts, clock() - first_at)
+            finished = True
+        finally:
+            for attempt in list(running):
+                if not finished:
+                    attempt.health.record_cancelled()
+                await abandon(attempt)
+
+
+# Singleton instance for the application process
+_provider_health_registry_instance: Optional[ProviderHealthRegistry] = None
+
+
+def get_provider_health_registry() -> ProviderHealthRegistry:
+    """
+    Get or create a singleton instance of ProviderHealthRegistry.
+
+    Returns:
+        ProviderHealthRegistry instance
+    """
+    global _provider_health_registry_instance
+
+    if _provider_health_registry_instance is None:
+        _provider_health_registry_instance = ProviderHealthRegistry()
+
+    return _provider_health_registry_instance
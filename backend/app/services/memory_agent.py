@@ -1,23 +1,60 @@
 """Memory agent using LangGraph for intelligent context retrieval."""
 import logging
 import os
-from typing import TypedDict, Annotated, List, Dict, Optional
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from functools import cached_property
+from typing import Any, TypedDict, Annotated, List, Dict, Optional
 from datetime import datetime
 from sqlalchemy.orm import Session
 
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, END
 from langchain_openai import ChatOpenAI
 
 from app.services.vector_store import get_vector_store
+from app.services.embedding_cache import get_embedding_function
+from app.services.memory_classifier import get_memory_classifier, decide
 from app.services.session_service import SessionService
 from app.repositories.user_repository import UserRepository
-from app.prompts import PromptContext, build_system_prompt
+from app.auth_cache import get_principal_cache
+from app.prompts import PromptContext, build_dynamic_context, build_persona_prompt, system_message
 from app.config.settings import get_settings
 from app.services.user_service import calculate_age
 
 
 logger = logging.getLogger(__name__)
 
+# Keywords used when the LLM classifier fails or misses its latency budget
+MEMORY_KEYWORDS = ["remember", "last time", "you said", "before", "earlier", "previously", "you mentioned"]
+
+# MEMORY_CLASSIFIER_MODE values that may call the remote classifier LLM
+CLASSIFIER_LLM_MODES = ("llm", "hybrid")
+
+_prefetch_executor: Optional[ThreadPoolExecutor] = None
+_prefetch_executor_lock = threading.Lock()
+
+
+def get_prefetch_executor() -> ThreadPoolExecutor:
+    """
+    Get or create the shared thread pool used for speculative memory prefetch.
+
+    Returns:
+        ThreadPoolExecutor instance
+    """
+    global _prefetch_executor
+
+    if _prefetch_executor is None:
+        with _prefetch_executor_lock:
+            if _prefetch_executor is None:
+                _prefetch_executor = ThreadPoolExecutor(
+                    max_workers=get_settings().memory_prefetch_workers,
+                    thread_name_prefix="memory-prefetch",
+                )
+
+    return _prefetch_executor
+
 
 class AgentState(TypedDict):
     """State passed through the LangGraph workflow."""
@@ -29,9 +66,149 @@ class AgentState(TypedDict):
     conversation_history: List[Dict]
     retrieved_memories: List[str]
     needs_memory: bool
+    recent_context: Optional[str]
+    recent_context_loaded: bool
     final_context: List[Dict]
 
 
+# The compiled graph is shared process-wide; each invocation carries its
+# MemoryAgent (and therefore its DB session) in the run config under this key.
+AGENT_CONFIG_KEY = "memory_agent"
+
+_compiled_graphs: Dict[bool, Any] = {}
+_compiled_graphs_lock = threading.Lock()
+_classifier_llm: Optional[ChatOpenAI] = None
+_classifier_llm_lock = threading.Lock()
+
+
+def _agent(config: RunnableConfig) -> "MemoryAgent":
+    return config["configurable"][AGENT_CONFIG_KEY]
+
+
+def _assess_memory_need_node(state: AgentState, config: RunnableConfig) -> AgentState:
+    return _agent(config)._assess_memory_need(state)
+
+
+def _retrieve_memories_node(state: AgentState, config: RunnableConfig) -> AgentState:
+    return _agent(config)._retrieve_memories(state)
+
+
+def _prefetch_context_node(state: AgentState, config: RunnableConfig) -> AgentState:
+    return _agent(config)._prefetch_context(state)
+
+
+def _build_context_node(state: AgentState, config: RunnableConfig) -> AgentState:
+    return _agent(config)._build_context(state)
+
+
+def _should_retrieve_memory(state: AgentState) -> str:
+    """Conditional edge: decide whether to retrieve memories."""
+    return "retrieve" if state["needs_memory"] else "skip"
+
+
+def _compile_graph(speculative: bool):
+    """Build and compile the LangGraph workflow."""
+    workflow = StateGraph(AgentState)
+    
+    if speculative:
+        workflow.add_node("prefetch_context", _prefetch_context_node)
+        workflow.add_node("build_context", _build_context_node)
+        workflow.set_entry_point("prefetch_context")
+        workflow.add_edge("prefetch_context", "build_context")
+        workflow.add_edge("build_context", END)
+        return workflow.compile()
+    
+    # Define nodes
+    workflow.add_node("assess_memory_need", _assess_memory_need_node)
+    workflow.add_node("retrieve_memories", _retrieve_memories_node)
+    workflow.add_node("build_context", _build_context_node)
+    
+    # Define edges
+    workflow.set_entry_point("assess_memory_need")
+    workflow.add_conditional_edges(
+        "assess_memory_need",
+        _should_retrieve_memory,
+        {
+            "retrieve": "retrieve_memories",
+            "skip": "build_context"
+        }
+    )
+    workflow.add_edge("retrieve_memories", "build_context")
+    workflow.add_edge("build_context", END)
+    
+    return workflow.compile()
+
+
+def get_compiled_graph(speculative: bool):
+    """
+    Get the process-wide compiled graph for a workflow mode, compiling it once.
+
+    Args:
+        speculative: Whether to use the speculative prefetch workflow
+
+    Returns:
+        Compiled LangGraph graph
+    """
+    graph = _compiled_graphs.get(speculative)
+    if graph is None:
+        with _compiled_graphs_lock:
+            graph = _compiled_graphs.get(speculative)
+            if graph is None:
+                graph = _compile_graph(speculative)
+                _compiled_graphs[speculative] = graph
+    return graph
+
+
+def get_classifier_llm() -> ChatOpenAI:
+    """
+    Get or create the shared fast LLM used for memory-need classification.
+
+    Returns:
+        ChatOpenAI instance
+    """
+    global _classifier_llm
+
+    if _classifier_llm is None:
+        with _classifier_llm_lock:
+            if _classifier_llm is None:
+                # Fast LLM for classification (cheap and fast)
+                _classifier_llm = ChatOpenAI(
+                    model="gpt-5-nano",
+                    temperature=0,
+                    max_tokens=10
+                )
+
+    return _classifier_llm
+
+
+def warm_up_memory_agent() -> None:
+    """
+    Build the shared MemoryAgent resources ahead of the first chat turn.
+
+    Compiles the configured graph, creates the classifier client and loads the
+    local classifier, prefetch pool, vector store and embedding model.
+    Failures are logged and left to the first request to retry.
+    """
+    settings = get_settings()
+    started = time.monotonic()
+    steps = [("graph", lambda: get_compiled_graph(settings.memory_speculative_retrieval))]
+    if settings.memory_enabled:
+        if settings.memory_classifier_mode in CLASSIFIER_LLM_MODES:
+            steps.append(("classifier LLM", get_classifier_llm))
+        if settings.memory_classifier_mode != "llm":
+            steps.append(("local classifier", get_memory_classifier))
+        if settings.memory_speculative_retrieval:
+            steps.append(("prefetch pool", get_prefetch_executor))
+        steps.append(("vector store", get_vector_store))
+        steps.append(("embedding model", lambda: get_embedding_function()(["warm up"])))
+    for name, step in steps:
+        try:
+            step()
+        except Exception as e:
+            logger.warning(f"MemoryAgent warm-up step '{name}' failed: {str(e)}")
+    logger.info(f"MemoryAgent warm-up finished in {(time.monotonic() - started) * 1000:.0f}ms")
+
+
 class MemoryAgent:
     """
     LangGraph-based agent for intelligent memory retrieval and context building.
@@ -40,6 +217,13 @@ class MemoryAgent:
     1. Assess if memory retrieval is needed
     2. Retrieve relevant memories if needed
     3. Build enriched context with memories + recent history
+    
+    In speculative mode steps 1-2 and the recent-context lookup run
+    concurrently within a latency budget; memories are discarded if the
+    classifier decides they are not needed.
+    
+    Instances are cheap: the compiled graph and classifier client are shared
+    process-wide, so only the DB session (and repositories over it) is per call.
     """
     
     def __init__(self, db_session: Session):
@@ -51,7 +235,6 @@ class MemoryAgent:
         """
         self.db = db_session
         self.vector_store = get_vector_store()
-        self.session_service = SessionService(db_session)
         self.user_repository = UserRepository(db_session)
         self.logger = logging.getLogger(self.__class__.__name__)
         
@@ -65,49 +248,43 @@ class MemoryAgent:
         settings = get_settings()
         self.memory_enabled = settings.memory_enabled
         self.memory_limit = settings.memory_retrieval_limit
+        self.speculative_retrieval = settings.memory_speculative_retrieval
+        self.prefetch_budget_seconds = settings.memory_prefetch_budget_ms / 1000
+        self.classifier_mode = settings.memory_classifier_mode
+        self.classifier_low = settings.memory_classifier_low
+        self.classifier_high = settings.memory_classifier_high
         
-        # Fast LLM for classification (cheap and fast)
-        self.fast_llm = ChatOpenAI(
-            model="gpt-5-nano",
-            temperature=0,
-            max_tokens=10
-        )
-        
-        # Build the graph
+        # Shared graph (compiled once per process); the classifier client is fetched on first escalation
         self.graph = self._build_graph()
         
-        self.logger.info(f"MemoryAgent initialized (memory_enabled={self.memory_enabled})")
+        self.logger.debug(f"MemoryAgent initialized (memory_enabled={self.memory_enabled})")
     
-    def _build_graph(self) -> StateGraph:
-        """Build the LangGraph workflow."""
-        workflow = StateGraph(AgentState)
-        
-        # Define nodes
-        workflow.add_node("assess_memory_need", self._assess_memory_need)
-        workflow.add_node("retrieve_memories", self._retrieve_memories)
-        workflow.add_node("build_context", self._build_context)
-        
-        # Define edges
-        workflow.set_entry_point("assess_memory_need")
-        workflow.add_conditional_edges(
-            "assess_memory_need",
-            self._should_retrieve_memory,
-            {
-                "retrieve": "retrieve_memories",
-                "skip": "build_context"
-            }
-        )
-        workflow.add_edge("retrieve_memories", "build_context")
-        workflow.add_edge("build_context", END)
+    @cached_property
+    def fast_llm(self) -> ChatOpenAI:
+        """Shared classifier LLM, created only when a message is escalated to it."""
+        return get_classifier_llm()
+    
+    @cached_property
+    def session_service(self) -> SessionService:
+        """Session service over this agent's DB session (created on first use)."""
+        return SessionService(self.db)
+    
+    def _build_graph(self):
+        """Return the shared compiled graph for this agent's workflow mode.
         
-        return workflow.compile()
+        Nodes dispatch to the agent passed in the run config, so the graph is
+        compiled once per mode and reused by every instance.
+        """
+        return get_compiled_graph(self.speculative_retrieval)
     
     def _assess_memory_need(self, state: AgentState) -> AgentState:
         """
-        Decide if we need to retrieve past memories using fast LLM classifier.
+        Decide if we need to retrieve past memories.
         
-        Uses gpt-4o-mini for classification (~$0.0001 per request, 200-300ms).
-        Falls back to keyword heuristic if LLM fails.
+        The local hashed n-gram classifier answers confident cases for free;
+        in "hybrid" mode only ambiguous messages escalate to the fast LLM
+        classifier (~$0.0001 per request, 200-300ms). Falls back to keyword
+        heuristic if LLM fails.
         """
         message = state["current_message"]
         
@@ -116,6 +293,27 @@ class MemoryAgent:
             state["needs_memory"] = False
             return state
         
+        if self.classifier_mode != "llm":
+            local_classifier = get_memory_classifier()
+            if local_classifier is not None:
+                probability = local_classifier.predict_proba(message)
+                decision = decide(probability, self.classifier_low, self.classifier_high)
+                if decision is None and self.classifier_mode == "local":
+                    decision = probability >= 0.5
+                if decision is not None:
+                    state["needs_memory"] = decision
+                    self.logger.debug(
+                        f"Local classifier: needs_memory={decision} (p={probability:.2f}) for message: {message[:50]}..."
+                    )
+                    return state
+                self.logger.debug(f"Local classifier ambiguous (p={probability:.2f}), escalating to LLM")
+        
+        if self.classifier_mode not in CLASSIFIER_LLM_MODES:
+            # Local mode never builds the remote client, even if the local model failed to load
+            state["needs_memory"] = self._keyword_needs_memory(message)
+            self.logger.debug(f"Keyword classifier: needs_memory={state['needs_memory']}")
+            return state
+        
         try:
             classifier_prompt = f"""You are a memory retrieval classifier. Decide if the user's message requires retrieving past conversation history.
 
@@ -144,15 +342,71 @@ class MemoryAgent:
         except Exception as e:
             self.logger.warning(f"LLM classifier failed, using keyword fallback: {str(e)}")
             # Fallback to keyword heuristic
-            keywords = ["remember", "last time", "you said", "before", "earlier", "previously", "you mentioned"]
-            state["needs_memory"] = any(kw in message.lower() for kw in keywords)
+            state["needs_memory"] = self._keyword_needs_memory(message)
             self.logger.debug(f"Keyword classifier: needs_memory={state['needs_memory']}")
         
         return state
     
-    def _should_retrieve_memory(self, state: AgentState) -> str:
-        """Conditional edge: decide whether to retrieve memories."""
-        return "retrieve" if state["needs_memory"] else "skip"
+    def _keyword_needs_memory(self, message: str) -> bool:
+        """Cheap keyword heuristic for whether a message refers to the past."""
+        return any(kw in message.lower() for kw in MEMORY_KEYWORDS)
+    
+    def _prefetch_context(self, state: AgentState) -> AgentState:
+        """
+        Speculatively run the classifier, vector search and recent-context
+        lookup at the same time, bounded by the prefetch latency budget.
+        
+        The classifier and vector search run on the shared prefetch pool; the
+        recent-context SQL stays on this thread because the DB session is not
+        thread-safe. Retrieved memories are dropped if the classifier says no.
+        A classifier that misses the budget falls back to the keyword
+        heuristic; a vector search that misses it contributes no memories.
+        """
+        if not self.memory_enabled:
+            self.logger.debug("Memory retrieval disabled via config")
+            state["needs_memory"] = False
+            state["retrieved_memories"] = []
+            state["recent_context"] = self._get_recent_context(state["user_id"], state["session_id"])
+            state["recent_context_loaded"] = True
+            return state
+        
+        started = time.monotonic()
+        deadline = started + self.prefetch_budget_seconds
+        executor = get_prefetch_executor()
+        # Each node mutates and returns its state, so give each its own copy
+        assess_future = executor.submit(self._assess_memory_need, dict(state))
+        retrieve_future = executor.submit(self._retrieve_memories, dict(state))
+        
+        state["recent_context"] = self._get_recent_context(state["user_id"], state["session_id"])
+        state["recent_context_loaded"] = True
+        
+        try:
+            needs_memory = assess_future.result(timeout=max(0.0, deadline - time.monotonic()))["needs_memory"]
+        except FutureTimeoutError:
+            needs_memory = self._keyword_needs_memory(state["current_message"])
+            self.logger.warning(f"Memory classifier exceeded budget, keyword fallback: needs_memory={needs_memory}")
+        except Exception as e:
+            needs_memory = self._keyword_needs_memory(state["current_message"])
+            self.logger.warning(f"Memory classifier failed, keyword fallback: {str(e)}")
+        
+        memories: List[str] = []
+        if needs_memory:
+            try:
+                memories = retrieve_future.result(timeout=max(0.0, deadline - time.monotonic()))["retrieved_memories"]
+            except FutureTimeoutError:
+                self.logger.warning(f"Memory retrieval exceeded budget for user {state['user_id']}, continuing without memories")
+            except Exception as e:
+                self.logger.error(f"Failed to retrieve memories: {str(e)}")
+        else:
+            retrieve_future.cancel()
+        
+        state["needs_memory"] = needs_memory
+        state["retrieved_memories"] = memories
+        self.logger.debug(
+            f"Prefetched context in {(time.monotonic() - started) * 1000:.0f}ms "
+            f"(needs_memory={needs_memory}, memories={len(memories)})"
+        )
+        return state
     
     def _retrieve_memories(self, state: AgentState) -> AgentState:
         """Retrieve relevant memories from vector store."""
@@ -194,11 +448,14 @@ class MemoryAgent:
                 system_prompt_content = conversation[0]["content"]
                 remaining_messages = conversation[1:]  # Everything after system prompt
             
-            # Get recent sessions summary
-            recent_context_text = self._get_recent_context(
-                state["user_id"],
-                state["session_id"]
-            )
+            # Get recent sessions summary (already loaded by the prefetch node in speculative mode)
+            if state.get("recent_context_loaded"):
+                recent_context_text = state.get("recent_context")
+            else:
+                recent_context_text = self._get_recent_context(
+                    state["user_id"],
+                    state["session_id"]
+                )
             
             # Build retrieved memories text
             memories_text = None
@@ -207,46 +464,24 @@ class MemoryAgent:
                     f"- {memory}" for memory in state["retrieved_memories"]
                 )
             
-            # Build context injection sections
-            context_additions = []
-            
-            # Add user name context if available
-            if state.get("user_name"):
-                context_additions.append(f"\n<user_info>\nThe user's name is {state.get('user_name')}.\n</user_info>")
-
-            # Add user age context if available
-            if state.get("user_age"):
-                context_additions.append(f"\n<user_info>\nThe user's age is {state.get('user_age')}.\n</user_info>")
-            
-            # Add conversation history context (important for first-time users)
-            if not recent_context_text and not memories_text:
-                context_additions.append(f"\n<conversation_context>\nThis is your first conversation with this user. Welcome them naturally and be present.\n</conversation_context>")
-            
-            # Add recent sessions context
-            if recent_context_text:
-                context_additions.append(f"\n<recent_context>\nHere's a brief summary of recent conversations with this user:\n{recent_context_text}\n</recent_context>")
-            
-            # Add retrieved memories
-            if memories_text:
-                context_additions.append(f"\n<relevant_memories>\nHere are relevant past conversations that may provide useful context:\n{memories_text}\n</relevant_memories>")
-            
-            # If we have a system prompt, append context to it
-            # Otherwise, build a fresh one with PromptContext
-            if system_prompt_content:
-                # Append context to existing prompt (don't rebuild from scratch)
-                enhanced_prompt = system_prompt_content + "".join(context_additions)
-            else:
-                # No existing prompt, build fresh with PromptContext
-                prompt_context = PromptContext(
+            # Per-user context goes after the persona so the persona stays a
+            # stable, provider-cacheable prefix across turns
+            dynamic_context = build_dynamic_context(
+                PromptContext(
                     user_name=state.get("user_name"),
                     user_age=state.get("user_age"),
                     recent_sessions=recent_context_text,
                     retrieved_memories=memories_text
-                )
-                enhanced_prompt = build_system_prompt("therapybro", prompt_context)
+                ),
+                # Important for first-time users
+                first_conversation=not recent_context_text and not memories_text
+            )
+            
+            # Keep the stored persona prompt as-is; build one if history has none
+            static_prompt = system_prompt_content or build_persona_prompt("TherapyBro")
             
             # Build final context
-            final_context = [{"role": "system", "content": enhanced_prompt}]
+            final_context = [system_message(static_prompt, dynamic_context)]
             final_context.extend(remaining_messages)
             
             state["final_context"] = final_context
@@ -273,21 +508,18 @@ class MemoryAgent:
         Returns formatted string with brief summaries.
         """
         try:
-            # Get recent sessions
-            all_sessions = self.session_repository.find_by_user_id(user_id)
-            
-            # Filter out current session and get last 2
-            recent_sessions = [
-                s for s in all_sessions 
-                if s.session_id != current_session_id
-            ][-2:]  # Last 2 sessions
+            # One query: last 2 other sessions plus each one's opening user message
+            recent_sessions = self.session_repository.find_recent_with_opening_message(
+                user_id,
+                exclude_session_id=current_session_id,
+                limit=2
+            )
             
             if not recent_sessions:
                 return None
             
             summaries = []
-            for session in recent_sessions:
-                first_msg = self._get_first_user_message(session.session_id)
+            for session, first_msg in recent_sessions:
                 date_str = session.created_at.strftime('%b %d')
                 preview = first_msg[:100] if first_msg else "(no messages)"
                 summaries.append(f"- {date_str}: {preview}")
@@ -298,18 +530,6 @@ class MemoryAgent:
             self.logger.error(f"Failed to get recent context: {str(e)}")
             return None
     
-    def _get_first_user_message(self, session_id: str) -> str:
-        """Get the first user message from a session."""
-        try:
-            messages = self.message_repository.find_by_session_id(session_id)
-            for msg in messages:
-                if msg.role == "user":
-                    return msg.content
-            return ""
-        except Exception as e:
-            self.logger.error(f"Failed to get first message: {str(e)}")
-            return ""
-    
     def process(
         self,
         user_id: int,
@@ -331,8 +551,8 @@ class MemoryAgent:
         """
         self.logger.info(f"Processing message for user {user_id}, session {session_id}")
         
-        # Get user name from database
-        user = self.user_repository.find_by_id(user_id)
+        # Get user name (principal cache is warm from authentication; DB on a miss)
+        user = get_principal_cache().get_by_id(user_id) or self.user_repository.find_by_id(user_id)
         user_name = user.name if user and user.name else None
         user_age = calculate_age(user.date_of_birth) if user and user.date_of_birth else None
         self.logger.info(f"User name retrieved: {user_name} (user_id: {user_id})")
@@ -347,12 +567,14 @@ class MemoryAgent:
             "conversation_history": history,
             "retrieved_memories": [],
             "needs_memory": False,
+            "recent_context": None,
+            "recent_context_loaded": False,
             "final_context": []
         }
         
         # Run the graph
         try:
-            final_state = self.graph.invoke(state)
+            final_state = self.graph.invoke(state, config={"configurable": {AGENT_CONFIG_KEY: self}})
             return final_state["final_context"]
         except Exception as e:
             self.logger.error(f"Graph execution failed: {str(e)}")
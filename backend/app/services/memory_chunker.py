@@ -6,6 +6,7 @@ from sqlalchemy.orm import Session
 from app.models import Message, MemoryChunk
 from app.services.vector_store import get_vector_store
 from app.repositories.memory_repository import MemoryRepository
+from app.repositories.unit_of_work import unit_of_work
 from app.utils import now_utc
 
 
@@ -53,55 +54,61 @@ class MemoryChunkerService:
             self.logger.warning(f"No chunks created for session {session_id}")
             return 0
         
-        chunks_created = 0
-        
-        for chunk_text, msg_ids in chunks:
-            try:
-                chunk_id = uuid.uuid4().hex
-                
-                # Store in ChromaDB with embeddings
-                self.vector_store.add_memory(
-                    chunk_id=chunk_id,
-                    text=chunk_text,
-                    metadata={
-                        "user_id": user_id,
-                        "session_id": session_id,
-                        "timestamp": now_utc().isoformat(),
-                        "message_count": len(msg_ids)
-                    }
-                )
-                
-                # Store metadata in SQL for tracking
-                chunk_model = MemoryChunk(
-                    chunk_id=chunk_id,
-                    user_id=user_id,
-                    session_id=session_id,
-                    chunk_text=chunk_text[:500],  # Store preview (first 500 chars)
-                    message_ids=",".join(map(str, msg_ids)),
-                    chunk_type="conversation",
-                    created_at=now_utc()
-                )
-                
-                self.memory_repo.create(chunk_model)
-                chunks_created += 1
-                
-                self.logger.debug(
-                    f"Created chunk {chunk_id} with {len(msg_ids)} messages"
-                )
-                
-            except Exception as e:
-                self.logger.error(
-                    f"Failed to create chunk for session {session_id}: {str(e)}"
-                )
-                # Continue with other chunks even if one fails
-                continue
+        timestamp = now_utc()
+        chunk_ids = [uuid.uuid4().hex for _ in chunks]
+        texts = [chunk_text for chunk_text, _ in chunks]
+        metadatas = [
+            {
+                "user_id": user_id,
+                "session_id": session_id,
+                "timestamp": timestamp.isoformat(),
+                "message_count": len(msg_ids)
+            }
+            for _, msg_ids in chunks
+        ]
+        # Metadata in SQL for tracking
+        chunk_models = [
+            MemoryChunk(
+                chunk_id=chunk_id,
+                user_id=user_id,
+                session_id=session_id,
+                chunk_text=chunk_text[:500],  # Store preview (first 500 chars)
+                message_ids=",".join(map(str, msg_ids)),
+                chunk_type="conversation",
+                created_at=timestamp
+            )
+            for chunk_id, (chunk_text, msg_ids) in zip(chunk_ids, chunks)
+        ]
+        
+        # All-or-nothing: every chunk is embedded and added to the vector store
+        # in one batch before any SQL is written, so the database write lock is
+        # only held for the short insert + commit, never across embedding calls.
+        # If the vector add fails nothing is written; if the insert or commit
+        # fails the vectors are removed again.
+        vectors_added = False
+        try:
+            self.vector_store.add_memories(chunk_ids, texts, metadatas)
+            vectors_added = True
+            with unit_of_work(self.db):
+                self.memory_repo.create_many(chunk_models)
+        except Exception as e:
+            self.logger.error(
+                f"Failed to store {len(chunks)} chunks for session {session_id}: {str(e)}"
+            )
+            if vectors_added:
+                try:
+                    self.vector_store.delete_memories(chunk_ids)
+                except Exception as cleanup_error:
+                    self.logger.error(
+                        f"Failed to remove orphaned vectors for session {session_id}: {str(cleanup_error)}"
+                    )
+            return 0
         
-        # Log success (commits already happened in create())
         self.logger.info(
-            f"Successfully stored {chunks_created} chunks for session {session_id}"
+            f"Successfully stored {len(chunks)} chunks for session {session_id}"
         )
         
-        return chunks_created
+        return len(chunks)
     
     def _create_semantic_chunks(
         self, 
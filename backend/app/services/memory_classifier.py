@@ -0,0 +1,255 @@
+"""Local memory-need classifier: logistic regression over hashed word n-grams."""
+import json
+import logging
+import math
+import random
+import re
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.config.settings import get_settings
+
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+DEFAULT_MODEL_PATH = DATA_DIR / "memory_need_model.json"
+DEFAULT_EXAMPLES_PATH = DATA_DIR / "memory_need_examples.jsonl"
+# Labelled messages kept out of training, for evaluating the shipped model
+DEFAULT_HOLDOUT_PATH = DATA_DIR / "memory_need_holdout.jsonl"
+
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+
+class LocalMemoryClassifier:
+    """
+    Zero-cost classifier deciding whether a message needs past memories.
+
+    Messages are lowercased, split into words, and word unigrams + bigrams
+    are hashed (crc32, stable across processes) into a fixed-size sparse
+    feature vector that is L2-normalised. A logistic regression over those
+    features gives P(needs_memory).
+    """
+
+    def __init__(self, n_features: int = 2 ** 14, weights: Optional[Dict[int, float]] = None, bias: float = 0.0):
+        """
+        Initialize the classifier.
+
+        Args:
+            n_features: Size of the hashed feature space
+            weights: Sparse weight vector (feature index -> weight)
+            bias: Intercept
+        """
+        self.n_features = n_features
+        self.weights: Dict[int, float] = dict(weights or {})
+        self.bias = bias
+
+    def features(self, text: str) -> Dict[int, float]:
+        """Hash word unigrams and bigrams of text into a normalised sparse vector."""
+        tokens = _TOKEN_RE.findall(text.lower())
+        grams = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        counts: Dict[int, float] = {}
+        for gram in grams:
+            index = zlib.crc32(gram.encode("utf-8")) % self.n_features
+            counts[index] = counts.get(index, 0.0) + 1.0
+        norm = math.sqrt(sum(v * v for v in counts.values()))
+        if norm:
+            for index in counts:
+                counts[index] /= norm
+        return counts
+
+    def predict_proba(self, text: str) -> float:
+        """Return P(needs_memory) for a message."""
+        score = self.bias + sum(self.weights.get(i, 0.0) * v for i, v in self.features(text).items())
+        return _sigmoid(score)
+
+    def fit(
+        self,
+        texts: Sequence[str],
+        labels: Sequence[bool],
+        epochs: int = 40,
+        learning_rate: float = 0.5,
+        l2: float = 1e-4,
+        seed: int = 0,
+    ) -> "LocalMemoryClassifier":
+        """
+        Train with plain SGD on log-loss.
+
+        Args:
+            texts: Training messages
+            labels: True if the message needs memory retrieval
+            epochs: Passes over the data
+            learning_rate: SGD step size
+            l2: L2 regularisation strength
+            seed: Shuffle seed (training is deterministic for a given seed)
+
+        Returns:
+            self
+        """
+        examples = [(self.features(t), 1.0 if y else 0.0) for t, y in zip(texts, labels)]
+        rng = random.Random(seed)
+        for _ in range(epochs):
+            rng.shuffle(examples)
+            for features, target in examples:
+                score = self.bias + sum(self.weights.get(i, 0.0) * v for i, v in features.items())
+                gradient = _sigmoid(score) - target
+                for i, v in features.items():
+                    w = self.weights.get(i, 0.0)
+                    self.weights[i] = w - learning_rate * (gradient * v + l2 * w)
+                self.bias -= learning_rate * gradient
+        return self
+
+    def to_dict(self) -> Dict:
+        """Serialise the model to a JSON-compatible dict."""
+        return {
+            "n_features": self.n_features,
+            "bias": self.bias,
+            "weights": {str(i): round(w, 6) for i, w in self.weights.items() if abs(w) > 1e-6},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "LocalMemoryClassifier":
+        """Load a model produced by to_dict()."""
+        return cls(
+            n_features=int(data["n_features"]),
+            weights={int(i): float(w) for i, w in data["weights"].items()},
+            bias=float(data["bias"]),
+        )
+
+    def save(self, path: Path) -> None:
+        """Write the model as JSON."""
+        Path(path).write_text(json.dumps(self.to_dict(), sort_keys=True))
+
+    @classmethod
+    def load(cls, path: Path) -> "LocalMemoryClassifier":
+        """Read a model written by save()."""
+        return cls.from_dict(json.loads(Path(path).read_text()))
+
+
+@dataclass
+class GateEvaluation:
+    """Held-out metrics for a classifier behind the confidence gate."""
+    accuracy: float
+    precision: float
+    recall: float
+    coverage: float
+    gated_accuracy: float
+
+
+def _sigmoid(x: float) -> float:
+    if x >= 0:
+        return 1.0 / (1.0 + math.exp(-x))
+    z = math.exp(x)
+    return z / (1.0 + z)
+
+
+def decide(probability: float, low: float, high: float) -> Optional[bool]:
+    """
+    Apply the confidence gate.
+
+    Returns:
+        True/False when the probability is outside (low, high), None when it
+        is ambiguous and should be escalated
+    """
+    if probability >= high:
+        return True
+    if probability <= low:
+        return False
+    return None
+
+
+def load_examples(path: Path = DEFAULT_EXAMPLES_PATH) -> Tuple[List[str], List[bool]]:
+    """Load labelled messages from a JSONL file of {"text", "needs_memory"} rows."""
+    texts: List[str] = []
+    labels: List[bool] = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            row = json.loads(line)
+            texts.append(row["text"])
+            labels.append(bool(row["needs_memory"]))
+    return texts, labels
+
+
+def evaluate(
+    classifier: LocalMemoryClassifier,
+    texts: Iterable[str],
+    labels: Iterable[bool],
+    low: float,
+    high: float,
+) -> GateEvaluation:
+    """
+    Evaluate a classifier on labelled messages.
+
+    Accuracy/precision/recall use a 0.5 threshold; coverage is the share of
+    messages the gate decides locally and gated_accuracy is the accuracy on
+    that share (the rest would be escalated to the remote LLM).
+    """
+    tp = fp = fn = correct = decided = decided_correct = total = 0
+    for text, label in zip(texts, labels):
+        probability = classifier.predict_proba(text)
+        predicted = probability >= 0.5
+        total += 1
+        correct += predicted == label
+        tp += predicted and label
+        fp += predicted and not label
+        fn += (not predicted) and label
+        gated = decide(probability, low, high)
+        if gated is not None:
+            decided += 1
+            decided_correct += gated == label
+    return GateEvaluation(
+        accuracy=correct / total if total else 0.0,
+        precision=tp / (tp + fp) if tp + fp else 0.0,
+        recall=tp / (tp + fn) if tp + fn else 0.0,
+        coverage=decided / total if total else 0.0,
+        gated_accuracy=decided_correct / decided if decided else 0.0,
+    )
+
+
+def load_default_classifier() -> Optional[LocalMemoryClassifier]:
+    """
+    Load the configured model, training one from the bundled examples if no
+    model file exists.
+
+    Returns:
+        LocalMemoryClassifier, or None if neither a model nor examples are available
+    """
+    settings = get_settings()
+    model_path = Path(settings.memory_classifier_model_path) if settings.memory_classifier_model_path else DEFAULT_MODEL_PATH
+    try:
+        if model_path.exists():
+            classifier = LocalMemoryClassifier.load(model_path)
+            logger.info(f"Loaded memory-need classifier from {model_path}")
+            return classifier
+        texts, labels = load_examples()
+        logger.info(f"No memory-need model at {model_path}; training on {len(texts)} bundled examples")
+        return LocalMemoryClassifier().fit(texts, labels)
+    except Exception as e:
+        logger.error(f"Failed to load memory-need classifier: {str(e)}")
+        return None
+
+
+# Singleton instance
+_memory_classifier_instance: Optional[LocalMemoryClassifier] = None
+_memory_classifier_loaded = False
+
+
+def get_memory_classifier() -> Optional[LocalMemoryClassifier]:
+    """
+    Get or create a singleton instance of the local memory-need classifier.
+
+    Returns:
+        LocalMemoryClassifier instance, or None if it could not be loaded
+    """
+    global _memory_classifier_instance, _memory_classifier_loaded
+
+    if not _memory_classifier_loaded:
+        _memory_classifier_instance = load_default_classifier()
+        _memory_classifier_loaded = True
+
+    return _memory_classifier_instance
@@ -0,0 +1,256 @@
+"""Background memory finalization: durable SQL-backed queue, worker pool and sweeper."""
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.config.settings import get_settings
+from app.repositories.finalization_job_repository import MemoryFinalizationJobRepository
+from app.repositories.memory_repository import MemoryRepository
+from app.repositories.message_repository import MessageRepository
+from app.utils import now_utc
+
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_session_finalization(
+    db: Session,
+    session_id: str,
+    user_id: int,
+    ended_at: Optional[datetime] = None,
+    force: bool = False,
+) -> bool:
+    """
+    Queue a session for background memory finalization.
+
+    Cheap enough for request handlers: a single keyed insert/update, no
+    chunking or embedding. A session already finalized since `ended_at` is
+    not queued again unless `force` is set.
+
+    Args:
+        db: SQLAlchemy database session
+        session_id: Session to finalize
+        user_id: Owner of the session
+        ended_at: When the session ended
+        force: Re-index even if the session was already finalized (extensions)
+
+    Returns:
+        True if a job was queued, False if one was pending or not needed
+    """
+    if not get_settings().memory_enabled:
+        return False
+    return MemoryFinalizationJobRepository(db).enqueue(session_id, user_id, ended_at=ended_at, force=force)
+
+
+def finalize_session(db: Session, session_id: str, user_id: int) -> int:
+    """
+    Chunk and embed a session into memory, replacing any earlier chunks.
+
+    Re-running is safe: previous chunks for the session are removed first, so
+    a session finalized again after an extension is indexed exactly once.
+
+    Args:
+        db: SQLAlchemy database session
+        session_id: Session to finalize
+        user_id: Owner of the session
+
+    Returns:
+        Number of chunks stored
+
+    Raises:
+        RuntimeError: If chunking/embedding failed (the job will be retried)
+    """
+    from app.services.memory_chunker import MemoryChunkerService
+
+    # Sessions reference their persona instead of storing a system row; skip
+    # any legacy system rows so only conversation messages count
+    messages = [m for m in MessageRepository(db).find_by_session_id(session_id) if m.role != "system"]
+    if not messages:
+        logger.debug(f"Nothing to finalize for session {session_id}")
+        return 0
+
+    chunker = MemoryChunkerService(db)
+    if MemoryRepository(db).count_by_session_id(session_id) > 0:
+        if not chunker.delete_session_chunks(session_id):
+            raise RuntimeError("failed to remove previous memory chunks")
+
+    created = chunker.chunk_and_store_session(session_id, user_id, messages)
+    if created == 0:
+        raise RuntimeError("memory chunking failed")
+    return created
+
+
+class MemoryFinalizationWorker:
+    """
+    Worker pool that drains the memory finalization queue.
+
+    Each worker thread claims due jobs with a lease, finalizes them and
+    records the outcome; failures are retried with exponential backoff until
+    max_attempts. A sweeper thread periodically enqueues sessions whose
+    end time has passed without a finalization, so sessions that simply
+    time out are indexed even if the user never returns. The sweep only
+    looks back `sweep_lookback_hours`, so the first sweep after deployment
+    does not queue every historical session.
+    """
+
+    def __init__(
+        self,
+        session_factory: Optional[Callable[[], Session]] = None,
+        workers: Optional[int] = None,
+        poll_seconds: Optional[float] = None,
+        sweep_seconds: Optional[float] = None,
+        max_attempts: Optional[int] = None,
+        backoff_seconds: Optional[float] = None,
+        lease_seconds: Optional[float] = None,
+        sweep_lookback_hours: Optional[float] = None,
+    ):
+        """
+        Initialize the worker pool (uses settings for any value left as None).
+
+        Args:
+            session_factory: Callable returning a new DB session (defaults to the app engine)
+            workers: Number of worker threads
+            poll_seconds: Idle wait between queue polls
+            sweep_seconds: Interval between expired-session sweeps
+            max_attempts: Attempts before a job is marked failed
+            backoff_seconds: Base retry delay (doubles per attempt)
+            lease_seconds: How long a claimed job is held before it can be reclaimed
+            sweep_lookback_hours: Only sweep sessions that ended this recently (0 sweeps all)
+        """
+        settings = get_settings()
+        if session_factory is None:
+            from app.db import engine
+            session_factory = lambda: Session(engine)
+        self.session_factory = session_factory
+        self.workers = workers if workers is not None else settings.memory_finalizer_workers
+        self.poll_seconds = poll_seconds if poll_seconds is not None else settings.memory_finalizer_poll_seconds
+        self.sweep_seconds = sweep_seconds if sweep_seconds is not None else settings.memory_finalizer_sweep_seconds
+        self.max_attempts = max_attempts if max_attempts is not None else settings.memory_finalizer_max_attempts
+        self.backoff_seconds = backoff_seconds if backoff_seconds is not None else settings.memory_finalizer_backoff_seconds
+        self.lease_seconds = lease_seconds if lease_seconds is not None else settings.memory_finalizer_lease_seconds
+        self.sweep_lookback_hours = (
+            sweep_lookback_hours if sweep_lookback_hours is not None else settings.memory_finalizer_sweep_lookback_hours
+        )
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    def start(self) -> None:
+        """Start the worker and sweeper threads."""
+        if self._threads:
+            return
+        self._stop.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker_loop, name=f"memory-finalizer-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        sweeper = threading.Thread(target=self._sweeper_loop, name="memory-finalizer-sweeper", daemon=True)
+        sweeper.start()
+        self._threads.append(sweeper)
+        self.logger.info(f"Memory finalization worker started ({self.workers} workers)")
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Signal all threads to stop and wait for them briefly."""
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        self.logger.info("Memory finalization worker stopped")
+
+    def notify(self) -> None:
+        """Wake idle workers (call after enqueueing to skip the poll delay)."""
+        self._wake.set()
+
+    def run_pending(self, limit: int = 1) -> int:
+        """
+        Claim and process up to `limit` due jobs on the calling thread.
+
+        Returns:
+            Number of jobs processed (successfully or not)
+        """
+        with self.session_factory() as db:
+            repo = MemoryFinalizationJobRepository(db)
+            jobs = repo.claim_due(limit, self.lease_seconds)
+            for job in jobs:
+                self._process(db, repo, job)
+            return len(jobs)
+
+    def sweep(self, limit: int = 100) -> int:
+        """
+        Enqueue ended sessions that have not been finalized since they ended.
+
+        Returns:
+            Number of sessions queued
+        """
+        ended_after = None
+        if self.sweep_lookback_hours > 0:
+            ended_after = now_utc() - timedelta(hours=self.sweep_lookback_hours)
+        with self.session_factory() as db:
+            repo = MemoryFinalizationJobRepository(db)
+            queued = 0
+            for session_id, user_id, ended_at in repo.find_sessions_needing_finalization(limit, ended_after):
+                queued += repo.enqueue(session_id, user_id, ended_at=ended_at)
+            if queued:
+                self.logger.info(f"Sweeper queued {queued} expired sessions for finalization")
+                self.notify()
+            return queued
+
+    def _process(self, db: Session, repo: MemoryFinalizationJobRepository, job) -> None:
+        """Run one claimed job and record success or a retry."""
+        session_id, attempts = job.session_id, job.attempts
+        try:
+            created = finalize_session(db, session_id, job.user_id)
+            repo.mark_done(job)
+            self.logger.info(f"Finalized memory for session {session_id} ({created} chunks)")
+        except Exception as e:
+            db.rollback()
+            if attempts >= self.max_attempts:
+                repo.mark_failed(job, str(e), retry_at=None)
+                self.logger.error(f"Giving up on memory finalization for session {session_id} after {attempts} attempts: {str(e)}")
+            else:
+                delay = self.backoff_seconds * (2 ** (attempts - 1))
+                repo.mark_failed(job, str(e), retry_at=now_utc() + timedelta(seconds=delay))
+                self.logger.warning(f"Memory finalization failed for session {session_id} (attempt {attempts}), retrying in {delay:.0f}s: {str(e)}")
+
+    def _worker_loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                processed = self.run_pending()
+            except Exception as e:
+                self.logger.error(f"Memory finalization worker error: {str(e)}")
+                processed = 0
+            if not processed:
+                self._wake.wait(self.poll_seconds)
+                self._wake.clear()
+
+    def _sweeper_loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.sweep()
+            except Exception as e:
+                self.logger.error(f"Memory finalization sweeper error: {str(e)}")
+            self._stop.wait(self.sweep_seconds)
+
+
+# Singleton instance for the application process
+_memory_finalizer_instance: Optional[MemoryFinalizationWorker] = None
+
+
+def get_memory_finalizer() -> MemoryFinalizationWorker:
+    """
+    Get or create a singleton instance of MemoryFinalizationWorker.
+
+    Returns:
+        MemoryFinalizationWorker instance
+    """
+    global _memory_finalizer_instance
+
+    if _memory_finalizer_instance is None:
+        _memory_finalizer_instance = MemoryFinalizationWorker()
+
+    return _memory_finalizer_instance
@@ -1,15 +1,22 @@
 """Message service for handling LLM interactions and streaming."""
-import json
+import asyncio
 import logging
 import os
-from typing import List, Dict, Iterable, Generator
+from typing import List, Dict, Iterable, AsyncGenerator, Optional
+import anyio
 from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from app.llm_metrics import get_stream_cancellation_metrics
 from app.services.base_service import BaseService
+from app.services.history_builder import count_tokens
 from app.services.llm_factory import get_llm_factory, LLMStreamer
 from app.services.session_service import SessionService
 from datetime import timezone
 from app.utils import now_utc
 from app.repositories.session_repository import SessionRepository
+from app.services.memory_finalizer import enqueue_session_finalization, get_memory_finalizer
+from app.services.message_writer import get_message_writer
+from app.services.stream_framing import StreamFramer, coalesce_tokens, open_token_stream
 from app.config.settings import get_settings
 
 
@@ -25,7 +32,7 @@ class MessageService(BaseService):
         super().__init__(db_session)
         self.session_service = SessionService(db_session)
     
-    def process_message_stream(self, session_id: str, user_id: int, content: str, provider: str = None) -> StreamingResponse:
+    def process_message_stream(self, session_id: str, user_id: int, content: str, provider: str = None, stream_format: str = "ndjson") -> StreamingResponse:
         """Process a user message and stream LLM response.
         
         Args:
@@ -33,6 +40,7 @@ class MessageService(BaseService):
             user_id: User ID (for authorization)
             content: User message content
             provider: LLM provider to use (optional)
+            stream_format: "ndjson" (default) or "sse"
             
         Returns:
             StreamingResponse with LLM response
@@ -43,6 +51,7 @@ class MessageService(BaseService):
         """
         self.logger.info(f"Processing message stream for session: {session_id}, user: {user_id}")
         self.logger.debug(f"Message length: {len(content)} characters")
+        framer = StreamFramer(stream_format)
         
         try:
             # Enforce server-side timer: reject if expired/not active
@@ -57,23 +66,12 @@ class MessageService(BaseService):
             # Block if session not active or time elapsed
             if getattr(chat_session, "status", "ended") != "active" or (end is not None and end <= now):
                 self.logger.info(f"Blocking send: session expired for {session_id}")
-                # Finalize-on-expiry: chunk and store session memory once when expired
+                # Finalize-on-expiry: hand the session to the background memory worker
                 try:
-                    settings = get_settings()
-                    if settings.memory_enabled:
-                        from app.services.memory_chunker import MemoryChunkerService
-                        from app.repositories.memory_repository import MemoryRepository
-                        # Only chunk if there are meaningful messages
-                        messages = self.session_service.message_repository.find_by_session_id(session_id)
-                        if len(messages) > 1:
-                            # Avoid duplicate chunking for same session
-                            mem_repo = MemoryRepository(self.db)
-                            if mem_repo.count_by_session_id(session_id) == 0:
-                                chunker = MemoryChunkerService(self.db)
-                                chunker.chunk_and_store_session(session_id, user_id, messages)
-                                self.logger.info(f"Finalized memory for expired session {session_id}")
+                    if enqueue_session_finalization(self.db, session_id, user_id, ended_at=end):
+                        get_memory_finalizer().notify()
                 except Exception as e:
-                    self.logger.warning(f"Finalize-on-expiry memory store failed for {session_id}: {str(e)}")
+                    self.logger.warning(f"Failed to queue memory finalization for {session_id}: {str(e)}")
                 raise RuntimeError("SESSION_EXPIRED")
 
             # Add user message to session
@@ -81,8 +79,13 @@ class MessageService(BaseService):
             self.logger.debug(f"User message persisted for session: {session_id}")
 
             # Build conversation history for LLM with memory enrichment
-            base_history = self.session_service.get_conversation_history(session_id)
-            self.logger.debug(f"Built base conversation history with {len(base_history)} messages")
+            window = self.session_service.build_conversation_window(session_id, chat_session)
+            base_history = window.messages
+            self.logger.info(
+                f"Built base conversation history for session {session_id}: "
+                f"{len(base_history)} messages, {window.prompt_tokens} prompt tokens, "
+                f"{window.dropped_messages} trimmed"
+            )
             
             # Check if memory system is enabled
             settings = get_settings()
@@ -119,42 +122,97 @@ class MessageService(BaseService):
                 raise RuntimeError("SESSION_EXPIRED")
             raise
 
-        # Create LLM streamer
+        # Create LLM streamer (an explicit provider bypasses adaptive routing)
         try:
             llm_factory = get_llm_factory()
-            streamer = llm_factory.create_streamer(provider=provider)
+            if provider is None and settings.llm_routing_policy != "static":
+                streamer = llm_factory.route_streamer(content, window.prompt_tokens)
+            else:
+                streamer = llm_factory.create_streamer(provider=provider)
             self.logger.info(f"Using LLM provider: {provider or 'default'}, model: {getattr(streamer, 'model', 'unknown')}")
         except Exception as e:
             self.logger.error(f"Failed to create LLM streamer: {str(e)}")
             raise RuntimeError(f"Failed to create LLM streamer: {str(e)}")
 
-        def ndjson_stream() -> Generator[bytes, None, None]:
-            """Generate NDJSON stream for LLM response."""
+        async def ndjson_stream() -> AsyncGenerator[bytes, None]:
+            """Generate the framed stream for the LLM response (NDJSON or SSE)."""
             assembled: List[str] = []
+            disconnected = False
+            chunks = coalesce_tokens(
+                open_token_stream(streamer, wire),
+                settings.stream_coalesce_chars,
+                settings.stream_coalesce_ms,
+            )
             try:
                 self.logger.info(f"Starting LLM stream for session: {session_id}")
-                for tok in streamer.stream_chat(wire):
-                    assembled.append(tok)
-                    yield (json.dumps({"type": "delta", "content": tok}) + "\n").encode("utf-8")
+                async for chunk in chunks:
+                    assembled.append(chunk)
+                    yield framer.delta(chunk)
                     
+            except (asyncio.CancelledError, GeneratorExit):
+                # Client went away: Starlette cancels the response (or the server closes it)
+                disconnected = True
+                raise
+                
             except Exception as e:
                 self.logger.error(f"LLM streaming error for session {session_id}: {str(e)}")
-                yield (json.dumps({"type": "delta", "content": "[Error streaming, please retry]"}) + "\n").encode("utf-8")
+                yield framer.delta("[Error streaming, please retry]")
                 
             finally:
-                full = "".join(assembled)
-                self.logger.info(f"LLM response completed for session {session_id}, length: {len(full)} characters")
-                
-                # Persist assistant message
-                try:
-                    self.session_service.add_assistant_message(session_id, full)
-                    self.logger.debug(f"Assistant message persisted for session: {session_id}")
-                except Exception as e:
-                    self.logger.error(f"Failed to persist assistant message for session {session_id}: {str(e)}")
+                # Shielded: on a disconnect this block runs while the response is being cancelled
+                with anyio.CancelScope(shield=True):
+                    # Stop pulling tokens and close the provider's upstream stream
+                    await chunks.aclose()
+                    full = "".join(assembled)
+                    if disconnected:
+                        self._record_disconnect(session_id, streamer, provider, full)
+                    else:
+                        self.logger.info(f"LLM response completed for session {session_id}, length: {len(full)} characters")
+                    
+                    # Hand the assistant message to the write-behind writer; only
+                    # wait for its batch commit when MESSAGE_WRITE_ACK=commit. A reply cut
+                    # short by a disconnect is kept (marked truncated) if it has any text.
+                    writer = get_message_writer()
+                    try:
+                        if full or not disconnected:
+                            pending = self.session_service.submit_assistant_message(session_id, full, truncated=disconnected)
+                            if pending is None:
+                                # Writer not running: persist off the event loop (SQLAlchemy session is sync)
+                                await run_in_threadpool(self.session_service.add_assistant_message, session_id, full, disconnected)
+                            elif writer.ack_mode == "commit":
+                                # Bounded like the sync path; shield so a timeout doesn't cancel the queued write
+                                await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(pending)), writer.write_timeout)
+                            self.logger.debug(f"Assistant message persisted for session: {session_id}")
+                    except asyncio.TimeoutError:
+                        self.logger.error(
+                            f"Failed to persist assistant message for session {session_id}: "
+                            f"not committed within {writer.write_timeout:.0f}s"
+                        )
+                    except Exception as e:
+                        self.logger.error(f"Failed to persist assistant message for session {session_id}: {str(e)}")
                 
-                yield (json.dumps({"type": "done"}) + "\n").encode("utf-8")
+                if not disconnected:
+                    yield framer.done()
+
+        return StreamingResponse(ndjson_stream(), media_type=framer.media_type, headers=framer.headers)
+    
+    def _record_disconnect(self, session_id: str, streamer: LLMStreamer, provider: Optional[str], partial: str) -> None:
+        """Log a reply cut short by a client disconnect and count the output tokens it saved.
 
-        return StreamingResponse(ndjson_stream(), media_type="application/x-ndjson")
+        The tokens are booked under the provider/route that was serving the
+        reply (a router's ``active_provider``), else the requested or
+        configured provider.
+        """
+        provider = getattr(streamer, "active_provider", None) or provider or get_settings().llm_provider
+        generated = count_tokens(partial) if partial else 0
+        budget = getattr(streamer, "max_output_tokens", None)
+        if budget is None:
+            budget = get_settings().stream_disconnect_token_budget
+        get_stream_cancellation_metrics().record(provider, generated_tokens=generated, budget_tokens=budget)
+        self.logger.info(
+            f"Client disconnected from session {session_id}; closed LLM stream after "
+            f"{len(partial)} characters (~{generated} tokens)"
+        )
     
     def get_conversation_history(self, session_id: str) -> List[Dict[str, str]]:
         """Get conversation history for a session.
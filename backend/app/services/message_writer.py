@@ -0,0 +1,282 @@
+"""Write-behind message persistence: one writer thread, batched multi-row INSERTs."""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from app.config.settings import get_settings
+from app.models import Message
+from app.repositories.message_repository import MessageRepository
+from app.repositories.session_repository import SessionRepository
+from app.repositories.unit_of_work import unit_of_work
+from app.services.history_builder import get_history_builder
+from app.utils import now_utc
+
+
+logger = logging.getLogger(__name__)
+
+# MESSAGE_WRITE_ACK values: acknowledge a write once it is queued, or once it is committed
+ACK_MODES = ("enqueue", "commit")
+
+
+@dataclass
+class _PendingWrite:
+    message: Message
+    touch_session: bool
+    future: Future = field(default_factory=Future)
+
+
+class MessageWriter:
+    """
+    Write-behind queue that persists chat messages across requests.
+
+    Messages from every request go into one FIFO queue. A writer thread
+    takes the first waiting message, collects more for up to `flush_ms` or
+    until `batch_size` rows, and writes them in a single multi-row INSERT
+    (plus one UPDATE bumping the touched sessions) and one commit. Each
+    submit returns a Future resolving to the message ID after that commit.
+
+    The queue is FIFO and IDs are assigned in submission order, so a
+    session's messages stay ordered. Committed messages are appended to the
+    history cache before their futures resolve, so a caller that waited for
+    its write sees it (and everything queued before it) in the next window.
+
+    With ack_mode "commit" callers wait for the commit before acknowledging
+    the write to the client; with "enqueue" they acknowledge immediately and
+    a crash can lose at most the last flush interval. Stopping the writer
+    drains the queue.
+
+    A batch that hits an OperationalError (e.g. SQLite "database is locked")
+    is retried up to `retries` times with doubling backoff before its futures
+    fail, since in "enqueue" mode nobody is waiting to retry it. If the writer
+    thread ever dies, `running` turns False and later submits are written on
+    the caller's thread.
+    """
+
+    def __init__(
+        self,
+        session_factory: Optional[Callable[[], Session]] = None,
+        flush_ms: Optional[float] = None,
+        batch_size: Optional[int] = None,
+        ack_mode: Optional[str] = None,
+        retries: Optional[int] = None,
+        retry_backoff_ms: Optional[float] = None,
+        write_timeout: Optional[float] = None,
+    ):
+        """
+        Initialize the writer (uses settings for any value left as None).
+
+        Args:
+            session_factory: Callable returning a new DB session (defaults to the app engine)
+            flush_ms: Longest a message waits for more rows to batch with
+            batch_size: Most rows written per INSERT
+            ack_mode: "enqueue" or "commit" (see class docstring)
+            retries: Extra attempts for a batch failing with an OperationalError
+            retry_backoff_ms: Delay before the first retry (doubles per retry)
+            write_timeout: Longest a caller should wait on a submitted write, in seconds
+
+        Raises:
+            ValueError: If ack_mode is not one of ACK_MODES
+        """
+        settings = get_settings()
+        if session_factory is None:
+            from app.db import engine
+            session_factory = lambda: Session(engine)
+        self.session_factory = session_factory
+        self.flush_seconds = (flush_ms if flush_ms is not None else settings.message_write_flush_ms) / 1000.0
+        self.batch_size = batch_size if batch_size is not None else settings.message_write_batch_size
+        self.ack_mode = ack_mode or settings.message_write_ack
+        if self.ack_mode not in ACK_MODES:
+            raise ValueError(f"Invalid message write ack mode: {self.ack_mode} (expected one of {', '.join(ACK_MODES)})")
+        self.retries = retries if retries is not None else settings.message_write_retries
+        self.retry_backoff_seconds = (
+            retry_backoff_ms if retry_backoff_ms is not None else settings.message_write_retry_backoff_ms
+        ) / 1000.0
+        self.write_timeout = write_timeout if write_timeout is not None else settings.message_write_timeout_seconds
+        self._queue: "queue.Queue[Optional[_PendingWrite]]" = queue.Queue()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    @property
+    def running(self) -> bool:
+        """True while the writer thread is alive and accepts messages."""
+        return self._thread is not None and self._thread.is_alive() and not self._stop.is_set()
+
+    def start(self) -> None:
+        """Start the writer thread."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="message-writer", daemon=True)
+        self._thread.start()
+        self.logger.info(f"Message writer started (flush {self.flush_seconds * 1000:.0f}ms, batch {self.batch_size}, ack {self.ack_mode})")
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop accepting messages, write everything queued and stop the thread."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._queue.put(None)  # wakes the writer; everything queued before it is written first
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            # Still writing: leave the rest of the queue to it rather than write concurrently
+            self.logger.warning(f"Message writer still draining after {timeout:.0f}s; leaving it to finish")
+            self._thread = None
+            return
+        self._thread = None
+        # Anything that raced past the running check is written on this thread
+        self.flush()
+        self.logger.info("Message writer stopped")
+
+    def submit(self, message: Message, touch_session: bool = False) -> "Future[int]":
+        """
+        Queue a message for the next batch.
+
+        If the writer is not running the message is written immediately on
+        the calling thread, so the returned future is already resolved.
+
+        Args:
+            message: Unsaved Message (its id is set once written)
+            touch_session: Also bump the session's updated_at in the same commit
+
+        Returns:
+            Future resolving to the message ID (or raising the write error)
+        """
+        pending = _PendingWrite(message, touch_session)
+        if self.running:
+            self._queue.put(pending)
+        else:
+            self._write([pending])
+        return pending.future
+
+    def flush(self) -> int:
+        """
+        Write every queued message on the calling thread.
+
+        Returns:
+            Number of messages written (or failed)
+        """
+        written = 0
+        while True:
+            batch = self._drain(self.batch_size)
+            if not batch:
+                return written
+            self._write(batch)
+            written += len(batch)
+
+    def _drain(self, limit: int) -> List["_PendingWrite"]:
+        batch = []
+        while len(batch) < limit:
+            try:
+                pending = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if pending is not None:
+                batch.append(pending)
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            try:
+                if not self._run_once():
+                    return
+            except Exception as e:
+                # Never let one bad batch end the thread: callers would wait on it forever
+                self.logger.error(f"Message writer loop error: {str(e)}")
+
+    def _run_once(self) -> bool:
+        """Collect and write one batch; returns False once the stop sentinel is seen."""
+        first = self._queue.get()
+        if first is None:
+            return False
+        batch = [first]
+        stopping = False
+        try:
+            deadline = time.monotonic() + self.flush_seconds
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    pending = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if pending is None:
+                    stopping = True
+                    break
+                batch.append(pending)
+            self._write(batch)
+        except Exception as e:
+            self.logger.error(f"Message writer failed on a batch of {len(batch)}: {str(e)}")
+            for pending in batch:
+                if not pending.future.done():
+                    get_history_builder().invalidate(pending.message.session_id)
+                    pending.future.set_exception(e)
+        return not stopping
+
+    def _write(self, batch: List["_PendingWrite"]) -> None:
+        """Insert a batch in one transaction, then update the history cache and resolve futures."""
+        messages = [pending.message for pending in batch]
+        touched = sorted({pending.message.session_id for pending in batch if pending.touch_session})
+        attempt = 0
+        while True:
+            try:
+                with self.session_factory() as db, unit_of_work(db):
+                    MessageRepository(db).create_many(messages)
+                    SessionRepository(db).touch(touched, now_utc())
+                break
+            except OperationalError as e:
+                if attempt >= self.retries:
+                    self._fail(batch, e)
+                    return
+                delay = self.retry_backoff_seconds * (2 ** attempt)
+                attempt += 1
+                self.logger.warning(f"Retrying write of {len(batch)} messages in {delay * 1000:.0f}ms (attempt {attempt}): {str(e)}")
+                time.sleep(delay)
+            except Exception as e:
+                self._fail(batch, e)
+                return
+
+        history = get_history_builder()
+        for pending in batch:
+            try:
+                history.append(pending.message.session_id, pending.message)
+            except Exception as e:
+                # The row is committed; the next history read rebuilds the window from the database
+                self.logger.warning(f"Failed to update history cache for session {pending.message.session_id}: {str(e)}")
+                history.invalidate(pending.message.session_id)
+            pending.future.set_result(pending.message.id)
+        self.logger.debug(f"Wrote {len(batch)} messages ({len(touched)} sessions touched)")
+
+    def _fail(self, batch: List["_PendingWrite"], error: Exception) -> None:
+        """Report a batch that could not be written through its futures."""
+        self.logger.error(f"Failed to write {len(batch)} messages: {str(error)}")
+        for pending in batch:
+            get_history_builder().invalidate(pending.message.session_id)
+            pending.future.set_exception(error)
+
+
+# Singleton instance for the application process
+_message_writer_instance: Optional[MessageWriter] = None
+
+
+def get_message_writer() -> MessageWriter:
+    """
+    Get or create a singleton instance of MessageWriter.
+
+    Returns:
+        MessageWriter instance
+    """
+    global _message_writer_instance
+
+    if _message_writer_instance is None:
+        _message_writer_instance = MessageWriter()
+
+    return _message_writer_instance
@@ -0,0 +1,453 @@
+"""In-process vector store: per-user numpy shards with exact cosine search."""
+import json
+import logging
+import os
+import shutil
+import threading
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from app.config.settings import get_settings
+from app.services.embedding_cache import EmbeddingFunction, get_embedding_function
+
+try:  # Optional: approximate search for very large shards
+    import hnswlib
+except ImportError:  # pragma: no cover - depends on the environment
+    hnswlib = None
+
+try:  # Inter-process shard locks (POSIX); without it shards are only locked per process
+    import fcntl
+except ImportError:  # pragma: no cover - depends on the platform
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+_VECTORS_FILE = "vectors.npy"
+_ENTRIES_FILE = "entries.json"
+_LOCK_DIR = ".locks"
+
+
+def _empty_results() -> Dict:
+    return {'documents': [[]], 'metadatas': [[]], 'distances': [[]], 'ids': [[]]}
+
+
+def _shard_version(shard_dir: Path) -> Optional[Tuple[int, int, int]]:
+    """Identify the shard on disk; entries.json is replaced last on every write."""
+    try:
+        stat = os.stat(shard_dir / _ENTRIES_FILE)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+@dataclass
+class _UserShard:
+    """One user's memories: an L2-normalised float32 matrix plus aligned entries."""
+    ids: List[str]
+    documents: List[str]
+    metadatas: List[Dict[str, Any]]
+    vectors: np.ndarray
+    hnsw_index: Any = field(default=None, repr=False)
+    version: Optional[Tuple[int, int, int]] = field(default=None, repr=False)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+class NumpyVectorStore:
+    """
+    Vector store keeping each user's memories in their own shard.
+
+    A shard is a contiguous float32 matrix (rows L2-normalised at write time,
+    memory-mapped from ``vectors.npy``) plus an ``entries.json`` holding ids,
+    documents and metadata. Queries only touch the caller's shard and score it
+    with a single matrix-vector product, so latency tracks the user's own
+    history rather than the whole tenant base. Shards larger than
+    ``hnsw_threshold`` are searched with an in-memory HNSW index when
+    ``hnswlib`` is installed.
+
+    Several processes (uvicorn workers, the finalization worker) may share
+    the shard directory. Writes hold an exclusive ``flock`` on the user's
+    lock file and re-read the shard if another process replaced it, so a
+    read-modify-write never starts from a stale cached copy; readers reload
+    whenever the shard's file version changes.
+
+    Results use the same shape as VectorStoreService (Chroma) so callers can
+    switch backends without changes.
+    """
+
+    def __init__(
+        self,
+        shard_directory: Optional[str] = None,
+        embedding_function: Optional[EmbeddingFunction] = None,
+        hnsw_threshold: Optional[int] = None,
+    ):
+        """
+        Initialize the shard store.
+
+        Args:
+            shard_directory: Root directory for per-user shards (uses settings if None)
+            embedding_function: Callable mapping texts to vectors (defaults to the shared,
+                cached embedding function, so both backends embed identically)
+            hnsw_threshold: Shard size above which HNSW search is used (uses settings if None)
+        """
+        settings = get_settings()
+        self.root = Path(shard_directory or settings.vector_store_shard_directory)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.hnsw_threshold = hnsw_threshold if hnsw_threshold is not None else settings.vector_store_hnsw_threshold
+        self._embedding_function = embedding_function
+        self._shards: Dict[int, _UserShard] = {}
+        self._user_locks: Dict[int, threading.Lock] = {}
+        self._lock = threading.Lock()
+        # chunk_id -> user_id and session_id -> user_ids, so deletes by id/session find their shard
+        self._chunk_owners: Dict[str, int] = {}
+        self._session_owners: Dict[str, set] = {}
+        self._load_owner_index()
+        if self.hnsw_threshold and hnswlib is None:
+            logger.info("hnswlib not installed; all shards use exact search")
+        logger.info(f"NumpyVectorStore initialized at {self.root} ({len(self._chunk_owners)} memories)")
+
+    # Embedding ---------------------------------------------------------
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        if self._embedding_function is None:
+            self._embedding_function = get_embedding_function()
+        vectors = np.asarray(self._embedding_function(list(texts)), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    # Shard storage -----------------------------------------------------
+
+    def _shard_dir(self, user_id: int) -> Path:
+        return self.root / f"user_{int(user_id)}"
+
+    def _user_lock(self, user_id: int) -> threading.Lock:
+        with self._lock:
+            return self._user_locks.setdefault(int(user_id), threading.Lock())
+
+    @contextmanager
+    def _locked(self, user_id: int, shared: bool = False) -> Iterator[None]:
+        """Hold a user's shard lock across threads and processes (shared for reads)."""
+        thread_lock = nullcontext() if shared else self._user_lock(user_id)
+        with thread_lock:
+            if fcntl is None:
+                yield
+                return
+            lock_dir = self.root / _LOCK_DIR
+            lock_dir.mkdir(parents=True, exist_ok=True)
+            with open(lock_dir / f"user_{int(user_id)}.lock", "a+") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load_owner_index(self) -> None:
+        for entries_path in self.root.glob(f"user_*/{_ENTRIES_FILE}"):
+            try:
+                user_id = int(entries_path.parent.name.split("_", 1)[1])
+                entries = json.loads(entries_path.read_text())
+            except (ValueError, OSError) as e:
+                logger.warning(f"Skipping unreadable shard {entries_path.parent}: {str(e)}")
+                continue
+            self._index_owners(user_id, entries["ids"], entries["metadatas"])
+
+    def _index_owners(self, user_id: int, ids: List[str], metadatas: List[Dict]) -> None:
+        with self._lock:
+            for chunk_id, metadata in zip(ids, metadatas):
+                self._chunk_owners[chunk_id] = user_id
+                if metadata.get("session_id") is not None:
+                    self._session_owners.setdefault(metadata["session_id"], set()).add(user_id)
+
+    def _sync_owners(self, user_id: int, old: Optional[_UserShard], new: Optional[_UserShard]) -> None:
+        """Update the owner indexes for a shard that changed from `old` to `new`."""
+        old_ids = set(old.ids) if old is not None else set()
+        new_ids = set(new.ids) if new is not None else set()
+        old_sessions = {m.get("session_id") for m in old.metadatas} if old is not None else set()
+        new_sessions = {m.get("session_id") for m in new.metadatas} if new is not None else set()
+        with self._lock:
+            for chunk_id in old_ids - new_ids:
+                if self._chunk_owners.get(chunk_id) == user_id:
+                    del self._chunk_owners[chunk_id]
+            for chunk_id in new_ids - old_ids:
+                self._chunk_owners[chunk_id] = user_id
+            for session_id in old_sessions - new_sessions - {None}:
+                owners = self._session_owners.get(session_id)
+                if owners is not None:
+                    owners.discard(user_id)
+                    if not owners:
+                        del self._session_owners[session_id]
+            for session_id in new_sessions - old_sessions - {None}:
+                self._session_owners.setdefault(session_id, set()).add(user_id)
+
+    def _get_shard(self, user_id: int, locked: bool = False) -> Optional[_UserShard]:
+        """
+        Return a user's shard, reloading it if another process replaced it.
+
+        Args:
+            user_id: Shard owner
+            locked: The caller already holds the user's exclusive lock
+        """
+        user_id = int(user_id)
+        shard_dir = self._shard_dir(user_id)
+        cached = self._shards.get(user_id)
+        if cached is not None and cached.version == _shard_version(shard_dir):
+            return cached
+        with nullcontext() if locked else self._locked(user_id, shared=True):
+            version = _shard_version(shard_dir)
+            shard = None
+            if version is not None:
+                entries = json.loads((shard_dir / _ENTRIES_FILE).read_text())
+                vectors = np.load(shard_dir / _VECTORS_FILE, mmap_mode="r")
+                shard = _UserShard(entries["ids"], entries["documents"], entries["metadatas"], vectors, version=version)
+        self._cache_shard(user_id, shard)
+        return shard
+
+    def _cache_shard(self, user_id: int, shard: Optional[_UserShard]) -> None:
+        with self._lock:
+            previous = self._shards.pop(user_id, None)
+            if shard is not None:
+                self._shards[user_id] = shard
+        self._sync_owners(user_id, previous, shard)
+
+    def _write_shard(self, user_id: int, shard: _UserShard) -> None:
+        """Persist a shard atomically (write temp files, then rename) and cache it; hold the user's lock."""
+        shard_dir = self._shard_dir(user_id)
+        if not len(shard):
+            shutil.rmtree(shard_dir, ignore_errors=True)
+            self._cache_shard(int(user_id), None)
+            return
+        shard_dir.mkdir(parents=True, exist_ok=True)
+        tmp_vectors = shard_dir / f"{_VECTORS_FILE}.tmp"
+        with open(tmp_vectors, "wb") as f:
+            np.save(f, np.ascontiguousarray(shard.vectors, dtype=np.float32))
+        tmp_entries = shard_dir / f"{_ENTRIES_FILE}.tmp"
+        tmp_entries.write_text(json.dumps({
+            "ids": shard.ids,
+            "documents": shard.documents,
+            "metadatas": shard.metadatas,
+        }))
+        os.replace(tmp_vectors, shard_dir / _VECTORS_FILE)
+        os.replace(tmp_entries, shard_dir / _ENTRIES_FILE)
+        self._cache_shard(int(user_id), _UserShard(
+            shard.ids, shard.documents, shard.metadatas,
+            np.load(shard_dir / _VECTORS_FILE, mmap_mode="r"),
+            version=_shard_version(shard_dir),
+        ))
+
+    def _remove_where(self, user_id: int, keep: Callable[[str, Dict], bool]) -> int:
+        """Rewrite a user's shard keeping only entries for which keep() is true."""
+        with self._locked(user_id):
+            shard = self._get_shard(user_id, locked=True)
+            if shard is None:
+                return 0
+            rows = [i for i, (chunk_id, metadata) in enumerate(zip(shard.ids, shard.metadatas)) if keep(chunk_id, metadata)]
+            removed = len(shard) - len(rows)
+            if removed:
+                # Rewriting also prunes the removed chunk and session owners
+                self._write_shard(user_id, _UserShard(
+                    [shard.ids[i] for i in rows],
+                    [shard.documents[i] for i in rows],
+                    [shard.metadatas[i] for i in rows],
+                    np.asarray(shard.vectors)[rows],
+                ))
+            return removed
+
+    # Public API (mirrors VectorStoreService) ---------------------------
+
+    def add_memory(self, chunk_id: str, text: str, metadata: Dict) -> None:
+        """
+        Add a memory chunk to its user's shard.
+
+        Raises:
+            ValueError: If metadata doesn't include user_id
+        """
+        self.add_memories([chunk_id], [text], [metadata])
+
+    def add_memories(self, chunk_ids: List[str], texts: List[str], metadatas: List[Dict]) -> None:
+        """
+        Add several memory chunks (embedded as one batch, one shard write per user).
+
+        Raises:
+            ValueError: If the lists differ in length or any metadata lacks user_id
+        """
+        if not (len(chunk_ids) == len(texts) == len(metadatas)):
+            raise ValueError("chunk_ids, texts and metadatas must have the same length")
+        if any("user_id" not in metadata for metadata in metadatas):
+            raise ValueError("metadata must include 'user_id' for multi-user isolation")
+        if not chunk_ids:
+            return
+
+        try:
+            vectors = self._embed(texts)
+            by_user: Dict[int, List[int]] = {}
+            for i, metadata in enumerate(metadatas):
+                by_user.setdefault(int(metadata["user_id"]), []).append(i)
+
+            for user_id, rows in by_user.items():
+                with self._locked(user_id):
+                    shard = self._get_shard(user_id, locked=True)
+                    new_ids = [chunk_ids[i] for i in rows]
+                    if shard is None:
+                        shard = _UserShard([], [], [], np.empty((0, vectors.shape[1]), dtype=np.float32))
+                    if set(new_ids) & set(shard.ids):
+                        raise ValueError(f"duplicate memory ids for user {user_id}")
+                    self._write_shard(user_id, _UserShard(
+                        shard.ids + new_ids,
+                        shard.documents + [texts[i] for i in rows],
+                        shard.metadatas + [dict(metadatas[i]) for i in rows],
+                        np.vstack([np.asarray(shard.vectors), vectors[rows]]),
+                    ))
+            logger.debug(f"Added {len(chunk_ids)} memory chunks to {len(by_user)} shards")
+
+        except Exception as e:
+            logger.error(f"Failed to add {len(chunk_ids)} memory chunks: {str(e)}")
+            raise
+
+    def search_memories(
+        self,
+        query: str,
+        user_id: int,
+        limit: Optional[int] = None,
+        min_similarity: Optional[float] = None
+    ) -> Dict:
+        """
+        Search a user's shard by cosine similarity.
+
+        Returns:
+            Dictionary with 'documents', 'metadatas', 'distances' (1 - cosine) and 'ids'
+        """
+        try:
+            if limit is None or min_similarity is None:
+                settings = get_settings()
+                if limit is None:
+                    limit = settings.memory_retrieval_limit
+                if min_similarity is None:
+                    min_similarity = settings.memory_min_similarity
+
+            shard = self._get_shard(user_id)
+            if shard is None or not len(shard) or limit <= 0:
+                return _empty_results()
+
+            query_vector = self._embed([query])[0]
+            k = min(limit, len(shard))
+            if hnswlib is not None and self.hnsw_threshold and len(shard) > self.hnsw_threshold:
+                rows, similarities = self._search_hnsw(shard, query_vector, k)
+            else:
+                scores = np.asarray(shard.vectors) @ query_vector
+                rows = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+                rows = rows[np.argsort(-scores[rows])]
+                similarities = scores[rows]
+
+            results = _empty_results()
+            for row, similarity in zip(rows, similarities):
+                if min_similarity is not None and similarity < min_similarity:
+                    continue
+                results['documents'][0].append(shard.documents[row])
+                results['metadatas'][0].append(shard.metadatas[row])
+                results['distances'][0].append(float(1.0 - similarity))
+                results['ids'][0].append(shard.ids[row])
+
+            logger.debug(f"Found {len(results['documents'][0])} memories for user {user_id}")
+            return results
+
+        except Exception as e:
+            logger.error(f"Failed to search memories for user {user_id}: {str(e)}")
+            return _empty_results()
+
+    def _search_hnsw(self, shard: _UserShard, query_vector: np.ndarray, k: int):
+        """Approximate search for large shards; the index is built lazily per shard version."""
+        if shard.hnsw_index is None:
+            vectors = np.asarray(shard.vectors)
+            index = hnswlib.Index(space="ip", dim=vectors.shape[1])
+            index.init_index(max_elements=len(shard), ef_construction=200, M=16)
+            index.add_items(vectors, np.arange(len(shard)))
+            shard.hnsw_index = index
+        shard.hnsw_index.set_ef(max(50, k * 4))
+        labels, distances = shard.hnsw_index.knn_query(query_vector, k=k)
+        # hnswlib's inner-product distance is 1 - dot
+        return labels[0], 1.0 - distances[0]
+
+    def delete_memory(self, chunk_id: str) -> None:
+        """Delete a specific memory chunk."""
+        self.delete_memories([chunk_id])
+
+    def delete_memories(self, chunk_ids: List[str]) -> None:
+        """Delete several memory chunks by ID."""
+        if not chunk_ids:
+            return
+        try:
+            if any(chunk_id not in self._chunk_owners for chunk_id in chunk_ids):
+                # Possibly added by another process since this one indexed the shards
+                self._load_owner_index()
+            by_user: Dict[int, set] = {}
+            for chunk_id in chunk_ids:
+                user_id = self._chunk_owners.get(chunk_id)
+                if user_id is not None:
+                    by_user.setdefault(user_id, set()).add(chunk_id)
+            for user_id, ids in by_user.items():
+                self._remove_where(user_id, lambda chunk_id, _metadata: chunk_id not in ids)
+            logger.debug(f"Deleted {len(chunk_ids)} memory chunks")
+
+        except Exception as e:
+            logger.error(f"Failed to delete {len(chunk_ids)} memory chunks: {str(e)}")
+            raise
+
+    def delete_user_memories(self, user_id: int) -> None:
+        """Delete all memories for a specific user (drops the shard)."""
+        try:
+            self._remove_where(user_id, lambda _chunk_id, _metadata: False)
+            logger.info(f"Deleted all memories for user {user_id}")
+
+        except Exception as e:
+            logger.error(f"Failed to delete memories for user {user_id}: {str(e)}")
+            raise
+
+    def delete_session_memories(self, session_id: str) -> None:
+        """Delete all memories from a specific session."""
+        try:
+            if session_id not in self._session_owners:
+                self._load_owner_index()
+            with self._lock:
+                owners = set(self._session_owners.get(session_id, ()))
+            for user_id in owners:
+                self._remove_where(user_id, lambda _chunk_id, metadata: metadata.get("session_id") != session_id)
+            logger.debug(f"Deleted all memories for session {session_id}")
+
+        except Exception as e:
+            logger.error(f"Failed to delete memories for session {session_id}: {str(e)}")
+            raise
+
+    def get_collection_stats(self) -> Dict:
+        """Get statistics about the shard store."""
+        try:
+            return {
+                "name": "numpy_shards",
+                "count": len(self._chunk_owners),
+                "metadata": {
+                    "shards": len({user_id for user_id in self._chunk_owners.values()}),
+                    "hnsw_threshold": self.hnsw_threshold,
+                    "hnsw_available": hnswlib is not None,
+                },
+            }
+        except Exception as e:
+            logger.error(f"Failed to get collection stats: {str(e)}")
+            return {"error": str(e)}
+
+    def reset_collection(self) -> None:
+        """
+        Delete every shard.
+        WARNING: This is destructive and should only be used in development/testing.
+        """
+        with self._lock:
+            shutil.rmtree(self.root, ignore_errors=True)
+            self.root.mkdir(parents=True, exist_ok=True)
+            self._shards.clear()
+            self._chunk_owners.clear()
+            self._session_owners.clear()
+        logger.warning("Vector shards reset - all memories deleted")
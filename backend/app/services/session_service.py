@@ -1,16 +1,26 @@
 """Session service for managing chat session operations."""
+import hashlib
+import json
 import uuid
-from typing import List, Optional
+from concurrent.futures import Future
+from typing import Iterator, List, Optional, Tuple
 from datetime import timedelta, datetime, timezone
 from decimal import Decimal
 from sqlalchemy.orm import Session
+from sqlalchemy import delete, func, select
 from app.models import ChatSession, Message, WalletTransaction
+from app.prompts import get_persona_registry, prompt_version
 from app.schemas import SessionStatus, StartSessionIn, MessageIn, NotesIn, ConversationItem, HistoryOut, MessageOut, ExtendSessionOut, StartSessionOut
 from app.services.base_service import BaseService
+from app.services.deletion_service import DeletionService
 from app.repositories.session_repository import SessionRepository
 from app.repositories.message_repository import MessageRepository
+from app.repositories.persona_version_repository import PersonaVersionRepository
 from app.repositories.wallet_repository import WalletRepository, TransactionRepository
-from app.utils import now_ist, now_utc
+from app.services.history_builder import get_history_builder, ConversationWindow
+from app.services.message_writer import get_message_writer
+from app.exceptions import ValidationError
+from app.utils import decode_cursor, encode_cursor, now_ist, now_utc
 from app.config.settings import get_settings
 
 
@@ -26,6 +36,7 @@ class SessionService(BaseService):
         super().__init__(db_session)
         self.session_repository = SessionRepository(db_session)
         self.message_repository = MessageRepository(db_session)
+        self.persona_version_repository = PersonaVersionRepository(db_session)
     
     def list_user_sessions(self, user_id: int) -> List[ConversationItem]:
         """Get all chat sessions for a user.
@@ -34,16 +45,48 @@ class SessionService(BaseService):
             user_id: User ID to get sessions for
             
         Returns:
-            List of conversation items
+            List of conversation items, most recently updated first
         """
-        self.logger.debug(f"Listing sessions for user_id: {user_id}")
+        return self.list_user_sessions_page(user_id)[0]
+    
+    def list_user_sessions_page(
+        self,
+        user_id: int,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[ConversationItem], Optional[str]]:
+        """Get a page of a user's chat sessions, most recently updated first.
+        
+        Args:
+            user_id: User ID to get sessions for
+            limit: Page size (None for all remaining sessions)
+            cursor: Cursor returned with the previous page
+            
+        Returns:
+            (conversation items, cursor for the next page or None)
+            
+        Raises:
+            ValidationError: If the cursor is malformed
+        """
+        self.logger.debug(f"Listing sessions for user_id: {user_id} (limit: {limit})")
         
-        sessions = self.session_repository.find_by_user_id(user_id)
+        before = None
+        if cursor:
+            updated_at, session_pk = self._decode_cursor(cursor, 2)
+            try:
+                before = (datetime.fromisoformat(updated_at), int(session_pk))
+            except (TypeError, ValueError):
+                raise ValidationError("Invalid cursor", field="cursor")
         
-        # Sort by updated_at desc since find_by_criteria sorts by PK
-        sessions.sort(key=lambda s: s.updated_at, reverse=True)
+        sessions = self.session_repository.find_page_by_user_id(
+            user_id, limit=limit + 1 if limit else None, before=before
+        )
+        next_cursor = None
+        if limit and len(sessions) > limit:
+            sessions = sessions[:limit]
+            next_cursor = encode_cursor(sessions[-1].updated_at.isoformat(), sessions[-1].id)
         
-        return [
+        items = [
             ConversationItem(
                 session_id=session.session_id,
                 category=session.category,
@@ -54,6 +97,7 @@ class SessionService(BaseService):
             )
             for session in sessions
         ]
+        return items, next_cursor
     
     def create_session(self, user_id: int, category: str, system_prompt: str) -> StartSessionOut:
         """Create a new chat session.
@@ -61,7 +105,8 @@ class SessionService(BaseService):
         Args:
             user_id: User ID creating the session
             category: Session category
-            system_prompt: System prompt for the session
+            system_prompt: System prompt for the session (stored once per distinct
+                prompt as a PersonaVersion and referenced by the session)
             
         Returns:
             StartSessionOut with session details and timer info
@@ -74,16 +119,14 @@ class SessionService(BaseService):
         session_id = uuid.uuid4().hex
         
         try:
+            persona_version = get_persona_registry().register_prompt(system_prompt)
+            self.persona_version_repository.ensure(persona_version, category, system_prompt)
+
             # Determine eligibility for one-time free session using durable marker
             start_time = now_utc()
             wallet_repo = WalletRepository(self.db)
             tx_repo = TransactionRepository(self.db)
             wallet = wallet_repo.find_by_user_id(user_id)
-            if not wallet:
-                from app.models import Wallet
-                wallet = Wallet(user_id=user_id, balance=Decimal("0.0000"), reserved=Decimal("0.0000"), currency=get_settings().wallet_currency)
-                wallet_repo.create(wallet)
-
             has_used_free = tx_repo.user_has_transaction_of_type(user_id, "free_session")
 
             if not has_used_free:
@@ -107,33 +150,32 @@ class SessionService(BaseService):
                 session_end_time=end_time,
                 duration_seconds=default_duration,
                 status=status,
+                persona_version=persona_version,
             )
-            chat_session = self.session_repository.create(chat_session)
-            
-            # Add system message
-            system_message = Message(
-                session_id=session_id,
-                role="system",
-                content=system_prompt,
-                created_at=now_utc()
-            )
-            self.message_repository.create(system_message)
+            # Wallet, session and free-session marker commit together
+            with self.unit_of_work():
+                if not wallet:
+                    from app.models import Wallet
+                    wallet = Wallet(user_id=user_id, balance=Decimal("0.0000"), reserved=Decimal("0.0000"), currency=get_settings().wallet_currency)
+                    wallet_repo.create(wallet)
+
+                chat_session = self.session_repository.create(chat_session)
+                
+                # If this was the user's first (free) session, record a marker transaction
+                if not has_used_free:
+                    tx = WalletTransaction(
+                        wallet_id=wallet.id,
+                        user_id=user_id,
+                        type="free_session",
+                        amount=Decimal("0.0000"),
+                        balance_after=wallet.balance,
+                        reference_id=f"free:{session_id}",
+                        meta={"session_id": session_id, "duration_seconds": default_duration},
+                    )
+                    tx_repo.create(tx)
             
             self.logger.info(f"Session created successfully: {session_id}")
             
-            # If this was the user's first (free) session, record a marker transaction
-            if not has_used_free:
-                tx = WalletTransaction(
-                    wallet_id=wallet.id,
-                    user_id=user_id,
-                    type="free_session",
-                    amount=Decimal("0.0000"),
-                    balance_after=wallet.balance,
-                    reference_id=f"free:{session_id}",
-                    meta={"session_id": session_id, "duration_seconds": default_duration},
-                )
-                tx_repo.create(tx)
-            
             return StartSessionOut(
                 session_id=session_id,
                 session_start_time=start_time,
@@ -150,36 +192,133 @@ class SessionService(BaseService):
             self.logger.error(f"Failed to create session: {str(e)}")
             raise Exception(f"Failed to create session: {str(e)}")
     
-    def get_session_history(self, session_id: str, user_id: int) -> HistoryOut:
+    def get_session_history(
+        self,
+        session_id: str,
+        user_id: int,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None
+    ) -> HistoryOut:
         """Get chat history for a session.
         
         Args:
             session_id: Session ID to get history for
             user_id: User ID (for authorization)
+            limit: Page size (None for all remaining messages)
+            cursor: Cursor returned with the previous page
             
         Returns:
-            Session history with messages
+            Session history with messages (next_cursor set if more follow)
             
         Raises:
             ValueError: If session not found
+            ValidationError: If the cursor is malformed
         """
         self.logger.info(f"Retrieving history for session: {session_id}, user_id: {user_id}")
         
-        # Find session
-        chat_session = self.session_repository.find_by_session_and_user(session_id, user_id)
+        chat_session = self._get_owned_session(session_id, user_id)
+        after_id = self._decode_message_cursor(cursor)
         
-        if not chat_session:
-            self.logger.warning(f"Session not found: {session_id} for user: {user_id}")
-            raise ValueError("Session not found")
+        # Messages in insertion order, read via the (session_id, id) index
+        messages = self.message_repository.find_by_session_after_id(
+            session_id, after_id, limit=limit + 1 if limit else None
+        )
+        next_cursor = None
+        if limit and len(messages) > limit:
+            messages = messages[:limit]
+            next_cursor = encode_cursor(messages[-1].id)
         
-        # Get messages
-        messages = self.message_repository.find_by_session_id(session_id)
+        self.logger.info(f"Retrieved {len(messages)} messages for session: {session_id}")
         
-        # Sort by created_at asc since find_by_criteria sorts by PK
-        messages.sort(key=lambda m: m.created_at)
+        return self._history_out(chat_session, messages, next_cursor)
+    
+    def get_history_etag(
+        self,
+        session_id: str,
+        user_id: int,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None
+    ) -> str:
+        """Compute the ETag of a history response without loading its messages.
+        
+        Changes whenever a message is added or removed, the session's timing
+        or status changes, or a different page is requested.
         
-        self.logger.info(f"Retrieved {len(messages)} messages for session: {session_id}")
+        Args:
+            session_id: Session ID
+            user_id: User ID (for authorization)
+            limit: Requested page size
+            cursor: Requested page cursor
+            
+        Returns:
+            Quoted ETag value
+            
+        Raises:
+            ValueError: If session not found
+        """
+        chat_session = self._get_owned_session(session_id, user_id)
+        count, max_id = self.message_repository.get_session_stats(session_id)
+        basis = "|".join(str(value) for value in (
+            session_id,
+            chat_session.category,
+            chat_session.session_start_time,
+            chat_session.session_end_time,
+            chat_session.duration_seconds,
+            self._get_session_status(chat_session),
+            self._calculate_remaining_seconds(chat_session),
+            count,
+            max_id,
+            limit,
+            cursor,
+        ))
+        return '"' + hashlib.sha256(basis.encode("utf-8")).hexdigest()[:32] + '"'
+    
+    def export_session_history(self, session_id: str, user_id: int, batch_size: int = 500) -> Iterator[bytes]:
+        """Stream a session's full history as NDJSON.
         
+        The first line describes the session ("type": "session"); each
+        following line is one message ("type": "message"). Messages are read
+        in keyset batches so memory use doesn't grow with the session.
+        
+        Args:
+            session_id: Session ID to export
+            user_id: User ID (for authorization)
+            batch_size: Messages read per query
+            
+        Yields:
+            NDJSON lines as bytes
+            
+        Raises:
+            ValueError: If session not found
+        """
+        chat_session = self._get_owned_session(session_id, user_id)
+        header = self._history_out(chat_session, []).model_dump(mode="json", exclude={"messages", "next_cursor"})
+        yield (json.dumps({"type": "session", **header}) + "\n").encode("utf-8")
+        
+        after_id = 0
+        while True:
+            batch = self.message_repository.find_by_session_after_id(session_id, after_id, limit=batch_size)
+            for message in batch:
+                yield (json.dumps({
+                    "type": "message",
+                    "id": message.id,
+                    "role": message.role,
+                    "content": message.content,
+                    "truncated": bool(message.truncated),
+                    "created_at": message.created_at.isoformat() if message.created_at else None,
+                }) + "\n").encode("utf-8")
+            if len(batch) < batch_size:
+                break
+            after_id = batch[-1].id
+    
+    def _get_owned_session(self, session_id: str, user_id: int) -> ChatSession:
+        chat_session = self.session_repository.find_by_session_and_user(session_id, user_id)
+        if not chat_session:
+            self.logger.warning(f"Session not found: {session_id} for user: {user_id}")
+            raise ValueError("Session not found")
+        return chat_session
+    
+    def _history_out(self, chat_session: ChatSession, messages: List[Message], next_cursor: Optional[str] = None) -> HistoryOut:
         return HistoryOut(
             session_id=chat_session.session_id,
             category=chat_session.category,
@@ -188,8 +327,23 @@ class SessionService(BaseService):
             duration_seconds=chat_session.duration_seconds,
             status=self._get_session_status(chat_session),
             remaining_seconds=self._calculate_remaining_seconds(chat_session),
-            messages=[MessageOut(role=m.role, content=m.content) for m in messages],
+            messages=[MessageOut(role=m.role, content=m.content, truncated=bool(m.truncated)) for m in messages],
+            next_cursor=next_cursor,
         )
+    
+    def _decode_cursor(self, cursor: str, size: int) -> list:
+        try:
+            return decode_cursor(cursor, size)
+        except ValueError:
+            raise ValidationError("Invalid cursor", field="cursor")
+    
+    def _decode_message_cursor(self, cursor: Optional[str]) -> int:
+        if not cursor:
+            return 0
+        (after_id,) = self._decode_cursor(cursor, 1)
+        if not isinstance(after_id, int):
+            raise ValidationError("Invalid cursor", field="cursor")
+        return after_id
 
     def extend_session(self, session_id: str, user_id: int, duration_seconds: int, request_id: Optional[str] = None) -> ExtendSessionOut:
         """Extend a session by duration after checking and deducting wallet balance.
@@ -232,64 +386,60 @@ class SessionService(BaseService):
         wallet_repo = WalletRepository(self.db)
         tx_repo = TransactionRepository(self.db)
         wallet = wallet_repo.find_by_user_id(user_id)
-        if not wallet:
-            # create wallet with zero if somehow missing
-            from app.models import Wallet
-            wallet = Wallet(user_id=user_id, balance=Decimal("0.0000"), reserved=Decimal("0.0000"), currency=settings.wallet_currency)
-            wallet_repo.create(wallet)
+        was_ended = chat_session.status == "ended"
 
-        if wallet.balance < amount:
-            raise RuntimeError("INSUFFICIENT_FUNDS")
+        # Debit, ledger entry and session extension commit together (or not at all)
+        with self.unit_of_work():
+            if not wallet:
+                # create wallet with zero if somehow missing
+                from app.models import Wallet
+                wallet = Wallet(user_id=user_id, balance=Decimal("0.0000"), reserved=Decimal("0.0000"), currency=settings.wallet_currency)
+                wallet_repo.create(wallet)
 
-        # Deduct and record transaction atomically
-        new_balance = (wallet.balance - amount).quantize(Decimal("0.0000"))
-        wallet.balance = new_balance
-        wallet_repo.update(wallet)
+            if wallet.balance < amount:
+                raise RuntimeError("INSUFFICIENT_FUNDS")
 
-        tx = WalletTransaction(
-            wallet_id=wallet.id,
-            user_id=user_id,
-            type="charge",
-            amount=-amount,
-            balance_after=new_balance,
-            reference_id=f"extend:{session_id}",
-            meta={"duration_seconds": int(duration_seconds), "unit_price": str(unit_price), "request_id": request_id} if request_id else {"duration_seconds": int(duration_seconds), "unit_price": str(unit_price),"category": chat_session.category},
-        )
-        tx_repo.create(tx)
-        
-        # Store memory chunks if session was previously ended/expired
-        # (we want to preserve the conversation before extending)
-        settings = get_settings()
-        memory_enabled = settings.memory_enabled
-        if memory_enabled and chat_session.status == "ended":
+            new_balance = (wallet.balance - amount).quantize(Decimal("0.0000"))
+            wallet.balance = new_balance
+            wallet_repo.update(wallet)
+
+            tx = WalletTransaction(
+                wallet_id=wallet.id,
+                user_id=user_id,
+                type="charge",
+                amount=-amount,
+                balance_after=new_balance,
+                reference_id=f"extend:{session_id}",
+                meta={"duration_seconds": int(duration_seconds), "unit_price": str(unit_price), "request_id": request_id} if request_id else {"duration_seconds": int(duration_seconds), "unit_price": str(unit_price),"category": chat_session.category},
+            )
+            tx_repo.create(tx)
+
+            # Update session timing
+            now = now_utc()
+            # Normalize potential naive datetimes from SQLite
+            end = chat_session.session_end_time
+            if end is not None and end.tzinfo is None:
+                end = end.replace(tzinfo=timezone.utc)
+            # If currently active and end time is in future, extend from existing end; else start from now
+            base = end if end and end > now else now
+            new_end = base + timedelta(seconds=duration_seconds)
+            chat_session.session_end_time = new_end
+            chat_session.duration_seconds = duration_seconds
+            chat_session.status = "active"
+            chat_session.updated_at = now
+            self.session_repository.update(chat_session)
+
+        # Index the conversation so far if the session had ended; the background
+        # worker does the chunking/embedding so the extension doesn't wait on it
+        if was_ended:
             try:
-                from app.services.memory_chunker import MemoryChunkerService
-                
-                chunker = MemoryChunkerService(self.db)
-                messages = self.message_repository.find_by_session_id(session_id)
+                from app.services.memory_finalizer import enqueue_session_finalization, get_memory_finalizer
                 
-                # Only chunk if there are meaningful messages (more than just system prompt)
-                if len(messages) > 1:
-                    chunker.chunk_and_store_session(session_id, user_id, messages)
-                    self.logger.info(f"Stored memory chunks for session {session_id} before extension")
+                if enqueue_session_finalization(self.db, session_id, user_id, force=True):
+                    get_memory_finalizer().notify()
             except Exception as e:
-                self.logger.warning(f"Failed to store memory chunks for session {session_id}: {str(e)}")
-                # Don't fail the extension if memory storage fails
-
-        # Update session timing
-        now = now_utc()
-        # Normalize potential naive datetimes from SQLite
-        end = chat_session.session_end_time
-        if end is not None and end.tzinfo is None:
-            end = end.replace(tzinfo=timezone.utc)
-        # If currently active and end time is in future, extend from existing end; else start from now
-        base = end if end and end > now else now
-        new_end = base + timedelta(seconds=duration_seconds)
-        chat_session.session_end_time = new_end
-        chat_session.duration_seconds = duration_seconds
-        chat_session.status = "active"
-        chat_session.updated_at = now
-        self.session_repository.update(chat_session)
+                self.logger.warning(f"Failed to queue memory finalization for session {session_id}: {str(e)}")
+                # Don't fail the extension if memory indexing can't be queued
 
         remaining_seconds = max(0, int((new_end - now).total_seconds()))
 
@@ -331,19 +481,33 @@ class SessionService(BaseService):
             content=content,
             created_at=now_utc()
         )
-        self.message_repository.create(user_message)
-        
-        # Update session timestamp
-        chat_session.updated_at = now_utc()
-        self.session_repository.update(chat_session)
+        writer = get_message_writer()
+        if writer.running:
+            # Batched with other requests' writes; wait for the commit so the
+            # history window built next includes this message
+            writer.submit(user_message, touch_session=True).result(timeout=writer.write_timeout)
+            self.logger.debug(f"User message added to session: {session_id}")
+            return
+        # Message insert and session timestamp bump share one commit
+        try:
+            with self.unit_of_work():
+                self.message_repository.create(user_message)
+                chat_session.updated_at = now_utc()
+                self.session_repository.update(chat_session)
+                # Appended after the flush (ID assigned) but before commit expires the row
+                get_history_builder().append(session_id, user_message)
+        except Exception:
+            get_history_builder().invalidate(session_id)
+            raise
         self.logger.debug(f"User message added to session: {session_id}")
     
-    def add_assistant_message(self, session_id: str, content: str) -> None:
+    def add_assistant_message(self, session_id: str, content: str, truncated: bool = False) -> None:
         """Add an assistant message to a session.
         
         Args:
             session_id: Session ID to add message to
             content: Message content
+            truncated: The reply was cut short by a client disconnect
         """
         self.logger.debug(f"Adding assistant message to session: {session_id}")
         
@@ -351,11 +515,48 @@ class SessionService(BaseService):
             session_id=session_id,
             role="assistant",
             content=content,
-            created_at=now_utc()
+            created_at=now_utc(),
+            truncated=truncated,
         )
-        self.message_repository.create(assistant_message)
+        writer = get_message_writer()
+        if writer.running:
+            writer.submit(assistant_message).result(timeout=writer.write_timeout)
+            self.logger.debug(f"Assistant message added to session: {session_id}")
+            return
+        try:
+            with self.unit_of_work():
+                self.message_repository.create(assistant_message)
+                get_history_builder().append(session_id, assistant_message)
+        except Exception:
+            get_history_builder().invalidate(session_id)
+            raise
         self.logger.debug(f"Assistant message added to session: {session_id}")
     
+    def submit_assistant_message(self, session_id: str, content: str, truncated: bool = False) -> Optional["Future[int]"]:
+        """Queue an assistant message on the write-behind writer without waiting.
+        
+        Args:
+            session_id: Session ID to add message to
+            content: Message content
+            truncated: The reply was cut short by a client disconnect
+            
+        Returns:
+            Pending write resolving to the message ID once committed, or None
+            if the writer is not running (use add_assistant_message instead)
+        """
+        writer = get_message_writer()
+        if not writer.running:
+            return None
+        assistant_message = Message(
+            session_id=session_id,
+            role="assistant",
+            content=content,
+            created_at=now_utc(),
+            truncated=truncated,
+        )
+        self.logger.debug(f"Queued assistant message for session: {session_id}")
+        return writer.submit(assistant_message)
+    
     def get_conversation_history(self, session_id: str) -> List[dict]:
         """Get conversation history for LLM processing.
         
@@ -363,19 +564,108 @@ class SessionService(BaseService):
             session_id: Session ID to get history for
             
         Returns:
-            List of message dictionaries for LLM
+            List of message dictionaries for LLM, trimmed to the token budget
+        """
+        return self.build_conversation_window(session_id).messages
+    
+    def build_conversation_window(self, session_id: str, chat_session: Optional[ChatSession] = None) -> ConversationWindow:
+        """Build the token-bounded conversation window for LLM processing.
+        
+        Uses the process-wide history cache so only new messages are read from
+        the database after the first turn. The system prompt comes from the
+        session's persona version.
+        
+        Args:
+            session_id: Session ID to get history for
+            chat_session: The session, if the caller has already loaded it
+            
+        Returns:
+            ConversationWindow with messages and prompt token count
         """
         self.logger.debug(f"Building conversation history for session: {session_id}")
         
-        messages = self.message_repository.find_by_session_id(session_id)
+        if chat_session is None:
+            chat_session = self.session_repository.find_by_id(session_id)
+        system_prompt = self.resolve_system_prompt(chat_session) if chat_session else None
+        window = get_history_builder().build(session_id, self.message_repository, system_prompt=system_prompt)
+        self.logger.debug(
+            f"Built conversation history with {len(window.messages)} messages, "
+            f"{window.prompt_tokens} tokens ({window.dropped_messages} older messages trimmed)"
+        )
         
-        # Sort by created_at asc since find_by_criteria sorts by PK
-        messages.sort(key=lambda m: m.created_at)
+        return window
+    
+    def resolve_system_prompt(self, chat_session: ChatSession) -> Optional[str]:
+        """Get the system prompt a session references.
         
-        wire = [{"role": m.role, "content": m.content} for m in messages]
-        self.logger.debug(f"Built conversation history with {len(wire)} messages")
+        Resolved from the in-process persona registry; versions it doesn't know
+        yet (e.g. an edited persona's older prompt) are read once from the
+        database and then remembered.
         
-        return wire
+        Args:
+            chat_session: Session to resolve the prompt for
+            
+        Returns:
+            System prompt, or None for sessions that store it as a message row
+        """
+        version_id = chat_session.persona_version
+        if not version_id:
+            return None
+        registry = get_persona_registry()
+        prompt = registry.resolve_version(version_id)
+        if prompt is None:
+            version = self.persona_version_repository.find_by_id(version_id)
+            if version is None:
+                self.logger.error(f"Persona version {version_id} not found for session {chat_session.session_id}")
+                return None
+            registry.register_prompt(version.prompt)
+            prompt = version.prompt
+        return prompt
+    
+    def migrate_system_messages(self, batch_size: int = 500) -> int:
+        """Move stored system-message rows to persona versions.
+        
+        For each session without a persona version, its first system message
+        is stored once as a PersonaVersion, referenced from the session and
+        deleted. Runs in batches, committing after each one.
+        
+        Args:
+            batch_size: Sessions migrated per transaction
+            
+        Returns:
+            Number of sessions migrated
+        """
+        first_system_ids = (
+            select(func.min(Message.id).label("id"))
+            .where(Message.role == "system")
+            .group_by(Message.session_id)
+            .subquery()
+        )
+        query = (
+            select(Message, ChatSession)
+            .join(first_system_ids, Message.id == first_system_ids.c.id)
+            .join(ChatSession, ChatSession.session_id == Message.session_id)
+            .where(ChatSession.persona_version.is_(None))
+            .order_by(Message.id)
+            .limit(batch_size)
+        )
+        migrated = 0
+        while True:
+            rows = self.db.execute(query).all()
+            if not rows:
+                break
+            with self.unit_of_work():
+                for message, chat_session in rows:
+                    version_id = prompt_version(message.content)
+                    self.persona_version_repository.ensure(version_id, chat_session.category, message.content)
+                    chat_session.persona_version = version_id
+                    self.session_repository.update(chat_session)
+                self.db.execute(delete(Message).where(Message.id.in_([message.id for message, _ in rows])))
+            for message, _ in rows:
+                get_history_builder().invalidate(message.session_id)
+            migrated += len(rows)
+            self.logger.info(f"Migrated system prompts for {migrated} sessions")
+        return migrated
     
     def update_session_notes(self, session_id: str, notes: str, user_id: int) -> None:
         """Update session notes.
@@ -403,7 +693,7 @@ class SessionService(BaseService):
         self.logger.debug(f"Notes updated for session: {session_id}")
     
     def delete_session(self, session_id: str, user_id: int) -> None:
-        """Delete a chat session and all its messages.
+        """Delete a chat session with its messages, memories, charges and feedback.
         
         Args:
             session_id: Session ID to delete
@@ -413,19 +703,7 @@ class SessionService(BaseService):
             ValueError: If session not found
         """
         self.logger.info(f"Deleting session: {session_id} for user: {user_id}")
-        
-        chat_session = self.session_repository.find_by_session_and_user(session_id, user_id)
-        
-        if not chat_session:
-            self.logger.warning(f"Session not found: {session_id} for user: {user_id}")
-            raise ValueError("Session not found")
-        
-        # Delete all messages for this session
-        self.message_repository.delete_by_session_id(session_id)
-        
-        # Delete the chat session
-        self.session_repository.delete(session_id)
-        
+        DeletionService(self.db).delete_session(session_id, user_id)
         self.logger.info(f"Session deleted: {session_id}")
     
     def find_session_by_id(self, session_id: str, user_id: int) -> Optional[ChatSession]:
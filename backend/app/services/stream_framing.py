@@ -0,0 +1,234 @@
+"""Streamed LLM replies: token iteration, coalescing and NDJSON/SSE framing."""
+import asyncio
+import inspect
+import json
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional
+
+import anyio
+from starlette.concurrency import run_in_threadpool
+
+try:  # Optional: faster JSON string escaping for stream frames
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+
+# Longest we wait for a cancelled token read to unwind and close its upstream stream
+CLOSE_TIMEOUT_SECONDS = 5.0
+
+_STREAM_END = object()
+
+STREAM_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream",
+}
+
+
+def _json_string(text: str) -> bytes:
+    """Encode a str as a JSON string literal."""
+    if orjson is not None:
+        return orjson.dumps(text)
+    return json.dumps(text, ensure_ascii=False).encode("utf-8")
+
+
+def open_token_stream(streamer: Any, messages: List[Dict[str, str]], **kwargs) -> AsyncIterator[str]:
+    """
+    Return an async token iterator for any LLM streamer.
+
+    Streamers exposing a native ``astream_chat`` async generator run on the
+    event loop; sync-only streamers are drained through the threadpool.
+
+    Args:
+        streamer: LLM streamer instance
+        messages: Conversation context to send
+
+    Returns:
+        Async iterator of text deltas
+    """
+    astream = getattr(streamer, "astream_chat", None)
+    if astream is not None and inspect.isasyncgenfunction(astream):
+        return astream(messages, **kwargs)
+    return iterate_sync_stream(streamer.stream_chat(messages, **kwargs))
+
+
+async def iterate_sync_stream(tokens: Iterable[str]) -> AsyncIterator[str]:
+    """
+    Drain a sync token iterator through the threadpool, one token per call.
+
+    Closing this generator (or cancelling the read) closes the sync
+    iterator, which exits the provider's stream context and closes its HTTP
+    response, so the worker thread stops after the token it is waiting on.
+    """
+    iterator = iter(tokens)
+    # A cancelled read leaves its thread inside next(); close() waits for it to return
+    lock = threading.Lock()
+
+    def pull():
+        with lock:
+            return next(iterator, _STREAM_END)
+
+    def close():
+        with lock:
+            getattr(iterator, "close", lambda: None)()
+
+    try:
+        while True:
+            token = await run_in_threadpool(pull)
+            if token is _STREAM_END:
+                return
+            yield token
+    finally:
+        # Submitted straight to the executor (and shielded) so the close runs
+        # even while this task is being cancelled
+        closing = asyncio.get_running_loop().run_in_executor(None, close)
+        with anyio.CancelScope(shield=True):
+            await asyncio.shield(closing)
+
+
+class StreamFramer:
+    """
+    Encodes stream events as NDJSON lines or Server-Sent Events.
+
+    Both formats carry the same JSON objects ({"type": "delta", "content":
+    ...} and {"type": "done"}), so clients parse one payload either way.
+    Frames are built from pre-encoded byte templates; only the delta text
+    itself is JSON-escaped per frame.
+    """
+
+    def __init__(self, stream_format: str = "ndjson"):
+        """
+        Initialize the framer.
+
+        Args:
+            stream_format: "ndjson" or "sse"
+
+        Raises:
+            ValueError: If the format is not one of STREAM_FORMATS
+        """
+        if stream_format not in STREAM_FORMATS:
+            raise ValueError(f"Invalid stream format: {stream_format}")
+        self.format = stream_format
+        self.media_type = STREAM_FORMATS[stream_format]
+        if stream_format == "sse":
+            self._prefix, self._suffix = b"data: ", b"\n\n"
+        else:
+            self._prefix, self._suffix = b"", b"\n"
+        self._delta_prefix = self._prefix + b'{"type":"delta","content":'
+        self._delta_suffix = b"}" + self._suffix
+        self._done = self._prefix + b'{"type":"done"}' + self._suffix
+
+    def delta(self, text: str) -> bytes:
+        """Frame a chunk of reply text."""
+        return self._delta_prefix + _json_string(text) + self._delta_suffix
+
+    def done(self) -> bytes:
+        """Frame the end-of-reply marker."""
+        return self._done
+
+    @property
+    def headers(self):
+        """Extra response headers for the format (SSE must not be buffered by proxies)."""
+        if self.format == "sse":
+            return {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        return {}
+
+
+async def coalesce_tokens(
+    tokens: AsyncIterator[str],
+    max_chars: int,
+    max_delay_ms: float,
+) -> AsyncIterator[str]:
+    """
+    Merge consecutive tokens into larger chunks.
+
+    A chunk is emitted once it holds `max_chars` characters or its first
+    token has waited `max_delay_ms`, whichever comes first; a token that
+    arrives after a pause is never held back longer than `max_delay_ms`.
+    With max_delay_ms <= 0 tokens are passed through unchanged.
+
+    When the consumer stops early (closed or cancelled, e.g. on a client
+    disconnect) the in-flight read is cancelled and the source is closed,
+    so provider streams release their upstream HTTP response right away.
+
+    Args:
+        tokens: Async iterator of text deltas
+        max_chars: Size bound per chunk
+        max_delay_ms: Time bound per chunk
+
+    Yields:
+        Coalesced text chunks (their concatenation equals the input)
+    """
+    iterator = tokens.__aiter__()
+    if max_delay_ms <= 0:
+        try:
+            async for token in iterator:
+                yield token
+        finally:
+            await close_token_stream(iterator)
+        return
+
+    max_delay = max_delay_ms / 1000.0
+    parts = []
+    size = 0
+    started = 0.0
+    pending: Optional[asyncio.Future] = None
+    try:
+        while True:
+            if not parts:
+                # Nothing buffered: wait as long as it takes for the next token
+                try:
+                    token = await (pending if pending is not None else iterator.__anext__())
+                except StopAsyncIteration:
+                    return
+                pending = None
+                started = time.monotonic()
+            else:
+                if pending is None:
+                    pending = asyncio.ensure_future(iterator.__anext__())
+                remaining = max_delay - (time.monotonic() - started)
+                done, _ = await asyncio.wait({pending}, timeout=max(remaining, 0))
+                if not done:
+                    # Window elapsed: emit what we have and keep waiting on the same read
+                    yield "".join(parts)
+                    parts, size = [], 0
+                    continue
+                try:
+                    token = pending.result()
+                except StopAsyncIteration:
+                    pending = None
+                    break
+                except Exception:
+                    # Deliver what the source produced before it failed
+                    pending = None
+                    yield "".join(parts)
+                    raise
+                pending = None
+            parts.append(token)
+            size += len(token)
+            if size >= max_chars or time.monotonic() - started >= max_delay:
+                yield "".join(parts)
+                parts, size = [], 0
+        if parts:
+            yield "".join(parts)
+    finally:
+        await close_token_stream(iterator, pending)
+
+
+async def close_token_stream(iterator: AsyncIterator[str], pending: Optional[asyncio.Future] = None) -> None:
+    """Cancel an in-flight read and close the token source.
+
+    Shielded so it completes even while the consumer is being cancelled.
+
+    Args:
+        iterator: Token iterator to close
+        pending: Outstanding ``__anext__`` future on it, if any
+    """
+    with anyio.move_on_after(CLOSE_TIMEOUT_SECONDS, shield=True):
+        if pending is not None and not pending.done():
+            pending.cancel()
+            await asyncio.wait({pending})
+        aclose = getattr(iterator, "aclose", None)
+        if aclose is not None:
+            await aclose()
@@ -98,15 +98,17 @@ class UserService(BaseService):
             created_at=now_utc(),
         )
 
-        created_user = self.user_repository.create(user)
-        self.logger.info(f"User created successfully: {created_user.login_id} (ID: {created_user.id})")
-
-        # Create wallet with initial balance
-        self.logger.info(f"Creating wallet for new user: {created_user.login_id}")
-        wallet_service = WalletService(self.db)
-        wallet = wallet_service.create_wallet_with_bonus(created_user.id)
-        self.logger.info(f"Wallet created with initial balance of {wallet.balance} for user: {created_user.login_id}")
-
+        # User row and wallet (with signup bonus) commit together
+        with self.unit_of_work():
+            created_user = self.user_repository.create(user)
+            self.logger.info(f"User created successfully: {created_user.login_id} (ID: {created_user.id})")
+
+            # Create wallet with initial balance
+            self.logger.info(f"Creating wallet for new user: {created_user.login_id}")
+            wallet_service = WalletService(self.db)
+            wallet = wallet_service.create_wallet_with_bonus(created_user.id)
+            self.logger.info(f"Wallet created with initial balance of {wallet.balance} for user: {created_user.login_id}")
+        
         return created_user
     
     def authenticate_user(self, login_id: str, password: str) -> User:
@@ -283,14 +285,16 @@ class UserService(BaseService):
             created_at=now_utc(),
         )
         
-        created_user = self.user_repository.create(user)
-        self.logger.info(f"Google user created successfully: {created_user.login_id} (ID: {created_user.id})")
+        # User row and wallet (with signup bonus) commit together
+        with self.unit_of_work():
+            created_user = self.user_repository.create(user)
+            self.logger.info(f"Google user created successfully: {created_user.login_id} (ID: {created_user.id})")
         
-        # Create wallet with initial balance
-        self.logger.info(f"Creating wallet for new Google user: {created_user.login_id}")
-        wallet_service = WalletService(self.db)
-        wallet = wallet_service.create_wallet_with_bonus(created_user.id)
-        self.logger.info(f"Wallet created with initial balance of {wallet.balance} for user: {created_user.login_id}")
+            # Create wallet with initial balance
+            self.logger.info(f"Creating wallet for new Google user: {created_user.login_id}")
+            wallet_service = WalletService(self.db)
+            wallet = wallet_service.create_wallet_with_bonus(created_user.id)
+            self.logger.info(f"Wallet created with initial balance of {wallet.balance} for user: {created_user.login_id}")
         
         return created_user
     
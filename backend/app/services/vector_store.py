@@ -1,25 +1,78 @@
 """Vector store service for managing ChromaDB memory storage."""
 import chromadb
 from chromadb.config import Settings
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Protocol
 import logging
 import os
 from app.config.settings import get_settings
+from app.services.embedding_cache import EmbeddingFunction, get_embedding_function
 
 logger = logging.getLogger(__name__)
 
 
+class VectorStore(Protocol):
+    """Protocol for memory vector store backends."""
+    
+    def add_memory(self, chunk_id: str, text: str, metadata: Dict) -> None:
+        """Add one memory chunk (metadata must include user_id)."""
+        ...
+    
+    def add_memories(self, chunk_ids: List[str], texts: List[str], metadatas: List[Dict]) -> None:
+        """Add several memory chunks in one call."""
+        ...
+    
+    def search_memories(
+        self,
+        query: str,
+        user_id: int,
+        limit: Optional[int] = None,
+        min_similarity: Optional[float] = None
+    ) -> Dict:
+        """Return a user's most similar memories as 'documents', 'metadatas', 'distances' and 'ids'."""
+        ...
+    
+    def delete_memory(self, chunk_id: str) -> None:
+        """Delete a specific memory chunk."""
+        ...
+    
+    def delete_memories(self, chunk_ids: List[str]) -> None:
+        """Delete several memory chunks by ID."""
+        ...
+    
+    def delete_user_memories(self, user_id: int) -> None:
+        """Delete all memories for a user."""
+        ...
+    
+    def delete_session_memories(self, session_id: str) -> None:
+        """Delete all memories from a session."""
+        ...
+    
+    def get_collection_stats(self) -> Dict:
+        """Get statistics about the store."""
+        ...
+    
+    def reset_collection(self) -> None:
+        """Delete every memory (development/testing only)."""
+        ...
+
+
 class VectorStoreService:
     """Service for managing vector embeddings in ChromaDB."""
     
-    def __init__(self, persist_directory: Optional[str] = None):
+    def __init__(self, persist_directory: Optional[str] = None, embedding_function: Optional[EmbeddingFunction] = None):
         """
         Initialize ChromaDB client with persistent storage.
         
+        Embeddings are computed here (through the shared embedding cache by
+        default) and passed to Chroma, so repeated texts are not re-embedded.
+        
         Args:
             persist_directory: Directory path for ChromaDB persistence (uses settings if None)
+            embedding_function: Callable mapping texts to vectors (uses the cached default if None)
         """
         try:
+            self.embedding_function = embedding_function or get_embedding_function()
+            
             # Get persist directory from settings if not provided
             if persist_directory is None:
                 settings = get_settings()
@@ -65,7 +118,8 @@ class VectorStoreService:
             self.collection.add(
                 ids=[chunk_id],
                 documents=[text],
-                metadatas=[metadata]
+                metadatas=[metadata],
+                embeddings=self.embedding_function([text])
             )
             logger.debug(f"Added memory chunk {chunk_id} for user {metadata['user_id']}")
             
@@ -73,6 +127,38 @@ class VectorStoreService:
             logger.error(f"Failed to add memory chunk {chunk_id}: {str(e)}")
             raise
     
+    def add_memories(self, chunk_ids: List[str], texts: List[str], metadatas: List[Dict]) -> None:
+        """
+        Add several memory chunks in one call (embeddings computed as one batch).
+        
+        Args:
+            chunk_ids: Unique identifiers for the chunks
+            texts: Text content to be embedded, aligned with chunk_ids
+            metadatas: Metadata dictionaries, aligned with chunk_ids (each must include user_id)
+        
+        Raises:
+            ValueError: If the lists differ in length or any metadata lacks user_id
+        """
+        if not (len(chunk_ids) == len(texts) == len(metadatas)):
+            raise ValueError("chunk_ids, texts and metadatas must have the same length")
+        if any("user_id" not in metadata for metadata in metadatas):
+            raise ValueError("metadata must include 'user_id' for multi-user isolation")
+        if not chunk_ids:
+            return
+        
+        try:
+            self.collection.add(
+                ids=chunk_ids,
+                documents=texts,
+                metadatas=metadatas,
+                embeddings=self.embedding_function(texts)
+            )
+            logger.debug(f"Added {len(chunk_ids)} memory chunks")
+            
+        except Exception as e:
+            logger.error(f"Failed to add {len(chunk_ids)} memory chunks: {str(e)}")
+            raise
+    
     def search_memories(
         self,
         query: str,
@@ -101,7 +187,7 @@ class VectorStoreService:
                 if min_similarity is None:
                     min_similarity = settings.memory_min_similarity
             results = self.collection.query(
-                query_texts=[query],
+                query_embeddings=self.embedding_function([query]),
                 n_results=limit,
                 where={"user_id": user_id}  # User isolation via metadata filtering
             )
@@ -149,6 +235,23 @@ class VectorStoreService:
             logger.error(f"Failed to delete memory chunk {chunk_id}: {str(e)}")
             raise
     
+    def delete_memories(self, chunk_ids: List[str]) -> None:
+        """
+        Delete several memory chunks by ID.
+        
+        Args:
+            chunk_ids: Unique identifiers of the chunks to delete
+        """
+        if not chunk_ids:
+            return
+        try:
+            self.collection.delete(ids=chunk_ids)
+            logger.debug(f"Deleted {len(chunk_ids)} memory chunks")
+            
+        except Exception as e:
+            logger.error(f"Failed to delete {len(chunk_ids)} memory chunks: {str(e)}")
+            raise
+    
     def delete_user_memories(self, user_id: int) -> None:
         """
         Delete all memories for a specific user.
@@ -216,21 +319,30 @@ class VectorStoreService:
 
 
 # Singleton instance for reuse across services
-_vector_store_instance: Optional[VectorStoreService] = None
+_vector_store_instance: Optional[VectorStore] = None
 
 
-def get_vector_store() -> VectorStoreService:
+def get_vector_store() -> VectorStore:
     """
-    Get or create a singleton instance of VectorStoreService.
+    Get or create a singleton instance of the configured vector store backend.
+    
+    VECTOR_STORE_BACKEND selects "chroma" (VectorStoreService, the default) or
+    "numpy" (NumpyVectorStore, per-user shards).
     
     Returns:
-        VectorStoreService instance
+        VectorStore instance
     """
     global _vector_store_instance
     
     if _vector_store_instance is None:
-        persist_dir = os.getenv("CHROMA_PERSIST_DIRECTORY", "./chroma_db")
-        _vector_store_instance = VectorStoreService(persist_directory=persist_dir)
+        backend = get_settings().vector_store_backend.lower()
+        if backend == "numpy":
+            from app.services.numpy_vector_store import NumpyVectorStore
+            _vector_store_instance = NumpyVectorStore()
+        elif backend == "chroma":
+            persist_dir = os.getenv("CHROMA_PERSIST_DIRECTORY", "./chroma_db")
+            _vector_store_instance = VectorStoreService(persist_directory=persist_dir)
+        else:
+            raise ValueError(f"Unsupported vector store backend: {backend}")
     
     return _vector_store_instance
-
@@ -44,22 +44,22 @@ class WalletService(BaseService):
             updated_at=now_utc()
         )
         
-        # Add wallet to database
-        wallet = self.wallet_repository.create(wallet)
-        
-        # Create initial transaction record
-        transaction = WalletTransaction(
-            wallet_id=wallet.id,
-            user_id=user_id,
-            type="topup",
-            amount=settings.initial_wallet_balance,
-            balance_after=settings.initial_wallet_balance,
-            reference_id="initial_signup_bonus",
-            meta={"reason": "New user signup bonus"},
-            created_at=now_utc()
-        )
-        self.transaction_repository.create(transaction)
-        self.db.refresh(wallet)
+        # Wallet and its bonus transaction commit together
+        with self.unit_of_work():
+            wallet = self.wallet_repository.create(wallet)
+            
+            # Create initial transaction record
+            transaction = WalletTransaction(
+                wallet_id=wallet.id,
+                user_id=user_id,
+                type="topup",
+                amount=settings.initial_wallet_balance,
+                balance_after=settings.initial_wallet_balance,
+                reference_id="initial_signup_bonus",
+                meta={"reason": "New user signup bonus"},
+                created_at=now_utc()
+            )
+            self.transaction_repository.create(transaction)
         
         self.logger.info(f"Wallet created with initial balance of {settings.initial_wallet_balance} for user ID: {user_id}")
         return wallet
@@ -187,13 +187,15 @@ class WalletService(BaseService):
             created_at=now_utc()
         )
         
-        transaction = self.transaction_repository.create(transaction)
-        
-        # Update wallet balance
-        wallet.balance = new_balance
-        wallet.updated_at = now_utc()
-        
-        self.wallet_repository.update(wallet)
+        # Ledger entry and balance change commit together
+        with self.unit_of_work():
+            transaction = self.transaction_repository.create(transaction)
+            
+            # Update wallet balance
+            wallet.balance = new_balance
+            wallet.updated_at = now_utc()
+            
+            self.wallet_repository.update(wallet)
         
         self.logger.info(f"Transaction added successfully for wallet ID: {wallet_id}")
         return transaction
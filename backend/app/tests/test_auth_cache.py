@@ -0,0 +1,137 @@
+"""Tests for cached JWT authentication."""
+import pytest
+from unittest.mock import Mock, patch
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+
+from app.auth import get_current_user
+from app.auth_cache import PrincipalCache, PrincipalCacheFactory
+from app.repositories.user_repository import UserRepository
+from app.utils import create_access_token, decode_token, decode_token_claims
+
+
+@pytest.fixture
+def principal_cache():
+    """Fresh process-wide principal cache for each test."""
+    PrincipalCacheFactory.reset_instance()
+    cache = PrincipalCacheFactory.create_cache()
+    yield cache
+    PrincipalCacheFactory.reset_instance()
+
+
+@pytest.fixture
+def bind_auth_db(db_session):
+    """Point get_current_user's session factory at the test database."""
+    from contextlib import contextmanager
+    from sqlmodel import Session
+
+    @contextmanager
+    def _session():
+        with Session(db_session.get_bind()) as session:
+            yield session
+
+    with patch('app.auth.get_session', _session):
+        yield
+
+
+def _request():
+    request = Mock()
+    request.method = "GET"
+    request.url = "http://test/api/chats"
+    return request
+
+
+def _creds(token):
+    return HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+
+class TestTokenClaims:
+    """Test token claim handling."""
+
+    def test_token_carries_user_id(self):
+        token = create_access_token("alice", 42)
+        claims = decode_token_claims(token)
+        assert claims["sub"] == "alice"
+        assert claims["uid"] == 42
+        assert decode_token(token) == "alice"
+
+    def test_legacy_token_without_user_id(self):
+        claims = decode_token_claims(create_access_token("bob"))
+        assert "uid" not in claims
+
+    def test_invalid_token(self):
+        assert decode_token_claims("not-a-token") is None
+
+
+class TestPrincipalCache:
+    """Test PrincipalCache behaviour."""
+
+    def test_ttl_expiry(self, test_user):
+        cache = PrincipalCache(ttl_seconds=0, max_entries=10)
+        cache.put(test_user)
+        assert cache.get_by_id(test_user.id) is None
+
+    def test_lru_eviction(self, test_user):
+        cache = PrincipalCache(ttl_seconds=60, max_entries=1)
+        cache.put(test_user)
+        other = Mock(id=test_user.id + 1000, login_id="other")
+        other.model_dump.return_value = {"id": other.id, "login_id": "other"}
+        cache.put(other)
+        assert cache.get_by_login_id(test_user.login_id) is None
+
+    def test_returns_independent_copies(self, test_user):
+        cache = PrincipalCache(ttl_seconds=60, max_entries=10)
+        cache.put(test_user)
+        first = cache.get_by_id(test_user.id)
+        first.name = "Mutated"
+        assert cache.get_by_id(test_user.id).name == test_user.name
+
+
+class TestCachedAuthentication:
+    """Test get_current_user with the principal cache."""
+
+    def test_second_request_skips_db(self, principal_cache, bind_auth_db, test_user):
+        token = create_access_token(test_user.login_id, test_user.id)
+
+        first = get_current_user(_request(), _creds(token))
+        with patch('app.auth.get_session', side_effect=AssertionError("DB should not be hit")):
+            second = get_current_user(_request(), _creds(token))
+
+        assert first.id == second.id == test_user.id
+        assert principal_cache.stats()["hits"] == 1
+
+    def test_legacy_token_uses_login_index(self, principal_cache, bind_auth_db, test_user):
+        token = create_access_token(test_user.login_id)
+
+        get_current_user(_request(), _creds(token))
+        with patch('app.auth.get_session', side_effect=AssertionError("DB should not be hit")):
+            user = get_current_user(_request(), _creds(token))
+
+        assert user.login_id == test_user.login_id
+
+    def test_mismatched_user_id_rejected(self, principal_cache, bind_auth_db, test_user):
+        token = create_access_token("someone_else", test_user.id)
+
+        with pytest.raises(HTTPException) as exc:
+            get_current_user(_request(), _creds(token))
+        assert exc.value.status_code == 401
+
+    def test_profile_update_invalidates(self, principal_cache, bind_auth_db, db_session, test_user):
+        token = create_access_token(test_user.login_id, test_user.id)
+        get_current_user(_request(), _creds(token))
+
+        test_user.name = "Renamed"
+        UserRepository(db_session).update(test_user)
+
+        assert principal_cache.get_by_id(test_user.id) is None
+        assert get_current_user(_request(), _creds(token)).name == "Renamed"
+
+    def test_user_deletion_invalidates(self, principal_cache, bind_auth_db, db_session, test_user):
+        token = create_access_token(test_user.login_id, test_user.id)
+        get_current_user(_request(), _creds(token))
+
+        UserRepository(db_session).delete(test_user.id)
+
+        with pytest.raises(HTTPException) as exc:
+            get_current_user(_request(), _creds(token))
+        assert exc.value.status_code == 401
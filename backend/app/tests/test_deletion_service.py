@@ -0,0 +1,216 @@
+"""Tests for cascading session and account data deletion."""
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from unittest.mock import MagicMock
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select
+from sqlalchemy.orm import sessionmaker
+
+from app.auth import get_current_user
+from app.main import app
+from app.models import (
+    ChatSession, DeletionJob, Feedback, MemoryChunk, MemoryFinalizationJob, Message, SessionCharge, WalletTransaction,
+)
+from app.routers import sessions as sessions_router
+from app.services import deletion_service
+from app.services.deletion_service import DeletionService, run_deletion_job
+from app.utils import now_utc
+
+
+def _make_session(db, user_id, session_id, messages=3):
+    db.add(ChatSession(session_id=session_id, user_id=user_id, category="TherapyBro", status="ended"))
+    for i in range(messages):
+        db.add(Message(session_id=session_id, role="user", content=f"message {i}"))
+    db.add(MemoryChunk(
+        chunk_id=f"{session_id}-chunk", user_id=user_id, session_id=session_id,
+        chunk_text="text", message_ids="[]", chunk_type="conversation",
+    ))
+    db.add(SessionCharge(
+        session_id=session_id, wallet_id=1, reserved_amount=Decimal("20"),
+        unit_price=Decimal("4"), minutes_requested=Decimal("5"),
+    ))
+    db.add(Feedback(user_id=user_id, session_id=session_id, rating=5))
+    db.add(MemoryFinalizationJob(session_id=session_id, user_id=user_id))
+    db.commit()
+
+
+def _count(db, model, **criteria):
+    query = select(func.count()).select_from(model).filter_by(**criteria)
+    return db.execute(query).scalar_one()
+
+
+@pytest.fixture
+def vector_store():
+    return MagicMock()
+
+
+@pytest.fixture
+def session_factory(db_session):
+    return sessionmaker(bind=db_session.get_bind(), autoflush=False)
+
+
+class TestDeleteSession:
+    """Test deleting a single session."""
+
+    def test_cascades_to_all_session_rows(self, db_session, test_user, vector_store):
+        """Messages, memories, charges, feedback and the finalization job go with the session."""
+        _make_session(db_session, test_user.id, "del-1", messages=7)
+        _make_session(db_session, test_user.id, "keep-1")
+
+        counts = DeletionService(db_session, batch_size=3, vector_store=vector_store).delete_session("del-1", test_user.id)
+
+        assert counts == {"sessions": 1, "messages": 7, "memories": 1, "charges": 1, "feedback": 1}
+        vector_store.delete_session_memories.assert_called_once_with("del-1")
+        for model in (ChatSession, Message, MemoryChunk, SessionCharge, Feedback, MemoryFinalizationJob):
+            assert _count(db_session, model, session_id="del-1") == 0
+            assert _count(db_session, model, session_id="keep-1") == (3 if model is Message else 1)
+
+    def test_reports_progress_per_message_batch(self, db_session, test_user, vector_store):
+        """Large sessions report progress after every full message batch."""
+        _make_session(db_session, test_user.id, "del-2", messages=5)
+        seen = []
+
+        DeletionService(db_session, batch_size=2, vector_store=vector_store).delete_session(
+            "del-2", test_user.id, progress=lambda counts: seen.append(counts["messages"])
+        )
+
+        assert seen == [2, 4, 5]
+
+    def test_other_users_session_not_found(self, db_session, test_user, vector_store):
+        """A session owned by someone else is not deleted."""
+        _make_session(db_session, test_user.id, "del-3")
+
+        with pytest.raises(ValueError, match="Session not found"):
+            DeletionService(db_session, vector_store=vector_store).delete_session("del-3", test_user.id + 1)
+        assert _count(db_session, Message, session_id="del-3") == 3
+
+    def test_skips_vector_store_without_memories(self, db_session, test_user, vector_store):
+        """Sessions without memory chunks never touch the vector store."""
+        db_session.add(ChatSession(session_id="del-4", user_id=test_user.id, category="TherapyBro"))
+        db_session.commit()
+
+        DeletionService(db_session, vector_store=vector_store).delete_session("del-4", test_user.id)
+
+        vector_store.delete_session_memories.assert_not_called()
+
+
+class TestDeleteUserData:
+    """Test deleting all of a user's conversation data."""
+
+    def test_deletes_every_session_and_keeps_ledger(self, db_session, test_user, vector_store):
+        """All sessions and user-level memories go; wallet transactions stay."""
+        for i in range(5):
+            _make_session(db_session, test_user.id, f"user-del-{i}", messages=2)
+        _make_session(db_session, test_user.id + 1, "other-user")
+        db_session.add(MemoryChunk(
+            chunk_id="orphan", user_id=test_user.id, session_id="gone",
+            chunk_text="text", message_ids="[]", chunk_type="session_summary",
+        ))
+        db_session.add(WalletTransaction(wallet_id=1, user_id=test_user.id, type="recharge", amount=Decimal("100"), balance_after=Decimal("100")))
+        db_session.commit()
+
+        counts = DeletionService(db_session, batch_size=2, vector_store=vector_store).delete_user_data(test_user.id)
+
+        assert counts == {"sessions": 5, "messages": 10, "memories": 6, "charges": 5, "feedback": 5}
+        vector_store.delete_user_memories.assert_called_once_with(test_user.id)
+        assert _count(db_session, ChatSession, user_id=test_user.id) == 0
+        assert _count(db_session, MemoryChunk, user_id=test_user.id) == 0
+        assert _count(db_session, ChatSession, user_id=test_user.id + 1) == 1
+        assert _count(db_session, WalletTransaction, user_id=test_user.id) == 1
+
+
+class TestDeletionJobs:
+    """Test background deletion jobs."""
+
+    def test_job_runs_and_records_progress(self, db_session, test_user, session_factory, monkeypatch, vector_store):
+        """A requested job deletes the account data and stores the final counts."""
+        monkeypatch.setattr(deletion_service.DeletionService, "vector_store", vector_store)
+        for i in range(3):
+            _make_session(db_session, test_user.id, f"job-{i}", messages=2)
+        service = DeletionService(db_session)
+
+        job = service.request_user_deletion(test_user.id)
+        assert job.status == "pending"
+        assert job.sessions_total == 3
+        assert service.request_user_deletion(test_user.id).job_id == job.job_id
+
+        assert run_deletion_job(job.job_id, session_factory=session_factory) is True
+        assert run_deletion_job(job.job_id, session_factory=session_factory) is False
+
+        status = service.get_user_deletion(job.job_id, test_user.id)
+        assert status.status == "done"
+        assert status.progress["sessions"] == 3
+        assert status.progress["messages"] == 6
+        assert status.completed_at is not None
+        assert _count(db_session, ChatSession, user_id=test_user.id) == 0
+
+    def test_running_job_is_reclaimed_only_when_stale(self, db_session, test_user, session_factory, monkeypatch, vector_store):
+        """A running job is left alone until it stops reporting progress."""
+        monkeypatch.setattr(deletion_service.DeletionService, "vector_store", vector_store)
+        _make_session(db_session, test_user.id, "stale-1")
+        job = DeletionJob(user_id=test_user.id, status="running", sessions_total=1)
+        db_session.add(job)
+        db_session.commit()
+
+        assert run_deletion_job(job.id, session_factory=session_factory) is False
+
+        job.updated_at = now_utc() - timedelta(hours=1)
+        db_session.commit()
+        assert run_deletion_job(job.id, session_factory=session_factory) is True
+        assert _count(db_session, ChatSession, session_id="stale-1") == 0
+
+    def test_failed_job_records_error(self, db_session, test_user, session_factory, monkeypatch):
+        """A vector store failure marks the job failed and keeps the session row."""
+        failing = MagicMock()
+        failing.delete_session_memories.side_effect = RuntimeError("vector store down")
+        monkeypatch.setattr(deletion_service.DeletionService, "vector_store", failing)
+        _make_session(db_session, test_user.id, "fail-1")
+        job = DeletionService(db_session).request_user_deletion(test_user.id)
+
+        assert run_deletion_job(job.job_id, session_factory=session_factory) is False
+
+        status = DeletionService(db_session).get_user_deletion(job.job_id, test_user.id)
+        assert status.status == "failed"
+        assert "vector store down" in status.error
+        assert _count(db_session, ChatSession, session_id="fail-1") == 1
+
+    def test_job_hidden_from_other_users(self, db_session, test_user):
+        """Job status is only visible to its owner."""
+        job = DeletionService(db_session).request_user_deletion(test_user.id)
+
+        with pytest.raises(ValueError, match="Deletion job not found"):
+            DeletionService(db_session).get_user_deletion(job.job_id, test_user.id + 1)
+
+
+class TestDeletionApi:
+    """Test the chat deletion endpoints."""
+
+    def test_delete_all_chats_runs_in_background(self, db_session, test_user, session_factory, monkeypatch, vector_store):
+        """DELETE /api/chats accepts the job, runs it and reports progress."""
+        @contextmanager
+        def _session():
+            yield db_session
+
+        monkeypatch.setattr(sessions_router, "get_session", _session)
+        monkeypatch.setattr(
+            sessions_router, "run_deletion_job", lambda job_id: run_deletion_job(job_id, session_factory=session_factory)
+        )
+        monkeypatch.setattr(deletion_service.DeletionService, "vector_store", vector_store)
+        app.dependency_overrides[get_current_user] = lambda: test_user
+        _make_session(db_session, test_user.id, "api-del-1")
+        try:
+            client = TestClient(app)
+            response = client.delete("/api/chats")
+            assert response.status_code == 202
+            job_id = response.json()["job_id"]
+
+            status = client.get(f"/api/chats/deletions/{job_id}")
+            assert status.status_code == 200
+            assert status.json()["status"] == "done"
+            assert status.json()["progress"]["sessions"] == 1
+            assert client.get(f"/api/chats/deletions/{job_id + 1}").status_code == 404
+        finally:
+            app.dependency_overrides.pop(get_current_user, None)
@@ -0,0 +1,76 @@
+"""Tests for the content-addressed embedding cache."""
+from unittest.mock import Mock
+
+from app.services.embedding_cache import CachedEmbeddingFunction, EmbeddingCache, cache_key
+
+
+def _embedding_function():
+    """Mock embedding function returning one 3-d vector per text."""
+    return Mock(side_effect=lambda texts: [[float(len(text)), 1.0, 0.5] for text in texts])
+
+
+class TestEmbeddingCache:
+    """Test EmbeddingCache tiers, keys and counters."""
+
+    def test_key_normalises_text_and_includes_model(self):
+        """Test near-identical texts share a key and models do not."""
+        assert cache_key("m", "  I'm feeling   ANXIOUS again ") == cache_key("m", "i'm feeling anxious again")
+        assert cache_key("m", "hi") != cache_key("other-model", "hi")
+
+    def test_repeated_texts_embedded_once(self):
+        """Test hits skip the embedding function and misses are batched and de-duplicated."""
+        cache = EmbeddingCache(model="m")
+        embed = _embedding_function()
+
+        first = cache.embed(["hi", "Hi ", "hello"], embed)
+        second = cache.embed(["hello", "hi"], embed)
+
+        embed.assert_called_once_with(["hi", "hello"])
+        assert [v.tolist() for v in second] == [first[2].tolist(), first[0].tolist()]
+        stats = cache.stats()
+        assert stats["misses"] == 3
+        assert stats["memory_hits"] == 2
+
+    def test_memory_tier_evicts_least_recently_used(self):
+        """Test the LRU tier stays within capacity."""
+        cache = EmbeddingCache(model="m", max_memory_entries=2)
+        embed = _embedding_function()
+        cache.embed(["a"], embed)
+        cache.embed(["b"], embed)
+        cache.embed(["a"], embed)
+        cache.embed(["c"], embed)
+
+        assert cache.get_many(["b"]) == [None]
+        assert cache.get_many(["a"])[0] is not None
+        assert cache.stats()["memory_evictions"] == 1
+
+    def test_disk_tier_survives_restart(self, tmp_path):
+        """Test embeddings persisted to SQLite are served by a new cache instance."""
+        db_path = str(tmp_path / "embeddings.db")
+        EmbeddingCache(model="m", db_path=db_path).embed(["remember me"], _embedding_function())
+
+        cache = EmbeddingCache(model="m", db_path=db_path)
+        embed = _embedding_function()
+        vectors = cache.embed(["remember me"], embed)
+
+        embed.assert_not_called()
+        assert vectors[0].tolist() == [11.0, 1.0, 0.5]
+        assert cache.stats()["disk_hits"] == 1
+
+    def test_disk_tier_is_bounded(self, tmp_path):
+        """Test the disk tier evicts its least recently used rows."""
+        cache = EmbeddingCache(model="m", db_path=str(tmp_path / "embeddings.db"), max_disk_entries=2)
+        cache.embed(["a", "b", "c"], _embedding_function())
+
+        stats = cache.stats()
+        assert stats["disk_entries"] == 2
+        assert stats["disk_evictions"] == 1
+
+    def test_cached_embedding_function_returns_lists(self):
+        """Test the callable wrapper used by the vector stores."""
+        embed = _embedding_function()
+        cached = CachedEmbeddingFunction(embed, EmbeddingCache(model="m"))
+
+        assert cached(["ab"]) == [[2.0, 1.0, 0.5]]
+        assert cached(["ab"]) == [[2.0, 1.0, 0.5]]
+        embed.assert_called_once()
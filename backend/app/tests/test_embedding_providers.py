@@ -0,0 +1,105 @@
+"""Tests for the embedding provider layer."""
+import math
+import numpy as np
+import pytest
+from types import SimpleNamespace
+from unittest.mock import Mock
+
+from app.config.settings import get_settings
+from app.services.embedding_providers import (
+    HashingEmbeddingProvider,
+    LocalOnnxEmbeddingProvider,
+    create_embedding_provider,
+)
+
+
+def _cosine(a, b):
+    return sum(x * y for x, y in zip(a, b))
+
+
+class TestHashingEmbeddingProvider:
+    """Test the deterministic hashing embedder."""
+
+    def test_vectors_are_deterministic_and_normalised(self):
+        """Test the same text always maps to the same unit vector."""
+        provider = HashingEmbeddingProvider(dimension=64)
+        first, again = provider(["I'm feeling anxious again"]), provider(["I'm feeling anxious again"])
+
+        assert first == again
+        assert len(first[0]) == 64
+        assert math.isclose(math.sqrt(sum(v * v for v in first[0])), 1.0)
+
+    def test_shared_words_score_higher(self):
+        """Test texts sharing words are closer than unrelated ones."""
+        query, related, unrelated = HashingEmbeddingProvider()(
+            ["stress at my job", "my job is stressful", "my sister visited"]
+        )
+        assert _cosine(query, related) > _cosine(query, unrelated)
+
+    def test_empty_text_gives_zero_vector(self):
+        """Test texts without tokens don't divide by zero."""
+        assert HashingEmbeddingProvider(dimension=8)(["..."]) == [[0.0] * 8]
+
+
+class TestLocalOnnxEmbeddingProvider:
+    """Test batching and pooling of the local ONNX provider with a stub model."""
+
+    def test_mean_pooling_ignores_padding_and_batches(self):
+        """Test padded positions are excluded and texts are split into batches."""
+        provider = LocalOnnxEmbeddingProvider(batch_size=2)
+        provider._tokenizer = Mock()
+        provider._tokenizer.encode_batch.side_effect = lambda batch: [
+            SimpleNamespace(ids=[1, 2], attention_mask=[1, 1]) if text == "two" else SimpleNamespace(ids=[1, 0], attention_mask=[1, 0])
+            for text in batch
+        ]
+        # Token vectors: position 0 -> [1, 0], position 1 -> [0, 1] (padding would pull "one" off-axis)
+        provider._session = Mock()
+        provider._session.run.side_effect = lambda _, inputs: [
+            np.tile(np.array([[1.0, 0.0], [0.0, 1.0]]), (inputs["input_ids"].shape[0], 1, 1))
+        ]
+
+        vectors = provider(["one", "two", "one"])
+
+        assert provider._session.run.call_count == 2
+        assert vectors[0] == pytest.approx([1.0, 0.0])
+        assert vectors[1] == pytest.approx([math.sqrt(0.5), math.sqrt(0.5)])
+        assert vectors[2] == pytest.approx([1.0, 0.0])
+
+    def test_unknown_model_requires_path(self):
+        """Test models other than Chroma's bundled one need an explicit path."""
+        provider = LocalOnnxEmbeddingProvider(model_name="some-other-model")
+        with pytest.raises(ValueError):
+            provider.load()
+
+
+    def test_default_model_downloaded_through_public_call(self, tmp_path, monkeypatch):
+        """Test a missing Chroma model is fetched by embedding a dummy string, not a private helper."""
+        from chromadb.utils.embedding_functions import onnx_mini_lm_l6_v2
+        chroma_model = Mock()
+        chroma_model.MODEL_NAME = onnx_mini_lm_l6_v2.ONNXMiniLM_L6_V2.MODEL_NAME
+        chroma_model.DOWNLOAD_PATH = str(tmp_path)
+        chroma_model.EXTRACTED_FOLDER_NAME = "onnx"
+        monkeypatch.setattr(onnx_mini_lm_l6_v2, "ONNXMiniLM_L6_V2", chroma_model)
+
+        model_dir = LocalOnnxEmbeddingProvider()._model_dir()
+
+        assert model_dir == tmp_path / "onnx"
+        chroma_model.return_value.assert_called_once_with(["warm up"])
+
+
+class TestCreateEmbeddingProvider:
+    """Test provider selection from settings."""
+
+    def test_provider_selected_by_name(self, monkeypatch):
+        """Test each provider name builds the matching backend."""
+        monkeypatch.setattr(get_settings(), "embedding_dimension", 16)
+
+        assert create_embedding_provider("hashing").name == "hashing/16"
+        assert isinstance(create_embedding_provider("local"), LocalOnnxEmbeddingProvider)
+        with pytest.raises(ValueError):
+            create_embedding_provider("unknown")
+
+    def test_default_comes_from_settings(self, monkeypatch):
+        """Test EMBEDDING_PROVIDER picks the provider when none is given."""
+        monkeypatch.setattr(get_settings(), "embedding_provider", "hashing")
+        assert isinstance(create_embedding_provider(), HashingEmbeddingProvider)
@@ -0,0 +1,111 @@
+"""Tests for the token-windowed conversation history builder."""
+from unittest.mock import Mock
+
+from app.models import Message
+from app.services.history_builder import ConversationHistoryBuilder, count_tokens
+from app.services.session_service import SessionService
+
+
+def _msg(msg_id, role, content):
+    return Message(id=msg_id, session_id="s1", role=role, content=content)
+
+
+class TestConversationHistoryBuilder:
+    """Test cases for ConversationHistoryBuilder."""
+
+    def test_cache_hit_only_reads_new_messages(self):
+        """Test that after the first build only newer rows are queried."""
+        repo = Mock()
+        repo.find_by_session_id.return_value = [_msg(1, "system", "sys"), _msg(2, "user", "hi")]
+        repo.find_by_session_after_id.return_value = [_msg(3, "assistant", "hello")]
+        builder = ConversationHistoryBuilder(token_budget=10_000, max_sessions=10)
+
+        first = builder.build("s1", repo)
+        second = builder.build("s1", repo)
+
+        repo.find_by_session_id.assert_called_once_with("s1")
+        repo.find_by_session_after_id.assert_called_once_with("s1", 2)
+        assert [m["role"] for m in first.messages] == ["system", "user"]
+        assert [m["role"] for m in second.messages] == ["system", "user", "assistant"]
+        assert second.prompt_tokens > first.prompt_tokens
+
+    def test_append_updates_cached_window(self):
+        """Test that appended messages are visible without a reload."""
+        repo = Mock()
+        repo.find_by_session_id.return_value = [_msg(1, "system", "sys")]
+        repo.find_by_session_after_id.return_value = []
+        builder = ConversationHistoryBuilder(token_budget=10_000, max_sessions=10)
+        builder.build("s1", repo)
+
+        builder.append("s1", _msg(2, "user", "new message"))
+        window = builder.build("s1", repo)
+
+        assert window.messages[-1] == {"role": "user", "content": "new message"}
+        repo.find_by_session_after_id.assert_called_with("s1", 2)
+
+    def test_trims_oldest_turns_to_budget(self):
+        """Test that the window keeps the system prompt and newest turns within budget."""
+        repo = Mock()
+        long_text = "word " * 200
+        repo.find_by_session_id.return_value = [
+            _msg(1, "system", "sys"),
+            _msg(2, "user", long_text),
+            _msg(3, "assistant", long_text),
+            _msg(4, "user", "latest question"),
+        ]
+        budget = count_tokens("sys") + count_tokens(long_text) + count_tokens("latest question") + 12
+        builder = ConversationHistoryBuilder(token_budget=budget, max_sessions=10)
+
+        window = builder.build("s1", repo)
+
+        # The assistant turn fits but would leave the window starting with an assistant message
+        assert [m["role"] for m in window.messages] == ["system", "user"]
+        assert window.messages[-1]["content"] == "latest question"
+        assert window.dropped_messages == 2
+        assert window.total_messages == 4
+        assert window.prompt_tokens <= budget
+
+    def test_system_prompt_passed_by_caller(self):
+        """Test a caller-supplied system prompt leads the window and counts toward the budget."""
+        repo = Mock()
+        repo.find_by_session_id.return_value = [_msg(1, "user", "hi")]
+        repo.find_by_session_after_id.return_value = []
+        builder = ConversationHistoryBuilder(token_budget=10_000, max_sessions=10)
+
+        without = builder.build("s1", repo)
+        window = builder.build("s1", repo, system_prompt="You are TherapyBro.")
+
+        assert window.messages == [
+            {"role": "system", "content": "You are TherapyBro."},
+            {"role": "user", "content": "hi"},
+        ]
+        assert window.prompt_tokens > without.prompt_tokens
+        assert window.total_messages == 2
+
+    def test_lru_eviction(self):
+        """Test that the cache is bounded by max_sessions."""
+        repo = Mock()
+        repo.find_by_session_id.return_value = [_msg(1, "system", "sys")]
+        repo.find_by_session_after_id.return_value = []
+        builder = ConversationHistoryBuilder(token_budget=10_000, max_sessions=1)
+
+        builder.build("a", repo)
+        builder.build("b", repo)
+        builder.build("a", repo)
+
+        assert repo.find_by_session_id.call_count == 3
+
+    def test_session_service_uses_window(self, db_session, test_user):
+        """Test that SessionService history reflects new messages incrementally."""
+        session_service = SessionService(db_session)
+        session_out = session_service.create_session(test_user.id, "therapy", "You are a helpful therapist.")
+        session_id = session_out.session_id
+
+        session_service.add_user_message(session_id, "Hello", test_user.id)
+        window = session_service.build_conversation_window(session_id)
+        session_service.add_assistant_message(session_id, "Hi there!")
+        history = session_service.get_conversation_history(session_id)
+
+        assert len(window.messages) == 2
+        assert window.prompt_tokens > 0
+        assert history[-1] == {"role": "assistant", "content": "Hi there!"}
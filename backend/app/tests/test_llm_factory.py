@@ -54,3 +54,38 @@ class TestLLMFactory:
         # Test that logger is set
         assert factory.logger is not None
         assert factory.logger.name == "llm.factory"
+    
+    def test_create_streamer_reuses_pooled_instance(self, monkeypatch):
+        """Test that streamers and HTTP pools are shared across calls."""
+        monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+        factory = LLMFactory()
+        
+        first = factory.create_streamer("anthropic")
+        second = factory.create_streamer("ANTHROPIC")
+        other_model = factory.create_streamer("anthropic", model="claude-other")
+        
+        assert first is second
+        assert other_model is not first
+        assert other_model.model == "claude-other"
+        assert factory.registry.stats() == {"streamers": 2, "http_pools": 1}
+    
+    def test_aclose_releases_pools(self, monkeypatch):
+        """Test that shutdown clears cached streamers and connection pools."""
+        import asyncio
+        monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+        factory = LLMFactory()
+        factory.create_streamer("openai")
+        
+        asyncio.run(factory.aclose())
+        
+        assert factory.registry.stats() == {"streamers": 0, "http_pools": 0}
+    
+    def test_create_streamer_failure_not_cached(self, monkeypatch):
+        """Test that a failed provider initialization is not cached."""
+        monkeypatch.delenv("TOGETHER_API_KEY", raising=False)
+        factory = LLMFactory()
+        
+        with pytest.raises(RuntimeError, match="Failed to create LLM streamer"):
+            factory.create_streamer("together")
+        
+        assert factory.registry.stats()["streamers"] == 0
@@ -0,0 +1,396 @@
+"""Tests for multi-provider LLM routing: failover, hedging and circuit breakers."""
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
+
+from app.config.settings import Settings, get_settings
+from app.main import app
+from app.services.llm_factory import LLMFactory
+from app.services.llm_router import (
+    BREAKER_CLOSED, BREAKER_HALF_OPEN, BREAKER_OPEN, ProviderHealth, ProviderHealthRegistry, Route, RoutingPolicy,
+    RoutingStreamer, get_provider_health_registry, is_emotional,
+)
+
+
+class FakeStreamer:
+    """Async streamer with a configurable first-token delay and failure point."""
+
+    def __init__(self, tokens, first_token_delay=0.0, fail_after=None):
+        self.model = "fake"
+        self.tokens = tokens
+        self.first_token_delay = first_token_delay
+        self.fail_after = fail_after
+        self.calls = 0
+        self.closed = False
+
+    def stream_chat(self, messages, **kwargs):
+        self.calls += 1
+        for i, token in enumerate(self.tokens):
+            if self.fail_after == i:
+                raise RuntimeError("provider down")
+            yield token
+
+    async def astream_chat(self, messages, **kwargs):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.first_token_delay)
+            for i, token in enumerate(self.tokens):
+                if self.fail_after == i:
+                    raise RuntimeError("provider down")
+                yield token
+        finally:
+            self.closed = True
+
+
+def _router(streamers, **kwargs):
+    kwargs.setdefault("first_token_timeout", 1.0)
+    kwargs.setdefault("hedge_enabled", False)
+    return RoutingStreamer(streamers, health=ProviderHealthRegistry(), **kwargs)
+
+
+def _collect(router):
+    async def run():
+        return [token async for token in router.astream_chat([{"role": "user", "content": "hi"}])]
+    return asyncio.run(run())
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestFailover:
+    """Test failover before the first token."""
+
+    def test_error_before_first_token_fails_over(self):
+        """A provider that fails immediately is replaced by the next one."""
+        primary = FakeStreamer(["never"], fail_after=0)
+        fallback = FakeStreamer(["Hi", " there"])
+        router = _router([("anthropic", primary), ("openai", fallback)])
+
+        assert _collect(router) == ["Hi", " there"]
+        stats = router.health.snapshot()
+        assert stats["anthropic"]["failures"] == 1
+        assert stats["openai"]["failures"] == 0
+
+    def test_first_token_timeout_fails_over(self):
+        """A provider silent past the first-token deadline is abandoned and closed."""
+        primary = FakeStreamer(["late"], first_token_delay=5.0)
+        fallback = FakeStreamer(["on time"])
+        router = _router([("anthropic", primary), ("openai", fallback)], first_token_timeout=0.05)
+
+        assert _collect(router) == ["on time"]
+        assert primary.closed is True
+        assert router.health.snapshot()["anthropic"]["timeouts"] == 1
+
+    def test_no_failover_after_first_token(self):
+        """Once a token has been sent, a provider error reaches the caller."""
+        primary = FakeStreamer(["partial", "more"], fail_after=1)
+        fallback = FakeStreamer(["other"])
+        router = _router([("anthropic", primary), ("openai", fallback)])
+        received = []
+
+        async def run():
+            async for token in router.astream_chat([]):
+                received.append(token)
+
+        with pytest.raises(RuntimeError, match="provider down"):
+            asyncio.run(run())
+        assert received == ["partial"]
+        assert fallback.calls == 0
+
+    def test_all_providers_failing(self):
+        """When every provider fails the caller gets one error."""
+        router = _router([("anthropic", FakeStreamer(["x"], fail_after=0)), ("openai", FakeStreamer(["y"], fail_after=0))])
+
+        with pytest.raises(RuntimeError, match="All LLM providers failed"):
+            _collect(router)
+
+    def test_sync_stream_fails_over(self):
+        """Sync callers get failover too."""
+        router = _router([("anthropic", FakeStreamer(["x"], fail_after=0)), ("openai", FakeStreamer(["ok"]))])
+
+        assert list(router.stream_chat([])) == ["ok"]
+
+    def test_active_provider_follows_the_winner(self):
+        """The router reports the provider that served the reply, not the preferred one."""
+        router = _router([("anthropic", FakeStreamer(["x"], fail_after=0)), ("openai", FakeStreamer(["ok"]))])
+        assert router.active_provider == "anthropic"
+
+        _collect(router)
+        assert router.active_provider == "openai"
+
+        sync_router = _router([("anthropic", FakeStreamer(["x"], fail_after=0)), ("openai", FakeStreamer(["ok"]))])
+        list(sync_router.stream_chat([]))
+        assert sync_router.active_provider == "openai"
+
+
+class TestHedging:
+    """Test hedged requests on slow first tokens."""
+
+    def test_hedge_wins_and_primary_is_closed(self):
+        """A slow primary is hedged; the faster provider serves the reply."""
+        primary = FakeStreamer(["slow"], first_token_delay=0.5)
+        fallback = FakeStreamer(["fast"])
+        router = _router([("anthropic", primary), ("openai", fallback)], hedge_enabled=True, hedge_delay_ms=20)
+
+        assert _collect(router) == ["fast"]
+        assert primary.closed is True
+        # The hedged-out primary is not counted as a failure
+        assert router.health.snapshot()["anthropic"]["failures"] == 0
+
+    def test_fast_primary_is_not_hedged(self):
+        """No second request starts when the first token arrives in time."""
+        primary = FakeStreamer(["quick"])
+        fallback = FakeStreamer(["unused"])
+        router = _router([("anthropic", primary), ("openai", fallback)], hedge_enabled=True, hedge_delay_ms=200)
+
+        assert _collect(router) == ["quick"]
+        assert fallback.calls == 0
+
+    def test_hedge_delay_uses_p95(self):
+        """With enough samples the hedge delay is the provider's p95 time to first token."""
+        router = _router([("anthropic", FakeStreamer([]))], hedge_delay_ms=2000)
+        health = router.health.get("anthropic")
+        for ms in range(1, 101):
+            health.record_first_token(ms / 1000.0)
+
+        assert router._hedge_delay_for(health) == pytest.approx(0.096)
+
+
+class TestCircuitBreaker:
+    """Test the per-provider circuit breaker."""
+
+    def _health(self, clock):
+        return ProviderHealth("anthropic", window=10, error_rate=0.5, min_requests=4, cooldown_seconds=30, clock=clock)
+
+    def test_opens_on_error_rate_and_recovers(self):
+        """Failures open the breaker; after the cooldown one probe decides."""
+        clock = FakeClock()
+        health = self._health(clock)
+        for _ in range(2):
+            health.allow_request()
+            health.record_success()
+        for _ in range(2):
+            health.allow_request()
+            health.record_failure()
+
+        assert health.state == BREAKER_OPEN
+        assert health.allow_request() is False
+
+        clock.now = 31
+        assert health.state == BREAKER_HALF_OPEN
+        assert health.allow_request() is True
+        assert health.allow_request() is False  # one probe at a time
+        health.record_success()
+        assert health.state == BREAKER_CLOSED
+
+    def test_failed_probe_reopens(self):
+        """A failing half-open probe opens the breaker again."""
+        clock = FakeClock()
+        health = self._health(clock)
+        for _ in range(4):
+            health.allow_request()
+            health.record_failure(timeout=True)
+        clock.now = 31
+        health.allow_request()
+        health.record_failure()
+
+        assert health.state == BREAKER_OPEN
+        assert health.snapshot()["trips"] == 2
+
+    def test_router_skips_open_provider(self):
+        """Requests go straight to the fallback while the primary's breaker is open."""
+        primary = FakeStreamer(["primary"])
+        fallback = FakeStreamer(["fallback"])
+        router = _router([("anthropic", primary), ("openai", fallback)])
+        health = router.health.get("anthropic")
+        for _ in range(get_settings().llm_breaker_min_requests):
+            health.allow_request()
+            health.record_failure()
+
+        assert _collect(router) == ["fallback"]
+        assert primary.calls == 0
+
+
+class TestFactoryRouting:
+    """Test that the factory wraps fallbacks in a RoutingStreamer."""
+
+    def test_fallbacks_build_a_router(self, monkeypatch):
+        """LLM_FALLBACK_PROVIDERS adds the fallback providers after the primary."""
+        monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+        monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+        monkeypatch.setattr(get_settings(), "llm_fallback_providers", "openai, anthropic, bogus")
+
+        streamer = LLMFactory().create_streamer("anthropic")
+
+        assert isinstance(streamer, RoutingStreamer)
+        assert streamer.providers == ["anthropic", "openai"]
+
+    def test_specific_model_is_not_routed(self, monkeypatch):
+        """Asking for a specific model pins the provider."""
+        monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+        monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+        monkeypatch.setattr(get_settings(), "llm_fallback_providers", "openai")
+
+        streamer = LLMFactory().create_streamer("anthropic", model="claude-test")
+
+        assert not isinstance(streamer, RoutingStreamer)
+
+
+class TestEwmaStats:
+    """Test the moving averages fed by streamed replies."""
+
+    def test_reply_updates_latency_throughput_and_cost(self):
+        """A completed reply records time to first token, tokens/sec, length and cost."""
+        router = _router([("openai:gpt-test", FakeStreamer(["Hello", " there"]))], prices={"openai:gpt-test": (1.0, 2.0)}, prompt_tokens=1000)
+
+        _collect(router)
+
+        ewma = router.health.snapshot()["openai:gpt-test"]["ewma"]
+        assert ewma["ttft_ms"] is not None
+        assert ewma["error_rate"] == 0.0
+        assert ewma["output_tokens"] > 0
+        assert ewma["cost_usd"] == pytest.approx((1000 * 1.0 + ewma["output_tokens"] * 2.0) / 1_000_000)
+
+    def test_error_rate_moves_by_alpha(self):
+        """Each outcome moves the error rate average by alpha."""
+        health = ProviderHealth("openai", window=10, error_rate=0.9, min_requests=10, cooldown_seconds=30, ewma_alpha=0.5)
+
+        health.record_success()
+        health.record_failure()
+        health.record_failure()
+
+        assert health.ewma("error_rate") == pytest.approx(0.75)
+
+
+class TestRoutingPolicy:
+    """Test ranking routes by policy and live stats."""
+
+    fast = Route("openai", "gpt-fast", tier="fast", input_price=0.1, output_price=0.4)
+    strong = Route("anthropic", "claude-strong", tier="strong", input_price=3.0, output_price=15.0)
+
+    def _policy(self, policy, registry=None):
+        return RoutingPolicy(
+            [self.strong, self.fast], policy, registry or ProviderHealthRegistry(),
+            ttft_slo_ms=1000, long_message_chars=200,
+        )
+
+    def test_cheapest_under_slo(self):
+        """The cheapest route wins while it meets the SLO and loses once it is too slow."""
+        registry = ProviderHealthRegistry()
+        policy = self._policy("cheapest_under_slo", registry)
+
+        assert policy.rank("hi", 500) == [self.fast, self.strong]
+
+        registry.get(self.fast.name).record_first_token(3.0)
+        registry.get(self.strong.name).record_first_token(0.4)
+        assert policy.rank("hi", 500) == [self.strong, self.fast]
+
+    def test_timing_out_route_loses_its_place(self):
+        """A route that only times out counts as over the SLO instead of unexplored."""
+        registry = ProviderHealthRegistry()
+        policy = self._policy("cheapest_under_slo", registry)
+
+        registry.get(self.fast.name).record_failure(timeout=True, waited_seconds=10.0)
+
+        assert registry.get(self.fast.name).ewma("ttft_ms") == pytest.approx(10000)
+        assert policy.rank("hi", 500) == [self.strong, self.fast]
+
+    def test_router_records_timeout_as_ttft_sample(self):
+        """A first-token timeout feeds the time-to-first-token average but not the hedge percentiles."""
+        router = _router([("anthropic", FakeStreamer(["late"], first_token_delay=5.0)), ("openai", FakeStreamer(["ok"]))], first_token_timeout=0.05)
+
+        _collect(router)
+
+        health = router.health.get("anthropic")
+        assert health.ewma("ttft_ms") == pytest.approx(50)
+        assert health.ttft_percentile(0.95) is None
+
+    def test_error_prone_route_is_demoted(self):
+        """Error rate raises a route's expected cost and demotes it past max_error_rate."""
+        registry = ProviderHealthRegistry()
+        policy = self._policy("cheapest_under_slo", registry)
+        fast_health = registry.get(self.fast.name)
+        for _ in range(4):
+            fast_health.record_failure()
+
+        assert fast_health.state == BREAKER_CLOSED
+        assert fast_health.ewma("error_rate") >= policy.max_error_rate
+        assert policy.rank("hi", 500) == [self.strong, self.fast]
+
+    def test_by_message_tiers(self):
+        """Short neutral messages go to the fast tier; long or emotional ones to the strong tier."""
+        policy = self._policy("by_message")
+
+        assert policy.rank("what time works tomorrow?", 100) == [self.fast, self.strong]
+        assert policy.rank("I feel so hopeless lately", 100) == [self.strong, self.fast]
+        assert policy.rank("word " * 100, 100)[0] == self.strong
+
+    def test_emotional_terms(self):
+        """Emotional cues are matched as whole words."""
+        assert is_emotional("I've been really ANXIOUS") is True
+        assert is_emotional("let's plan the dieting schedule") is False
+
+    def test_invalid_route_and_policy(self):
+        """Bad configuration is rejected."""
+        with pytest.raises(ValueError, match="tier"):
+            Route.from_config({"provider": "openai", "tier": "medium"})
+        with pytest.raises(ValueError, match="routing policy"):
+            RoutingPolicy([], "static", ProviderHealthRegistry(), 1000, 200)
+
+    def test_unknown_policy_fails_settings_validation(self):
+        """A misspelled LLM_ROUTING_POLICY is rejected when settings load, not per request."""
+        with pytest.raises(ValidationError, match="LLM_ROUTING_POLICY"):
+            Settings(LLM_ROUTING_POLICY="cheapest")
+
+    def test_factory_routes_by_policy(self, monkeypatch):
+        """route_streamer builds a router over the ranked routes."""
+        monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+        monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+        settings = get_settings()
+        monkeypatch.setattr(settings, "llm_routing_policy", "by_message")
+        monkeypatch.setattr(settings, "llm_routes", [
+            {"provider": "anthropic", "model": "claude-strong", "tier": "strong", "input_price": 3, "output_price": 15},
+            {"provider": "openai", "model": "gpt-fast", "tier": "fast", "input_price": 0.1, "output_price": 0.4},
+        ])
+        get_provider_health_registry().reset()
+
+        streamer = LLMFactory().route_streamer("ok thanks", 100)
+
+        assert isinstance(streamer, RoutingStreamer)
+        assert streamer.providers == ["openai:gpt-fast", "anthropic:claude-strong"]
+        assert streamer.prices["openai:gpt-fast"] == (0.1, 0.4)
+
+
+class TestLlmStatsApi:
+    """Test the internal stats endpoint."""
+
+    def test_requires_configured_token(self, monkeypatch):
+        """The endpoint is hidden without a token and rejects a wrong one."""
+        client = TestClient(app)
+        monkeypatch.setattr(get_settings(), "internal_api_token", "")
+        assert client.get("/internal/llm-stats").status_code == 404
+
+        monkeypatch.setattr(get_settings(), "internal_api_token", "secret")
+        assert client.get("/internal/llm-stats", headers={"X-Internal-Token": "wrong"}).status_code == 401
+
+    def test_returns_route_stats(self, monkeypatch):
+        """Route stats include breaker state and EWMA values."""
+        monkeypatch.setattr(get_settings(), "internal_api_token", "secret")
+        registry = get_provider_health_registry()
+        registry.reset()
+        registry.get("openai:gpt-fast").record_first_token(0.25)
+
+        response = TestClient(app).get("/internal/llm-stats", headers={"X-Internal-Token": "secret"})
+
+        assert response.status_code == 200
+        route = response.json()["routes"]["openai:gpt-fast"]
+        assert route["state"] == BREAKER_CLOSED
+        assert route["ewma"]["ttft_ms"] == pytest.approx(250)
+        registry.reset()
@@ -0,0 +1,157 @@
+"""Tests for the local memory-need classifier."""
+import pytest
+from unittest.mock import Mock
+
+from pydantic import ValidationError
+
+from app.config.settings import Settings, get_settings
+
+from app.services.memory_agent import MemoryAgent, warm_up_memory_agent
+from app.services.memory_classifier import (
+    DEFAULT_HOLDOUT_PATH,
+    LocalMemoryClassifier,
+    decide,
+    evaluate,
+    get_memory_classifier,
+    load_examples,
+)
+
+
+class TestLocalMemoryClassifier:
+    """Test cases for LocalMemoryClassifier."""
+
+    def test_fit_separates_training_data(self):
+        """Test that the model learns an easy separation."""
+        texts = ["remember last time", "like you said before", "hello", "good morning"]
+        labels = [True, True, False, False]
+        model = LocalMemoryClassifier(n_features=1024).fit(texts, labels)
+
+        assert model.predict_proba("remember last time") > 0.5
+        assert model.predict_proba("good morning") < 0.5
+
+    def test_save_and_load_round_trip(self, tmp_path):
+        """Test that a saved model predicts identically after loading."""
+        texts, labels = load_examples()
+        model = LocalMemoryClassifier().fit(texts, labels)
+        path = tmp_path / "model.json"
+        model.save(path)
+
+        loaded = LocalMemoryClassifier.load(path)
+
+        message = "you mentioned breathing exercises before"
+        assert loaded.predict_proba(message) == pytest.approx(model.predict_proba(message), abs=1e-4)
+
+    def test_confidence_gate(self):
+        """Test that only ambiguous probabilities are escalated."""
+        assert decide(0.9, 0.3, 0.7) is True
+        assert decide(0.1, 0.3, 0.7) is False
+        assert decide(0.5, 0.3, 0.7) is None
+
+    def test_holdout_is_disjoint_from_training_data(self):
+        """Test that no held-out message appears in the training examples."""
+        holdout, _ = load_examples(DEFAULT_HOLDOUT_PATH)
+        training, _ = load_examples()
+
+        assert not set(holdout) & set(training)
+
+    def test_bundled_model_on_holdout(self):
+        """Test that the shipped model decides most unseen messages locally and correctly."""
+        texts, labels = load_examples(DEFAULT_HOLDOUT_PATH)
+        result = evaluate(get_memory_classifier(), texts, labels, 0.3, 0.7)
+
+        assert result.accuracy > 0.85
+        assert result.coverage > 0.6
+        assert result.gated_accuracy > 0.9
+
+
+class TestHybridMemoryAssessment:
+    """Test MemoryAgent's local-first memory assessment."""
+
+    @pytest.fixture
+    def agent(self, db_session):
+        agent = MemoryAgent(db_session)
+        agent.fast_llm = Mock()
+        agent.fast_llm.invoke.return_value = Mock(content="TRUE")
+        return agent
+
+    @staticmethod
+    def _state(message):
+        return {"current_message": message, "needs_memory": False}
+
+    def test_confident_message_skips_llm(self, agent, monkeypatch):
+        """Test that confident local decisions never call the remote LLM."""
+        classifier = Mock()
+        classifier.predict_proba.return_value = 0.05
+        monkeypatch.setattr("app.services.memory_agent.get_memory_classifier", lambda: classifier)
+
+        state = agent._assess_memory_need(self._state("hello"))
+
+        assert state["needs_memory"] is False
+        agent.fast_llm.invoke.assert_not_called()
+
+    def test_ambiguous_message_escalates_to_llm(self, agent, monkeypatch):
+        """Test that ambiguous messages are sent to the remote LLM in hybrid mode."""
+        classifier = Mock()
+        classifier.predict_proba.return_value = 0.5
+        monkeypatch.setattr("app.services.memory_agent.get_memory_classifier", lambda: classifier)
+
+        state = agent._assess_memory_need(self._state("that thing"))
+
+        assert state["needs_memory"] is True
+        agent.fast_llm.invoke.assert_called_once()
+
+    def test_unknown_mode_is_rejected(self):
+        """Test that a misspelled MEMORY_CLASSIFIER_MODE fails settings validation."""
+        with pytest.raises(ValidationError, match="MEMORY_CLASSIFIER_MODE"):
+            Settings(MEMORY_CLASSIFIER_MODE="hybird")
+
+    def test_local_mode_never_escalates(self, agent, monkeypatch):
+        """Test that local mode thresholds ambiguous messages at 0.5."""
+        classifier = Mock()
+        classifier.predict_proba.return_value = 0.6
+        monkeypatch.setattr("app.services.memory_agent.get_memory_classifier", lambda: classifier)
+        agent.classifier_mode = "local"
+
+        state = agent._assess_memory_need(self._state("that thing"))
+
+        assert state["needs_memory"] is True
+        agent.fast_llm.invoke.assert_not_called()
+
+    def test_local_mode_needs_no_openai_key(self, db_session, monkeypatch):
+        """Test that local mode classifies without ever building the remote client."""
+        monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+        monkeypatch.setattr("app.services.memory_agent._classifier_llm", None)
+        monkeypatch.setattr(get_settings(), "memory_classifier_mode", "local")
+        classifier = Mock()
+        classifier.predict_proba.return_value = 0.9
+        monkeypatch.setattr("app.services.memory_agent.get_memory_classifier", lambda: classifier)
+
+        agent = MemoryAgent(db_session)
+        state = agent._assess_memory_need(self._state("you mentioned this before"))
+
+        assert state["needs_memory"] is True
+        assert "fast_llm" not in vars(agent)
+
+    def test_local_mode_without_model_uses_keywords(self, agent, monkeypatch):
+        """Test that local mode falls back to keywords rather than the remote LLM."""
+        monkeypatch.setattr("app.services.memory_agent.get_memory_classifier", lambda: None)
+        agent.classifier_mode = "local"
+
+        state = agent._assess_memory_need(self._state("like last time"))
+
+        assert state["needs_memory"] is True
+        agent.fast_llm.invoke.assert_not_called()
+
+    @pytest.mark.parametrize("mode, builds_client", [("local", False), ("hybrid", True), ("llm", True)])
+    def test_warm_up_builds_client_for_llm_modes_only(self, monkeypatch, mode, builds_client):
+        """Test that warm-up builds the classifier client exactly when the agent could use it."""
+        monkeypatch.setattr(get_settings(), "memory_classifier_mode", mode)
+        monkeypatch.setattr(get_settings(), "memory_enabled", True)
+        for name in ("get_compiled_graph", "get_memory_classifier", "get_prefetch_executor", "get_vector_store", "get_embedding_function"):
+            monkeypatch.setattr(f"app.services.memory_agent.{name}", Mock())
+        build_client = Mock()
+        monkeypatch.setattr("app.services.memory_agent.get_classifier_llm", build_client)
+
+        warm_up_memory_agent()
+
+        assert build_client.called is builds_client
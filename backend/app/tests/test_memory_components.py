@@ -161,7 +161,9 @@ class TestMemoryChunkerService:
     @pytest.fixture
     def mock_db_session(self):
         """Mock database session."""
-        return Mock(spec=Session)
+        session = Mock(spec=Session)
+        session.info = {}
+        return session
     
     @pytest.fixture
     def memory_chunker(self, mock_db_session):
@@ -190,23 +192,63 @@ class TestMemoryChunkerService:
         ]
         
         # Mock vector store
-        memory_chunker.vector_store.add_memory = Mock()
+        memory_chunker.vector_store.add_memories = Mock()
         
         # Mock repository (it's created in __init__)
-        memory_chunker.memory_repo.create = Mock()
+        memory_chunker.memory_repo.create_many = Mock()
         
         # Test chunking
-        memory_chunker.chunk_and_store_session(
+        created = memory_chunker.chunk_and_store_session(
             session_id="test-session",
             user_id=1,
             messages=messages
         )
         
-        # Verify vector store was called
-        assert memory_chunker.vector_store.add_memory.called
+        # Verify vector store was called once with every chunk
+        memory_chunker.vector_store.add_memories.assert_called_once()
+        chunk_ids, texts, metadatas = memory_chunker.vector_store.add_memories.call_args[0]
+        assert len(chunk_ids) == len(texts) == len(metadatas) == created == 1
+        
+        # Verify repository was called once and the batch committed once
+        memory_chunker.memory_repo.create_many.assert_called_once()
+        memory_chunker.db.commit.assert_called_once()
+    
+    def test_chunk_and_store_session_all_or_nothing(self, memory_chunker):
+        """Test that a failed vector add writes no SQL and reports no chunks."""
+        messages = [Mock(id=i, role="user" if i % 2 else "assistant", content=f"m{i}") for i in range(1, 14)]
+        memory_chunker.memory_repo.create_many = Mock()
+        memory_chunker.vector_store.add_memories = Mock(side_effect=RuntimeError("embedding failed"))
+        
+        created = memory_chunker.chunk_and_store_session("test-session", 1, messages)
+        
+        assert created == 0
+        memory_chunker.memory_repo.create_many.assert_not_called()
+        memory_chunker.db.commit.assert_not_called()
+    
+    def test_chunk_and_store_session_embeds_before_sql(self, memory_chunker):
+        """Test that embedding finishes before the SQL transaction starts."""
+        messages = [Mock(id=1, role="user", content="Hello"), Mock(id=2, role="assistant", content="Hi")]
+        calls = []
+        memory_chunker.vector_store.add_memories = Mock(side_effect=lambda *a: calls.append("vectors"))
+        memory_chunker.memory_repo.create_many = Mock(side_effect=lambda *a: calls.append("insert"))
+        memory_chunker.db.commit.side_effect = lambda: calls.append("commit")
+        
+        memory_chunker.chunk_and_store_session("test-session", 1, messages)
         
-        # Verify repository was called
-        assert memory_chunker.memory_repo.create.called
+        assert calls == ["vectors", "insert", "commit"]
+    
+    def test_chunk_and_store_session_removes_vectors_on_commit_failure(self, memory_chunker):
+        """Test that vectors are deleted again if the SQL commit fails."""
+        messages = [Mock(id=1, role="user", content="Hello"), Mock(id=2, role="assistant", content="Hi")]
+        memory_chunker.memory_repo.create_many = Mock()
+        memory_chunker.vector_store.add_memories = Mock()
+        memory_chunker.db.commit.side_effect = RuntimeError("disk full")
+        
+        created = memory_chunker.chunk_and_store_session("test-session", 1, messages)
+        
+        assert created == 0
+        chunk_ids = memory_chunker.vector_store.add_memories.call_args[0][0]
+        memory_chunker.vector_store.delete_memories.assert_called_once_with(chunk_ids)
     
     def test_create_semantic_chunks(self, memory_chunker):
         """Test semantic chunking logic."""
@@ -278,6 +320,19 @@ class TestMemoryRepository:
         memory_repository.db.add.assert_called_once_with(chunk)
         memory_repository.db.commit.assert_called_once()
     
+    def test_create_many_commits_once(self, memory_repository):
+        """Test that bulk creation adds all chunks and commits once without refreshes."""
+        chunks = [
+            MemoryChunk(chunk_id=f"bulk-{i}", user_id=1, session_id="test-session", chunk_text="t", message_ids="1", chunk_type="conversation")
+            for i in range(3)
+        ]
+        
+        memory_repository.create_many(chunks)
+        
+        memory_repository.db.add_all.assert_called_once_with(chunks)
+        memory_repository.db.commit.assert_called_once()
+        memory_repository.db.refresh.assert_not_called()
+    
     def test_find_by_user_id(self, memory_repository):
         """Test finding chunks by user ID."""
         # Mock query result
@@ -327,6 +382,12 @@ class TestMemoryRepository:
         memory_repository.db.commit.assert_called_once()
 
 
+def _bag_of_words_embedding(texts):
+    """Deterministic toy embedding: counts of a few vocabulary words."""
+    vocabulary = ["job", "work", "sister", "family", "sleep", "anxiety"]
+    return [[text.lower().count(word) + 0.01 for word in vocabulary] for text in texts]
+
+
 class TestVectorStoreService:
     """Test VectorStoreService functionality."""
     
@@ -340,7 +401,7 @@ class TestVectorStoreService:
             mock_client.get_or_create_collection.return_value = mock_collection
             mock_chromadb.PersistentClient.return_value = mock_client
             
-            vs = VectorStoreService()
+            vs = VectorStoreService(embedding_function=_bag_of_words_embedding)
             vs.client = mock_client
             vs.collection = mock_collection
             return vs
@@ -359,6 +420,39 @@ class TestVectorStoreService:
         assert call_args[1]["ids"] == ["test-chunk"]
         assert call_args[1]["documents"] == ["Test conversation"]
         assert call_args[1]["metadatas"] == [{"user_id": 1, "session_id": "test-session"}]
+        assert call_args[1]["embeddings"] == _bag_of_words_embedding(["Test conversation"])
+    
+    def test_add_memories_single_call(self, vector_store):
+        """Test that a batch of memories is added with one collection.add."""
+        vector_store.add_memories(
+            ["a", "b"],
+            ["first", "second"],
+            [{"user_id": 1}, {"user_id": 1}]
+        )
+        
+        vector_store.collection.add.assert_called_once_with(
+            ids=["a", "b"],
+            documents=["first", "second"],
+            metadatas=[{"user_id": 1}, {"user_id": 1}],
+            embeddings=_bag_of_words_embedding(["first", "second"])
+        )
+    
+    def test_add_memories_requires_user_id(self, vector_store):
+        """Test that every metadata entry must carry user_id."""
+        with pytest.raises(ValueError):
+            vector_store.add_memories(["a"], ["first"], [{"session_id": "s"}])
+        vector_store.collection.add.assert_not_called()
+    
+    def test_search_memories_queries_by_embedding(self, vector_store):
+        """Test the query is embedded locally and sent as query_embeddings."""
+        vector_store.collection.query.return_value = {"documents": [[]], "metadatas": [[]], "distances": [[]], "ids": [[]]}
+        
+        vector_store.search_memories(query="my job", user_id=1, limit=3, min_similarity=0.5)
+        
+        call_kwargs = vector_store.collection.query.call_args[1]
+        assert call_kwargs["query_embeddings"] == _bag_of_words_embedding(["my job"])
+        assert call_kwargs["where"] == {"user_id": 1}
+        assert "query_texts" not in call_kwargs
     
     def test_search_memories(self, vector_store):
         """Test searching memories."""
@@ -428,6 +522,127 @@ class TestVectorStoreService:
         assert stats["count"] == 42
 
 
+class TestNumpyVectorStore:
+    """Test the per-user numpy shard backend."""
+    
+    @pytest.fixture
+    def vector_store(self, tmp_path):
+        """Create a NumpyVectorStore in a temporary directory."""
+        from app.services.numpy_vector_store import NumpyVectorStore
+        return NumpyVectorStore(
+            shard_directory=str(tmp_path / "shards"),
+            embedding_function=_bag_of_words_embedding,
+            hnsw_threshold=0,
+        )
+    
+    def test_search_ranks_by_cosine_within_user_shard(self, vector_store):
+        """Test exact search returns the closest memories of that user only."""
+        vector_store.add_memories(
+            ["a", "b", "c"],
+            ["stress at work and my job", "my sister and family", "another job worry"],
+            [{"user_id": 1, "session_id": "s1"}, {"user_id": 1, "session_id": "s1"}, {"user_id": 2, "session_id": "s2"}]
+        )
+        
+        result = vector_store.search_memories("job", user_id=1, limit=2, min_similarity=0.0)
+        
+        assert result["ids"][0] == ["a", "b"]
+        assert result["distances"][0][0] < result["distances"][0][1]
+        assert all(m["user_id"] == 1 for m in result["metadatas"][0])
+    
+    def test_search_applies_similarity_threshold(self, vector_store):
+        """Test memories below min_similarity are dropped."""
+        vector_store.add_memories(["a", "b"], ["job job", "sister"], [{"user_id": 1}, {"user_id": 1}])
+        
+        result = vector_store.search_memories("job", user_id=1, limit=5, min_similarity=0.9)
+        
+        assert result["ids"][0] == ["a"]
+    
+    def test_unknown_user_returns_empty_results(self, vector_store):
+        """Test a user without a shard gets empty Chroma-shaped results."""
+        result = vector_store.search_memories("job", user_id=99, limit=3, min_similarity=0.0)
+        assert result == {"documents": [[]], "metadatas": [[]], "distances": [[]], "ids": [[]]}
+    
+    def test_shards_persist_and_reload_memory_mapped(self, vector_store):
+        """Test a new store over the same directory sees existing shards."""
+        from app.services.numpy_vector_store import NumpyVectorStore
+        vector_store.add_memories(["a"], ["work"], [{"user_id": 3, "session_id": "s3"}])
+        
+        reopened = NumpyVectorStore(
+            shard_directory=str(vector_store.root),
+            embedding_function=_bag_of_words_embedding,
+        )
+        
+        assert reopened.search_memories("work", user_id=3, limit=1, min_similarity=0.0)["ids"][0] == ["a"]
+        assert reopened.get_collection_stats()["count"] == 1
+        reopened.delete_memories(["a"])
+        assert reopened.search_memories("work", user_id=3, limit=1, min_similarity=0.0)["ids"][0] == []
+    
+    def test_delete_by_session_and_user(self, vector_store):
+        """Test session and user deletes only touch matching memories."""
+        vector_store.add_memories(
+            ["a", "b", "c"],
+            ["work", "sleep", "family"],
+            [{"user_id": 1, "session_id": "s1"}, {"user_id": 1, "session_id": "s2"}, {"user_id": 2, "session_id": "s3"}]
+        )
+        
+        vector_store.delete_session_memories("s1")
+        assert vector_store.search_memories("work sleep", user_id=1, limit=5, min_similarity=0.0)["ids"][0] == ["b"]
+        
+        vector_store.delete_user_memories(2)
+        assert vector_store.search_memories("family", user_id=2, limit=5, min_similarity=0.0)["ids"][0] == []
+        assert vector_store.get_collection_stats()["count"] == 1
+    
+    def test_writes_from_another_process_are_not_lost(self, vector_store):
+        """Test a store with a stale cached shard reloads it before writing."""
+        from app.services.numpy_vector_store import NumpyVectorStore
+        other = NumpyVectorStore(shard_directory=str(vector_store.root), embedding_function=_bag_of_words_embedding)
+        vector_store.add_memories(["a"], ["work"], [{"user_id": 1, "session_id": "s1"}])
+        assert other.search_memories("work", user_id=1, limit=5, min_similarity=0.0)["ids"][0] == ["a"]
+        
+        vector_store.add_memories(["b"], ["sleep"], [{"user_id": 1, "session_id": "s2"}])
+        other.add_memories(["c"], ["family"], [{"user_id": 1, "session_id": "s3"}])
+        
+        found = vector_store.search_memories("work sleep family", user_id=1, limit=5, min_similarity=0.0)["ids"][0]
+        assert sorted(found) == ["a", "b", "c"]
+    
+    def test_deletes_memories_added_by_another_process(self, vector_store):
+        """Test deletes find shards that another store instance wrote after startup."""
+        from app.services.numpy_vector_store import NumpyVectorStore
+        other = NumpyVectorStore(shard_directory=str(vector_store.root), embedding_function=_bag_of_words_embedding)
+        vector_store.add_memories(["a", "b"], ["work", "sleep"], [{"user_id": 1, "session_id": "s1"}, {"user_id": 1, "session_id": "s2"}])
+        
+        other.delete_memories(["a"])
+        other.delete_session_memories("s2")
+        
+        assert vector_store.search_memories("work sleep", user_id=1, limit=5, min_similarity=0.0)["ids"][0] == []
+    
+    def test_session_delete_prunes_session_owners(self, vector_store):
+        """Test removing a session's last memory forgets the session owner."""
+        vector_store.add_memories(["a", "b"], ["work", "sleep"], [{"user_id": 1, "session_id": "s1"}, {"user_id": 1, "session_id": "s2"}])
+        
+        vector_store.delete_memories(["a"])
+        vector_store.delete_session_memories("s2")
+        
+        assert vector_store._session_owners == {}
+        assert vector_store._chunk_owners == {}
+    
+    def test_add_memories_requires_user_id(self, vector_store):
+        """Test that every metadata entry must carry user_id."""
+        with pytest.raises(ValueError):
+            vector_store.add_memories(["a"], ["first"], [{"session_id": "s"}])
+    
+    def test_backend_selected_from_settings(self, tmp_path, monkeypatch):
+        """Test get_vector_store builds the configured backend."""
+        from app.services import vector_store as vs_module
+        from app.services.numpy_vector_store import NumpyVectorStore
+        settings = get_settings()
+        monkeypatch.setattr(settings, "vector_store_backend", "numpy")
+        monkeypatch.setattr(settings, "vector_store_shard_directory", str(tmp_path / "shards"))
+        monkeypatch.setattr(vs_module, "_vector_store_instance", None)
+        
+        assert isinstance(vs_module.get_vector_store(), NumpyVectorStore)
+
+
 class TestMemoryIntegration:
     """Integration tests for memory system."""
     
@@ -507,6 +722,8 @@ class TestMemoryBehaviorGaps:
     def agent(self, db_session):
         # Use a real agent instance but stub external calls
         agent = MemoryAgent(db_session)
+        # These tests exercise the sequential assess -> retrieve graph
+        agent.speculative_retrieval = False
         return agent
 
     def test_first_conversation_context_injected(self, agent, monkeypatch):
@@ -530,6 +747,32 @@ class TestMemoryBehaviorGaps:
         assert "<conversation_context>" in system_text
         assert "first conversation" in system_text
 
+    def test_persona_prompt_marked_as_cacheable_prefix(self, agent, monkeypatch):
+        """The stored persona prompt stays first and is marked as the cacheable prefix."""
+        from app.prompts import CACHE_PREFIX_KEY, split_system_prompt
+        monkeypatch.setattr(agent, "_get_recent_context", lambda u, s: "- Session on 2024-01-01: work stress")
+
+        history = [{"role": "system", "content": "You are TherapyBro"}, {"role": "user", "content": "hi"}]
+        ctx = agent._build_context(self._state(history))["final_context"]
+
+        assert ctx[0][CACHE_PREFIX_KEY] == "You are TherapyBro"
+        prefix, suffix = split_system_prompt(ctx[0])
+        assert prefix == "You are TherapyBro"
+        assert "<recent_context>" in suffix
+        assert ctx[1:] == history[1:]
+
+    @staticmethod
+    def _state(history):
+        return {
+            "user_id": 1,
+            "session_id": "s1",
+            "current_message": "hi",
+            "conversation_history": history,
+            "retrieved_memories": [],
+            "user_name": None,
+            "user_age": None,
+        }
+
     def test_assess_memory_true_retrieves(self, agent, monkeypatch):
         """If assess says TRUE, we retrieve and include memories in context."""
         def _assess_true(state):
@@ -581,3 +824,116 @@ class TestMemoryBehaviorGaps:
         assert called["q"] is False  # ensure we did not hit vector store
         system_text = ctx[0]["content"] if ctx and ctx[0]["role"] == "system" else ""
         assert "<relevant_memories>" not in system_text
+
+
+class TestSharedMemoryGraph:
+    """Test that MemoryAgent instances share the compiled graph and client."""
+
+    def test_instances_share_graph_and_llm(self, db_session):
+        first = MemoryAgent(db_session)
+        second = MemoryAgent(db_session)
+
+        assert first.graph is second.graph
+        assert first.fast_llm is second.fast_llm
+
+    def test_shared_graph_dispatches_to_calling_agent(self, db_session, monkeypatch):
+        """A patched node on one agent does not leak into another using the same graph."""
+        patched = MemoryAgent(db_session)
+        plain = MemoryAgent(db_session)
+        for agent in (patched, plain):
+            monkeypatch.setattr(agent, "_get_recent_context", lambda u, s: None)
+            monkeypatch.setattr(agent.vector_store, "search_memories", lambda **kwargs: {"documents": [[]]})
+
+        def _assess(state):
+            state["needs_memory"] = False
+            return state
+        monkeypatch.setattr(patched, "_assess_memory_need", _assess)
+        monkeypatch.setattr(patched, "_build_context", lambda state: {**state, "final_context": [{"role": "system", "content": "patched"}]})
+
+        history = [{"role": "system", "content": "You are TherapyBro"}]
+        assert patched.process(user_id=7, session_id="s7", message="hi", history=history)[0]["content"] == "patched"
+        assert plain.process(user_id=7, session_id="s7", message="hi", history=history)[0]["content"] != "patched"
+
+
+class TestSpeculativeMemoryPrefetch:
+    """Test the speculative (concurrent) memory prefetch mode."""
+
+    @pytest.fixture
+    def agent(self, db_session):
+        agent = MemoryAgent(db_session)
+        agent.speculative_retrieval = True
+        agent.prefetch_budget_seconds = 2.0
+        return agent
+
+    @staticmethod
+    def _search_result(*docs):
+        return {"documents": [list(docs)], "metadatas": [[{} for _ in docs]], "distances": [[0.1 for _ in docs]], "ids": [[str(i) for i in range(len(docs))]]}
+
+    def test_steps_run_concurrently(self, agent, monkeypatch):
+        """Pre-LLM latency is the max of the steps, not their sum."""
+        import time
+
+        def _assess(state):
+            time.sleep(0.3)
+            state["needs_memory"] = True
+            return state
+
+        def _search(**kwargs):
+            time.sleep(0.3)
+            return self._search_result("Past memory A")
+
+        def _recent(user_id, session_id):
+            time.sleep(0.3)
+            return "- Jan 01: felt anxious"
+
+        monkeypatch.setattr(agent, "_assess_memory_need", _assess)
+        monkeypatch.setattr(agent.vector_store, "search_memories", _search)
+        monkeypatch.setattr(agent, "_get_recent_context", _recent)
+        agent.graph = agent._build_graph()
+
+        started = time.monotonic()
+        ctx = agent.process(user_id=4, session_id="s4", message="remember?", history=[{"role": "system", "content": "You are TherapyBro"}])
+        elapsed = time.monotonic() - started
+
+        assert elapsed < 0.8
+        assert "Past memory A" in ctx[0]["content"]
+        assert "felt anxious" in ctx[0]["content"]
+
+    def test_memories_discarded_when_not_needed(self, agent, monkeypatch):
+        """Speculatively retrieved memories are dropped if the classifier says no."""
+        def _assess(state):
+            state["needs_memory"] = False
+            return state
+
+        monkeypatch.setattr(agent, "_assess_memory_need", _assess)
+        monkeypatch.setattr(agent.vector_store, "search_memories", lambda **kwargs: self._search_result("Should not appear"))
+        monkeypatch.setattr(agent, "_get_recent_context", lambda u, s: None)
+        agent.graph = agent._build_graph()
+
+        ctx = agent.process(user_id=5, session_id="s5", message="hi", history=[{"role": "system", "content": "You are TherapyBro"}])
+
+        assert "<relevant_memories>" not in ctx[0]["content"]
+        assert "Should not appear" not in ctx[0]["content"]
+
+    def test_slow_classifier_falls_back_to_keywords(self, agent, monkeypatch):
+        """A classifier that misses the budget is replaced by the keyword heuristic."""
+        import threading
+        release = threading.Event()
+
+        def _assess(state):
+            release.wait(2)
+            state["needs_memory"] = False
+            return state
+
+        agent.prefetch_budget_seconds = 0.2
+        monkeypatch.setattr(agent, "_assess_memory_need", _assess)
+        monkeypatch.setattr(agent.vector_store, "search_memories", lambda **kwargs: self._search_result("Past memory B"))
+        monkeypatch.setattr(agent, "_get_recent_context", lambda u, s: None)
+        agent.graph = agent._build_graph()
+
+        try:
+            ctx = agent.process(user_id=6, session_id="s6", message="like I said last time", history=[{"role": "system", "content": "You are TherapyBro"}])
+        finally:
+            release.set()
+
+        assert "Past memory B" in ctx[0]["content"]
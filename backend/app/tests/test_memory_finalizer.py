@@ -0,0 +1,256 @@
+"""Tests for the durable background memory finalization queue."""
+import pytest
+from datetime import timedelta
+from unittest.mock import patch
+from sqlalchemy.orm import sessionmaker
+
+from app.models import ChatSession, Message, MemoryFinalizationJob
+from app.repositories.finalization_job_repository import MemoryFinalizationJobRepository
+from app.services.memory_finalizer import MemoryFinalizationWorker, enqueue_session_finalization, finalize_session
+from app.utils import now_utc
+
+
+def _make_session(db, user_id, session_id, end_offset_minutes=-5, status="ended", messages=2):
+    now = now_utc()
+    chat_session = ChatSession(
+        session_id=session_id,
+        user_id=user_id,
+        category="TherapyBro",
+        created_at=now - timedelta(minutes=15),
+        updated_at=now,
+        session_start_time=now - timedelta(minutes=10),
+        session_end_time=now + timedelta(minutes=end_offset_minutes),
+        duration_seconds=300,
+        status=status,
+    )
+    db.add(chat_session)
+    db.add(Message(session_id=session_id, role="system", content="sys", created_at=now))
+    for i in range(messages - 1):
+        db.add(Message(session_id=session_id, role="user", content=f"message {i}", created_at=now))
+    db.commit()
+    return chat_session
+
+
+@pytest.fixture
+def worker(db_session):
+    """Worker bound to the test database (no threads are started)."""
+    factory = sessionmaker(bind=db_session.get_bind(), autoflush=False)
+    return MemoryFinalizationWorker(
+        session_factory=factory,
+        workers=1,
+        max_attempts=3,
+        backoff_seconds=10.0,
+        lease_seconds=60.0,
+    )
+
+
+class TestFinalizationQueue:
+    """Test job enqueueing and claiming."""
+
+    def test_enqueue_is_idempotent_per_session(self, db_session, test_user):
+        """Queuing the same session twice keeps a single pending job."""
+        _make_session(db_session, test_user.id, "sess-fin-1")
+        repo = MemoryFinalizationJobRepository(db_session)
+
+        assert repo.enqueue("sess-fin-1", test_user.id) is True
+        assert repo.enqueue("sess-fin-1", test_user.id) is False
+
+        jobs = db_session.query(MemoryFinalizationJob).filter_by(session_id="sess-fin-1").all()
+        assert len(jobs) == 1
+        assert jobs[0].status == "pending"
+
+    def test_enqueue_is_noop_when_memory_disabled(self, db_session, test_user):
+        """No job is created when memory is disabled."""
+        _make_session(db_session, test_user.id, "sess-fin-off")
+        with patch("app.services.memory_finalizer.get_settings") as mock_settings:
+            mock_settings.return_value.memory_enabled = False
+            assert enqueue_session_finalization(db_session, "sess-fin-off", test_user.id) is False
+        assert MemoryFinalizationJobRepository(db_session).find_by_session_id("sess-fin-off") is None
+
+    def test_claimed_job_is_not_claimed_again_until_lease_expires(self, db_session, test_user):
+        """A running job is invisible to other workers while its lease holds."""
+        _make_session(db_session, test_user.id, "sess-fin-lease")
+        repo = MemoryFinalizationJobRepository(db_session)
+        repo.enqueue("sess-fin-lease", test_user.id)
+
+        claimed = repo.claim_due(limit=5, lease_seconds=60)
+        assert [job.session_id for job in claimed] == ["sess-fin-lease"]
+        assert claimed[0].status == "running"
+        assert claimed[0].attempts == 1
+        assert repo.claim_due(limit=5, lease_seconds=60) == []
+
+        # Simulate a crashed worker: the expired lease makes the job claimable again
+        claimed[0].locked_until = now_utc() - timedelta(seconds=1)
+        db_session.commit()
+        reclaimed = repo.claim_due(limit=5, lease_seconds=60)
+        assert len(reclaimed) == 1
+        assert reclaimed[0].attempts == 2
+
+
+class TestMemoryFinalizationWorker:
+    """Test job processing, retries and the expired-session sweeper."""
+
+    def test_run_pending_marks_job_done(self, db_session, test_user, worker):
+        """A successful finalization chunks the session and completes the job."""
+        _make_session(db_session, test_user.id, "sess-fin-ok")
+        MemoryFinalizationJobRepository(db_session).enqueue("sess-fin-ok", test_user.id)
+
+        with patch(
+            "app.services.memory_chunker.MemoryChunkerService.chunk_and_store_session", return_value=2
+        ) as mock_chunk, patch("app.services.memory_chunker.get_vector_store"):
+            assert worker.run_pending() == 1
+
+        mock_chunk.assert_called_once()
+        assert mock_chunk.call_args[0][0] == "sess-fin-ok"
+        db_session.expire_all()
+        job = MemoryFinalizationJobRepository(db_session).find_by_session_id("sess-fin-ok")
+        assert job.status == "done"
+        assert job.completed_at is not None
+        assert worker.run_pending() == 0
+
+    def test_single_message_session_is_finalized(self, db_session, test_user):
+        """A session with one conversation message and no system row is still indexed."""
+        _make_session(db_session, test_user.id, "sess-fin-single", messages=1)
+        db_session.query(Message).filter_by(session_id="sess-fin-single", role="system").delete()
+        db_session.add(Message(session_id="sess-fin-single", role="user", content="only message", created_at=now_utc()))
+        db_session.commit()
+
+        with patch(
+            "app.services.memory_chunker.MemoryChunkerService.chunk_and_store_session", return_value=1
+        ) as mock_chunk, patch("app.services.memory_chunker.get_vector_store"):
+            assert finalize_session(db_session, "sess-fin-single", test_user.id) == 1
+
+        assert [m.content for m in mock_chunk.call_args[0][2]] == ["only message"]
+
+    def test_system_only_session_is_skipped(self, db_session, test_user):
+        """A legacy session holding only a system row has nothing to index."""
+        _make_session(db_session, test_user.id, "sess-fin-system", messages=1)
+
+        with patch("app.services.memory_chunker.MemoryChunkerService.chunk_and_store_session") as mock_chunk:
+            assert finalize_session(db_session, "sess-fin-system", test_user.id) == 0
+
+        mock_chunk.assert_not_called()
+
+    def test_failure_retries_with_backoff_then_gives_up(self, db_session, test_user, worker):
+        """Failed attempts are rescheduled with growing delays until max_attempts."""
+        _make_session(db_session, test_user.id, "sess-fin-err")
+        repo = MemoryFinalizationJobRepository(db_session)
+        repo.enqueue("sess-fin-err", test_user.id)
+
+        with patch(
+            "app.services.memory_chunker.MemoryChunkerService.chunk_and_store_session", return_value=0
+        ), patch("app.services.memory_chunker.get_vector_store"):
+            delays = []
+            for _ in range(worker.max_attempts):
+                before = now_utc()
+                assert worker.run_pending() == 1
+                db_session.expire_all()
+                job = repo.find_by_session_id("sess-fin-err")
+                if job.status == "pending":
+                    delays.append((job.next_attempt_at.replace(tzinfo=before.tzinfo) - before).total_seconds())
+                    # Make the retry due now
+                    job.next_attempt_at = now_utc() - timedelta(seconds=1)
+                    db_session.commit()
+
+        assert [round(d) for d in delays] == [10, 20]
+        assert job.status == "failed"
+        assert job.attempts == worker.max_attempts
+        assert "memory chunking failed" in job.last_error
+        assert worker.run_pending() == 0
+
+    def test_sweeper_queues_expired_sessions_only(self, db_session, test_user, worker):
+        """Sessions past their end time are queued; active ones are not."""
+        _make_session(db_session, test_user.id, "sess-fin-expired")
+        _make_session(db_session, test_user.id, "sess-fin-active", end_offset_minutes=5, status="active")
+
+        assert worker.sweep() == 1
+        repo = MemoryFinalizationJobRepository(db_session)
+        assert repo.find_by_session_id("sess-fin-expired") is not None
+        assert repo.find_by_session_id("sess-fin-active") is None
+        # Already queued: the next sweep finds nothing new
+        assert worker.sweep() == 0
+
+    def test_sweeper_requeues_session_extended_after_finalization(self, db_session, test_user, worker):
+        """A session that ended again after its last finalization is re-queued."""
+        chat_session = _make_session(db_session, test_user.id, "sess-fin-extended")
+        repo = MemoryFinalizationJobRepository(db_session)
+        repo.enqueue("sess-fin-extended", test_user.id)
+        job = repo.claim_due(limit=1, lease_seconds=60)[0]
+        repo.mark_done(job)
+        job.completed_at = now_utc() - timedelta(minutes=8)
+        db_session.commit()
+
+        assert worker.sweep() == 1
+        db_session.expire_all()
+        job = repo.find_by_session_id(chat_session.session_id)
+        assert job.status == "pending"
+        assert job.attempts == 0
+
+    def test_sweeper_skips_sessions_outside_lookback(self, db_session, test_user, worker):
+        """Sessions that ended before the lookback window are not backfilled."""
+        _make_session(db_session, test_user.id, "sess-fin-recent")
+        _make_session(db_session, test_user.id, "sess-fin-historic", end_offset_minutes=-3 * 24 * 60)
+        worker.sweep_lookback_hours = 24
+
+        assert worker.sweep() == 1
+        repo = MemoryFinalizationJobRepository(db_session)
+        assert repo.find_by_session_id("sess-fin-historic") is None
+
+
+class TestFinalizationRearm:
+    """Test when a finished or failed job is queued again."""
+
+    def _finish(self, db, repo, session_id, user_id, status="done"):
+        repo.enqueue(session_id, user_id)
+        job = repo.claim_due(limit=1, lease_seconds=60)[0]
+        if status == "done":
+            repo.mark_done(job)
+        else:
+            repo.mark_failed(job, "boom", retry_at=None)
+        return job
+
+    def test_done_job_is_not_requeued_for_same_end(self, db_session, test_user):
+        """Repeated sends to an expired, finalized session do not re-index it."""
+        chat_session = _make_session(db_session, test_user.id, "sess-rearm-same")
+        repo = MemoryFinalizationJobRepository(db_session)
+        self._finish(db_session, repo, "sess-rearm-same", test_user.id)
+
+        assert repo.enqueue("sess-rearm-same", test_user.id, ended_at=chat_session.session_end_time) is False
+        assert repo.enqueue("sess-rearm-same", test_user.id) is False
+        assert repo.find_by_session_id("sess-rearm-same").status == "done"
+
+    def test_done_job_is_requeued_when_session_ended_again(self, db_session, test_user):
+        """A session that ended after its last finalization is queued again."""
+        _make_session(db_session, test_user.id, "sess-rearm-later")
+        repo = MemoryFinalizationJobRepository(db_session)
+        job = self._finish(db_session, repo, "sess-rearm-later", test_user.id)
+
+        assert repo.enqueue("sess-rearm-later", test_user.id, ended_at=job.completed_at + timedelta(minutes=1)) is True
+        assert repo.find_by_session_id("sess-rearm-later").status == "pending"
+
+    def test_failed_job_is_only_requeued_when_forced(self, db_session, test_user):
+        """A failed job stays failed until an extension forces a re-index."""
+        _make_session(db_session, test_user.id, "sess-rearm-failed")
+        repo = MemoryFinalizationJobRepository(db_session)
+        self._finish(db_session, repo, "sess-rearm-failed", test_user.id, status="failed")
+
+        assert repo.enqueue("sess-rearm-failed", test_user.id, ended_at=now_utc()) is False
+        assert repo.enqueue("sess-rearm-failed", test_user.id, force=True) is True
+        job = repo.find_by_session_id("sess-rearm-failed")
+        assert job.status == "pending"
+        assert job.attempts == 0
+
+    def test_duplicate_insert_keeps_callers_transaction(self, db_session, test_user):
+        """A concurrent duplicate only rolls back the job insert, not the caller's pending work."""
+        _make_session(db_session, test_user.id, "sess-rearm-race")
+        repo = MemoryFinalizationJobRepository(db_session)
+        repo.enqueue("sess-rearm-race", test_user.id)
+        db_session.add(Message(session_id="sess-rearm-race", role="user", content="pending write", created_at=now_utc()))
+        db_session.flush()
+
+        with patch.object(repo, "find_by_session_id", return_value=None):
+            assert repo.enqueue("sess-rearm-race", test_user.id) is False
+
+        db_session.commit()
+        contents = [m.content for m in db_session.query(Message).filter_by(session_id="sess-rearm-race")]
+        assert "pending write" in contents
@@ -43,7 +43,7 @@ def test_send_blocked_when_session_expired(db_session, test_user):
     def _override_db():
         yield db_session
     app.dependency_overrides[get_db_session] = _override_db
-    # Monkeypatch chunker to observe finalize-on-expiry behavior
+    # Monkeypatch chunker to check finalize-on-expiry no longer chunks inline
     from app.services import memory_chunker as mc
     called = {"chunked": False}
     original = mc.MemoryChunkerService.chunk_and_store_session
@@ -65,8 +65,12 @@ def test_send_blocked_when_session_expired(db_session, test_user):
     body = res.json()
     assert body["error"]["code"] == "HTTP_403"
     assert "Session has ended" in body["error"]["message"]
-    # Ensure finalize-on-expiry attempted chunking
-    assert called["chunked"] is True
+    # Finalize-on-expiry queues a background job instead of chunking in the request
+    assert called["chunked"] is False
+    from app.repositories.finalization_job_repository import MemoryFinalizationJobRepository
+    job = MemoryFinalizationJobRepository(db).find_by_session_id(s.session_id)
+    assert job is not None
+    assert job.status == "pending"
 
 
 def test_send_blocked_at_exact_expiry_boundary(db_session, test_user):
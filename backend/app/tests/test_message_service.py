@@ -249,3 +249,93 @@ class TestMessageService:
             
             # Verify that the response has a body iterator
             assert hasattr(response, 'body_iterator')
+    
+    def test_streaming_uses_async_streamer(self, db_session, test_user):
+        """Test that native async streamers are consumed on the event loop and persisted."""
+        import asyncio
+        message_service = MessageService(db_session)
+        
+        session_service = SessionService(db_session)
+        session_out = session_service.create_session(
+            test_user.id,
+            "therapy",
+            "You are a helpful therapist."
+        )
+        session_id = session_out.session_id
+        
+        class FakeAsyncStreamer:
+            model = "fake-async"
+            
+            def stream_chat(self, messages, **kwargs):
+                raise AssertionError("sync path should not be used")
+            
+            async def astream_chat(self, messages, **kwargs):
+                for tok in ["Hello", " async"]:
+                    yield tok
+        
+        async def collect(response):
+            return [chunk async for chunk in response.body_iterator]
+        
+        with patch('app.services.message_service.get_llm_factory') as mock_get_factory:
+            mock_get_factory.return_value.create_streamer.return_value = FakeAsyncStreamer()
+            response = message_service.process_message_stream(session_id, test_user.id, "Hello")
+            frames = [json.loads(c) for c in asyncio.run(collect(response))]
+        
+        # Tokens arriving back to back are coalesced into one delta frame
+        assert frames[:-1] == [{"type": "delta", "content": "Hello async"}]
+        assert frames[-1] == {"type": "done"}
+        history = message_service.get_conversation_history(session_id)
+        assert history[-1] == {"role": "assistant", "content": "Hello async"}
+    
+    def test_streaming_falls_back_to_sync_streamer(self, db_session, test_user):
+        """Test that sync-only streamers are drained through the threadpool."""
+        import asyncio
+        message_service = MessageService(db_session)
+        
+        session_service = SessionService(db_session)
+        session_out = session_service.create_session(
+            test_user.id,
+            "therapy",
+            "You are a helpful therapist."
+        )
+        session_id = session_out.session_id
+        
+        async def collect(response):
+            return [chunk async for chunk in response.body_iterator]
+        
+        with patch('app.services.message_service.get_llm_factory') as mock_get_factory:
+            mock_streamer = Mock(spec=["model", "stream_chat"])
+            mock_streamer.model = "test-model"
+            mock_streamer.stream_chat.return_value = ["Hi", "!"]
+            mock_get_factory.return_value.create_streamer.return_value = mock_streamer
+            response = message_service.process_message_stream(session_id, test_user.id, "Hello")
+            frames = [json.loads(c) for c in asyncio.run(collect(response))]
+        
+        assert "".join(f.get("content") for f in frames[:-1]) == "Hi!"
+        assert frames[-1] == {"type": "done"}
+    
+    def test_streaming_sse_format(self, db_session, test_user):
+        """Test that the SSE format carries the same frames as data events."""
+        import asyncio
+        message_service = MessageService(db_session)
+        session_id = SessionService(db_session).create_session(
+            test_user.id,
+            "therapy",
+            "You are a helpful therapist."
+        ).session_id
+        
+        async def collect(response):
+            return b"".join([chunk async for chunk in response.body_iterator])
+        
+        with patch('app.services.message_service.get_llm_factory') as mock_get_factory:
+            mock_streamer = Mock(spec=["model", "stream_chat"])
+            mock_streamer.model = "test-model"
+            mock_streamer.stream_chat.return_value = ["Hi", "!"]
+            mock_get_factory.return_value.create_streamer.return_value = mock_streamer
+            response = message_service.process_message_stream(session_id, test_user.id, "Hello", stream_format="sse")
+            body = asyncio.run(collect(response))
+        
+        assert response.media_type == "text/event-stream"
+        events = [json.loads(block[len(b"data: "):]) for block in body.split(b"\n\n") if block]
+        assert "".join(e.get("content", "") for e in events[:-1]) == "Hi!"
+        assert events[-1] == {"type": "done"}
@@ -0,0 +1,257 @@
+"""Tests for write-behind batched message persistence."""
+import asyncio
+import json
+import threading
+from datetime import timedelta
+from unittest.mock import Mock, patch
+
+import pytest
+from sqlalchemy import event, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from app.models import ChatSession, Message
+from app.services.history_builder import get_history_builder
+from app.services.message_service import MessageService
+from app.services.message_writer import MessageWriter
+from app.services.session_service import SessionService
+from app.utils import now_utc
+
+
+@pytest.fixture
+def writer(db_session):
+    """Writer bound to the test database; stopped (and drained) after the test."""
+    factory = sessionmaker(bind=db_session.get_bind(), autoflush=False)
+    writer = MessageWriter(session_factory=factory, flush_ms=50, batch_size=100, ack_mode="enqueue")
+    yield writer
+    writer.stop()
+
+
+def _count_inserts(db_session):
+    statements = []
+
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("INSERT INTO MESSAGE"):
+            statements.append(statement)
+
+    event.listen(db_session.get_bind(), "before_cursor_execute", _before_execute)
+    return statements, lambda: event.remove(db_session.get_bind(), "before_cursor_execute", _before_execute)
+
+
+def _add_session(db_session, user_id, session_id):
+    chat_session = ChatSession(
+        session_id=session_id, user_id=user_id, category="TherapyBro", status="active",
+        updated_at=now_utc() - timedelta(hours=1),
+    )
+    db_session.add(chat_session)
+    db_session.commit()
+    return chat_session
+
+
+class TestMessageWriter:
+    """Test batching, ordering and durability of the writer."""
+
+    def test_concurrent_writes_share_one_insert(self, db_session, test_user, writer):
+        """Messages submitted together are written by one multi-row INSERT, in order."""
+        _add_session(db_session, test_user.id, "mw-1")
+        statements, stop_recording = _count_inserts(db_session)
+        writer.start()
+        try:
+            futures = [writer.submit(Message(session_id="mw-1", role="user", content=f"m{i}")) for i in range(20)]
+            ids = [future.result(timeout=5) for future in futures]
+        finally:
+            stop_recording()
+
+        assert ids == sorted(ids)
+        assert len(statements) == 1
+        rows = db_session.execute(select(Message.content).where(Message.session_id == "mw-1").order_by(Message.id)).scalars().all()
+        assert rows == [f"m{i}" for i in range(20)]
+
+    def test_touch_session_bumps_updated_at(self, db_session, test_user, writer):
+        """touch_session updates the session's updated_at in the same commit."""
+        chat_session = _add_session(db_session, test_user.id, "mw-2")
+        before = chat_session.updated_at
+
+        writer.submit(Message(session_id="mw-2", role="user", content="hi"), touch_session=True).result(timeout=5)
+
+        db_session.refresh(chat_session)
+        assert chat_session.updated_at > before
+
+    def test_stop_drains_queue(self, db_session, test_user, writer):
+        """Messages still queued when the writer stops are written."""
+        _add_session(db_session, test_user.id, "mw-3")
+        writer.start()
+        futures = [writer.submit(Message(session_id="mw-3", role="assistant", content=f"r{i}")) for i in range(5)]
+        writer.stop()
+
+        assert all(future.done() and future.exception() is None for future in futures)
+        assert len(db_session.execute(select(Message).where(Message.session_id == "mw-3")).scalars().all()) == 5
+
+    def test_failed_batch_fails_its_futures(self, writer):
+        """A write error is reported through every future in the batch."""
+        broken = MessageWriter(session_factory=Mock(side_effect=RuntimeError("db down")), flush_ms=1)
+
+        future = broken.submit(Message(session_id="mw-4", role="user", content="hi"))
+
+        with pytest.raises(RuntimeError, match="db down"):
+            future.result(timeout=5)
+
+    def test_locked_database_is_retried(self, db_session, test_user):
+        """A batch failing with an OperationalError is retried instead of dropped."""
+        _add_session(db_session, test_user.id, "mw-5")
+        factory = sessionmaker(bind=db_session.get_bind(), autoflush=False)
+        attempts = []
+
+        def flaky_factory():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise OperationalError("INSERT INTO message", {}, Exception("database is locked"))
+            return factory()
+
+        flaky = MessageWriter(session_factory=flaky_factory, flush_ms=1, retries=3, retry_backoff_ms=1)
+
+        message_id = flaky.submit(Message(session_id="mw-5", role="user", content="kept")).result(timeout=5)
+
+        assert len(attempts) == 3
+        assert db_session.get(Message, message_id).content == "kept"
+
+    def test_retries_are_bounded(self):
+        """A batch that keeps failing fails its futures after the last retry."""
+        error = OperationalError("INSERT INTO message", {}, Exception("database is locked"))
+        locked = MessageWriter(session_factory=Mock(side_effect=error), flush_ms=1, retries=2, retry_backoff_ms=1)
+
+        future = locked.submit(Message(session_id="mw-6", role="user", content="hi"))
+
+        with pytest.raises(OperationalError):
+            future.result(timeout=5)
+        assert locked.session_factory.call_count == 3
+
+    def test_history_cache_error_does_not_stop_writer(self, db_session, test_user, writer):
+        """A failing history-cache update still resolves the write and keeps the thread alive."""
+        _add_session(db_session, test_user.id, "mw-7")
+        writer.start()
+        history = Mock()
+        history.append.side_effect = RuntimeError("cache broken")
+
+        with patch("app.services.message_writer.get_history_builder", return_value=history):
+            first = writer.submit(Message(session_id="mw-7", role="user", content="one")).result(timeout=5)
+        second = writer.submit(Message(session_id="mw-7", role="user", content="two")).result(timeout=5)
+
+        assert first < second
+        assert writer.running
+        history.invalidate.assert_called_once_with("mw-7")
+
+    def test_stop_does_not_flush_while_thread_is_still_writing(self, db_session, test_user):
+        """If the writer outlives the join timeout, stop() leaves the queue to it."""
+        _add_session(db_session, test_user.id, "mw-8")
+        factory = sessionmaker(bind=db_session.get_bind(), autoflush=False)
+        release = threading.Event()
+
+        def slow_factory():
+            release.wait(5)
+            return factory()
+
+        slow = MessageWriter(session_factory=slow_factory, flush_ms=1)
+        slow.start()
+        future = slow.submit(Message(session_id="mw-8", role="user", content="slow"))
+        with patch.object(slow, "flush") as mock_flush:
+            slow.stop(timeout=0.05)
+        mock_flush.assert_not_called()
+
+        release.set()
+        assert future.result(timeout=5)
+
+    def test_invalid_ack_mode(self, writer):
+        """Unknown ack modes are rejected."""
+        with pytest.raises(ValueError, match="ack mode"):
+            MessageWriter(session_factory=Mock(), ack_mode="fsync-maybe")
+
+
+class TestWriteBehindSessions:
+    """Test session and streaming writes through a running writer."""
+
+    def test_user_and_assistant_messages_keep_order_in_history(self, db_session, test_user, writer):
+        """Writes from several threads land in order and show up in the history window."""
+        writer.start()
+        with patch("app.services.session_service.get_message_writer", return_value=writer):
+            session_service = SessionService(db_session)
+            session_id = session_service.create_session(test_user.id, "therapy", "You are a helpful therapist.").session_id
+            session_service.get_conversation_history(session_id)
+
+            session_service.add_user_message(session_id, "Hello", test_user.id)
+            session_service.submit_assistant_message(session_id, "Hi there!")
+            factory = sessionmaker(bind=db_session.get_bind())
+
+            def send(content):
+                with factory() as db:
+                    SessionService(db).add_user_message(session_id, content, test_user.id)
+
+            threads = [threading.Thread(target=send, args=(f"again {i}",)) for i in range(3)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            history = session_service.get_conversation_history(session_id)
+
+        contents = [m["content"] for m in history if m["role"] != "system"]
+        assert contents[:2] == ["Hello", "Hi there!"]
+        assert sorted(contents[2:]) == ["again 0", "again 1", "again 2"]
+        stored = db_session.execute(select(Message.content).where(Message.session_id == session_id).order_by(Message.id)).scalars().all()
+        assert stored == contents
+        get_history_builder().invalidate(session_id)
+
+    def test_stream_done_frame_does_not_wait_for_commit(self, db_session, test_user, writer):
+        """In enqueue mode the done frame is sent while the reply is still queued."""
+        session_id = SessionService(db_session).create_session(test_user.id, "therapy", "You are a helpful therapist.").session_id
+        writer.start()
+
+        async def collect(response):
+            return [chunk async for chunk in response.body_iterator]
+
+        with patch("app.services.session_service.get_message_writer", return_value=writer), \
+                patch("app.services.message_service.get_message_writer", return_value=writer), \
+                patch("app.services.message_service.get_llm_factory") as mock_get_factory:
+            mock_streamer = Mock(spec=["model", "stream_chat"])
+            mock_streamer.model = "test-model"
+            mock_streamer.stream_chat.return_value = ["Hi", "!"]
+            mock_get_factory.return_value.create_streamer.return_value = mock_streamer
+            response = MessageService(db_session).process_message_stream(session_id, test_user.id, "Hello")
+            writer.flush_seconds = 60.0  # hold the reply's batch open until the writer stops
+            frames = [json.loads(c) for c in asyncio.run(collect(response))]
+
+        def stored_roles():
+            query = select(Message.role).where(Message.session_id == session_id).order_by(Message.id)
+            return db_session.execute(query).scalars().all()
+
+        assert frames[-1] == {"type": "done"}
+        assert stored_roles() == ["user"]
+        writer.stop()
+        assert stored_roles() == ["user", "assistant"]
+        get_history_builder().invalidate(session_id)
+
+    def test_commit_ack_wait_is_bounded(self, db_session, test_user, writer):
+        """In commit mode a stuck writer delays the done frame by at most write_timeout, and the write survives."""
+        session_id = SessionService(db_session).create_session(test_user.id, "therapy", "You are a helpful therapist.").session_id
+        writer.start()
+        writer.ack_mode = "commit"
+        writer.write_timeout = 0.1
+
+        async def collect(response):
+            return [chunk async for chunk in response.body_iterator]
+
+        with patch("app.services.session_service.get_message_writer", return_value=writer), \
+                patch("app.services.message_service.get_message_writer", return_value=writer), \
+                patch("app.services.message_service.get_llm_factory") as mock_get_factory:
+            mock_streamer = Mock(spec=["model", "stream_chat"])
+            mock_streamer.model = "test-model"
+            mock_streamer.stream_chat.return_value = ["Hi", "!"]
+            mock_get_factory.return_value.create_streamer.return_value = mock_streamer
+            response = MessageService(db_session).process_message_stream(session_id, test_user.id, "Hello")
+            writer.flush_seconds = 60.0  # the reply's batch is not committed before the timeout
+            frames = [json.loads(c) for c in asyncio.run(asyncio.wait_for(collect(response), 5))]
+
+        assert frames[-1] == {"type": "done"}
+        writer.stop()
+        query = select(Message.role).where(Message.session_id == session_id).order_by(Message.id)
+        assert db_session.execute(query).scalars().all() == ["user", "assistant"]
+        get_history_builder().invalidate(session_id)
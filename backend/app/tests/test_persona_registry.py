@@ -0,0 +1,103 @@
+"""Tests for the persona registry and memoized prompt rendering."""
+import pytest
+
+from app import prompts
+from app.config.settings import get_settings
+from app.prompts import (
+    PERSONA_PROMPTS,
+    PersonaRegistry,
+    PromptContext,
+    build_dynamic_context,
+    build_system_prompt,
+    get_persona_registry,
+    render_system_prompt,
+)
+
+
+class TestPersonaRegistry:
+    """Test persona loading, validation and rendering."""
+
+    def test_builtin_personas_registered(self):
+        """Test all built-in personas are available without a directory."""
+        registry = PersonaRegistry()
+        assert registry.names() == list(PERSONA_PROMPTS)
+        assert "Rahul" in registry and "Nobody" not in registry
+
+    def test_personas_loaded_from_directory(self, tmp_path):
+        """Test template files become personas named after the file stem."""
+        (tmp_path / "Meera.md").write_text("You are Meera, a calm listener.\n", encoding="utf-8")
+        (tmp_path / "Rahul.txt").write_text("You are a different Rahul.", encoding="utf-8")
+        (tmp_path / "notes.json").write_text("{}", encoding="utf-8")
+
+        registry = PersonaRegistry(directory=str(tmp_path))
+
+        assert registry.render_persona("Meera").text == "<system>\nYou are Meera, a calm listener.\n\n</system>"
+        assert "different Rahul" in registry.render_persona("Rahul").text
+        assert "notes" not in registry
+
+    @pytest.mark.parametrize("filename,content", [
+        ("Empty.md", "   \n"),
+        ("Tagged.md", "<system>nested</system>"),
+        ("bad name.md", "You are someone."),
+    ])
+    def test_invalid_templates_rejected(self, tmp_path, filename, content):
+        """Test empty prompts, stray system tags and bad names fail at load time."""
+        (tmp_path / filename).write_text(content, encoding="utf-8")
+        with pytest.raises(ValueError):
+            PersonaRegistry(directory=str(tmp_path))
+
+    def test_persona_render_is_memoized(self, monkeypatch):
+        """Test the static prompt is rendered and counted once per persona."""
+        calls = []
+        monkeypatch.setattr(prompts, "_count_tokens", lambda text: calls.append(text) or len(text))
+        registry = PersonaRegistry(builtins={"Test": "You are Test."})
+
+        first = registry.render_persona("Test")
+        second = registry.render_persona("Test")
+
+        assert first is second
+        assert calls == [first.text]
+        assert first.tokens == first.prefix_tokens == len(first.text)
+
+    def test_render_returns_text_and_token_count(self, monkeypatch):
+        """Test the full prompt adds context after the prefix and sums token counts."""
+        monkeypatch.setattr(prompts, "_count_tokens", len)
+        registry = PersonaRegistry(builtins={"Test": "You are Test."})
+
+        rendered = registry.render("Test", PromptContext(user_name="Asha"))
+
+        assert rendered.prefix == registry.render_persona("Test").text
+        assert rendered.text == rendered.prefix + build_dynamic_context(PromptContext(user_name="Asha"))
+        assert rendered.tokens == len(rendered.text)
+        assert registry.render("Test") is registry.render_persona("Test")
+
+    def test_unknown_persona_raises(self):
+        """Test rendering an unregistered persona is rejected."""
+        with pytest.raises(ValueError):
+            PersonaRegistry().render_persona("Nobody")
+
+
+class TestPromptModuleApi:
+    """Test the module-level helpers use the shared registry."""
+
+    def test_registry_reads_persona_directory(self, tmp_path, monkeypatch):
+        """Test PERSONA_DIRECTORY personas are usable through build_system_prompt."""
+        (tmp_path / "Meera.md").write_text("You are Meera.", encoding="utf-8")
+        monkeypatch.setattr(get_settings(), "persona_directory", str(tmp_path))
+        monkeypatch.setattr(prompts, "_persona_registry_instance", None)
+
+        assert get_persona_registry() is get_persona_registry()
+        assert "You are Meera." in build_system_prompt("Meera")
+
+    def test_render_system_prompt_matches_build_system_prompt(self):
+        """Test the rendered text is the same prompt build_system_prompt returns."""
+        context = PromptContext(user_name="Asha", user_age=30, user_preferences={"tone": "casual"})
+        rendered = render_system_prompt("Priya", context)
+
+        assert rendered.text == build_system_prompt("Priya", context)
+        assert rendered.tokens > rendered.prefix_tokens > 0
+
+    def test_dynamic_context_without_context(self):
+        """Test only the first-conversation note is added when there is no context."""
+        assert build_dynamic_context(None) == ""
+        assert "first conversation" in build_dynamic_context(None, first_conversation=True)
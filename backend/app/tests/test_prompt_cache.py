@@ -0,0 +1,147 @@
+"""Tests for prompt prefix caching across the prompt builder and LLM streamers."""
+import pytest
+from types import SimpleNamespace
+
+from app.llm_metrics import PromptCacheMetrics
+from app.prompts import (
+    CACHE_PREFIX_KEY,
+    PromptContext,
+    build_persona_prompt,
+    build_prompt_parts,
+    build_system_prompt,
+    split_system_prompt,
+    system_message,
+    system_prompt_for,
+)
+
+
+class TestPromptParts:
+    """Test the static/dynamic split of system prompts."""
+
+    def test_persona_prefix_is_independent_of_user_context(self):
+        """Test the prefix is identical for different users and equals the stored prompt."""
+        first, first_suffix = build_prompt_parts("Rahul", PromptContext(user_name="Asha", retrieved_memories="- a"))
+        second, second_suffix = build_prompt_parts("Rahul", PromptContext(user_name="Ravi", user_age=30))
+
+        assert first == second == system_prompt_for("Rahul")
+        assert "Asha" in first_suffix and "Asha" not in first
+        assert "30" in second_suffix
+
+    def test_build_system_prompt_puts_persona_first(self):
+        """Test the full prompt starts with the persona and ends with the user context."""
+        prompt = build_system_prompt("TherapyBro", PromptContext(user_name="Asha", recent_sessions="- chat"))
+
+        assert prompt.startswith(build_persona_prompt("TherapyBro"))
+        assert prompt.endswith("</recent_context>")
+
+    def test_invalid_category_raises(self):
+        """Test unknown personas are rejected."""
+        with pytest.raises(ValueError):
+            build_persona_prompt("Nobody")
+
+    def test_split_system_prompt(self):
+        """Test marked messages split at the prefix and unmarked ones are fully static."""
+        message = system_message("PERSONA", "\n<user_info>x</user_info>")
+
+        assert message["content"] == "PERSONA\n<user_info>x</user_info>"
+        assert split_system_prompt(message) == ("PERSONA", "\n<user_info>x</user_info>")
+        assert split_system_prompt({"role": "system", "content": "PERSONA"}) == ("PERSONA", "")
+        # A stale marker that no longer matches the content is ignored
+        assert split_system_prompt({"role": "system", "content": "other", CACHE_PREFIX_KEY: "PERSONA"}) == ("other", "")
+
+
+@pytest.fixture
+def conversation():
+    return [
+        system_message("PERSONA", "\n<relevant_memories>m</relevant_memories>"),
+        {"role": "user", "content": "first"},
+        {"role": "assistant", "content": "reply"},
+        {"role": "user", "content": "second"},
+    ]
+
+
+class TestStreamerPromptCaching:
+    """Test how each streamer lays out the cacheable prefix."""
+
+    def test_anthropic_marks_persona_with_cache_control(self, monkeypatch, conversation):
+        """Test the persona is a cache_control block and the context a separate block."""
+        from app.anthropic_client import AnthropicStreamer
+        monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+
+        request = AnthropicStreamer(model="claude-test")._build_request(conversation)
+
+        assert request["system"] == [
+            {"type": "text", "text": "PERSONA", "cache_control": {"type": "ephemeral"}},
+            {"type": "text", "text": "\n<relevant_memories>m</relevant_memories>"},
+        ]
+        assert [m["role"] for m in request["messages"]] == ["user", "assistant", "user"]
+
+    def test_anthropic_plain_system_prompt_when_disabled(self, monkeypatch, conversation):
+        """Test prompt caching can be switched off."""
+        from app.anthropic_client import AnthropicStreamer
+        monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+
+        request = AnthropicStreamer(model="claude-test", prompt_cache=False)._build_request(conversation)
+
+        assert request["system"] == conversation[0]["content"]
+
+    def test_openai_moves_dynamic_context_before_latest_turn(self, monkeypatch, conversation):
+        """Test persona and earlier turns form the prefix and the context precedes the new message."""
+        from app.openai_client import OpenAIStreamer
+        monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+
+        request = OpenAIStreamer(model="gpt-test")._build_request(conversation)
+
+        assert request["messages"] == [
+            {"role": "system", "content": "PERSONA"},
+            {"role": "user", "content": "first"},
+            {"role": "assistant", "content": "reply"},
+            {"role": "system", "content": "<relevant_memories>m</relevant_memories>"},
+            {"role": "user", "content": "second"},
+        ]
+        assert request["stream_options"] == {"include_usage": True}
+
+    def test_openai_strips_internal_keys_without_context(self, monkeypatch):
+        """Test messages are sent with only role and content."""
+        from app.openai_client import OpenAIStreamer
+        monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+
+        messages = OpenAIStreamer(model="gpt-test")._build_messages([system_message("PERSONA"), {"role": "user", "content": "hi"}])
+
+        assert messages == [{"role": "system", "content": "PERSONA"}, {"role": "user", "content": "hi"}]
+
+
+class TestPromptCacheMetrics:
+    """Test cached vs uncached input token accounting."""
+
+    def test_anthropic_usage(self):
+        """Test cache reads and writes are counted as input tokens."""
+        metrics = PromptCacheMetrics()
+        metrics.record_anthropic_usage(SimpleNamespace(
+            input_tokens=50, cache_read_input_tokens=900, cache_creation_input_tokens=0, output_tokens=20
+        ))
+        metrics.record_anthropic_usage(SimpleNamespace(
+            input_tokens=50, cache_read_input_tokens=0, cache_creation_input_tokens=900, output_tokens=20
+        ))
+
+        stats = metrics.snapshot()["anthropic"]
+        assert stats["requests"] == 2
+        assert stats["input_tokens"] == 1900
+        assert stats["cached_input_tokens"] == 900
+        assert stats["cache_write_tokens"] == 900
+        assert stats["uncached_input_tokens"] == 1000
+        assert stats["cache_hit_ratio"] == pytest.approx(900 / 1900)
+
+    def test_openai_usage(self):
+        """Test OpenAI-compatible usage with and without cached token details."""
+        metrics = PromptCacheMetrics()
+        metrics.record_openai_usage("openai", SimpleNamespace(
+            prompt_tokens=2000, completion_tokens=10, prompt_tokens_details=SimpleNamespace(cached_tokens=1536)
+        ))
+        metrics.record_openai_usage("together", SimpleNamespace(prompt_tokens=300, completion_tokens=5, prompt_tokens_details=None))
+        metrics.record_openai_usage("together", None)
+
+        stats = metrics.snapshot()
+        assert stats["openai"]["cached_input_tokens"] == 1536
+        assert stats["together"]["requests"] == 1
+        assert stats["together"]["cached_input_tokens"] == 0
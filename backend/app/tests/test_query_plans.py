@@ -0,0 +1,177 @@
+"""Query-plan regression tests: repository queries must not full-scan tables.
+
+Each case runs a repository method while recording the SQL it issues, then
+asks the database for the plan of every statement. SQLite uses EXPLAIN QUERY
+PLAN against the test database. Postgres uses EXPLAIN with sequential scans
+disabled, so a Seq Scan means no usable index; it only runs when
+TEST_POSTGRES_URL is set.
+"""
+import os
+import re
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlmodel import SQLModel
+
+from app.migrations import migrate_schema
+from app.models import ChatSession, Message
+from app.repositories.deletion_job_repository import DeletionJobRepository
+from app.repositories.finalization_job_repository import MemoryFinalizationJobRepository
+from app.repositories.memory_repository import MemoryRepository
+from app.repositories.message_repository import MessageRepository
+from app.repositories.persona_version_repository import PersonaVersionRepository
+from app.repositories.session_repository import SessionRepository
+from app.repositories.user_repository import UserRepository
+from app.repositories.wallet_repository import TransactionRepository, WalletRepository
+
+
+REPOSITORY_QUERIES = {
+    "session.find_by_id": lambda db: SessionRepository(db).find_by_id("s1"),
+    "session.find_by_user_id": lambda db: SessionRepository(db).find_by_user_id(1),
+    "session.find_by_session_and_user": lambda db: SessionRepository(db).find_by_session_and_user("s1", 1),
+    "session.find_page_by_user_id": lambda db: SessionRepository(db).find_page_by_user_id(
+        1, limit=20, before=(datetime(2024, 1, 1), 10)
+    ),
+    "session.find_session_ids_by_user_id": lambda db: SessionRepository(db).find_session_ids_by_user_id(1, limit=500),
+    "session.count_by_user_id": lambda db: SessionRepository(db).count_by_user_id(1),
+    "session.delete": lambda db: SessionRepository(db).delete("s1"),
+    "session.touch": lambda db: SessionRepository(db).touch(["s1", "s2"], datetime(2024, 1, 1)),
+    "session.find_recent_with_opening_message": lambda db: SessionRepository(db).find_recent_with_opening_message(1, "s1"),
+    "message.find_by_session_id": lambda db: MessageRepository(db).find_by_session_id("s1"),
+    "message.find_by_session_after_id": lambda db: MessageRepository(db).find_by_session_after_id("s1", 5, limit=20),
+    "message.find_by_session_and_role": lambda db: MessageRepository(db).find_by_session_and_role("s1", "user"),
+    "message.get_session_stats": lambda db: MessageRepository(db).get_session_stats("s1"),
+    "message.delete_by_session_id": lambda db: MessageRepository(db).delete_by_session_id("s1"),
+    "message.delete_by_session_id_batch": lambda db: MessageRepository(db).delete_by_session_id("s1", limit=500),
+    "wallet.find_by_user_id": lambda db: WalletRepository(db).find_by_user_id(1),
+    "transaction.find_by_wallet_id": lambda db: TransactionRepository(db).find_by_wallet_id(1),
+    "transaction.find_by_reference_id": lambda db: TransactionRepository(db).find_by_reference_id("extend:s1"),
+    "transaction.user_has_transaction_of_type": lambda db: TransactionRepository(db).user_has_transaction_of_type(1, "free_session"),
+    "user.find_by_id": lambda db: UserRepository(db).find_by_id(1),
+    "user.find_by_login_id": lambda db: UserRepository(db).find_by_login_id("login"),
+    "user.find_by_email": lambda db: UserRepository(db).find_by_email("a@example.com"),
+    "user.find_by_google_id": lambda db: UserRepository(db).find_by_google_id("g1"),
+    "user.find_by_phone": lambda db: UserRepository(db).find_by_phone("9999999999"),
+    "memory.find_by_id": lambda db: MemoryRepository(db).find_by_id("c1"),
+    "memory.find_by_user_id": lambda db: MemoryRepository(db).find_by_user_id(1, limit=5),
+    "memory.find_by_session_id": lambda db: MemoryRepository(db).find_by_session_id("s1"),
+    "memory.find_by_user_and_session": lambda db: MemoryRepository(db).find_by_user_and_session(1, "s1"),
+    "memory.count_by_user_id": lambda db: MemoryRepository(db).count_by_user_id(1),
+    "memory.count_by_session_id": lambda db: MemoryRepository(db).count_by_session_id("s1"),
+    "memory.delete_by_session_id": lambda db: MemoryRepository(db).delete_by_session_id("s1"),
+    "finalization.find_by_session_id": lambda db: MemoryFinalizationJobRepository(db).find_by_session_id("s1"),
+    "finalization.claim_due": lambda db: MemoryFinalizationJobRepository(db).claim_due(5, 60),
+    "finalization.find_sessions_needing_finalization": lambda db: MemoryFinalizationJobRepository(db).find_sessions_needing_finalization(5),
+    "deletion_job.find_active_by_user_id": lambda db: DeletionJobRepository(db).find_active_by_user_id(1),
+    "persona_version.find_by_id": lambda db: PersonaVersionRepository(db).find_by_id("abc"),
+}
+
+_SQLITE_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)")
+_POSTGRES_SEQ_SCAN = re.compile(r"Seq Scan on (\w+)")
+
+
+def _record_statements(db, run):
+    """Run a repository call and return the (statement, parameters) it executed."""
+    statements = []
+    engine = db.get_bind()
+
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", _before_execute)
+    try:
+        run(db)
+    finally:
+        event.remove(engine, "before_cursor_execute", _before_execute)
+    return statements
+
+
+def _full_scans(db, statements):
+    """Return the tables each statement's plan reads with a full scan."""
+    connection = db.connection()
+    tables = set(SQLModel.metadata.tables)
+    scans = []
+    for statement, parameters in statements:
+        if connection.dialect.name == "sqlite":
+            rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+            matches = [_SQLITE_SCAN.match(row[-1]) for row in rows]
+        else:
+            connection.exec_driver_sql("SET enable_seqscan = off")
+            rows = connection.exec_driver_sql(f"EXPLAIN {statement}", parameters).fetchall()
+            matches = [_POSTGRES_SEQ_SCAN.search(row[0]) for row in rows]
+        scans.extend((m.group(1), statement) for m in matches if m and m.group(1) in tables)
+    return scans
+
+
+def _assert_no_full_scans(db, name):
+    statements = _record_statements(db, REPOSITORY_QUERIES[name])
+    assert statements, f"{name} issued no statements"
+    scans = _full_scans(db, statements)
+    assert not scans, f"{name} full-scans: " + "; ".join(f"{table} in {sql}" for table, sql in scans)
+
+
+@pytest.mark.parametrize("name", sorted(REPOSITORY_QUERIES))
+def test_sqlite_query_uses_index(db_session, name):
+    """Test the repository query is served by indexes on SQLite."""
+    _assert_no_full_scans(db_session, name)
+
+
+@pytest.fixture(scope="module")
+def postgres_session_factory():
+    url = os.getenv("TEST_POSTGRES_URL")
+    if not url:
+        pytest.skip("TEST_POSTGRES_URL not set")
+    engine = create_engine(url)
+    SQLModel.metadata.create_all(engine)
+    try:
+        yield sessionmaker(bind=engine)
+    finally:
+        SQLModel.metadata.drop_all(engine)
+        engine.dispose()
+
+
+@pytest.mark.parametrize("name", sorted(REPOSITORY_QUERIES))
+def test_postgres_query_uses_index(postgres_session_factory, name):
+    """Test the repository query is served by indexes on Postgres."""
+    db = postgres_session_factory()
+    try:
+        _assert_no_full_scans(db, name)
+    finally:
+        db.rollback()
+        db.close()
+
+
+class TestMigrateSchema:
+    """Test the schema migration on a database created from older models."""
+
+    def test_upgrades_legacy_indexes_and_columns(self, tmp_path):
+        """Test composite indexes replace single-column ones and missing columns are added."""
+        engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+        SQLModel.metadata.create_all(engine)
+        with engine.begin() as connection:
+            connection.exec_driver_sql("DROP INDEX ix_message_session_id_id")
+            connection.exec_driver_sql("CREATE INDEX ix_message_session_id ON message (session_id)")
+            connection.exec_driver_sql("ALTER TABLE chatsession DROP COLUMN persona_version")
+            connection.exec_driver_sql("DROP TABLE personaversion")
+
+        report = migrate_schema(engine)
+        again = migrate_schema(engine)
+
+        assert report["tables"] == ["personaversion"]
+        assert report["columns"] == ["chatsession.persona_version"]
+        assert report["indexes"] == ["ix_message_session_id_id"]
+        assert report["dropped_indexes"] == ["ix_message_session_id"]
+        assert again == {"tables": [], "columns": [], "indexes": [], "dropped_indexes": []}
+
+        session = sessionmaker(bind=engine)()
+        try:
+            session.add(ChatSession(session_id="s1", user_id=1, category="TherapyBro", persona_version="abc"))
+            session.add(Message(session_id="s1", role="user", content="hi"))
+            session.commit()
+            _assert_no_full_scans(session, "message.find_by_session_after_id")
+        finally:
+            session.close()
+            engine.dispose()
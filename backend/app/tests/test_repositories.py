@@ -132,6 +132,38 @@ class TestSessionRepository:
         assert "user_session_1" in session_ids
         assert "user_session_2" in session_ids
 
+    def test_find_recent_with_opening_message(self, db_session, test_user):
+        """Test fetching recent sessions with their first user message in one query."""
+        from sqlalchemy import event
+        
+        repo = SessionRepository(db_session)
+        message_repo = MessageRepository(db_session)
+        for i in range(4):
+            repo.create(ChatSession(
+                session_id=f"recent_{i}",
+                user_id=test_user.id,
+                category="test",
+                created_at=now_utc(),
+                updated_at=now_utc()
+            ))
+            message_repo.create(Message(session_id=f"recent_{i}", role="system", content="sys"))
+            if i != 1:
+                message_repo.create(Message(session_id=f"recent_{i}", role="user", content=f"opening {i}"))
+                message_repo.create(Message(session_id=f"recent_{i}", role="user", content=f"later {i}"))
+        
+        user_id = test_user.id
+        statements = []
+        def _count(conn, cursor, statement, params, context, executemany):
+            statements.append(statement)
+        event.listen(db_session.get_bind(), "before_cursor_execute", _count)
+        try:
+            rows = repo.find_recent_with_opening_message(user_id, exclude_session_id="recent_3", limit=2)
+        finally:
+            event.remove(db_session.get_bind(), "before_cursor_execute", _count)
+        
+        assert len(statements) == 1
+        assert [(s.session_id, first) for s, first in rows] == [("recent_1", None), ("recent_2", "opening 2")]
+
 
 class TestMessageRepository:
     """Test MessageRepository functionality."""
@@ -108,7 +108,7 @@ def test_extend_session_success(db_session, test_user, monkeypatch):
     assert data["cost_charged"] in ("20.00", "20.0", "20.0000")
 
 
-def test_extend_session_chunks_when_previous_status_ended(db_session, test_user, monkeypatch):
+def test_extend_session_queues_finalization_when_previous_status_ended(db_session, test_user, monkeypatch):
     # Create an ended session with some messages
     s = ChatSession(
         session_id="sess-ended-1",
@@ -157,7 +157,12 @@ def test_extend_session_chunks_when_previous_status_ended(db_session, test_user,
         app.dependency_overrides.pop(get_db_session, None)
 
     assert res.status_code == 200
-    assert called["chunked"] is True
+    # Chunking happens in the background worker; the extension only queues it
+    assert called["chunked"] is False
+    from app.repositories.finalization_job_repository import MemoryFinalizationJobRepository
+    job = MemoryFinalizationJobRepository(db).find_by_session_id(s.session_id)
+    assert job is not None
+    assert job.status == "pending"
 
 
 def test_extend_session_fails_when_not_today_utc(db_session, test_user):
@@ -0,0 +1,91 @@
+"""API tests for paginated, cacheable and streamed session history."""
+import json
+from contextlib import contextmanager
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.auth import get_current_user
+from app.dependencies import get_db_session
+from app.models import ChatSession, Message
+from app.routers import sessions as sessions_router
+
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def api(monkeypatch, db_session, test_user):
+    """Route the sessions API to the test database as test_user."""
+    @contextmanager
+    def _session():
+        yield db_session
+
+    def _override_db():
+        yield db_session
+
+    monkeypatch.setattr(sessions_router, "get_session", _session)
+    app.dependency_overrides[get_current_user] = lambda: test_user
+    app.dependency_overrides[get_db_session] = _override_db
+    try:
+        yield client
+    finally:
+        app.dependency_overrides.pop(get_current_user, None)
+        app.dependency_overrides.pop(get_db_session, None)
+
+
+@pytest.fixture
+def ended_session(db_session, test_user):
+    db_session.add(ChatSession(session_id="hist-1", user_id=test_user.id, category="TherapyBro", status="ended"))
+    for i in range(3):
+        db_session.add(Message(session_id="hist-1", role="user", content=f"message {i}"))
+    db_session.commit()
+    return "hist-1"
+
+
+def test_unchanged_history_returns_304(api, ended_session):
+    first = api.get(f"/api/sessions/{ended_session}")
+    etag = first.headers["ETag"]
+
+    again = api.get(f"/api/sessions/{ended_session}", headers={"If-None-Match": etag})
+
+    assert first.status_code == 200
+    assert again.status_code == 304
+    assert again.content == b""
+
+
+def test_history_page_sets_next_cursor(api, ended_session):
+    page = api.get(f"/api/sessions/{ended_session}", params={"limit": 2})
+    rest = api.get(f"/api/sessions/{ended_session}", params={"limit": 2, "cursor": page.headers["X-Next-Cursor"]})
+
+    assert [m["content"] for m in page.json()["messages"]] == ["message 0", "message 1"]
+    assert page.json()["next_cursor"] == page.headers["X-Next-Cursor"]
+    assert [m["content"] for m in rest.json()["messages"]] == ["message 2"]
+    assert "X-Next-Cursor" not in rest.headers
+
+
+def test_history_ndjson_export(api, ended_session):
+    response = api.get(f"/api/sessions/{ended_session}", params={"format": "ndjson"})
+
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert [line["type"] for line in lines] == ["session", "message", "message", "message"]
+
+
+def test_invalid_cursor_is_400(api, ended_session):
+    response = api.get(f"/api/sessions/{ended_session}", params={"limit": 2, "cursor": "%%%"})
+    assert response.status_code == 400
+
+
+def test_chats_pagination_header(api, db_session, test_user):
+    for i in range(3):
+        db_session.add(ChatSession(session_id=f"chat-{i}", user_id=test_user.id, category="TherapyBro"))
+    db_session.commit()
+
+    first = api.get("/api/chats", params={"limit": 2})
+    second = api.get("/api/chats", params={"limit": 2, "cursor": first.headers["X-Next-Cursor"]})
+
+    assert [c["session_id"] for c in first.json()] == ["chat-2", "chat-1"]
+    assert [c["session_id"] for c in second.json()] == ["chat-0"]
+    assert "X-Next-Cursor" not in second.headers
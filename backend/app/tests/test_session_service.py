@@ -2,7 +2,8 @@
 import pytest
 from datetime import date
 from app.services.session_service import SessionService
-from app.models import ChatSession, Message, User
+from app.models import ChatSession, Message, PersonaVersion, User
+from app.prompts import get_persona_registry, prompt_version
 from app.schemas import StartSessionIn, MessageIn, NotesIn
 
 
@@ -70,11 +71,13 @@ class TestSessionService:
         assert session.category == "therapy"
         assert session.notes is None
         
-        # Verify system message was created
+        # Verify the system prompt is referenced, not stored as a message
         messages = session_service.get_conversation_history(session_id)
         assert len(messages) == 1
         assert messages[0]["role"] == "system"
         assert messages[0]["content"] == "You are a helpful therapist."
+        assert session.persona_version is not None
+        assert db_session.query(Message).filter(Message.session_id == session_id).count() == 0
     
     def test_get_session_history(self, db_session, test_user):
         """Test getting session history."""
@@ -100,10 +103,9 @@ class TestSessionService:
         # Verify history
         assert history.session_id == session_id
         assert history.category == "therapy"
-        assert len(history.messages) == 3
-        assert history.messages[0].role == "system"
-        assert history.messages[1].role == "user"
-        assert history.messages[2].role == "assistant"
+        assert len(history.messages) == 2
+        assert history.messages[0].role == "user"
+        assert history.messages[1].role == "assistant"
     
     def test_get_session_history_not_found(self, db_session, test_user):
         """Test getting history for non-existent session."""
@@ -310,3 +312,122 @@ class TestSessionService:
         
         # Should not find session (authorization check)
         assert session is None
+
+
+class TestPersonaVersions:
+    """Test sessions referencing persona versions instead of system message rows."""
+
+    def test_sessions_share_one_stored_prompt(self, db_session, test_user):
+        """Test identical prompts are stored once and referenced by every session."""
+        session_service = SessionService(db_session)
+        first = session_service.create_session(test_user.id, "therapy", "You are a helpful therapist.")
+        second = session_service.create_session(test_user.id, "therapy", "You are a helpful therapist.")
+
+        sessions = [session_service.find_session_by_id(s.session_id, test_user.id) for s in (first, second)]
+
+        assert sessions[0].persona_version == sessions[1].persona_version == prompt_version("You are a helpful therapist.")
+        assert db_session.query(PersonaVersion).count() == 1
+
+    def test_unknown_version_resolved_from_database(self, db_session, test_user, monkeypatch):
+        """Test prompts missing from the in-process registry are loaded from their stored version."""
+        import app.prompts as prompts
+        session_service = SessionService(db_session)
+        session_out = session_service.create_session(test_user.id, "therapy", "An older persona prompt.")
+        # Simulate another process that never registered this prompt
+        monkeypatch.setattr(prompts, "_persona_registry_instance", None)
+
+        history = session_service.get_conversation_history(session_out.session_id)
+
+        assert history == [{"role": "system", "content": "An older persona prompt."}]
+        assert get_persona_registry().resolve_version(prompt_version("An older persona prompt.")) == "An older persona prompt."
+
+    def test_migrate_system_messages(self, db_session, test_user):
+        """Test legacy system rows become persona versions and are deleted."""
+        for session_id in ("legacy_1", "legacy_2"):
+            db_session.add(ChatSession(session_id=session_id, user_id=test_user.id, category="therapy"))
+            db_session.add(Message(session_id=session_id, role="system", content="Legacy prompt"))
+            db_session.add(Message(session_id=session_id, role="user", content="Hello"))
+        db_session.commit()
+        session_service = SessionService(db_session)
+
+        migrated = session_service.migrate_system_messages(batch_size=1)
+
+        assert migrated == 2
+        assert session_service.migrate_system_messages() == 0
+        assert db_session.query(Message).filter(Message.role == "system").count() == 0
+        assert db_session.query(PersonaVersion).count() == 1
+        assert session_service.find_session_by_id("legacy_1", test_user.id).persona_version == prompt_version("Legacy prompt")
+        assert session_service.get_conversation_history("legacy_2") == [
+            {"role": "system", "content": "Legacy prompt"},
+            {"role": "user", "content": "Hello"},
+        ]
+
+
+class TestHistoryPagination:
+    """Test keyset pagination, ETags and NDJSON export of session history."""
+
+    def _session_with_messages(self, db_session, test_user, count):
+        session_service = SessionService(db_session)
+        session_id = session_service.create_session(test_user.id, "therapy", "You are a helpful therapist.").session_id
+        for i in range(count):
+            session_service.add_user_message(session_id, f"message {i}", test_user.id)
+        return session_service, session_id
+
+    def test_history_pages_follow_cursor(self, db_session, test_user):
+        """Test paging through messages returns each message once, in order."""
+        session_service, session_id = self._session_with_messages(db_session, test_user, 5)
+
+        contents, cursor = [], None
+        while True:
+            page = session_service.get_session_history(session_id, test_user.id, limit=2, cursor=cursor)
+            contents.extend(m.content for m in page.messages)
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+
+        assert contents == [f"message {i}" for i in range(5)]
+
+    def test_invalid_cursor_rejected(self, db_session, test_user):
+        """Test malformed cursors raise a validation error."""
+        from app.exceptions import ValidationError
+        session_service, session_id = self._session_with_messages(db_session, test_user, 1)
+
+        with pytest.raises(ValidationError):
+            session_service.get_session_history(session_id, test_user.id, limit=2, cursor="not-a-cursor")
+
+    def test_session_list_pages(self, db_session, test_user):
+        """Test session listing pages by most recent update without gaps or repeats."""
+        session_service = SessionService(db_session)
+        for i in range(5):
+            db_session.add(ChatSession(session_id=f"page_{i}", user_id=test_user.id, category="therapy"))
+        db_session.commit()
+
+        first, cursor = session_service.list_user_sessions_page(test_user.id, limit=3)
+        second, last_cursor = session_service.list_user_sessions_page(test_user.id, limit=3, cursor=cursor)
+
+        assert [item.session_id for item in first + second] == [f"page_{i}" for i in reversed(range(5))]
+        assert last_cursor is None
+
+    def test_etag_changes_only_with_history(self, db_session, test_user):
+        """Test the ETag is stable until a message is added."""
+        session_service, session_id = self._session_with_messages(db_session, test_user, 1)
+        session = session_service.find_session_by_id(session_id, test_user.id)
+        session.status = "ended"
+        db_session.commit()
+
+        before = session_service.get_history_etag(session_id, test_user.id)
+        assert session_service.get_history_etag(session_id, test_user.id) == before
+        assert session_service.get_history_etag(session_id, test_user.id, limit=1) != before
+
+        session_service.add_assistant_message(session_id, "reply")
+        assert session_service.get_history_etag(session_id, test_user.id) != before
+
+    def test_export_streams_ndjson(self, db_session, test_user):
+        """Test the export has a session line followed by every message in batches."""
+        import json
+        session_service, session_id = self._session_with_messages(db_session, test_user, 3)
+
+        lines = [json.loads(line) for line in session_service.export_session_history(session_id, test_user.id, batch_size=2)]
+
+        assert lines[0]["type"] == "session" and lines[0]["session_id"] == session_id
+        assert [line["content"] for line in lines[1:]] == ["message 0", "message 1", "message 2"]
@@ -0,0 +1,191 @@
+"""Tests for closing LLM streams when the client disconnects mid-reply."""
+import asyncio
+import json
+import time
+from unittest.mock import Mock, patch
+
+import pytest
+from sqlalchemy import select
+
+from app.llm_metrics import StreamCancellationMetrics, get_stream_cancellation_metrics
+from app.models import Message
+from app.services.history_builder import get_history_builder
+from app.services.llm_router import ProviderHealthRegistry, RoutingStreamer
+from app.services.message_service import MessageService
+from app.services.session_service import SessionService
+
+
+async def _serve_until_disconnect(response, frames=1):
+    """Run the response as an ASGI app; the client disconnects after `frames` body frames."""
+    sent = []
+    enough = asyncio.Event()
+
+    async def send(message):
+        if message["type"] == "http.response.body" and message.get("body"):
+            sent.append(message["body"])
+            if len(sent) >= frames:
+                enough.set()
+
+    async def receive():
+        await enough.wait()
+        return {"type": "http.disconnect"}
+
+    await response({"type": "http", "method": "POST", "path": "/", "headers": []}, receive, send)
+    return [json.loads(frame) for frame in sent]
+
+
+@pytest.fixture
+def session_id(db_session, test_user):
+    session_id = SessionService(db_session).create_session(test_user.id, "therapy", "You are a helpful therapist.").session_id
+    yield session_id
+    get_history_builder().invalidate(session_id)
+
+
+@pytest.fixture(autouse=True)
+def metrics():
+    get_stream_cancellation_metrics().reset()
+    yield get_stream_cancellation_metrics()
+    get_stream_cancellation_metrics().reset()
+
+
+def _stored_replies(db_session, session_id):
+    query = select(Message).where(Message.session_id == session_id, Message.role == "assistant")
+    return db_session.execute(query).scalars().all()
+
+
+class TestDisconnect:
+    """Test that a disconnect closes the provider stream and keeps the partial reply."""
+
+    def test_async_provider_stream_is_closed(self, db_session, test_user, session_id, metrics):
+        """The provider generator is closed right away and the partial reply is stored as truncated."""
+        state = {"pulled": 0, "closed": False}
+
+        class SlowStreamer:
+            model = "slow-async"
+            max_output_tokens = 500
+
+            async def astream_chat(self, messages, **kwargs):
+                try:
+                    for i in range(100):
+                        state["pulled"] += 1
+                        yield f"tok{i} "
+                        await asyncio.sleep(0.02)
+                finally:
+                    state["closed"] = True
+
+        with patch("app.services.message_service.get_llm_factory") as mock_get_factory:
+            mock_get_factory.return_value.create_streamer.return_value = SlowStreamer()
+            response = MessageService(db_session).process_message_stream(session_id, test_user.id, "Hello", provider="anthropic")
+            frames = asyncio.run(_serve_until_disconnect(response))
+
+        assert state["closed"] is True
+        assert state["pulled"] < 20
+        assert {"type": "done"} not in frames
+        [reply] = _stored_replies(db_session, session_id)
+        assert reply.truncated is True
+        assert reply.content.startswith("tok0 ")
+        totals = metrics.snapshot()["anthropic"]
+        assert totals["cancelled_streams"] == 1
+        assert 0 < totals["generated_output_tokens"] < 500
+        assert totals["saved_output_tokens"] == 500 - totals["generated_output_tokens"]
+
+    def test_sync_provider_stream_stops_pulling(self, db_session, test_user, session_id, metrics):
+        """Sync streamers are closed after the token in flight instead of running to the end."""
+        state = {"pulled": 0, "closed": False}
+
+        def stream_chat(messages, **kwargs):
+            try:
+                for i in range(100):
+                    time.sleep(0.02)
+                    state["pulled"] += 1
+                    yield f"tok{i} "
+            finally:
+                state["closed"] = True
+
+        with patch("app.services.message_service.get_llm_factory") as mock_get_factory:
+            streamer = Mock(spec=["model", "stream_chat"])
+            streamer.model = "slow-sync"
+            streamer.stream_chat.side_effect = stream_chat
+            mock_get_factory.return_value.create_streamer.return_value = streamer
+            response = MessageService(db_session).process_message_stream(session_id, test_user.id, "Hello", provider="openai")
+            asyncio.run(_serve_until_disconnect(response))
+
+        assert state["closed"] is True
+        assert state["pulled"] < 20
+        [reply] = _stored_replies(db_session, session_id)
+        assert reply.truncated is True
+        assert metrics.snapshot()["openai"]["cancelled_streams"] == 1
+
+    def test_disconnect_is_booked_under_the_serving_route(self, db_session, test_user, session_id, metrics):
+        """Under failover the cancelled tokens count against the route that served the reply."""
+        class FailingStreamer:
+            model = "down"
+
+            async def astream_chat(self, messages, **kwargs):
+                raise RuntimeError("provider down")
+                yield
+
+        class SlowStreamer:
+            model = "slow-async"
+
+            async def astream_chat(self, messages, **kwargs):
+                for i in range(100):
+                    yield f"tok{i} "
+                    await asyncio.sleep(0.02)
+
+        router = RoutingStreamer(
+            [("primary-route", FailingStreamer()), ("fallback-route", SlowStreamer())],
+            health=ProviderHealthRegistry(),
+            hedge_enabled=False,
+        )
+        with patch("app.services.message_service.get_llm_factory") as mock_get_factory:
+            mock_get_factory.return_value.route_streamer.return_value = router
+            mock_get_factory.return_value.create_streamer.return_value = router
+            response = MessageService(db_session).process_message_stream(session_id, test_user.id, "Hello")
+            asyncio.run(_serve_until_disconnect(response))
+
+        snapshot = metrics.snapshot()
+        assert snapshot["fallback-route"]["cancelled_streams"] == 1
+        assert "primary-route" not in snapshot
+
+    def test_completed_reply_is_not_truncated(self, db_session, test_user, session_id, metrics):
+        """A reply streamed to the end is stored without the marker and records no cancellation."""
+        async def collect(response):
+            return [chunk async for chunk in response.body_iterator]
+
+        with patch("app.services.message_service.get_llm_factory") as mock_get_factory:
+            streamer = Mock(spec=["model", "stream_chat"])
+            streamer.model = "test-model"
+            streamer.stream_chat.return_value = ["Hi", "!"]
+            mock_get_factory.return_value.create_streamer.return_value = streamer
+            response = MessageService(db_session).process_message_stream(session_id, test_user.id, "Hello")
+            asyncio.run(collect(response))
+
+        [reply] = _stored_replies(db_session, session_id)
+        assert reply.content == "Hi!"
+        assert not reply.truncated
+        assert metrics.snapshot() == {}
+
+    def test_history_marks_truncated_reply(self, db_session, test_user, session_id):
+        """Chat history exposes the truncated marker."""
+        service = SessionService(db_session)
+        service.add_assistant_message(session_id, "Partial", truncated=True)
+
+        history = service.get_session_history(session_id, test_user.id)
+
+        assert history.messages[-1].truncated is True
+
+
+class TestStreamCancellationMetrics:
+    """Test the cancellation counters."""
+
+    def test_saved_tokens_never_negative(self):
+        """Replies that already used their budget count as cancelled with nothing saved."""
+        metrics = StreamCancellationMetrics()
+
+        metrics.record("together", generated_tokens=30, budget_tokens=100)
+        metrics.record("together", generated_tokens=150, budget_tokens=100)
+
+        assert metrics.snapshot()["together"] == {
+            "cancelled_streams": 2, "generated_output_tokens": 180, "saved_output_tokens": 70,
+        }
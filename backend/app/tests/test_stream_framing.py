@@ -0,0 +1,120 @@
+"""Tests for streamed reply framing and token coalescing."""
+import asyncio
+import json
+import time
+
+import pytest
+
+from app.services.stream_framing import StreamFramer, coalesce_tokens
+
+
+async def _tokens(items, delay=0.0):
+    for item in items:
+        if delay:
+            await asyncio.sleep(delay)
+        yield item
+
+
+def _collect(iterator):
+    async def run():
+        return [chunk async for chunk in iterator]
+    return asyncio.run(run())
+
+
+class TestStreamFramer:
+    """Test NDJSON and SSE frame encoding."""
+
+    @pytest.mark.parametrize("text", ["plain", 'quote " and \\ backslash', "line\nbreak", "unicode é 😀", ""])
+    def test_ndjson_delta_matches_json(self, text):
+        """Delta frames are single JSON lines equal to the old json.dumps frames."""
+        frame = StreamFramer("ndjson").delta(text)
+
+        assert frame.endswith(b"\n") and frame.count(b"\n") == 1
+        assert json.loads(frame) == {"type": "delta", "content": text}
+
+    def test_sse_frames(self):
+        """SSE frames carry the same JSON payload as data events."""
+        framer = StreamFramer("sse")
+
+        assert framer.media_type == "text/event-stream"
+        assert framer.delta("hi\nthere") == b'data: {"type":"delta","content":"hi\\nthere"}\n\n'
+        assert framer.done() == b'data: {"type":"done"}\n\n'
+        assert framer.headers["Cache-Control"] == "no-cache"
+
+    def test_invalid_format(self):
+        """Unknown formats are rejected."""
+        with pytest.raises(ValueError, match="Invalid stream format"):
+            StreamFramer("xml")
+
+
+class TestCoalesceTokens:
+    """Test merging of token deltas into bounded chunks."""
+
+    def test_back_to_back_tokens_are_merged(self):
+        """Tokens that arrive together become one chunk."""
+        chunks = _collect(coalesce_tokens(_tokens(["a", "b", "c"]), max_chars=100, max_delay_ms=50))
+
+        assert chunks == ["abc"]
+
+    def test_size_bound(self):
+        """A chunk is emitted as soon as it reaches max_chars."""
+        chunks = _collect(coalesce_tokens(_tokens(["ab", "cd", "ef", "g"]), max_chars=4, max_delay_ms=1000))
+
+        assert chunks == ["abcd", "efg"]
+
+    def test_slow_tokens_are_not_held_back(self):
+        """A token followed by a pause is emitted once the window closes, not when the next one arrives."""
+        emitted = []
+
+        async def run():
+            start = time.monotonic()
+            async for chunk in coalesce_tokens(_tokens(["a", "b"], delay=0.2), max_chars=100, max_delay_ms=20):
+                emitted.append((chunk, time.monotonic() - start))
+
+        asyncio.run(run())
+
+        assert [chunk for chunk, _ in emitted] == ["a", "b"]
+        assert emitted[0][1] < 0.35
+
+    def test_disabled_passes_tokens_through(self):
+        """max_delay_ms <= 0 keeps one chunk per token."""
+        chunks = _collect(coalesce_tokens(_tokens(["a", "b"]), max_chars=100, max_delay_ms=0))
+
+        assert chunks == ["a", "b"]
+
+    def test_producer_error_propagates(self):
+        """Errors from the token source reach the consumer after buffered text."""
+        async def failing():
+            yield "partial"
+            raise RuntimeError("provider failed")
+
+        received = []
+
+        async def run():
+            async for chunk in coalesce_tokens(failing(), max_chars=100, max_delay_ms=50):
+                received.append(chunk)
+
+        with pytest.raises(RuntimeError, match="provider failed"):
+            asyncio.run(run())
+        assert received == ["partial"]
+
+    def test_closing_early_closes_source(self):
+        """Stopping the consumer cancels the in-flight read and closes the token source."""
+        state = {"closed": False}
+
+        async def source():
+            try:
+                yield "a"
+                await asyncio.sleep(10)
+                yield "b"
+            finally:
+                state["closed"] = True
+
+        async def run():
+            chunks = coalesce_tokens(source(), max_chars=100, max_delay_ms=20)
+            first = await chunks.__anext__()
+            await chunks.aclose()
+            return first
+
+        assert asyncio.run(asyncio.wait_for(run(), timeout=2)) == "a"
+        assert state["closed"] is True
@@ -0,0 +1,112 @@
+"""Tests for unit-of-work transactions across repositories and services."""
+import pytest
+from decimal import Decimal
+from datetime import timedelta
+from unittest.mock import patch
+from sqlalchemy import event, select
+
+from app.models import ChatSession, Message, Wallet, WalletTransaction
+from app.repositories import MessageRepository, WalletRepository, TransactionRepository, unit_of_work, in_unit_of_work
+from app.services.session_service import SessionService
+from app.utils import now_utc
+
+
+@pytest.fixture
+def commit_counter(db_session):
+    """Count commits issued on the test session."""
+    counts = {"commits": 0}
+
+    def _on_commit(session):
+        counts["commits"] += 1
+
+    event.listen(db_session, "after_commit", _on_commit)
+    yield counts
+    event.remove(db_session, "after_commit", _on_commit)
+
+
+def _active_session(db_session, user_id, session_id):
+    chat_session = ChatSession(
+        session_id=session_id,
+        user_id=user_id,
+        category="TherapyBro",
+        created_at=now_utc(),
+        updated_at=now_utc(),
+        session_start_time=now_utc(),
+        session_end_time=now_utc() + timedelta(seconds=300),
+        duration_seconds=300,
+        status="active",
+    )
+    db_session.add(chat_session)
+    db_session.commit()
+    return chat_session
+
+
+class TestUnitOfWork:
+    """Test cases for the unit_of_work context manager."""
+
+    def test_batches_writes_into_one_commit(self, db_session, test_user, commit_counter):
+        """Test that repository writes inside a unit of work commit once."""
+        _active_session(db_session, test_user.id, "uow-1")
+        commit_counter["commits"] = 0
+        repo = MessageRepository(db_session)
+
+        with unit_of_work(db_session):
+            assert in_unit_of_work(db_session)
+            first = repo.create(Message(session_id="uow-1", role="user", content="a"))
+            repo.create(Message(session_id="uow-1", role="assistant", content="b"))
+            # Flushed, so generated IDs are already available
+            assert first.id is not None
+
+        assert not in_unit_of_work(db_session)
+        assert commit_counter["commits"] == 1
+        assert len(repo.find_by_session_id("uow-1")) == 2
+
+    def test_rolls_back_on_error(self, db_session, test_user):
+        """Test that a failure discards every write in the unit of work."""
+        _active_session(db_session, test_user.id, "uow-2")
+        repo = MessageRepository(db_session)
+
+        with pytest.raises(RuntimeError):
+            with unit_of_work(db_session):
+                repo.create(Message(session_id="uow-2", role="user", content="lost"))
+                raise RuntimeError("boom")
+
+        assert repo.find_by_session_id("uow-2") == []
+
+    def test_nested_blocks_join_outer_transaction(self, db_session, test_user, commit_counter):
+        """Test that only the outermost block commits."""
+        _active_session(db_session, test_user.id, "uow-3")
+        commit_counter["commits"] = 0
+        repo = MessageRepository(db_session)
+
+        with unit_of_work(db_session):
+            with unit_of_work(db_session):
+                repo.create(Message(session_id="uow-3", role="user", content="inner"))
+            assert commit_counter["commits"] == 0
+
+        assert commit_counter["commits"] == 1
+
+    def test_add_user_message_commits_once(self, db_session, test_user, commit_counter):
+        """Test that a chat turn's user message costs a single commit."""
+        _active_session(db_session, test_user.id, "uow-4")
+        commit_counter["commits"] = 0
+
+        SessionService(db_session).add_user_message("uow-4", "Hello", test_user.id)
+
+        assert commit_counter["commits"] == 1
+
+    def test_extend_session_debit_is_atomic(self, db_session, test_user):
+        """Test that a failed ledger write leaves the wallet balance untouched."""
+        _active_session(db_session, test_user.id, "uow-5")
+        wallet = Wallet(user_id=test_user.id, balance=Decimal("100.00"), reserved=Decimal("0.00"), currency="INR")
+        db_session.add(wallet)
+        db_session.commit()
+
+        with patch.object(TransactionRepository, "create", side_effect=RuntimeError("ledger down")):
+            with pytest.raises(RuntimeError):
+                SessionService(db_session).extend_session("uow-5", test_user.id, 300)
+
+        db_session.expire_all()
+        assert WalletRepository(db_session).find_by_user_id(test_user.id).balance == Decimal("100.00")
+        txs = db_session.execute(select(WalletTransaction).where(WalletTransaction.user_id == test_user.id)).scalars().all()
+        assert txs == []
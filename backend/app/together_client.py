@@ -1,9 +1,12 @@
 from __future__ import annotations
-from typing import Dict, Iterable, List
+from typing import AsyncIterator, Dict, Iterable, List
 import os
 import logging
+import httpx
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
+from app.llm_metrics import get_prompt_cache_metrics
+from app.prompts import wire_message
 
 # Create logger for Together client
 llm_logger = logging.getLogger('llm.together')
@@ -11,7 +14,13 @@ llm_logger = logging.getLogger('llm.together')
 load_dotenv()
 
 class TogetherStreamer:
-    def __init__(self, model: str | None = None) -> None:
+    def __init__(
+        self,
+        model: str | None = None,
+        http_client: httpx.Client | None = None,
+        async_http_client: httpx.AsyncClient | None = None,
+        prompt_cache: bool = True,
+    ) -> None:
         api_key = os.getenv("TOGETHER_API_KEY")
         if not api_key:
             llm_logger.error("TOGETHER_API_KEY is not set")
@@ -20,9 +29,18 @@ class TogetherStreamer:
         # Together AI uses OpenAI-compatible API with custom base URL
         self.client = OpenAI(
             api_key=api_key,
-            base_url="https://api.together.xyz/v1"
+            base_url="https://api.together.xyz/v1",
+            http_client=http_client,
+        )
+        self.async_client = AsyncOpenAI(
+            api_key=api_key,
+            base_url="https://api.together.xyz/v1",
+            http_client=async_http_client,
         )
         self.model = model or os.getenv("TOGETHER_MODEL", "openai/gpt-oss-20b")
+        # Kept for interface parity: the single system message already starts with the
+        # static persona, which is what Together's prefix caching keys on
+        self.prompt_cache = prompt_cache
         llm_logger.info(f"Together AI client initialized with model: {self.model}")
 
     def stream_chat(self, messages: List[Dict[str, str]], **kwargs) -> Iterable[str]:
@@ -35,22 +53,68 @@ class TogetherStreamer:
         try:
             response = self.client.chat.completions.create(
                 model=self.model,
-                messages=messages,
+                # One system message (persona first, per-turn context after it): open-model
+                # chat templates generally reject system messages mid-conversation
+                messages=[wire_message(m) for m in messages],
                 stream=True,
                 **kwargs,
             )
             
             token_count = 0
-            for chunk in response:
-                if not chunk.choices:
-                    continue
-                delta = chunk.choices[0].delta
-                if delta and delta.content:
-                    token_count += 1
-                    yield delta.content
+            usage = None
+            # Closing the stream (also when the consumer stops early) closes the upstream HTTP response
+            with response:
+                for chunk in response:
+                    if getattr(chunk, "usage", None):
+                        usage = chunk.usage
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta
+                    if delta and delta.content:
+                        token_count += 1
+                        yield delta.content
             
             llm_logger.info(f"Together AI stream completed successfully, yielded {token_count} tokens")
+            get_prompt_cache_metrics().record_openai_usage("together", usage)
             
         except Exception as e:
             llm_logger.error(f"Together AI streaming failed: {str(e)}")
             raise
+
+    async def astream_chat(self, messages: List[Dict[str, str]], **kwargs) -> AsyncIterator[str]:
+        """
+        Stream chat completion from Together AI on the event loop.
+        Mirrors stream_chat but uses the async OpenAI-compatible client.
+        """
+        llm_logger.info(f"Starting async Together AI chat stream with {len(messages)} messages")
+        
+        try:
+            response = await self.async_client.chat.completions.create(
+                model=self.model,
+                # One system message (persona first, per-turn context after it): open-model
+                # chat templates generally reject system messages mid-conversation
+                messages=[wire_message(m) for m in messages],
+                stream=True,
+                **kwargs,
+            )
+            
+            token_count = 0
+            usage = None
+            # Closing the stream (also when the consumer stops early) closes the upstream HTTP response
+            async with response:
+                async for chunk in response:
+                    if getattr(chunk, "usage", None):
+                        usage = chunk.usage
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta
+                    if delta and delta.content:
+                        token_count += 1
+                        yield delta.content
+            
+            llm_logger.info(f"Async Together AI stream completed successfully, yielded {token_count} tokens")
+            get_prompt_cache_metrics().record_openai_usage("together", usage)
+            
+        except Exception as e:
+            llm_logger.error(f"Async Together AI streaming failed: {str(e)}")
+            raise
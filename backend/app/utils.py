@@ -3,7 +3,10 @@ from datetime import datetime, timedelta, timezone
 from zoneinfo import ZoneInfo
 from passlib.context import CryptContext
 from jose import jwt, JWTError
-from typing import Optional
+from typing import Any, Dict, List, Optional
+import base64
+import binascii
+import json
 import os
 import logging
 
@@ -36,6 +39,8 @@ def get_password_context() -> CryptContext:
 JWT_SECRET = os.getenv("JWT_SECRET", "dev-secret-change")
 JWT_ALG = os.getenv("JWT_ALG", "HS256")
 JWT_EXPIRE_MIN = int(os.getenv("JWT_EXPIRE_MIN", "1440"))  # 24h
+# Embed the numeric user ID ("uid") in tokens so auth can resolve users by primary key
+JWT_INCLUDE_USER_ID = os.getenv("JWT_INCLUDE_USER_ID", "true").strip().lower() in ("1", "true", "yes")
 
 def now_ist() -> datetime:
     return datetime.now(ZoneInfo("Asia/Kolkata"))
@@ -58,21 +63,50 @@ def verify_password(p: str, h: str) -> bool:
     utils_logger.debug(f"Password verification result: {is_valid}")
     return is_valid
 
-def create_access_token(sub: str) -> str:
+def create_access_token(sub: str, user_id: Optional[int] = None) -> str:
     utils_logger.info(f"Creating access token for user: {sub}")
     expire = datetime.now(timezone.utc) + timedelta(minutes=JWT_EXPIRE_MIN)
     payload = {"sub": sub, "exp": expire}
+    if user_id is not None and JWT_INCLUDE_USER_ID:
+        payload["uid"] = user_id
     token = jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALG)
     utils_logger.info(f"Access token created successfully for user: {sub}")
     return token
 
-def decode_token(token: str) -> Optional[str]:
+def decode_token_claims(token: str) -> Optional[Dict[str, Any]]:
+    """Decode and verify a token, returning all claims or None if invalid."""
     utils_logger.debug("Attempting to decode token")
     try:
         data = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALG])
-        sub = data.get("sub")
-        utils_logger.debug(f"Token decoded successfully for user: {sub}")
-        return sub
+        if not data.get("sub"):
+            return None
+        utils_logger.debug(f"Token decoded successfully for user: {data.get('sub')}")
+        return data
     except JWTError as e:
         utils_logger.warning(f"Token decode failed: {str(e)}")
         return None
+
+def decode_token(token: str) -> Optional[str]:
+    claims = decode_token_claims(token)
+    return claims.get("sub") if claims else None
+
+
+def encode_cursor(*values: Any) -> str:
+    """Encode keyset pagination values as an opaque, URL-safe cursor."""
+    raw = json.dumps(values, separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    """Decode a cursor made by encode_cursor.
+
+    Raises:
+        ValueError: If the cursor is malformed or doesn't hold ``size`` values
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (binascii.Error, UnicodeError, json.JSONDecodeError) as e:
+        raise ValueError(f"Malformed cursor: {cursor}") from e
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError(f"Malformed cursor: {cursor}")
+    return values
@@ -0,0 +1,75 @@
+"""
+Benchmark memory retrieval latency offline.
+
+Indexes the bundled example messages as memories for a number of synthetic
+users in a temporary NumpyVectorStore, then times embedding + search for
+each query. Uses no network with the "local" (once the model is cached) or
+"hashing" providers.
+
+Usage:
+    python benchmark_memory_search.py [--provider hashing|local] [--users N] [--queries N]
+"""
+import argparse
+import random
+import statistics
+import sys
+import os
+import tempfile
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.embedding_providers import create_embedding_provider
+from app.services.memory_classifier import load_examples
+from app.services.numpy_vector_store import NumpyVectorStore
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark offline memory retrieval")
+    parser.add_argument("--provider", default="hashing", help="Embedding provider (hashing, local, openai)")
+    parser.add_argument("--users", type=int, default=20, help="Synthetic users to index")
+    parser.add_argument("--queries", type=int, default=200, help="Queries to time")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print("MEMORY SEARCH BENCHMARK")
+    print("=" * 80)
+
+    provider = create_embedding_provider(args.provider)
+    texts, _ = load_examples()
+    rng = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory() as shard_dir:
+        store = NumpyVectorStore(shard_directory=shard_dir, embedding_function=provider)
+
+        print(f"\n1. Indexing {len(texts)} memories for each of {args.users} users with {provider.name}")
+        started = time.perf_counter()
+        for user_id in range(1, args.users + 1):
+            store.add_memories(
+                [f"u{user_id}-{i}" for i in range(len(texts))],
+                texts,
+                [{"user_id": user_id, "session_id": f"s{user_id}"} for _ in texts],
+            )
+        print(f"   Indexed in {time.perf_counter() - started:.2f}s")
+
+        print(f"\n2. Timing {args.queries} searches (embedding + per-user search)")
+        latencies = []
+        for _ in range(args.queries):
+            query = rng.choice(texts)
+            started = time.perf_counter()
+            store.search_memories(query, user_id=rng.randint(1, args.users), limit=3, min_similarity=0.0)
+            latencies.append((time.perf_counter() - started) * 1000)
+        print(f"   p50: {statistics.median(latencies):.2f}ms")
+        print(f"   p95: {percentile(latencies, 0.95):.2f}ms")
+        print(f"   max: {max(latencies):.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
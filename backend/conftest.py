@@ -1,11 +1,16 @@
 """Pytest configuration and fixtures."""
+import os
+
+# Keep memory tests offline and deterministic: no embedding model download, no on-disk cache
+os.environ.setdefault("EMBEDDING_PROVIDER", "hashing")
+os.environ.setdefault("EMBEDDING_CACHE_PATH", "")
+
 import pytest
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from sqlmodel import SQLModel
 from app.models import User, ChatSession, Message, Wallet, WalletTransaction
 import tempfile
-import os
 
 
 @pytest.fixture(scope="session")
@@ -1,6 +1,9 @@
 """
-Database migration script to add PhoneVerification table and any other missing tables.
-This script checks existing tables and only creates missing ones.
+Database migration script for existing databases.
+
+Brings the schema up to app/models.py: creates missing tables, adds missing
+nullable columns, creates the declared (composite) indexes and drops the
+single-column indexes they replace. Safe to re-run.
 """
 import sys
 import os
@@ -8,91 +11,42 @@ import os
 # Add parent directory to path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from sqlmodel import SQLModel, Session, text
-from app.models import User, ChatSession, Message, Wallet, WalletTransaction, SessionCharge, Payment, PasswordResetToken, PhoneVerification
-from app.db import engine, init_db
+from sqlalchemy import inspect
+from app.db import engine
+from app.migrations import migrate_schema
 
-def get_existing_tables(db_engine):
-    """Get list of existing tables in the database."""
-    with Session(db_engine) as session:
-        result = session.exec(text("SELECT name FROM sqlite_master WHERE type='table'"))
-        return [row[0] for row in result]
 
 def migrate_database():
-    """Run database migration to create missing tables."""
+    """Run the schema migration and print what changed."""
     print("=" * 80)
     print("DATABASE MIGRATION")
     print("=" * 80)
 
-    # Check existing tables
-    print("\n1. Checking existing tables...")
-    existing_tables = get_existing_tables(engine)
-    print(f"   Found {len(existing_tables)} existing tables:")
-    for table in existing_tables:
-        print(f"   - {table}")
+    print("\n1. Migrating schema...")
+    try:
+        report = migrate_schema(engine)
+    except Exception as e:
+        print(f"   ✗ Error migrating schema: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
 
-    # List of expected tables
-    expected_tables = {
-        'user': User,
-        'chatsession': ChatSession,
-        'message': Message,
-        'wallet': Wallet,
-        'wallettransaction': WalletTransaction,
-        'sessioncharge': SessionCharge,
-        'payment': Payment,
-        'passwordresettoken': PasswordResetToken,
-        'phoneverification': PhoneVerification
+    labels = {
+        "tables": "Created tables",
+        "columns": "Added columns",
+        "indexes": "Created indexes",
+        "dropped_indexes": "Dropped superseded indexes",
     }
-
-    # Find missing tables
-    missing_tables = []
-    for table_name in expected_tables.keys():
-        if table_name not in existing_tables:
-            missing_tables.append(table_name)
-
-    print(f"\n2. Missing tables: {len(missing_tables)}")
-    if missing_tables:
-        for table in missing_tables:
-            print(f"   - {table}")
-    else:
-        print("   ✓ All tables exist!")
-
-    # Create missing tables
-    if missing_tables:
-        print(f"\n3. Creating {len(missing_tables)} missing table(s)...")
-        try:
-            # Use init_db which creates all tables
-            init_db()
-            print("   ✓ Tables created successfully!")
-        except Exception as e:
-            print(f"   ✗ Error creating tables: {e}")
-            import traceback
-            traceback.print_exc()
-            return False
-    else:
-        print("\n3. Skipping table creation - all tables already exist")
-
-    # Verify tables were created
-    print("\n4. Verifying database schema...")
-    existing_tables_after = get_existing_tables(engine)
-    print(f"   Found {len(existing_tables_after)} tables after migration:")
-    for table in existing_tables_after:
-        print(f"   - {table}")
-
-    # Check if PhoneVerification table exists now
-    if 'phoneverification' in existing_tables_after:
-        print("\n✅ SUCCESS: PhoneVerification table created!")
-
-        # Show table schema
-        with Session(engine) as session:
-            result = session.exec(text("PRAGMA table_info(phoneverification)"))
-            columns = list(result)
-            print("\n   PhoneVerification table schema:")
-            for col in columns:
-                print(f"   - {col[1]}: {col[2]}")
-    else:
-        print("\n✗ WARNING: PhoneVerification table was not created")
-        return False
+    for kind, label in labels.items():
+        print(f"   {label}: {len(report[kind])}")
+        for name in report[kind]:
+            print(f"   - {name}")
+
+    print("\n2. Verifying database schema...")
+    inspector = inspect(engine)
+    for table_name in inspector.get_table_names():
+        indexes = [index["name"] for index in inspector.get_indexes(table_name)]
+        print(f"   - {table_name}: {', '.join(indexes) if indexes else 'no secondary indexes'}")
 
     print("\n" + "=" * 80)
     print("MIGRATION COMPLETED SUCCESSFULLY")
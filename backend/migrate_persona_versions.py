@@ -0,0 +1,55 @@
+"""
+Database migration script to store session system prompts as persona versions.
+
+Sessions used to get a copy of the full system prompt as their first message.
+This script runs the schema migration (adding the personaversion table and the
+chatsession.persona_version column), then moves each session's system message
+into a (de-duplicated) persona version referenced by the session. Safe to
+re-run.
+"""
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlmodel import Session, text
+from app.db import engine
+from app.migrations import migrate_schema
+from app.services.session_service import SessionService
+
+
+def migrate_database(batch_size: int = 500) -> bool:
+    """Run the persona version migration."""
+    print("=" * 80)
+    print("PERSONA VERSION MIGRATION")
+    print("=" * 80)
+
+    print("\n1. Migrating schema (personaversion table, chatsession.persona_version)...")
+    report = migrate_schema(engine)
+    print(f"   ✓ {len(report['tables'])} tables and {len(report['columns'])} columns added")
+
+    print("\n2. Moving system messages to persona versions...")
+    try:
+        with Session(engine) as session:
+            migrated = SessionService(session).migrate_system_messages(batch_size=batch_size)
+            remaining = session.exec(text("SELECT COUNT(*) FROM message WHERE role = 'system'")).one()[0]
+            versions = session.exec(text("SELECT COUNT(*) FROM personaversion")).one()[0]
+    except Exception as e:
+        print(f"   ✗ Error migrating system messages: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+    print(f"   ✓ Migrated {migrated} sessions ({versions} distinct persona versions)")
+    if remaining:
+        print(f"   - {remaining} system messages left in place (extra or orphaned rows)")
+
+    print("\n" + "=" * 80)
+    print("MIGRATION COMPLETED SUCCESSFULLY")
+    print("=" * 80)
+    return True
+
+
+if __name__ == "__main__":
+    success = migrate_database()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,90 @@
+"""
+Train and evaluate the local memory-need classifier.
+
+Reads labelled messages (JSONL rows of {"text": ..., "needs_memory": bool}),
+reports cross-validated metrics behind the confidence gate, trains on all
+examples, writes the model used by MemoryAgent and scores it on a held-out
+set that is never trained on.
+
+Usage:
+    python train_memory_classifier.py [--examples PATH] [--holdout PATH] [--output PATH]
+"""
+import argparse
+import random
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.config.settings import get_settings
+from app.services.memory_classifier import (
+    DEFAULT_EXAMPLES_PATH,
+    DEFAULT_HOLDOUT_PATH,
+    DEFAULT_MODEL_PATH,
+    LocalMemoryClassifier,
+    evaluate,
+    load_examples,
+)
+
+
+def cross_validate(texts, labels, folds, low, high, seed):
+    """Average gate metrics over k stratified-by-shuffle folds."""
+    indices = list(range(len(texts)))
+    random.Random(seed).shuffle(indices)
+    results = []
+    for fold in range(folds):
+        test_idx = set(indices[fold::folds])
+        train = [(texts[i], labels[i]) for i in indices if i not in test_idx]
+        test = [(texts[i], labels[i]) for i in sorted(test_idx)]
+        model = LocalMemoryClassifier().fit([t for t, _ in train], [y for _, y in train], seed=seed)
+        results.append(evaluate(model, [t for t, _ in test], [y for _, y in test], low, high))
+    return {
+        name: sum(getattr(r, name) for r in results) / len(results)
+        for name in ("accuracy", "precision", "recall", "coverage", "gated_accuracy")
+    }
+
+
+def main():
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description="Train the local memory-need classifier")
+    parser.add_argument("--examples", default=str(DEFAULT_EXAMPLES_PATH), help="Labelled JSONL examples")
+    parser.add_argument("--holdout", default=str(DEFAULT_HOLDOUT_PATH), help="Labelled JSONL examples kept out of training")
+    parser.add_argument("--output", default=str(DEFAULT_MODEL_PATH), help="Where to write the model")
+    parser.add_argument("--folds", type=int, default=5, help="Cross-validation folds")
+    parser.add_argument("--low", type=float, default=settings.memory_classifier_low, help="Gate lower bound")
+    parser.add_argument("--high", type=float, default=settings.memory_classifier_high, help="Gate upper bound")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print("MEMORY-NEED CLASSIFIER TRAINING")
+    print("=" * 80)
+
+    texts, labels = load_examples(args.examples)
+    positives = sum(labels)
+    print(f"\n1. Loaded {len(texts)} examples ({positives} need memory, {len(texts) - positives} do not)")
+
+    print(f"\n2. {args.folds}-fold cross-validation (gate: p <= {args.low} -> FALSE, p >= {args.high} -> TRUE)")
+    metrics = cross_validate(texts, labels, args.folds, args.low, args.high, args.seed)
+    print(f"   Accuracy:         {metrics['accuracy']:.3f}")
+    print(f"   Precision:        {metrics['precision']:.3f}")
+    print(f"   Recall:           {metrics['recall']:.3f}")
+    print(f"   Gate coverage:    {metrics['coverage']:.3f}  (share decided locally, rest escalated to LLM)")
+    print(f"   Gated accuracy:   {metrics['gated_accuracy']:.3f}")
+
+    print(f"\n3. Training on all examples and writing {args.output}")
+    model = LocalMemoryClassifier().fit(texts, labels, seed=args.seed)
+    model.save(args.output)
+    print(f"   Saved model with {len(model.to_dict()['weights'])} non-zero weights")
+
+    holdout_texts, holdout_labels = load_examples(args.holdout)
+    print(f"\n4. Held-out evaluation on {len(holdout_texts)} examples from {args.holdout}")
+    held_out = evaluate(model, holdout_texts, holdout_labels, args.low, args.high)
+    print(f"   Accuracy:         {held_out.accuracy:.3f}")
+    print(f"   Gate coverage:    {held_out.coverage:.3f}")
+    print(f"   Gated accuracy:   {held_out.gated_accuracy:.3f}")
+
+
+if __name__ == "__main__":
+    main()